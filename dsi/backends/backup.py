@@ -0,0 +1,46 @@
+import os
+
+# number of backup files kept per database by default: only the latest backup, as in earlier releases
+BACKUP_GENERATIONS = 1
+# pages copied per step of the SQLite online backup, so other connections can use the database between steps
+BACKUP_PAGES = 4096
+
+def generation_path(backup_file, generation):
+    """
+    Returns the path of an older backup, `generation` backups before the latest one in `backup_file`.
+    Generation 0 is `backup_file` itself, and generation 1 of "data.backup.db" is "data.backup.1.db"
+    """
+    if generation == 0:
+        return backup_file
+    root, extension = os.path.splitext(backup_file)
+    return f"{root}.{generation}{extension}"
+
+def rotate_backups(backup_file, generations):
+    """
+    Makes room for a new backup in `backup_file`: each kept backup moves one generation older
+    and the backup that would exceed `generations` files is deleted
+    """
+    oldest = generation_path(backup_file, generations - 1)
+    if os.path.exists(oldest):
+        os.remove(oldest)
+    for generation in range(generations - 2, -1, -1):
+        path = generation_path(backup_file, generation)
+        if os.path.exists(path):
+            os.replace(path, generation_path(backup_file, generation + 1))
+
+def install_backup(temp_file, backup_file, generations):
+    """
+    Moves a finished backup from `temp_file` into `backup_file` after rotating the older ones,
+    so an interrupted backup never replaces a complete one
+    """
+    if generations < 1:
+        raise ValueError("At least one backup generation must be kept")
+    rotate_backups(backup_file, generations)
+    os.replace(temp_file, backup_file)
+
+def backup_current(last_backup, backup_file, version):
+    """
+    Returns True if `backup_file` already holds the database at `version`, as recorded in `last_backup`
+    by the backend's previous backup, so a new backup would copy the same data
+    """
+    return last_backup == (backup_file, version) and os.path.isfile(backup_file)
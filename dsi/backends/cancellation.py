@@ -0,0 +1,221 @@
+import sqlite3
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+
+import pandas as pd
+
+# SQLite virtual machine instructions between two checks of the deadline and of cancel()
+PROGRESS_STEPS = 10000
+
+# Seconds between two interrupts of a DuckDB connection once its deadline passed or cancel() was called
+INTERRUPT_INTERVAL = 0.01
+
+class QueryCancelled(Exception):
+    """
+    Raised, or returned as the error type of a backend's error tuple, when a statement was interrupted
+    because its timeout passed or `cancel()` was called
+    """
+    pass
+
+class Limit:
+    """
+    **Internal use only. Do not call**
+
+    State of the outermost `limit()` running in one thread
+    """
+    def __init__(self, timeout):
+        self.depth = 0
+        self.timeout = timeout
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.cancelled = False
+        # the connection or cursor the statements run on, and the DuckDB watcher thread with its events
+        self.target = None
+        self.watcher = None
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+
+class Cancellation(metaclass=ABCMeta):
+    """
+    Timeout and cooperative cancellation of the statements a backend runs.
+
+    Statements run inside `limit()` are interrupted by the engine once the timeout passes, or as soon as `cancel()` is called
+    from another thread or a signal handler. The interrupted statement fails with the engine's interrupt error, which
+    `limit()` raises as a QueryCancelled. The connection, its transaction state and every loaded table are left intact.
+    Each thread has its own limit, so threads reading through a read pool time out independently. Nested `limit()` calls
+    of one thread share the deadline of the outermost one.
+    """
+    def __init__(self):
+        self.local = threading.local()
+        # outermost limits currently running, by thread
+        self.limits = {}
+
+    @contextmanager
+    def limit(self, timeout = None):
+        """
+        Context manager within which statements are interrupted after `timeout` seconds, or by `cancel()`.
+        No timeout applies if `timeout` is None
+        """
+        state = getattr(self.local, "limit", None)
+        if state is None:
+            state = self.local.limit = Limit(timeout)
+            self.arm(state)
+            self.limits[threading.get_ident()] = state
+        state.depth += 1
+        try:
+            yield
+        except self.interrupt_errors() as e:
+            if self.triggered(state):
+                raise QueryCancelled(self.reason(state)) from e
+            raise
+        finally:
+            state.depth -= 1
+            if state.depth == 0:
+                self.limits.pop(threading.get_ident(), None)
+                self.local.limit = None
+                self.disarm(state)
+
+    def cancel(self):
+        """
+        Interrupts the statements running inside `limit()` in every thread, if any. Safe to call from any thread
+        or a signal handler.
+
+        `return`: True if a statement was interrupted, False if none was running
+        """
+        # list() copies the running limits atomically, without a lock a signal handler could deadlock on
+        running = list(self.limits.values())
+        for state in running:
+            state.cancelled = True
+            self.interrupt(state)
+        return len(running) > 0
+
+    def triggered(self, state):
+        """
+        Returns True if the statement running under `state` must stop: `cancel()` was called or the deadline passed
+        """
+        return state.cancelled or (state.deadline is not None and time.monotonic() >= state.deadline)
+
+    def reason(self, state):
+        """
+        Returns the message of the QueryCancelled error of a statement interrupted under `state`
+        """
+        if state.cancelled:
+            return "The statement was cancelled"
+        return f"The statement was cancelled after exceeding its timeout of {state.timeout} seconds"
+
+    @abstractmethod
+    def arm(self, state):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    @abstractmethod
+    def disarm(self, state):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    @abstractmethod
+    def interrupt(self, state):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    @abstractmethod
+    def interrupt_errors(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns the exception types an interrupted statement fails with
+        """
+        pass
+
+class SqliteCancellation(Cancellation):
+    """
+    Cancellation of SQLite statements with a progress handler, which checks the deadline and `cancel()` every
+    few thousand virtual machine instructions and stops the statement once either is reached.
+    The handler is installed on the connection the calling thread's statements run on
+    """
+    def __init__(self, connection):
+        """
+        `connection` : function returning the connection that statements of the calling thread run on
+        """
+        super().__init__()
+        self.connection = connection
+
+    def arm(self, state):
+        state.target = self.connection()
+        state.target.set_progress_handler(lambda: self.triggered(state), PROGRESS_STEPS)
+
+    def disarm(self, state):
+        state.target.set_progress_handler(None, 0)
+        state.target = None
+
+    def interrupt(self, state):
+        # the progress handler stops the statement at its next check, so nothing else is needed
+        pass
+
+    def interrupt_errors(self):
+        # pandas reports errors of read_sql_query as its own DatabaseError
+        return (sqlite3.OperationalError, pd.errors.DatabaseError)
+
+class DuckDBCancellation(Cancellation):
+    """
+    Cancellation of DuckDB statements with `interrupt()`, called by a watcher thread once the deadline passes
+    or `cancel()` is called.
+
+    An interrupt only stops the statement running at that moment, and is lost if it arrives between two statements.
+    The watcher therefore keeps interrupting the connection every INTERRUPT_INTERVAL seconds until `limit()` exits,
+    so every statement started after the deadline is stopped as well.
+    """
+    def __init__(self, cursor):
+        """
+        `cursor` : the cursor, or ThreadCursor, the backend runs its statements on
+        """
+        super().__init__()
+        self.cursor = cursor
+
+    def arm(self, state):
+        # a ThreadCursor is resolved here, in the thread that runs the statements, rather than in the watcher thread
+        state.target = self.cursor.current() if hasattr(self.cursor, "current") else self.cursor
+        if state.deadline is not None:
+            self.watch(state)
+
+    def disarm(self, state):
+        state.stopped.set()
+        state.wake.set()
+
+    def interrupt(self, state):
+        # called by cancel(): wakes a watcher waiting for the deadline, or starts one, which interrupts until limit() exits
+        state.wake.set()
+        self.watch(state)
+
+    def watch(self, state):
+        """
+        **Internal use only. Do not call**
+
+        Starts the watcher thread of `state`, which interrupts its connection once the deadline passes or `cancel()`
+        wakes it, and then every INTERRUPT_INTERVAL seconds until `disarm()` is called. Does nothing if it is already running
+        """
+        if state.watcher is not None:
+            return
+        state.watcher = threading.Thread(target=self.repeat, args=(state,), daemon=True)
+        state.watcher.start()
+
+    def repeat(self, state):
+        """
+        **Internal use only. Do not call**
+        """
+        delay = None if state.deadline is None else max(state.deadline - time.monotonic(), 0)
+        state.wake.wait(delay)
+        while not state.stopped.is_set():
+            state.target.interrupt()
+            state.stopped.wait(INTERRUPT_INTERVAL)
+
+    def interrupt_errors(self):
+        import duckdb
+        return (duckdb.InterruptException,)
@@ -0,0 +1,302 @@
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+
+from dsi.backends.text_index import TEXT_INDEX_PREFIX
+from dsi.backends.column_stats import COLUMN_STATS_TABLE
+from dsi.backends.sketches import SKETCHES_TABLE
+from dsi.backends.merge import MERGED_RUNS_TABLE
+
+class CatalogTable:
+    """
+    Cached schema of one table
+
+        - name: table name as stored in the database
+        - columns: list of column names in declaration order
+        - types: list of declared column types, parallel to `columns`
+        - pk: list of primary key positions, parallel to `columns`. 0 if the column is not part of the primary key
+        - foreign_keys: list of (column, referenced table, referenced column) tuples
+    """
+    def __init__(self, name):
+        self.name = name
+        self.columns = []
+        self.types = []
+        self.pk = []
+        self.foreign_keys = []
+
+class Catalog(metaclass=ABCMeta):
+    """
+    In-process cache of a backend connection's schema: tables, columns, declared types, primary keys and foreign keys.
+
+    The whole schema is loaded with a few set-based queries and kept until the database's schema version marker changes.
+    Checking the marker is a single cheap query, so every backend method can call `tables()`/`table()` freely instead of
+    walking the system catalog table by table. DDL issued by the backend itself is applied with `reload_table()`,
+    which re-reads only the affected table.
+    """
+    # tables with these name prefixes are internal and never returned to users
+    hidden_prefixes = ()
+
+    def __init__(self, cursor):
+        """
+        `cursor` : database cursor used to read the schema. It must see the backend's open transaction
+        """
+        self.cur = cursor
+        self.lock = Lock()
+        self.loaded_version = None
+        self.entries = OrderedDict()
+
+    @abstractmethod
+    def version(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns a marker that changes whenever the schema changes
+        """
+        pass
+
+    @abstractmethod
+    def load(self):
+        """
+        **Internal use only. Do not call**
+
+        Reads the full schema and returns an OrderedDict of table name -> CatalogTable in catalog order
+        """
+        pass
+
+    @abstractmethod
+    def load_table(self, table_name):
+        """
+        **Internal use only. Do not call**
+
+        Reads the schema of one table. Returns a CatalogTable, or None if the table does not exist
+        """
+        pass
+
+    def reorder(self):
+        """
+        **Internal use only. Do not call**
+
+        Puts the cached tables back in catalog order after a table was added. New tables are appended by default
+        """
+        pass
+
+    def invalidate(self):
+        """
+        Forces the next lookup to reload the whole schema
+        """
+        self.loaded_version = None
+
+    def refresh(self):
+        """
+        **Internal use only. Do not call**
+
+        Reloads the schema if the version marker changed since it was last loaded
+        """
+        with self.lock:
+            current = self.version()
+            if self.loaded_version is None or current != self.loaded_version:
+                self.entries = self.load()
+                self.loaded_version = current
+
+    def reload_table(self, table_name):
+        """
+        Re-reads the schema of a single table after the backend created, altered or dropped it
+        """
+        with self.lock:
+            if self.loaded_version is None:
+                return
+            table_name = self.unquote(table_name)
+            entry = self.load_table(table_name)
+            if entry is None:
+                for name in [name for name in self.entries.keys() if name.lower() == table_name.lower()]:
+                    del self.entries[name]
+            else:
+                new_table = entry.name not in self.entries
+                self.entries[entry.name] = entry
+                if new_table:
+                    self.reorder()
+            self.loaded_version = self.version()
+
+    def unquote(self, table_name):
+        """
+        **Internal use only. Do not call**
+        """
+        if len(table_name) > 1 and table_name[0] == '"' and table_name[-1] == '"':
+            return table_name[1:-1]
+        return table_name
+
+    def is_hidden(self, table_name):
+        """
+        **Internal use only. Do not call**
+        """
+        return table_name.startswith(self.hidden_prefixes)
+
+    def tables(self):
+        """
+        Returns a list of all user visible table names in catalog order
+        """
+        self.refresh()
+        return [name for name in self.entries.keys() if not self.is_hidden(name)]
+
+    def all_tables(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns a list of all table names in catalog order, including internal tables
+        """
+        self.refresh()
+        return list(self.entries.keys())
+
+    def table(self, table_name):
+        """
+        Returns the CatalogTable for `table_name`, or None if the table does not exist.
+        A name wrapped in double quotes is matched without its quotes.
+        """
+        self.refresh()
+        table_name = self.unquote(table_name)
+        entry = self.entries.get(table_name)
+        if entry is None:
+            # both engines resolve unquoted identifiers case-insensitively
+            entry = next((e for name, e in self.entries.items() if name.lower() == table_name.lower()), None)
+        return entry
+
+    def relations(self):
+        """
+        Returns the (primary keys, foreign keys) of the whole database in catalog order.
+
+            - primary keys: list of (table, column) for the first column of each table's primary key
+            - foreign keys: list of (table, column, referenced table, referenced column)
+        """
+        self.refresh()
+        entries = [entry for entry in self.entries.values() if not self.is_hidden(entry.name)]
+        primary_keys = [(entry.name, col) for entry in entries for col, pk in zip(entry.columns, entry.pk) if pk == 1]
+        foreign_keys = [(entry.name,) + tuple(fk) for entry in entries for fk in entry.foreign_keys]
+        return primary_keys, foreign_keys
+
+class SqliteCatalog(Catalog):
+    """
+    Schema catalog of a SQLite connection, invalidated through `PRAGMA schema_version`
+    """
+    hidden_prefixes = ("sqlite_", TEXT_INDEX_PREFIX, COLUMN_STATS_TABLE, SKETCHES_TABLE, MERGED_RUNS_TABLE)
+
+    def version(self):
+        return self.cur.execute("PRAGMA schema_version;").fetchone()[0]
+
+    def load(self):
+        entries = OrderedDict()
+        col_rows = self.cur.execute("""
+            SELECT m.name, p.name, p.type, p.pk FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p
+            WHERE m.type = 'table';""").fetchall()
+        for table_name, col_name, col_type, pk in col_rows:
+            if table_name not in entries:
+                entries[table_name] = CatalogTable(table_name)
+            entry = entries[table_name]
+            entry.columns.append(col_name)
+            entry.types.append(col_type)
+            entry.pk.append(pk)
+
+        fk_rows = self.cur.execute("""
+            SELECT m.name, f."from", f."table", f."to" FROM sqlite_master AS m JOIN pragma_foreign_key_list(m.name) AS f
+            WHERE m.type = 'table';""").fetchall()
+        for table_name, col_name, ref_table, ref_col in fk_rows:
+            entries[table_name].foreign_keys.append((col_name, ref_table, ref_col))
+        return entries
+
+    def load_table(self, table_name):
+        name_row = self.cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE;",
+                                    (table_name,)).fetchone()
+        if name_row is None:
+            return None
+        entry = CatalogTable(name_row[0])
+        for col_name, col_type, pk in self.cur.execute("SELECT name, type, pk FROM pragma_table_info(?);", (entry.name,)).fetchall():
+            entry.columns.append(col_name)
+            entry.types.append(col_type)
+            entry.pk.append(pk)
+        entry.foreign_keys = self.cur.execute("""SELECT "from", "table", "to" FROM pragma_foreign_key_list(?);""",
+                                              (entry.name,)).fetchall()
+        return entry
+
+    def has_rowid_alias(self, table_name):
+        """
+        Returns True if `table_name` has an INTEGER PRIMARY KEY column. SQLite uses that column's value as the rowid,
+        so rows inserted later can have lower rowids than existing ones
+        """
+        entry = self.table(table_name)
+        if entry is None or sorted(entry.pk)[-1:] != [1]:
+            return False
+        return entry.types[entry.pk.index(1)].upper() == "INTEGER"
+
+class DuckDBCatalog(Catalog):
+    """
+    Schema catalog of a DuckDB connection, invalidated through a marker built from `duckdb_tables()`.
+    Every CREATE, DROP or ALTER of a table changes the table oids or column counts that make up the marker.
+    Only the connection's own database is read, not databases attached to it or temporary tables.
+    """
+    hidden_prefixes = (TEXT_INDEX_PREFIX, COLUMN_STATS_TABLE, SKETCHES_TABLE, MERGED_RUNS_TABLE)
+
+    def version(self):
+        return self.cur.execute("""SELECT COUNT(*), SUM(table_oid), SUM(column_count) FROM duckdb_tables()
+                                   WHERE database_name = current_database() AND schema_name = 'main';""").fetchone()
+
+    def load(self):
+        entries = OrderedDict()
+        table_rows = self.cur.execute("""
+            SELECT table_name FROM information_schema.tables
+            WHERE table_catalog = current_database() AND table_schema = 'main' AND table_type = 'BASE TABLE'""").fetchall()
+        for (table_name,) in table_rows:
+            entries[table_name] = CatalogTable(table_name)
+
+        col_rows = self.cur.execute("""
+            SELECT table_name, column_name, data_type FROM duckdb_columns()
+            WHERE database_name = current_database() AND schema_name = 'main' ORDER BY table_oid, column_index""").fetchall()
+        for table_name, col_name, col_type in col_rows:
+            if table_name in entries:
+                entries[table_name].columns.append(col_name)
+                entries[table_name].types.append(col_type)
+                entries[table_name].pk.append(0)
+
+        self.load_constraints(entries, """SELECT table_name, constraint_type, constraint_column_names, referenced_table,
+                                          referenced_column_names FROM duckdb_constraints() WHERE database_name = current_database()
+                                          AND schema_name = 'main' AND constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY')""")
+        return entries
+
+    def reorder(self):
+        names = self.cur.execute("""SELECT table_name FROM information_schema.tables
+                                    WHERE table_catalog = current_database() AND table_schema = 'main'
+                                    AND table_type = 'BASE TABLE'""").fetchall()
+        self.entries = OrderedDict((name, self.entries[name]) for (name,) in names if name in self.entries)
+
+    def load_table(self, table_name):
+        col_rows = self.cur.execute("""
+            SELECT table_name, column_name, data_type FROM duckdb_columns()
+            WHERE database_name = current_database() AND schema_name = 'main' AND lower(table_name) = lower(?)
+            ORDER BY column_index""", [table_name]).fetchall()
+        if len(col_rows) == 0:
+            return None
+        entry = CatalogTable(col_rows[0][0])
+        for _, col_name, col_type in col_rows:
+            entry.columns.append(col_name)
+            entry.types.append(col_type)
+            entry.pk.append(0)
+
+        self.load_constraints(OrderedDict([(entry.name, entry)]),
+                              """SELECT table_name, constraint_type, constraint_column_names, referenced_table,
+                                 referenced_column_names FROM duckdb_constraints() WHERE database_name = current_database()
+                                 AND schema_name = 'main' AND constraint_type IN ('PRIMARY KEY', 'FOREIGN KEY') AND table_name = ?""", [entry.name])
+        return entry
+
+    def load_constraints(self, entries, query, params = None):
+        """
+        **Internal use only. Do not call**
+
+        Adds the primary and foreign keys returned by `query` on duckdb_constraints() to the matching CatalogTables
+        """
+        for table_name, constraint_type, cols, ref_table, ref_cols in self.cur.execute(query, params).fetchall():
+            if table_name not in entries:
+                continue
+            entry = entries[table_name]
+            if constraint_type == 'PRIMARY KEY':
+                for position, col in enumerate(cols):
+                    entry.pk[entry.columns.index(col)] = position + 1
+            else:
+                entry.foreign_keys.append((cols[0], ref_table, ref_cols[0]))
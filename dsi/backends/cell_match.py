@@ -0,0 +1,55 @@
+import math
+
+from dsi.backends.type_inference import INT32, INT64, FLOAT
+from dsi.backends.type_inference import INT32_MIN, INT32_MAX, INT64_MIN, INT64_MAX
+
+# Characters that can appear in the text form of a number in either backend ('1.5e-05', '-inf', 'nan', 'Infinity'),
+# plus the LIKE wildcards. A string query with any other character can never match a numeric cell
+NUMBER_TEXT_CHARS = frozenset("0123456789.+-einfatyn%_")
+
+def is_number(query_object):
+    """
+    Returns True if `query_object` is searched for as a number rather than as text.
+    Booleans and non-finite floats are searched for as text, as before.
+    """
+    if isinstance(query_object, bool) or not isinstance(query_object, (int, float)):
+        return False
+    return not isinstance(query_object, float) or math.isfinite(query_object)
+
+def number_literal(query_object):
+    """
+    Returns the SQL literal of a number accepted by `is_number()`
+    """
+    return str(query_object) if isinstance(query_object, int) else repr(query_object)
+
+def like_pattern(query_object):
+    """
+    Returns the quoted SQL pattern that matches `query_object` anywhere in a cell's text
+    """
+    escaped = str(query_object).replace("'", "''")
+    return f"'%{escaped}%'"
+
+def number_text_possible(query_object):
+    """
+    Returns False if the text of `query_object` cannot be part of the text of any number
+    """
+    return set(str(query_object).lower()) <= NUMBER_TEXT_CHARS
+
+def number_fits(kind, query_object):
+    """
+    Returns False if a column of `kind` cannot hold a value equal to the number `query_object`:
+    a non-integral value or a value outside the column's range for integer columns
+    """
+    if kind not in (INT32, INT64):
+        return True
+    if isinstance(query_object, float) and not query_object.is_integer():
+        return False
+    low, high = (INT32_MIN, INT32_MAX) if kind == INT32 else (INT64_MIN, INT64_MAX)
+    return low <= query_object <= high
+
+def numeric_kind(kind):
+    """
+    Returns True for the kinds of columns that only hold numbers
+    """
+    return kind in (INT32, INT64, FLOAT)
+
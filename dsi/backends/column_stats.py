@@ -0,0 +1,638 @@
+import math
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from decimal import Decimal
+
+import numpy as np
+
+# Name of the table holding the statistics. Catalogs hide it from users
+COLUMN_STATS_TABLE = "dsi_column_stats"
+
+# mark() of a table that does not exist yet: every row it holds after the ingest was inserted by that ingest
+NEW_TABLE = "new table"
+
+class ColumnMoments:
+    """
+    Mergeable statistics of one column
+
+        - count: number of non-null values
+        - nulls: number of null values
+        - mean: mean of the values, None if there are none or the column is not numeric
+        - m2: sum of squared deviations from `mean`
+        - min, max: smallest and largest value, None if there are none
+
+    Sums and sums of squares are kept as a mean and M2 (sum of squared deviations) so that merging batches with
+    Chan's parallel formula does not lose precision to cancellation. The sum is `count * mean`, and the sum of
+    squares is `m2 + count * mean ** 2`.
+    """
+    def __init__(self, count = 0, nulls = 0, mean = None, m2 = 0.0, min = None, max = None):
+        self.count = count
+        self.nulls = nulls
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    def merge(self, other, order):
+        """
+        Returns the statistics of the union of both sets of values.
+        `order` is the sort key the database compares the column's values with
+        """
+        count = self.count + other.count
+        if self.mean is None or other.mean is None:
+            mean = self.mean if other.count == 0 else other.mean if self.count == 0 else None
+            m2 = self.m2 if other.count == 0 else other.m2 if self.count == 0 else 0.0
+        else:
+            delta = other.mean - self.mean
+            mean = self.mean + delta * other.count / count
+            m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / count
+        values = [v for v in (self.min, other.min) if v is not None]
+        minimum = min(values, key = order) if len(values) > 0 else None
+        values = [v for v in (self.max, other.max) if v is not None]
+        maximum = max(values, key = order) if len(values) > 0 else None
+        return ColumnMoments(count, self.nulls + other.nulls, mean, m2, minimum, maximum)
+
+    def std_dev(self, sample = False):
+        """
+        Returns the population (or sample) standard deviation. 0 for a single value, None without a mean
+        """
+        if self.mean is None:
+            return None
+        if self.count <= 1:
+            return 0
+        return math.sqrt(max(self.m2, 0.0) / (self.count - 1 if sample else self.count))
+
+class TableStats:
+    """
+    Statistics of one table: its row count, its highest rowid when they were taken,
+    and an OrderedDict of column name -> ColumnMoments in column order
+    """
+    def __init__(self, num_rows = 0, max_rowid = None, columns = None):
+        self.num_rows = num_rows
+        self.max_rowid = max_rowid
+        self.columns = OrderedDict() if columns is None else columns
+
+class ColumnStats(metaclass=ABCMeta):
+    """
+    Per-column statistics of every table, stored in the `dsi_column_stats` table and maintained incrementally
+    inside each ingest's transaction, so `list()`, `display()` and `summary()` read a few rows per column
+    instead of scanning tables.
+
+    Each table has one row with a NULL column_name holding its row count and highest rowid, and one row per column.
+    An ingest takes a `mark()` of a table before inserting, then `update()` aggregates only the rows added since the
+    mark and merges them into the stored statistics. A table created or recreated since its mark, or whose stored
+    statistics no longer match its contents, is aggregated again in full.
+
+    Statistics are checked against the table before they are used (see `is_fresh()`). Stale statistics,
+    e.g. of a database written by an older DSI, are rebuilt on first use.
+    """
+    def __init__(self, cursor, catalog):
+        """
+        `cursor` : database cursor that sees the backend's open transaction
+
+        `catalog` : the backend's schema Catalog
+        """
+        self.cur = cursor
+        self.catalog = catalog
+
+    def exists(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if the database already stores column statistics
+        """
+        return self.catalog.table(COLUMN_STATS_TABLE) is not None
+
+    @abstractmethod
+    def create(self):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    def mark(self, table_name):
+        """
+        Returns the highest rowid of `table_name` before an ingest, NEW_TABLE if the table does not exist yet,
+        or None if its stored statistics are stale and must be rebuilt after the ingest
+        """
+        return self.mark_state(table_name, self.load(table_name))
+
+    def mark_state(self, table_name, stored):
+        """
+        **Internal use only. Do not call**
+
+        Returns the mark of `table_name` for `stored` statistics or sketches (a TableStats), like `mark()`
+        """
+        if self.catalog.table(table_name) is None:
+            return NEW_TABLE
+        if stored is None or not self.is_fresh(table_name, stored):
+            return None
+        return self.current_state(table_name)[1]
+
+    def update(self, table_name, mark, values = None):
+        """
+        Merges the statistics of the rows of `table_name` added since `mark` was taken into the stored statistics.
+        Rebuilds them when `mark` is None. Runs inside the caller's transaction
+
+        `values` : dict, optional, default=None
+            The ingested data as column name -> list of values, which backends may aggregate without reading the rows back
+        """
+        if mark is NEW_TABLE:
+            stored, mark = TableStats(), None
+        else:
+            stored = None if mark is None else self.load(table_name)
+            if stored is not None and not self.in_order(table_name, mark, stored.num_rows, values):
+                stored = None
+            if stored is None:
+                self.store(table_name, self.compute(table_name))
+                return
+        batch = self.compute(table_name, mark = mark, values = values)
+        columns = OrderedDict()
+        for col, moments in batch.columns.items():
+            # a column added by this ingest was null in every earlier row
+            old = stored.columns.get(col, ColumnMoments(nulls = stored.num_rows))
+            columns[col] = old.merge(moments, self.order)
+        self.store(table_name, TableStats(stored.num_rows + batch.num_rows, batch.max_rowid, columns))
+
+    def get(self, table_name, cursor = None):
+        """
+        Returns the TableStats of `table_name`. Stale statistics are recomputed and stored again
+        (or only recomputed if the database cannot be written)
+        """
+        stored = self.load(table_name, cursor)
+        if stored is not None and self.is_fresh(table_name, stored, cursor):
+            return stored
+        table_stats = self.compute(table_name, cursor)
+        self.persist(table_name, table_stats)
+        return table_stats
+
+    def stale(self, table_names):
+        """
+        Returns the tables in `table_names` whose statistics are missing or stale
+        """
+        stale_tables = []
+        for table_name in table_names:
+            stored = self.load(table_name)
+            if stored is None or not self.is_fresh(table_name, stored):
+                stale_tables.append(table_name)
+        return stale_tables
+
+    def drop(self, table_name):
+        """
+        Deletes the statistics of a table. Runs inside the caller's transaction
+        """
+        if self.exists():
+            self.cur.execute(f"DELETE FROM {COLUMN_STATS_TABLE} WHERE lower(table_name) = lower(?)",
+                             [self.catalog.unquote(table_name)])
+
+    @abstractmethod
+    def is_fresh(self, table_name, stored, cursor = None):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if `stored` statistics still describe `table_name`
+        """
+        pass
+
+    def guard(self, name, stats_table):
+        """
+        **Internal use only. Do not call**
+
+        Makes the engine delete the rows of `stats_table` describing the table `name` whenever rows of the table are updated
+        or deleted, by DSI or any other writer, so that they are rebuilt on next use. Does nothing if the engine cannot
+        """
+        pass
+
+    def in_order(self, table_name, mark, num_rows, values = None):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if every row added to `table_name` since `mark` was taken has a rowid above `mark`, so that aggregating
+        those rows covers the whole ingest. `num_rows` is the table's row count when the mark was taken,
+        and `values` the ingested data passed to `update()`
+        """
+        return True
+
+    @abstractmethod
+    def current_state(self, table_name, cursor = None):
+        """
+        **Internal use only. Do not call**
+
+        Returns (row count or None if the engine cannot count cheaply, highest rowid) of `table_name`
+        """
+        pass
+
+    @abstractmethod
+    def compute(self, table_name, cursor = None, mark = None, table_info = None, values = None):
+        """
+        **Internal use only. Do not call**
+
+        Aggregates the rows of `table_name` whose rowid is greater than `mark` (all rows if None) and returns a TableStats.
+        `table_info` is the table's CatalogTable, looked up in the catalog if None.
+        `values` are the values of exactly those rows by column, as passed to `update()`
+        """
+        pass
+
+    def persist(self, table_name, table_stats):
+        """
+        **Internal use only. Do not call**
+
+        Stores `table_stats` in a transaction of its own, or in the open one. Statistics are only an optimization,
+        so a database that cannot be written is left as it is
+        """
+        self.write(lambda: self.store(table_name, table_stats))
+
+    @abstractmethod
+    def write(self, store):
+        """
+        **Internal use only. Do not call**
+
+        Calls `store()` in a transaction of its own, or in the open one, and ignores errors like `persist()`
+        """
+        pass
+
+    @abstractmethod
+    def is_numeric(self, col_type):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if means and deviations are kept for a column declared as `col_type`
+        """
+        pass
+
+    def order(self, value):
+        """
+        **Internal use only. Do not call**
+
+        Sort key matching how the engine compares the values of a column
+        """
+        return value
+
+    def encode(self, value):
+        """
+        **Internal use only. Do not call**
+        """
+        return value
+
+    def decode(self, value, col_type):
+        """
+        **Internal use only. Do not call**
+        """
+        return value
+
+    def load(self, table_name, cursor = None):
+        """
+        **Internal use only. Do not call**
+
+        Returns the stored TableStats of `table_name`, or None if there are none
+        """
+        if not self.exists():
+            return None
+        table_info = self.catalog.table(table_name)
+        if table_info is None:
+            return None
+        cursor = self.cur if cursor is None else cursor
+        types = dict(zip(table_info.columns, table_info.types))
+        rows = cursor.execute(f"""SELECT column_name, num_rows, max_rowid, num_values, num_nulls, mean, m2, min_value, max_value
+                                  FROM {COLUMN_STATS_TABLE} WHERE table_name = ?""", [table_info.name]).fetchall()
+        table_stats = None
+        columns = {}
+        for col, num_rows, max_rowid, count, nulls, mean, m2, min_value, max_value in rows:
+            if col is None:
+                table_stats = TableStats(num_rows, max_rowid)
+            elif col in types:
+                columns[col] = ColumnMoments(count, nulls, mean, m2, self.decode(min_value, types[col]),
+                                             self.decode(max_value, types[col]))
+            else:
+                return None
+        if table_stats is None or len(columns) != len(table_info.columns):
+            return None
+        table_stats.columns = OrderedDict((col, columns[col]) for col in table_info.columns)
+        return table_stats
+
+    def store(self, table_name, table_stats):
+        """
+        **Internal use only. Do not call**
+
+        Replaces the stored statistics of `table_name`. Runs inside the caller's transaction
+        """
+        self.create()
+        name = self.catalog.table(table_name).name
+        self.cur.execute(f"DELETE FROM {COLUMN_STATS_TABLE} WHERE table_name = ?", [name])
+        rows = [(name, None, table_stats.num_rows, table_stats.max_rowid, None, None, None, None, None, None)]
+        for col, m in table_stats.columns.items():
+            rows.append((name, col, None, None, m.count, m.nulls, m.mean, m.m2, self.encode(m.min), self.encode(m.max)))
+        self.cur.executemany(f"INSERT INTO {COLUMN_STATS_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.guard(name, COLUMN_STATS_TABLE)
+
+    def batch_rows(self, values):
+        """
+        **Internal use only. Do not call**
+
+        Returns the number of rows in the ingested `values`, or None if they are not lists of one length
+        """
+        if values is None:
+            return None
+        lengths = {len(v) if isinstance(v, list) else None for v in values.values()}
+        if len(lengths) != 1 or None in lengths:
+            return None
+        return lengths.pop()
+
+    def moments(self, values, numeric, num_rows):
+        """
+        **Internal use only. Do not call**
+
+        Builds a ColumnMoments from the (count, min, max, mean) aggregates of one column
+        """
+        count, minimum, maximum, mean = values
+        if not numeric or count == 0:
+            mean = None
+        return ColumnMoments(count, num_rows - count, mean, 0.0, minimum, maximum)
+
+    def quote(self, name):
+        """
+        **Internal use only. Do not call**
+        """
+        return '"' + name.replace('"', '""') + '"'
+
+class SqliteColumnStats(ColumnStats):
+    """
+    Column statistics of a SQLite backend. Min and max keep SQLite's own values and ordering (numbers < text < blobs).
+    Means and deviations are kept for columns with numeric affinity, where they follow SQLite's AVG(), which reads text as numbers.
+    Ingested lists that SQLite stores unchanged are aggregated in memory with NumPy instead of being read back.
+
+    Stored statistics are fresh while the table's columns and highest rowid are unchanged. Triggers on each table delete
+    its statistics whenever its rows are updated or deleted, by DSI or by any other program writing the file, so they are
+    rebuilt on next use. Statistics of a table without these triggers are never trusted. In a table keyed by an INTEGER PRIMARY KEY, the key is
+    the rowid, so new rows can have lower rowids than existing ones. Its statistics are only rebuilt after an ingest whose
+    keys were not all above the table's highest key.
+    """
+    def create(self):
+        if not self.exists():
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS {COLUMN_STATS_TABLE} (table_name TEXT, column_name TEXT,
+                                 num_rows INTEGER, max_rowid INTEGER, num_values INTEGER, num_nulls INTEGER,
+                                 mean REAL, m2 REAL, min_value, max_value)""")
+            self.catalog.reload_table(COLUMN_STATS_TABLE)
+
+    def current_state(self, table_name, cursor = None):
+        cursor = self.cur if cursor is None else cursor
+        return None, cursor.execute(f"SELECT MAX(rowid) FROM {self.quote(self.catalog.table(table_name).name)}").fetchone()[0]
+
+    def is_fresh(self, table_name, stored, cursor = None):
+        cursor = self.cur if cursor is None else cursor
+        if not self.guarded(self.catalog.table(table_name).name, COLUMN_STATS_TABLE, cursor):
+            return False
+        return stored.max_rowid == self.current_state(table_name, cursor)[1]
+
+    def triggers(self, name, stats_table):
+        """
+        **Internal use only. Do not call**
+
+        Returns the names of the UPDATE and DELETE triggers of `guard()`
+        """
+        return [f"{stats_table}_{name}_{event}" for event in ("update", "delete")]
+
+    def guard(self, name, stats_table):
+        # lets each trigger find the rows of its table without scanning the whole statistics table
+        self.cur.execute(f"CREATE INDEX IF NOT EXISTS {stats_table}_table_name ON {stats_table} (table_name)")
+        literal = "'" + name.replace("'", "''") + "'"
+        for event, trigger in zip(("UPDATE", "DELETE"), self.triggers(name, stats_table)):
+            self.cur.execute(f"""CREATE TRIGGER IF NOT EXISTS {self.quote(trigger)} AFTER {event} ON {self.quote(name)}
+                                 BEGIN DELETE FROM {stats_table} WHERE table_name = {literal}; END""")
+
+    def guarded(self, name, stats_table, cursor):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if the triggers of `guard()` exist on the table `name`
+        """
+        found = cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?)",
+                               self.triggers(name, stats_table)).fetchone()[0]
+        return found == 2
+
+    def in_order(self, table_name, mark, num_rows, values = None):
+        if not self.catalog.has_rowid_alias(table_name):
+            return True
+        table = self.quote(self.catalog.table(table_name).name)
+        added = self.batch_rows(values)
+        if added is None:
+            added = self.cur.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - num_rows
+        # a range scan over the new keys only
+        return added == self.cur.execute(f"SELECT COUNT(*) FROM {table} WHERE rowid > ?", (mark,)).fetchone()[0]
+
+    def affinity(self, col_type):
+        """
+        **Internal use only. Do not call**
+
+        Returns the SQLite type affinity of a column declared as `col_type`
+        """
+        col_type = col_type.upper()
+        if "INT" in col_type:
+            return "INTEGER"
+        if any(t in col_type for t in ("CHAR", "CLOB", "TEXT")):
+            return "TEXT"
+        if "BLOB" in col_type or col_type == "":
+            return "BLOB"
+        if any(t in col_type for t in ("REAL", "FLOA", "DOUB")):
+            return "REAL"
+        return "NUMERIC"
+
+    def is_numeric(self, col_type):
+        return self.affinity(col_type) not in ("TEXT", "BLOB")
+
+    def compute(self, table_name, cursor = None, mark = None, table_info = None, values = None):
+        cursor = self.cur if cursor is None else cursor
+        table_info = self.catalog.table(table_name) if table_info is None else table_info
+        table = self.quote(table_info.name)
+        where = "" if mark is None else f" WHERE rowid > {int(mark)}"
+
+        # columns whose ingested values are stored unchanged are aggregated in memory instead of read back
+        columns = OrderedDict((col, None) for col in table_info.columns)
+        num_rows = self.batch_rows(values)
+        if num_rows is not None:
+            by_name = {self.catalog.unquote(col).lower(): v for col, v in values.items()}
+            for col, col_type in zip(table_info.columns, table_info.types):
+                if col.lower() in by_name:
+                    columns[col] = self.batch_moments(by_name[col.lower()], col_type)
+
+        cols = [(col, self.quote(col), self.is_numeric(col_type))
+                for col, col_type in zip(table_info.columns, table_info.types) if columns[col] is None]
+        aggregates = "".join(f", COUNT({c}), MIN({c}), MAX({c}), {f'AVG({c})' if numeric else 'NULL'}" for _, c, numeric in cols)
+        if num_rows is None or len(cols) > 0:
+            row = cursor.execute(f"SELECT COUNT(*), MAX(rowid){aggregates} FROM {table}{where}").fetchone()
+            num_rows, max_rowid = row[0], row[1]
+        else:
+            max_rowid = cursor.execute(f"SELECT MAX(rowid) FROM {table}{where}").fetchone()[0]
+        for i, (col, _, numeric) in enumerate(cols):
+            columns[col] = self.moments(row[2 + 4 * i : 6 + 4 * i], numeric, num_rows)
+
+        # second pass for the squared deviations around each batch mean, as accurate as the two-pass variance
+        spread = [(col, c) for col, c, _ in cols if columns[col].mean is not None and columns[col].count > 1]
+        if len(spread) > 0:
+            deviations = ", ".join(f"SUM(({c} - ?) * ({c} - ?))" for _, c in spread)
+            means = [columns[col].mean for col, _ in spread for _ in range(2)]
+            for (col, _), m2 in zip(spread, cursor.execute(f"SELECT {deviations} FROM {table}{where}", means).fetchone()):
+                columns[col].m2 = m2
+
+        if mark is not None and max_rowid is None:
+            max_rowid = mark
+        return TableStats(num_rows, max_rowid, columns)
+
+    def batch_moments(self, values, col_type):
+        """
+        **Internal use only. Do not call**
+
+        Aggregates a list of ingested values in memory. Returns None unless SQLite stores them unchanged in a column
+        declared as `col_type`: integers in INTEGER or NUMERIC columns, finite numbers in REAL columns and strings in TEXT columns
+        """
+        if not isinstance(values, list):
+            return None
+        affinity = self.affinity(col_type)
+        non_null, nulls = values, 0
+        array = np.array(values) if affinity != "TEXT" else None
+        if affinity == "TEXT" or array.dtype == object:
+            nulls = values.count(None)
+            non_null = values if nulls == 0 else [v for v in values if v is not None]
+        if len(non_null) == 0:
+            return ColumnMoments(0, nulls)
+
+        if affinity == "TEXT":
+            if set(map(type, non_null)) != {str}:
+                return None
+            return ColumnMoments(len(non_null), nulls, None, 0.0, min(non_null), max(non_null))
+        if nulls > 0:
+            array = np.array(non_null)
+        # mixed types come out as object or string arrays, and NaN is stored as NULL
+        if array.dtype.kind in "bi" and affinity in ("INTEGER", "NUMERIC"):
+            minimum, maximum = int(array.min()), int(array.max())
+        elif array.dtype.kind in "bif" and affinity == "REAL" and np.isfinite(array).all():
+            minimum, maximum = float(array.min()), float(array.max())
+        else:
+            return None
+        array = array.astype(np.float64)
+        mean = float(array.mean())
+        deviations = array - mean
+        return ColumnMoments(len(non_null), nulls, mean, float(np.dot(deviations, deviations)), minimum, maximum)
+
+    def write(self, store):
+        con = self.cur.connection
+        started = not con.in_transaction
+        try:
+            store()
+            if started:
+                con.commit()
+        except Exception:
+            if started:
+                con.rollback()
+                self.catalog.invalidate()
+
+    def order(self, value):
+        if isinstance(value, (int, float)):
+            return (0, value, b"")
+        if isinstance(value, str):
+            return (1, 0, value.encode("utf-8"))
+        return (2, 0, bytes(value))
+
+class DuckDBColumnStats(ColumnStats):
+    """
+    Column statistics of a DuckDB backend. Min and max are kept for numeric and VARCHAR columns and stored as text.
+    Means and deviations are kept for numeric columns.
+
+    Stored statistics are fresh while the table's columns and row count are unchanged. DuckDB counts rows from its
+    metadata, so this check also notices deleted rows. Rows updated outside DSI are not detected.
+    """
+    integer_types = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "UHUGEINT")
+    float_types = ("FLOAT", "DOUBLE")
+
+    def create(self):
+        if not self.exists():
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS {COLUMN_STATS_TABLE} (table_name VARCHAR, column_name VARCHAR,
+                                 num_rows BIGINT, max_rowid BIGINT, num_values BIGINT, num_nulls BIGINT,
+                                 mean DOUBLE, m2 DOUBLE, min_value VARCHAR, max_value VARCHAR)""")
+            self.catalog.reload_table(COLUMN_STATS_TABLE)
+
+    def current_state(self, table_name, cursor = None):
+        cursor = self.cur if cursor is None else cursor
+        table = self.quote(self.catalog.table(table_name).name)
+        return cursor.execute(f"SELECT COUNT(*), COALESCE(MAX(rowid), -1) FROM {table}").fetchone()
+
+    def is_fresh(self, table_name, stored, cursor = None):
+        cursor = self.cur if cursor is None else cursor
+        table = self.quote(self.catalog.table(table_name).name)
+        return stored.num_rows == cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def kind(self, col_type):
+        """
+        **Internal use only. Do not call**
+
+        Returns 'integer', 'float', 'decimal', 'text' or None for the declared type of a column
+        """
+        col_type = col_type.upper()
+        if col_type in self.integer_types:
+            return "integer"
+        if col_type in self.float_types:
+            return "float"
+        if col_type.startswith("DECIMAL"):
+            return "decimal"
+        if col_type == "VARCHAR":
+            return "text"
+        return None
+
+    def is_numeric(self, col_type):
+        return self.kind(col_type) not in (None, "text")
+
+    def compute(self, table_name, cursor = None, mark = None, table_info = None, values = None):
+        cursor = self.cur if cursor is None else cursor
+        table_info = self.catalog.table(table_name) if table_info is None else table_info
+        table = self.quote(table_info.name)
+        kinds = [self.kind(col_type) for col_type in table_info.types]
+        aggregates = []
+        for col, kind in zip(table_info.columns, kinds):
+            c = self.quote(col)
+            min_max = f"MIN({c}), MAX({c})" if kind is not None else "NULL, NULL"
+            spread = f"AVG({c}), VAR_SAMP({c})" if kind not in (None, "text") else "NULL, NULL"
+            aggregates.append(f"COUNT({c}), {min_max}, {spread}")
+        # rows inserted in the open transaction have temporary rowids above every committed one
+        where = "" if mark is None else f" WHERE rowid > {int(mark)}"
+        values = cursor.execute(f"SELECT COUNT(*), {', '.join(aggregates)} FROM {table}{where}").fetchone()
+        num_rows = values[0]
+        columns = OrderedDict()
+        for i, (col, kind) in enumerate(zip(table_info.columns, kinds)):
+            count, minimum, maximum, mean, var_samp = values[1 + 5 * i : 6 + 5 * i]
+            columns[col] = self.moments((count, minimum, maximum, mean), kind not in (None, "text"), num_rows)
+            if columns[col].mean is not None:
+                columns[col].m2 = (var_samp or 0.0) * (count - 1)
+        return TableStats(num_rows, None, columns)
+
+    def write(self, store):
+        # the backend only keeps a transaction open while ingesting, so reads can always start their own
+        try:
+            self.cur.execute("BEGIN TRANSACTION")
+            store()
+            self.cur.execute("COMMIT")
+        except Exception:
+            self.cur.execute("ROLLBACK")
+            self.catalog.invalidate()
+
+    def order(self, value):
+        # DuckDB sorts NaN above every other float
+        if isinstance(value, float) and math.isnan(value):
+            return (1, 0.0)
+        return (0, value)
+
+    def encode(self, value):
+        if value is None:
+            return None
+        return repr(value) if isinstance(value, float) else str(value)
+
+    def decode(self, value, col_type):
+        if value is None:
+            return None
+        kind = self.kind(col_type)
+        if kind == "integer":
+            return int(value)
+        if kind == "float":
+            return float(value)
+        if kind == "decimal":
+            return Decimal(value)
+        return value
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+from abc import ABCMeta, abstractmethod
+from pathlib import Path
+
+# read pools shared by all backends of this process, by absolute database path
+READ_POOLS = {}
+READ_POOLS_LOCK = threading.Lock()
+
+class ReadPool(metaclass=ABCMeta):
+    """
+    Read handles to one database file, shared by every backend of the process that opens the file with `read_pool=True`.
+
+    Each thread gets its own handle, created on its first read and reused by all backends of the file until the last
+    of them closes. Handles only see committed data, so readers never observe a writer's open transaction.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.handles = []
+        self.users = 0
+
+    @abstractmethod
+    def connect(self):
+        """
+        **Internal use only. Do not call**
+
+        Opens a new read handle
+        """
+        pass
+
+    def handle(self):
+        """
+        Returns the read handle of the calling thread
+        """
+        handle = getattr(self.local, "handle", None)
+        if handle is None:
+            handle = self.connect()
+            with self.lock:
+                self.handles.append(handle)
+            self.local.handle = handle
+        return handle
+
+    def cursor(self):
+        """
+        Returns a new cursor of the calling thread's read handle, which is closed along with the pool
+        """
+        cursor = self.handle().cursor()
+        with self.lock:
+            self.handles.append(cursor)
+        return cursor
+
+    def close(self):
+        """
+        **Internal use only. Do not call**
+
+        Closes the cursors and read handles of all threads
+        """
+        with self.lock:
+            for handle in reversed(self.handles):
+                handle.close()
+            self.handles = []
+        self.local = threading.local()
+
+class SqliteReadPool(ReadPool):
+    """
+    Read-only `file:...?mode=ro` connections to a SQLite database, usable from any thread
+    """
+    def connect(self):
+        return sqlite3.connect(Path(self.path).as_uri() + "?mode=ro", uri = True, check_same_thread = False)
+
+class DuckDBReadPool(ReadPool):
+    """
+    One DuckDB connection per database file, shared by every backend of the process, with a cursor per thread
+    """
+    def __init__(self, path):
+        import duckdb
+        super().__init__(path)
+        self.con = duckdb.connect(path)
+
+    def connect(self):
+        return self.con.cursor()
+
+    def close(self):
+        super().close()
+        self.con.close()
+
+def acquire_read_pool(pool_class, filename):
+    """
+    Returns the process-wide read pool of the database `filename`, created by `pool_class` on first use.
+    Every call must be matched by a `release_read_pool()`
+    """
+    path = os.path.abspath(filename)
+    with READ_POOLS_LOCK:
+        pool = READ_POOLS.get(path)
+        if pool is None:
+            pool = READ_POOLS[path] = pool_class(path)
+        pool.users += 1
+        return pool
+
+def release_read_pool(pool):
+    """
+    Releases a pool returned by `acquire_read_pool()`, and closes it once no backend uses it
+    """
+    with READ_POOLS_LOCK:
+        pool.users -= 1
+        if pool.users > 0:
+            return
+        if READ_POOLS.get(pool.path) is pool:
+            del READ_POOLS[pool.path]
+    pool.close()
+
+class ThreadCursor:
+    """
+    Cursor of a backend that other threads may read through. In the thread that created the backend, statements run on
+    the backend's own `cursor`, so they see its open transaction. In any other thread they run on a cursor of that thread's
+    read handle from `pool`. Attributes such as `execute` and `fetchall` are those of the calling thread's cursor
+    """
+    def __init__(self, cursor, pool, owner):
+        self.cursor = cursor
+        self.pool = pool
+        self.owner = owner
+        self.local = threading.local()
+
+    def current(self):
+        """
+        Returns the cursor of the calling thread
+        """
+        if threading.get_ident() == self.owner:
+            return self.cursor
+        cursor = getattr(self.local, "cursor", None)
+        if cursor is None:
+            cursor = self.local.cursor = self.pool.cursor()
+        return cursor
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
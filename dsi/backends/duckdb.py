@@ -1,10 +1,35 @@
 import duckdb
 import re
+import os
+import shutil
+import threading
 from datetime import datetime
+import numpy as np
 import pandas as pd
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dsi.backends.filesystem import Filesystem
+from dsi.backends.type_inference import TypeInference, INT32, INT64, FLOAT, STRING
+from dsi.backends.cell_match import is_number, number_literal, like_pattern, number_text_possible, number_fits, numeric_kind
+from dsi.backends.lazy_rows import LazyRows
+from dsi.backends.catalog import DuckDBCatalog
+from dsi.backends.query_cache import QueryCache, QUERY_CACHE_BYTES, query_key
+from dsi.backends.connection_pool import DuckDBReadPool, ThreadCursor, acquire_read_pool, release_read_pool
+from dsi.backends.persistence import DuckDBPersistence
+from dsi.backends.backup import BACKUP_GENERATIONS, backup_current, install_backup
+from dsi.backends.storage_profile import storage_settings, duckdb_statements
+from dsi.backends.indexes import DuckDBIndexManager
+from dsi.backends.query_log import DuckDBQueryLog, SLOW_QUERY_MS
+from dsi.backends.maintenance import DuckDBMaintenance
+from dsi.backends.cancellation import DuckDBCancellation, QueryCancelled
+from dsi.backends.merge import DuckDBMerge, MERGED_RUNS_TABLE
+from dsi.backends.text_index import DuckDBTextIndex, TEXT_INDEX_PREFIX
+from dsi.backends.column_stats import DuckDBColumnStats, COLUMN_STATS_TABLE
+from dsi.backends.sketches import DuckDBColumnSketches, SKETCHES_TABLE
+from dsi.backends.table_reader import read_columns, arrow_columns, QUERY_BATCH_ROWS
+from dsi.backends.row_delta import RowDelta, column_values, kind_fits
+from dsi.backends.key_checks import key_error, keys_changed, keys_contained
 
 # Holds table name and data properties
 class DataType:
@@ -43,45 +68,129 @@ class DuckDB(Filesystem):
     """
     runTable = False
 
-    def __init__(self, filename):
+    def __init__(self, filename, text_index = False, sketches = False, cache_bytes = QUERY_CACHE_BYTES, read_pool = False,
+                 persist_to = None, persist_interval = None, profile = "default", storage_options = None, auto_index = False,
+                 query_log = None, slow_query_ms = SLOW_QUERY_MS):
         """
         Initializes a DuckDB backend with a user inputted filename, and creates other internal variables
+
+        `text_index` : bool, optional, default=False
+            If True, builds a trigram inverted index over every table, which is kept up to date on each ingest
+            and used by `find_cell()` and the `~`/`~~` operators of `find_relation()` instead of scanning every table.
+            An index already stored in the database is always kept up to date.
+
+        `sketches` : bool, optional, default=False
+            If True, builds quantile, distinct-count and sample sketches of every numeric column, which are kept up to date
+            on each ingest and used by `summary(approx=True)`. Sketches already stored in the database are always kept up to date.
+
+        `cache_bytes` : int, optional, default=64 MiB
+            Memory budget of the cache of `query_artifacts()`, `get_table()`, `find_cell()` and `find_relation()` results.
+            A cached result is only reused while the database file is unchanged, including by other connections. 0 disables the cache.
+
+        `read_pool` : bool, optional, default=False
+            If True, other threads can query and find while this backend ingests. All backends of this file in the process
+            share one DuckDB connection, and reads from any thread other than the one that created the backend run on
+            that thread's own cursor of it. Those reads only see committed data.
+
+        `persist_to` : str, optional, default=None
+            Only with `filename` ":memory:". File the in-memory database is loaded from if it exists, and saved to
+            with ATTACH and COPY FROM DATABASE by `persist()`, after writes once `persist_interval` seconds passed, and by `close()`.
+
+        `persist_interval` : float, optional, default=None
+            Minimum number of seconds between saves to `persist_to` after an ingest, overwrite or update.
+            If None, the database is only saved by `persist()` and `close()`.
+
+        `profile` : str, optional, default="default"
+            Storage profile setting the threads, memory limit and checkpoint threshold of the database:
+            "default", "ingest-heavy", "read-heavy" or "low-memory". See `dsi.backends.storage_profile.STORAGE_PROFILES`.
+
+        `storage_options` : dict, optional, default=None
+            Storage settings that override those of `profile`, by name. See `dsi.backends.storage_profile.STORAGE_SETTINGS`.
+
+        `auto_index` : bool, optional, default=False
+            If True, a column is indexed once `find_relation()` or the WHERE clauses of `query_artifacts()` filtered on it
+            3 times. Otherwise such columns are only listed by `index_advice()`. Foreign key columns, including `run_id`,
+            are always indexed at ingest.
+
+        `query_log` : str, optional, default=None
+            JSON-lines file to which every statement run by `query_artifacts()`, `find_cell()`, `find_column()` and
+            `find_relation()` is appended with its origin, latency and number of rows. Nothing is logged if None.
+
+        `slow_query_ms` : float, optional, default=100
+            Latency in milliseconds from which a logged statement is slow: its query plan is logged with it
+            and it is returned by `slow_queries()`.
         """
+        settings = storage_settings(profile, storage_options)
+        if persist_to is not None and filename != ":memory:":
+            raise ValueError("persist_to can only be used with an in-memory database, whose filename is ':memory:'")
         self.filename = filename
-        self.con = duckdb.connect(filename)
+        self.query_cache = QueryCache(cache_bytes)
+        self.data_version = 0
+        self.owner = threading.get_ident()
+        self.read_pool = None
+        if read_pool and filename != ":memory:":
+            self.read_pool = acquire_read_pool(DuckDBReadPool, filename)
+            self.con = self.read_pool.con
+        else:
+            self.con = duckdb.connect(filename)
         self.cur = self.con.cursor()
+        if self.read_pool is not None:
+            self.cur = ThreadCursor(self.cur, self.read_pool, self.owner)
+        for statement in duckdb_statements(settings):
+            self.cur.execute(statement)
+        self.persistence = None
+        self.last_backup = None
+        if filename == ":memory:":
+            self.persistence = DuckDBPersistence(self.cur, persist_to, persist_interval)
+            self.persistence.load()
+        self.catalog = DuckDBCatalog(self.cur)
         self.runTable = DuckDB.runTable
+        self.type_inference = TypeInference(self.catalog)
+        self.text_index = DuckDBTextIndex(self.cur, self.catalog, text_index)
+        self.column_stats = DuckDBColumnStats(self.cur, self.catalog)
+        self.column_sketches = DuckDBColumnSketches(self.cur, self.catalog, self.column_stats, sketches)
+        self.indexes = DuckDBIndexManager(self.cur, self.catalog, auto_index)
+        self.query_log = DuckDBQueryLog(self.cur, query_log, slow_query_ms)
+        self.maintenance = DuckDBMaintenance(filename, self.con)
+        self.cancellation = DuckDBCancellation(self.cur)
+        if text_index:
+            self.cur.execute("BEGIN TRANSACTION")
+            self.text_index.build_missing(self.catalog.tables())
+            self.cur.execute("COMMIT")
+        if sketches:
+            for table in self.catalog.tables():
+                self.column_sketches.get(table)
         
         keywords_df = self.cur.execute("SELECT * FROM duckdb_keywords();").fetchdf()
         filtered_df = keywords_df[keywords_df['keyword_category'] != 'unreserved']
         self.duckdb_keywords = filtered_df["keyword_name"].tolist()
 
-    def sql_type(self, input_list):
+    def sql_type(self, input_list, table_name = None, column_name = None):
         """
         **Internal use only. Do not call**
 
         Evaluates a list and returns the predicted compatible DuckDB Type
 
         `input_list` : list
-            A list of values to analyze for type compatibility.
+            A list of values to analyze for type compatibility. Typed NumPy arrays and pandas Series are also accepted.
+
+        `table_name` : str, optional, default=None
+            Name of the table the list belongs to. Used with `column_name` to cache the inferred type.
+
+        `column_name` : str, optional, default=None
+            Name of the column the list belongs to. Used with `table_name` to cache the inferred type.
 
         `return`: str
             A string representing the inferred DuckDB data type for the input list.
         """
-        DUCKDB_BIGINT_MIN = -9223372036854775808
-        DUCKDB_BIGINT_MAX =  9223372036854775807
-        DUCKDB_INT_MIN = -2147483648
-        DUCKDB_INT_MAX =  2147483647
-
-        if all(isinstance(x, int) for x in input_list if x is not None):
-            if any(x < DUCKDB_BIGINT_MIN or x > DUCKDB_BIGINT_MAX for x in input_list if x is not None):
-                return " DOUBLE"
-            elif any(x < DUCKDB_INT_MIN or x > DUCKDB_INT_MAX for x in input_list if x is not None):
-                return " BIGINT"
-            return " INTEGER"
-        elif all(isinstance(x, float) for x in input_list if x is not None):
+        kind = self.type_inference.infer(input_list, table_name, column_name)
+        if kind == STRING:
+            return " VARCHAR"
+        elif kind == FLOAT:
             return " DOUBLE"
-        return " VARCHAR"
+        elif kind == INT64:
+            return " BIGINT"
+        return " INTEGER"
     
     def duckdb_compatible_name(self, name):
         if (name.startswith('"') and name.endswith('"')) or (name.lower() not in self.duckdb_keywords and name.isidentifier()):
@@ -107,25 +216,25 @@ class DuckDB(Filesystem):
             If True, prints the CREATE TABLE statements for debugging or inspection.
         """
         #checking if extra column needs to be added to a table
-        if self.cur.execute(f"""
-                            SELECT table_name FROM information_schema.tables 
-                            WHERE table_type = 'BASE TABLE' AND table_name = '{types.name}'
-                            """).fetchone():
+        table_info = self.catalog.table(types.name)
+        if table_info is not None:
             col_names = types.properties.keys()
-            col_info = self.cur.execute(f"PRAGMA table_info({types.name});").fetchall()
-            query_cols = [self.duckdb_compatible_name(column[1]) for column in col_info]
+            query_cols = [self.duckdb_compatible_name(column) for column in table_info.columns]
             diff_cols = list(set(col_names) - set(query_cols))
             if len(diff_cols) > 0:
                 for col in diff_cols:
                     if col.lower() in [c.lower() for c in query_cols]:
+                        self.cur.execute("ROLLBACK")
+                        self.cur.execute("CHECKPOINT")
                         return (ValueError, "Cannot have duplicate column names")
-                    temp_name = col + self.sql_type(types.properties[col])
+                    temp_name = col + self.sql_type(types.properties[col], types.name, col)
                     try:
                         self.cur.execute(f"ALTER TABLE {types.name} ADD COLUMN {temp_name};")
                     except duckdb.Error as e:
                         self.cur.execute("ROLLBACK")
                         self.cur.execute("CHECKPOINT")
                         return (duckdb.Error, e)
+                self.catalog.reload_table(types.name)
         else:
             sql_cols = ', '.join(types.unit_keys)
             str_query = "CREATE TABLE IF NOT EXISTS {} ({}".format(str(types.name), sql_cols)
@@ -145,6 +254,7 @@ class DuckDB(Filesystem):
                 self.cur.execute("ROLLBACK")
                 self.cur.execute("CHECKPOINT")
                 return (duckdb.Error, e)
+            self.catalog.reload_table(types.name)
             self.types = types
 
     # OLD NAME OF ingest_artifacts(). TO BE DEPRECATED IN FUTURE DSI RELEASE
@@ -173,6 +283,19 @@ class DuckDB(Filesystem):
         `return`: None on successful ingestion. If an error occurs, returns a tuple in the format of: (ErrorType, error message). 
         Ex: (ValueError, "this is an error")
         """
+        error = self.ingest_collection_helper(collection, isVerbose)
+        self.data_changed()
+        if error is not None:
+            # the failed transaction was rolled back, so tables created in it no longer exist
+            self.type_inference.cache.clear()
+        return error
+
+    def ingest_collection_helper(self, collection, isVerbose=False):
+        """
+        **Internal use only. Do not call**
+
+        Ingests `collection` in a single transaction. See `ingest_artifacts()` for the inputs and return value.
+        """
         artifacts = collection
 
         table_order = artifacts.keys()
@@ -184,11 +307,18 @@ class DuckDB(Filesystem):
             else:
                 table_order = list(reversed(ordered_tables)) # ingest primary key tables first then children
 
+        # rows inserted in an open transaction only get their final rowids at commit, so the text index is updated after it.
+        # Column statistics and sketches only need to tell new rows from old ones and are updated inside the transaction
+        text_marks = []
+        stats_marks = []
         self.cur.execute("BEGIN TRANSACTION")
         if self.runTable:
+            text_marks.append(("runTable", self.text_index.mark("runTable")))
+            stats_marks.append(("runTable", self.column_stats.mark("runTable"), self.column_sketches.mark("runTable")))
             runTable_create = "CREATE TABLE IF NOT EXISTS runTable " \
             "(run_id INTEGER PRIMARY KEY, run_timestamp TEXT UNIQUE);"
             self.cur.execute(runTable_create)
+            self.catalog.reload_table("runTable")
 
             sequence_run_id = "CREATE SEQUENCE IF NOT EXISTS seq_run_id START 1;"
             self.cur.execute(sequence_run_id)
@@ -224,10 +354,12 @@ class DuckDB(Filesystem):
                 types.properties[sql_key] = tableData[key]
                 
                 if dsi_name in artifacts.keys() and comboTuple in artifacts[dsi_name]["primary_key"]:
-                    types.unit_keys.append(sql_key + self.sql_type(tableData[key]) + " PRIMARY KEY")
+                    types.unit_keys.append(sql_key + self.sql_type(tableData[key], types.name, sql_key) + " PRIMARY KEY")
                 else:
-                    types.unit_keys.append(sql_key + self.sql_type(tableData[key]))
+                    types.unit_keys.append(sql_key + self.sql_type(tableData[key], types.name, sql_key))
             
+            text_marks.append((types.name, self.text_index.mark(types.name)))
+            stats_marks.append((types.name, self.column_stats.mark(types.name), self.column_sketches.mark(types.name)))
             error = self.ingest_table_helper(types, foreign_query)
             if error is not None:
                 return error
@@ -255,8 +387,11 @@ class DuckDB(Filesystem):
             self.types = types #This will only copy the last table from artifacts (collections input)            
 
         if "dsi_units" in artifacts.keys():
+            text_marks.append(("dsi_units", self.text_index.mark("dsi_units")))
+            stats_marks.append(("dsi_units", self.column_stats.mark("dsi_units"), self.column_sketches.mark("dsi_units")))
             create_query = "CREATE TABLE IF NOT EXISTS dsi_units (table_name TEXT, column_name TEXT, unit TEXT)"
             self.cur.execute(create_query)
+            self.catalog.reload_table("dsi_units")
             units_data = artifacts["dsi_units"]
             for table_val, col_val, unit_val in zip(units_data["table_name"], units_data["column_name"], units_data["unit"]):
                 str_query = f"INSERT INTO dsi_units VALUES ('{table_val}', '{col_val}', '{unit_val}')"
@@ -274,19 +409,61 @@ class DuckDB(Filesystem):
                         return (duckdb.Error, e)
                             
         try:
+            for table_name, stats_mark, sketch_mark in stats_marks:
+                self.column_stats.update(table_name, stats_mark)
+                self.column_sketches.update(table_name, sketch_mark)
+            self.indexes.ensure_keys([table_name for table_name, _, _ in stats_marks if table_name not in ("runTable", "dsi_units")])
             self.cur.execute("COMMIT")
             self.cur.execute("CHECKPOINT")
+            # indexed after the checkpoint, which may renumber rowids of tables with deleted rows
+            if self.text_index.enabled:
+                self.cur.execute("BEGIN TRANSACTION")
+                for table_name, text_mark in text_marks:
+                    self.text_index.update(table_name, text_mark)
+                self.cur.execute("COMMIT")
+                self.cur.execute("CHECKPOINT")
         except duckdb.Error as e:
             self.cur.execute("ROLLBACK")
             self.cur.execute("CHECKPOINT")
             return (duckdb.Error, e)
 
 
+    def merge_artifacts(self, filenames, batch_size = None, workers = None, isVerbose = False):
+        """
+        Merges other DuckDB databases written by DSI into this database with set-based SQL, without reading their rows into Python.
+
+        The schemas of the files are reconciled first: tables and columns missing from this database are added, and units
+        in `dsi_units` must match. The files are then attached in batches, and each table of a batch is copied with one
+        `INSERT INTO ... SELECT`. Each run of each file gets its own run_id after this database's highest run_id, even if
+        several runs share a `run_timestamp`, and every `run_id` column is rewritten to match. Runs of a file merged again keep
+        the run_ids they got the first time.
+        A runTable created by `ingest_artifacts()` allows only one run per `run_timestamp`, so runs sharing a timestamp
+        can only be merged into a database without a runTable or with a runTable created by a merge.
+
+        `filenames` : str or list of str
+            DuckDB database files to merge into this database.
+
+        `batch_size` : int, optional, default=None
+            Number of files attached and merged in one transaction. If None, 64.
+
+        `workers` : int, optional, default=None
+            Number of threads reading the schemas of the files. If None, 8.
+
+        `isVerbose` : bool, optional, default=False
+            If True, prints the INSERT statements of each batch.
+
+        `return`: an OrderedDict of table name -> number of rows merged into it. If an error occurs, returns a tuple in the format of:
+        (ErrorType, error message). Batches merged before a failed batch stay in the database
+        """
+        result = DuckDBMerge(self).merge(filenames, batch_size, workers, isVerbose)
+        self.data_changed()
+        return result
+
     # OLD NAME OF query_artifacts(). TO BE DEPRECATED IN FUTURE DSI RELEASE
-    def get_artifacts(self, query, isVerbose=False, dict_return = False):
-        return self.query_artifacts(query, isVerbose, dict_return)
+    def get_artifacts(self, query, isVerbose=False, dict_return = False, timeout = None):
+        return self.query_artifacts(query, isVerbose, dict_return, timeout)
     
-    def query_artifacts(self, query, isVerbose=False, dict_return = False):
+    def query_artifacts(self, query, isVerbose=False, dict_return = False, timeout = None):
         """
         Executes a SQL query on the DuckDB backend and returns the result in the specified format dependent on `dict_return`
 
@@ -300,6 +477,10 @@ class DuckDB(Filesystem):
         `dict_return` : bool, optional, default=False
             If True, returns the result as an OrderedDict.
             If False, returns the result as a pandas DataFrame.
+
+        `timeout` : float, optional, default=None
+            Number of seconds after which the query is cancelled. The query can also be cancelled by `cancel()` from another
+            thread or a signal handler. A cancelled query returns (QueryCancelled, "error message").
         
         `return` : pandas.DataFrame or OrderedDict or tuple
             - If query is valid and `dict_return` is False: returns a DataFrame.
@@ -307,10 +488,23 @@ class DuckDB(Filesystem):
             - If query is invalid: returns a tuple (ErrorType, "error message"). Ex: (ValueError, "this is an error")
         """
         if query[:6].lower() == "select" or query[:6].lower() == "pragma":
+            key = query_key(query, dict_return)
+            version = self.cache_version()
+            cached = self.query_cache.get(key, version)
+            if cached is not None:
+                if isVerbose:
+                    print(cached)
+                return cached
+            self.indexes.record_query(query)
+            start = self.query_log.start()
             try:
-                data = self.cur.execute(query).fetch_df()
+                with self.cancellation.limit(timeout):
+                    data = self.cur.execute(query).fetch_df()
+                self.query_log.record("query_artifacts", query, start, len(data))
                 if isVerbose:
                     print(data)
+            except QueryCancelled as e:
+                return (QueryCancelled, f"Error in query_artifacts: {e}")
             except Exception as e:
                 message = str(e)
                 if "Table" in message and "does not exist" in message:
@@ -327,11 +521,98 @@ class DuckDB(Filesystem):
             tables = self.get_table_names(query)
             if len(tables) > 1:
                 return (RuntimeError, "Error in query_artifacts: Can only return ordered dictionary if query with one table")
-            
-            return OrderedDict(data.to_dict(orient='list'))
-        else:
-            return data
-    
+            data = OrderedDict(data.to_dict(orient='list'))
+        self.query_cache.put(key, version, data)
+        return data
+
+    def query_iter(self, query, batch_rows = QUERY_BATCH_ROWS, arrow = False):
+        """
+        Executes a SQL query on the DuckDB backend and returns an iterator over its result in batches of rows,
+        so a result larger than memory can be processed one batch at a time.
+
+        `query` : str
+            Must be a SELECT or PRAGMA SQL query. Aggregate functions like COUNT are allowed.
+
+        `batch_rows` : int, optional, default=10000
+            Maximum number of rows in each batch. The result is streamed from DuckDB as Arrow record batches.
+
+        `arrow` : bool, optional, default=False
+            If True, yields each batch as a pyarrow.RecordBatch.
+            If False, yields each batch as a pandas DataFrame.
+
+        `return` : iterator or tuple
+            - If query is valid: returns an iterator of DataFrames or RecordBatches. It is empty if the query returns no rows.
+            - If query is invalid: returns a tuple (ErrorType, "error message"). Ex: (ValueError, "this is an error")
+        """
+        if query[:6].lower() != "select" and query[:6].lower() != "pragma":
+            return (RuntimeError, "Error in query_iter: Can only run SELECT or PRAGMA queries on the data")
+        if isinstance(batch_rows, bool) or not isinstance(batch_rows, int) or batch_rows < 1:
+            return (ValueError, "Error in query_iter: batch_rows must be a positive integer")
+        cursor = self.con.cursor()
+        try:
+            result = cursor.execute(query)
+            # to_arrow_reader() replaced fetch_record_batch() in newer DuckDB releases
+            reader = result.to_arrow_reader(batch_rows) if hasattr(result, "to_arrow_reader") else result.fetch_record_batch(batch_rows)
+        except Exception as e:
+            cursor.close()
+            message = str(e)
+            if "Table" in message and "does not exist" in message:
+                table_name = message[message.find("Table"):message.find("Did you mean")-2]
+                print(f"WARNING: {table_name} in this database")
+                return iter(())
+            return (duckdb.Error, "Error in query_iter: Incorrect query on the data. Please try again")
+        return self.query_batches(cursor, reader, arrow)
+
+    def query_batches(self, cursor, reader, arrow):
+        """
+        **Internal use only. Do not call**
+
+        Yields the record batches of `reader`, as DataFrames unless `arrow` is True, and closes `cursor` once done
+        """
+        try:
+            for batch in reader:
+                if batch.num_rows == 0:
+                    continue
+                yield batch if arrow else batch.to_pandas()
+        finally:
+            cursor.close()
+
+    def cache_version(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns the version of the database that cached results are valid for. Every committed write through any connection
+        changes the size or modification time of the database file or its write-ahead log, and an in-memory database
+        is versioned by `data_changed()` alone
+        """
+        files = []
+        for path in (self.filename, f"{self.filename}.wal"):
+            try:
+                stat = os.stat(path)
+                files.append((stat.st_size, stat.st_mtime_ns))
+            except (OSError, ValueError):
+                files.append(None)
+        return (self.data_version, tuple(files))
+
+    def data_changed(self):
+        """
+        **Internal use only. Do not call**
+
+        Moves the database to a new version and drops the cached results after this backend ingested, overwrote or updated data,
+        and saves an in-memory database if its `persist_interval` elapsed
+        """
+        self.data_version += 1
+        self.query_cache.clear()
+        if self.persistence is not None:
+            self.persistence.save_if_due()
+
+    def cache_stats(self):
+        """
+        Returns statistics of the query result cache as a dict: the number of cache `hits`, `misses` and `evictions`,
+        and the number of cached `entries`, their approximate `bytes` and the `max_bytes` budget
+        """
+        return self.query_cache.stats()
+
     def get_table(self, table_name, dict_return = False):
         """
         Retrieves all data from a specified table without requiring knowledge of SQL.
@@ -373,7 +654,7 @@ class DuckDB(Filesystem):
         `return`: str
             Each table's CREATE TABLE statement is concatenated into one large string.
         """
-        schema_stmts = self.query_artifacts(query="SELECT sql FROM duckdb_tables where sql NOT NULL ")
+        schema_stmts = self.query_artifacts(query=f"SELECT sql FROM duckdb_tables where sql NOT NULL AND table_name NOT LIKE '{TEXT_INDEX_PREFIX}%' AND table_name NOT IN ('{COLUMN_STATS_TABLE}', '{SKETCHES_TABLE}', '{MERGED_RUNS_TABLE}')")
         return schema_stmts["sql"].str.cat(sep="\n")
     
     # OLD NAME OF notebook(). TO BE DEPRECATED IN FUTURE DSI RELEASE
@@ -384,55 +665,62 @@ class DuckDB(Filesystem):
         pass
 
     # OLD NAME OF process_artifacts(). TO BE DEPRECATED IN FUTURE DSI RELEASE
-    def read_to_artifact(self):
-        return self.process_artifacts()
+    def read_to_artifact(self, table_names = None, arrow = False):
+        return self.process_artifacts(table_names, arrow)
     
-    def process_artifacts(self):
+    def process_artifacts(self, table_names = None, arrow = False):
         """
         Reads data from the DuckDB database into a nested OrderedDict.
         Keys are table names, and values are OrderedDicts containing table data.
 
         If the database contains PK/FK relationships, they are stored in a special `dsi_relations` table.
+        Tables are read one at a time in chunks of rows, so memory use grows with the tables requested, not the database.
+
+        `table_names` : str or list of str, optional, default=None
+            If specified, only these tables, and the relations of their columns, are read. Names are case-insensitive.
+            Names of tables that do not exist are ignored. If None, every table is read.
+
+        `arrow` : bool, optional, default=False
+            If True, each column is returned as a pyarrow.ChunkedArray read directly from DuckDB's Arrow export instead of a list.
 
         `return` : OrderedDict
-            A nested OrderedDict containing all data from the DuckDB database.
+            A nested OrderedDict containing all (or the requested) data from the DuckDB database.
         """
         artifact = OrderedDict()
         artifact["dsi_relations"] = OrderedDict([("primary_key",[]), ("foreign_key", [])])
 
-        tableList = self.cur.execute("""
-                                     SELECT table_name FROM information_schema.tables
-                                     WHERE table_schema = 'main' AND table_type = 'BASE TABLE'
-                                     """).fetchall()
-        for item in tableList:
-            tableName = self.duckdb_compatible_name(item[0])
-
-            tableInfo = self.cur.execute(f"PRAGMA table_info({tableName});").fetchdf()
-            colDict = OrderedDict((self.duckdb_compatible_name(col), []) for col in tableInfo['name'])
-
-            data = self.cur.execute(f"SELECT * FROM {tableName};").fetchall()
-            for row in data:
-                for colName, val in zip(colDict.keys(), row):
-                    if val == "NULL":
-                        colDict[colName].append(None)
-                    else:
-                        colDict[colName].append(val)
-            artifact[tableName] = colDict
+        if isinstance(table_names, str):
+            table_names = [table_names]
+        wanted = None if table_names is None else {self.catalog.unquote(name).lower() for name in table_names}
+        def loaded(table):
+            return wanted is None or table.lower() in wanted
+
+        for item in self.catalog.tables():
+            if not loaded(item):
+                continue
+            tableName = self.duckdb_compatible_name(item)
+            col_names = [self.duckdb_compatible_name(col) for col in self.catalog.table(item).columns]
+            query = f"SELECT * FROM {tableName};"
+            if arrow:
+                result = self.cur.execute(query)
+                # to_arrow_table() replaced fetch_arrow_table() in newer DuckDB releases
+                to_arrow = getattr(result, "to_arrow_table", None) or result.fetch_arrow_table
+                artifact[tableName] = arrow_columns(to_arrow(), col_names)
+            else:
+                artifact[tableName] = read_columns(self.cur, query, col_names)
 
         pk_list = []
-        fkData = self.cur.execute(f"""
-                                  SELECT table_name, constraint_column_names, referenced_table, referenced_column_names
-                                  FROM duckdb_constraints() WHERE constraint_type = 'FOREIGN KEY'""").fetchall()
+        pkData, fkData = self.catalog.relations()
+        fkData = [row for row in fkData if loaded(row[0])]
+        pkData = [row for row in pkData if loaded(row[0])]
         for row in fkData:
-            curr_pk = (self.duckdb_compatible_name(row[2]), self.duckdb_compatible_name(row[3][0]))
+            curr_pk = (self.duckdb_compatible_name(row[2]), self.duckdb_compatible_name(row[3]))
             artifact["dsi_relations"]["primary_key"].append(curr_pk)
-            artifact["dsi_relations"]["foreign_key"].append((self.duckdb_compatible_name(row[0]), self.duckdb_compatible_name(row[1][0])))
+            artifact["dsi_relations"]["foreign_key"].append((self.duckdb_compatible_name(row[0]), self.duckdb_compatible_name(row[1])))
             pk_list.append(curr_pk)
         
-        pkData = self.cur.execute(f"""SELECT table_name, constraint_column_names FROM duckdb_constraints() 
-                                  WHERE constraint_type = 'PRIMARY KEY'""").fetchall()
         for pk_table, pk_col in pkData:
-            curr_pk = (self.duckdb_compatible_name(pk_table), self.duckdb_compatible_name(pk_col[0]))
+            curr_pk = (self.duckdb_compatible_name(pk_table), self.duckdb_compatible_name(pk_col))
             if curr_pk not in pk_list:
                 artifact["dsi_relations"]["primary_key"].append(curr_pk)
                 artifact["dsi_relations"]["foreign_key"].append((None, None))
@@ -472,40 +760,37 @@ class DuckDB(Filesystem):
         else:
             return f"{query_object} was not found in this database"
         
-    def find_table(self, query_object):
+    def find_table(self, query_object, limit = None):
         """
         Finds all tables whose names match or partially match the given `query_object`.
 
         `query_object` : str
             The string to search for in table names.
 
+        `limit` : int, optional, default=None
+            Maximum number of rows exposed by each returned table. All rows if None.
+
         `return` : list of ValueObjects
             One ValueObject per matching table.
 
         ValueObject Structure:
             - t_name:   table name (str)
             - c_name:   list of all columns in the table
-            - value:    table data as list of rows (each row is a list)
+            - value:    table data as a LazyRows list of row tuples. Rows are only read from the database when accessed
             - row_num:  None
             - type:     'table'
         """
-        tableList = self.cur.execute("""
-                                     SELECT table_name FROM information_schema.tables
-                                     WHERE table_schema = 'main' AND table_type = 'BASE TABLE'
-                                     """).fetchall()
-        tableList = [self.duckdb_compatible_name(table[0]) for table in tableList]
+        tableList = [self.duckdb_compatible_name(table) for table in self.catalog.tables()]
 
         if isinstance(query_object, str):
             table_return_list = []
             for table in tableList:
                 if query_object in table:
-                    colData = self.cur.execute(f"PRAGMA table_info({table});").fetchall()
-                    col_names = [self.duckdb_compatible_name(column[1]) for column in colData]
-                    table_data = self.cur.execute(f"SELECT * FROM {table};").fetchall()
+                    col_names = [self.duckdb_compatible_name(column) for column in self.catalog.table(table).columns]
                     val = ValueObject()
                     val.t_name = table
                     val.c_name = col_names
-                    val.value = table_data
+                    val.value = LazyRows(self.con.cursor, table, limit = limit)
                     val.type = "table"
                     table_return_list.append(val)
             
@@ -514,7 +799,7 @@ class DuckDB(Filesystem):
             return f"{query_object} is not a table name in this database"
         return f"{query_object} needs to be a string if finding among table names"
     
-    def find_column(self, query_object, range = False):
+    def find_column(self, query_object, range = False, limit = None):
         """
         Finds all columns whose names match or partially match the given `query_object`.
 
@@ -523,7 +808,11 @@ class DuckDB(Filesystem):
 
         `range` : bool, optional, default=False
             If True, `value` in the returned ValueObject will be the [min, max] of the matching numerical column.
-            If False, `value` in the returned ValueObject will be the full list of column data.
+            Computed in the database, counting missing values as 0.
+            If False, `value` in the returned ValueObject will be the full list of column data, read only when accessed.
+
+        `limit` : int, optional, default=None
+            Maximum number of values exposed by each returned column when `range` is False. All values if None.
 
         `return` : List of ValueObjects if there is a match. 
         
@@ -533,54 +822,77 @@ class DuckDB(Filesystem):
             - value:
 
                 - If range=True: [min, max]
-                - If range=False: list of column data
+                - If range=False: LazyRows list of column data
             - row_num:  None
             - type:
             
                 - If range=True: 'range'
                 - If range=False: 'column'
         """
-        tableList = self.cur.execute("""
-                                     SELECT table_name FROM information_schema.tables
-                                     WHERE table_schema = 'main' AND table_type = 'BASE TABLE'
-                                     """).fetchall()
-        tableList = [self.duckdb_compatible_name(table[0]) for table in tableList]
+        tableList = [self.duckdb_compatible_name(table) for table in self.catalog.tables()]
 
         if isinstance(query_object, str):
             col_return_list = []
             for table in tableList:
-                colList = self.cur.execute(f"PRAGMA table_info({table});").fetchall()
-                for col in colList:
-                    col_name = self.duckdb_compatible_name(col[1])
-                    if query_object in col_name:
-                        returned_col = self.cur.execute(f"SELECT {col_name} FROM {table};").fetchall()
-                        colData = [row[0] for row in returned_col]
-                        not_numeric = any(isinstance(item, str) for item in colData)
-
+                table_info = self.catalog.table(table)
+                matches = [(self.duckdb_compatible_name(col), col_type) for col, col_type in zip(table_info.columns, table_info.types)
+                           if query_object in self.duckdb_compatible_name(col)]
+                if len(matches) == 0:
+                    continue
+                if range == False:
+                    for col_name, _ in matches:
                         val = ValueObject()
                         val.t_name = table
                         val.c_name = [col_name]
-                        if range == True and not not_numeric:
-                            numeric_col = [0 if item is None else item for item in colData]
-                            val.value = [min(numeric_col), max(numeric_col)]
-                            val.type = "range"
-                            col_return_list.append(val)
-                        elif range == False:
-                            val.value = colData
-                            val.type = "column"
-                            col_return_list.append(val)
+                        val.value = LazyRows(self.con.cursor, table, col_name, limit, single_column = True)
+                        val.type = "column"
+                        col_return_list.append(val)
+                    continue
+
+                # a single aggregate pass over the table covers all of its matching columns.
+                # a VARCHAR column with any value in it is not numeric
+                aggregates = ", ".join(f"MIN({col_name}), MAX({col_name}), COUNT(*) - COUNT({col_name}), " +
+                                       (f"COUNT({col_name}) > 0" if col_type == "VARCHAR" else "FALSE")
+                                       for col_name, col_type in matches)
+                range_query = f"SELECT {aggregates} FROM {table};"
+                start = self.query_log.start()
+                stats = self.cur.execute(range_query).fetchone()
+                self.query_log.record("find_column", range_query, start, 1)
+                for i, (col_name, _) in enumerate(matches):
+                    minimum, maximum, null_count, not_numeric = stats[4 * i : 4 * i + 4]
+                    if not_numeric:
+                        continue
+                    val = ValueObject()
+                    val.t_name = table
+                    val.c_name = [col_name]
+                    val.value = self.range_with_nulls(minimum, maximum, null_count)
+                    val.type = "range"
+                    col_return_list.append(val)
             
             if len(col_return_list) > 0:
                 return col_return_list
             return f"{query_object} is not a column name in this database"
         return f"{query_object} needs to be a string if finding among column names"
 
+    def range_with_nulls(self, minimum, maximum, null_count):
+        """
+        **Internal use only. Do not call**
+
+        Returns the [min, max] reported by find_column(range=True), where missing values count as 0
+        """
+        if null_count == 0 or not isinstance(minimum, (int, float, type(None))):
+            return [minimum, maximum]
+        if minimum is None:
+            return [0, 0]
+        return [min(minimum, 0), max(maximum, 0)]
+
     def find_cell(self, query_object, row = False):
         """
         Finds all cells in the database that match or partially match the given `query_object`.
 
         `query_object` : int, float, or str
             The value to search for at the cell level, across all tables in the backend.
+            A string matches any cell containing it. A number matches numeric cells of equal value and text cells containing it.
 
         `row`: bool, optional, default=False
             If True, `value` in the returned ValueObject will be the entire row where a cell matched.
@@ -604,60 +916,110 @@ class DuckDB(Filesystem):
                 - If row=True: 'row'
                 - If row=False: 'cell'
         """
-        tableList = self.cur.execute("""
-                                     SELECT table_name FROM information_schema.tables
-                                     WHERE table_schema = 'main' AND table_type = 'BASE TABLE'
-                                     """).fetchall()
-        tableList = [self.duckdb_compatible_name(table[0]) for table in tableList]
-        query_list = []
-        for table in tableList:
-            colList = self.cur.execute(f"PRAGMA table_info({table});").fetchall()
-            all_cols = [self.duckdb_compatible_name(col[1]) for col in colList]
-            result = ', '.join(str(i) for i in all_cols)
-            table_row_query = ""
+        key = ("cell", type(query_object), query_object, row)
+        version = self.cache_version()
+        cached = self.query_cache.get(key, version)
+        if cached is not None:
+            return cached
+        value_obj_list = []
+        for table in self.catalog.tables():
+            table_info = self.catalog.table(table)
+            table = self.duckdb_compatible_name(table)
+            all_cols = [self.duckdb_compatible_name(col) for col in table_info.columns]
+            predicates = []
+            for col, col_type in zip(table_info.columns, table_info.types):
+                predicate = self.cell_predicate(self.duckdb_compatible_name(col), col_type, query_object)
+                if predicate is not None:
+                    predicates.append((col, predicate))
+            if len(predicates) == 0:
+                continue
+
+            candidates = None
+            if not is_number(query_object):
+                # the text index, if enabled, narrows the scan down to rows that can contain the query
+                candidates = self.text_index.candidates(table, f"%{query_object}%")
+                if candidates == "":
+                    continue
+
+            # one scan per table: every column predicate is evaluated on each row in the same pass
+            where = " OR ".join(f"({predicate})" for _, predicate in predicates)
             if row:
-                table_row_query = f"""SELECT '{table}', ROW_NUMBER() OVER () AS row_number, '{result}', *
-                                      FROM {table} WHERE """
-                for col in all_cols:
-                    table_row_query += f"CAST({col} AS TEXT) ILIKE '%{query_object}%' OR "
-                table_row_query = table_row_query[:-4] + ";"
+                select = ', '.join(all_cols)
             else:
-                casted_cols = ""
-                for col in all_cols:
-                    casted_cols += f"CAST({col} AS TEXT) AS {col}, "
-                casted_cols = casted_cols[:-2]
-                table_row_query = f"""SELECT '{table}', original_row_num, column_name, column_value
-                FROM ( SELECT * FROM (SELECT ROW_NUMBER() OVER () AS original_row_num, {casted_cols} FROM {table} )
-                UNPIVOT (column_value FOR column_name IN ({result}))) AS unpvt
-                WHERE column_value ILIKE '%{query_object}%';"""
-            table_row_return = self.cur.execute(table_row_query).fetchall()
-            query_list += table_row_return
-
-        if len(query_list) > 0:
-            value_obj_list = []
-            for value_row in query_list:
-                val = ValueObject()
-                val.t_name = value_row[0]
-                val.row_num = value_row[1]
+                select = ', '.join(f"({predicate})" for _, predicate in predicates) + ", " + \
+                         ', '.join(self.duckdb_compatible_name(col) for col, _ in predicates)
+            query = f"SELECT dsi_row_num, {select} FROM ({self.row_number_query(table, candidates)}) WHERE {where} ORDER BY dsi_row_num;"
+
+            start = self.query_log.start()
+            value_rows = self.cur.execute(query).fetchall()
+            self.query_log.record("find_cell", query, start, len(value_rows))
+            for value_row in value_rows:
                 if row:
-                    val.c_name = value_row[2].split(', ')
-                    val.value = list(value_row[3:])
+                    val = ValueObject()
+                    val.t_name = table
+                    val.row_num = value_row[0]
+                    val.c_name = list(all_cols)
+                    val.value = list(value_row[1:])
                     val.type = "row"
-                else:
-                    val.c_name = [value_row[2]]
-                    try:
-                        val.value = int(value_row[3])
-                    except ValueError:
-                        try:
-                            val.value = float(value_row[3])
-                        except ValueError:
-                            val.value = value_row[3]
-                    val.type = "cell"
-                value_obj_list.append(val)
+                    value_obj_list.append(val)
+                    continue
+                matched = value_row[1:len(predicates) + 1]
+                cells = value_row[len(predicates) + 1:]
+                for (col, _), is_match, cell in zip(predicates, matched, cells):
+                    if is_match:
+                        val = ValueObject()
+                        val.t_name = table
+                        val.row_num = value_row[0]
+                        val.c_name = [col]
+                        val.value = cell
+                        val.type = "cell"
+                        value_obj_list.append(val)
+
+        if len(value_obj_list) > 0:
+            self.query_cache.put(key, version, value_obj_list)
             return value_obj_list
 
         return f"{query_object} is not a cell in this database"
 
+    def cell_predicate(self, col_name, col_type, query_object):
+        """
+        **Internal use only. Do not call**
+
+        Returns the SQL condition under which a cell of column `col_name` matches `query_object` in find_cell(),
+        or None if no cell of the column's type `col_type` can match.
+
+            - numbers are compared numerically against numeric columns and matched as text in all other columns
+            - strings are matched with ILIKE. Numeric columns are skipped unless the string could be part of a number
+        """
+        kind = self.column_kind(col_type)
+        if numeric_kind(kind) and is_number(query_object):
+            if not number_fits(kind, query_object):
+                return None
+            return f"{col_name} = {number_literal(query_object)}"
+        if numeric_kind(kind) and not number_text_possible(query_object):
+            return None
+        if kind == STRING:
+            return f"{col_name} ILIKE {like_pattern(query_object)}"
+        return f"CAST({col_name} AS TEXT) ILIKE {like_pattern(query_object)}"
+
+    def column_kind(self, col_type):
+        """
+        **Internal use only. Do not call**
+
+        Maps a DuckDB column type to the kind of values it holds. Returns None for types that are neither numbers nor text
+        """
+        col_type = col_type.upper()
+        if col_type in ("TINYINT", "SMALLINT", "INTEGER", "UTINYINT", "USMALLINT"):
+            return INT32
+        if col_type in ("BIGINT", "UINTEGER"):
+            return INT64
+        if col_type in ("FLOAT", "DOUBLE", "HUGEINT", "UBIGINT", "UHUGEINT") or col_type.startswith("DECIMAL"):
+            # no integer range check for types wider than int64
+            return FLOAT
+        if col_type == "VARCHAR":
+            return STRING
+        return None
+
     def find_relation(self, column_name, relation):
         """
         Finds all rows in the first table of the database that satisfy the relation applied to the given column.
@@ -678,19 +1040,20 @@ class DuckDB(Filesystem):
             - row_num:  row index of the match
             - type:     'relation'
         """
+        key = ("relation", column_name, relation)
+        version = self.cache_version()
+        cached = self.query_cache.get(key, version)
+        if cached is not None:
+            return cached
         user_column = column_name
         column_name = self.duckdb_compatible_name(column_name)
-        tableList = self.cur.execute("""SELECT table_name FROM information_schema.tables
-                                        WHERE table_schema = 'main' AND table_type = 'BASE TABLE'
-                                        """).fetchall()
-        tableList = [self.duckdb_compatible_name(table[0]) for table in tableList]
+        tableList = [self.duckdb_compatible_name(table) for table in self.catalog.tables()]
 
         all_tables = []
         col_list = []
         pragma_col_name = column_name[1:-1] if column_name[0] == '"' and column_name[-1] == '"' else column_name
         for table in tableList:
-            colData = self.cur.execute(f"PRAGMA table_info({table})").fetchall()
-            columns = [row[1] for row in colData]
+            columns = self.catalog.table(table).columns
             if pragma_col_name in columns:
                 all_tables.append(table)
                 col_list = columns        
@@ -701,6 +1064,9 @@ class DuckDB(Filesystem):
             return f"'{user_column}' is not a column in this database. Ensure the column is written first."
         old_relation = relation
         old_col_name = column_name
+        candidates = None
+        if relation[0] != "~":
+            self.indexes.record(all_tables[0], pragma_col_name)
         if relation[0] == '(' and relation[-1] == ')':
             values = relation[1:-1].strip()
             values = re.sub(r"\s*,\s*(?=(?:[^']*'[^']*')*[^']*$)", ",", values)
@@ -711,10 +1077,15 @@ class DuckDB(Filesystem):
             relation = relation[3:] if relation[:2] == '~~' else relation[2:]
             if relation[0] == "'" and relation[-1] == "'":
                 relation = relation[1:-1]
+            candidates = self.text_index.candidates(all_tables[0], f"%{relation}%")
             relation = f"ILIKE '%{relation}%'"
         
-        query = f"SELECT * FROM (SELECT ROW_NUMBER() OVER () AS row_num, * FROM {all_tables[0]}) WHERE {column_name} {relation}"
-        output_data = self.cur.execute(query).fetchall()
+        output_data = []
+        if candidates != "":
+            query = f"SELECT * FROM ({self.row_number_query(all_tables[0], candidates)}) WHERE {column_name} {relation}"
+            start = self.query_log.start()
+            output_data = self.cur.execute(query).fetchall()
+            self.query_log.record("find_relation", query, start, len(output_data))
         
         if not output_data and len(all_tables) == 1:
             val = f' {old_col_name} {old_relation} '
@@ -733,23 +1104,62 @@ class DuckDB(Filesystem):
             temp.value = list(row[1:])
             return_list.append(temp)
         
+        self.query_cache.put(key, version, return_list)
         return return_list
     
+    def row_number_query(self, table_name, candidates = None):
+        """
+        **Internal use only. Do not call**
+
+        Returns a SELECT over `table_name` whose first column, `dsi_row_num`, is the 1-indexed position of each row in rowid order.
+
+        `candidates` : str, optional, default=None
+            IN list of rowids from the text index. If given, only those rows are read
+        """
+        if self.rowids_dense(table_name):
+            query = f"SELECT rowid + 1 AS dsi_row_num, * FROM {table_name}"
+            return query + f" WHERE rowid IN ({candidates})" if candidates else query
+        if not candidates:
+            return f"SELECT ROW_NUMBER() OVER (ORDER BY rowid) AS dsi_row_num, * FROM {table_name}"
+        return f"""SELECT n.dsi_row_num, t.* FROM (SELECT ROW_NUMBER() OVER (ORDER BY rowid) AS dsi_row_num, rowid AS dsi_rowid
+                   FROM {table_name}) AS n JOIN {table_name} AS t ON t.rowid = n.dsi_rowid WHERE n.dsi_rowid IN ({candidates})"""
+
+    def rowids_dense(self, table_name):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if the rowids of `table_name` are exactly 0..n-1, i.e. each row's rowid is one less than its row number.
+        True for tables that were only ever appended to.
+        """
+        min_rowid, max_rowid, num_rows = self.cur.execute(f"SELECT MIN(rowid), MAX(rowid), COUNT(*) FROM {table_name}").fetchone()
+        return min_rowid == 0 and max_rowid == num_rows - 1
+
+    def row_ids(self, table_name, row_numbers):
+        """
+        **Internal use only. Do not call**
+
+        Returns the rowids of the rows at the 1-indexed positions `row_numbers` of `table_name` in rowid order,
+        the inverse of `row_number_query()`
+        """
+        if len(row_numbers) == 0:
+            return []
+        if self.rowids_dense(table_name):
+            return [num - 1 for num in row_numbers]
+        positions = ', '.join(str(int(num)) for num in row_numbers)
+        found = dict(self.cur.execute(f"""SELECT dsi_row_num, dsi_rowid FROM (SELECT ROW_NUMBER() OVER (ORDER BY rowid) AS dsi_row_num,
+                                          rowid AS dsi_rowid FROM {table_name}) WHERE dsi_row_num IN ({positions})""").fetchall())
+        return [found[num] for num in row_numbers]
+
     def list(self):
         """
         Return a list of all tables and their dimensions from this DuckDB backend
         """
-        tableList = self.cur.execute("""
-                                     SELECT table_name FROM information_schema.tables
-                                     WHERE table_schema = 'main' AND table_type = 'BASE TABLE'
-                                     """).fetchall()
-        tableList = [self.duckdb_compatible_name(table[0]) for table in tableList]
+        tableList = [self.duckdb_compatible_name(table) for table in self.catalog.tables()]
         
         info_list = []
         for table in tableList:
-            colList = self.cur.execute(f"PRAGMA table_info({table});").fetchall()
-            num_cols = len(colList)
-            num_rows = self.cur.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            num_cols = len(self.catalog.table(table).columns)
+            num_rows = self.column_stats.get(table).num_rows
             info_list.append((table, num_cols, num_rows))
         
         return info_list
@@ -758,11 +1168,7 @@ class DuckDB(Filesystem):
         """
             Prints number of tables in this backend
         """
-        table_count = self.cur.execute("""
-                                       SELECT COUNT(*) 
-                                       FROM information_schema.tables 
-                                       WHERE table_schema NOT IN ('information_schema', 'pg_catalog')
-                                       """).fetchone()[0]
+        table_count = len(self.catalog.tables())
         if table_count != 1:
             print(f"Database now has {table_count} tables")
         else:
@@ -784,9 +1190,7 @@ class DuckDB(Filesystem):
             If None (default), all columns are displayed.
         """
         table_name = self.duckdb_compatible_name(table_name.replace(' ', '_'))
-        duckdb_table_name = table_name[1:-1] if table_name[0] == '"' and table_name[-1] == '"' else table_name
-        if self.cur.execute(f"""SELECT COUNT(*) FROM information_schema.tables 
-                                WHERE table_name = '{duckdb_table_name}'""").fetchone()[0] == 0:
+        if self.catalog.table(table_name) is None:
             return (ValueError, f"'{table_name}' does not exist in this DuckDB database")
         if display_cols == None:
             df = self.cur.execute(f"SELECT * FROM {table_name} LIMIT {num_rows};").fetchdf()
@@ -796,10 +1200,10 @@ class DuckDB(Filesystem):
                 df = self.cur.execute(f"SELECT {sql_list} FROM {table_name} LIMIT {num_rows};").fetchdf()
             except Exception as e:
                 return (duckdb.Error, "'display_cols' was incorrect. It must be a list of column names in the table")
-        df.attrs["max_rows"] = self.cur.execute(f"SELECT COUNT(*) FROM {table_name};").fetchone()[0]
+        df.attrs["max_rows"] = self.column_stats.get(table_name).num_rows
         return df
     
-    def summary(self, table_name = None):
+    def summary(self, table_name = None, approx = False):
         """
         Returns numerical metadata from tables in the first activated backend.
 
@@ -807,63 +1211,100 @@ class DuckDB(Filesystem):
             If specified, only the numerical metadata for that table will be returned as a Pandas DataFrame.
             
             If None (default), metadata for all available tables is returned as a list of Pandas DataFrames.
+
+        `approx` : bool, optional, default=False
+            If True, also returns approximate p50, p95 and p99 quantiles, an approximate distinct count and a random sample
+            of each numeric column, read from column sketches that are built on first use. Quantiles are within 1.65% of
+            the requested rank and distinct counts within 3.3% of the true count, both with high probability.
         """
         if table_name is None:
-            tableList = self.cur.execute("""
-                                        SELECT table_name FROM information_schema.tables
-                                        WHERE table_schema = 'main' AND table_type = 'BASE TABLE'
-                                        """).fetchall()
-            tableList = [self.duckdb_compatible_name(table[0]) for table in tableList]
+            tableList = [self.duckdb_compatible_name(table) for table in self.catalog.tables()]
 
             summary_list = []
-            for table in tableList:
-                headers, rows = self.summary_helper(table)
+            for headers, rows in self.summary_tables(tableList, approx):
                 summary_list.append(pd.DataFrame(rows, columns=headers, dtype=object))
             summary_list.insert(0, tableList)
             return summary_list
         else:
             table_name = self.duckdb_compatible_name(table_name.replace(' ', '_'))
-            duckdb_table_name = table_name[1:-1] if table_name[0] == '"' and table_name[-1] == '"' else table_name
-            if self.cur.execute(f"""SELECT COUNT(*) FROM information_schema.tables 
-                                WHERE table_name = '{duckdb_table_name}'""").fetchone()[0] == 0:
+            if self.catalog.table(table_name) is None:
                 return (ValueError, f"'{table_name}' does not exist in this DuckDB database")
-            headers, rows = self.summary_helper(table_name)
+            table_sketches = self.column_sketches.get(table_name) if approx else None
+            headers, rows = self.summary_helper(table_name, table_sketches = table_sketches)
             return pd.DataFrame(rows, columns=headers, dtype=object)
 
-    def summary_helper(self, table_name):
+    def summary_tables(self, tableList, approx = False):
         """
         **Internal use only. Do not call**
 
-        Generates and returns summary metadata for a specific table in the DuckDB backend.
+        Returns the summary_helper() output of each table in `tableList`, in order.
+        Summaries are read from the stored column statistics. Tables whose statistics are missing or stale are aggregated
+        again first: with more than one CPU, they are split between worker threads that each read through their own cursor.
+        With `approx`, column sketches are read (and rebuilt if stale) after the statistics.
+        """
+        table_infos = [self.catalog.table(table) for table in tableList]
+        stale = set(self.column_stats.stale(tableList))
+        positions = [i for i, table in enumerate(tableList) if table in stale]
+        table_stats = [None] * len(tableList)
+        workers = min(len(positions), os.cpu_count() or 1)
+        if workers > 1:
+            def aggregate(group):
+                cursor = self.con.cursor()
+                try:
+                    return [(i, self.column_stats.compute(tableList[i], cursor, table_info = table_infos[i])) for i in group]
+                finally:
+                    cursor.close()
+
+            with ThreadPoolExecutor(max_workers = workers) as pool:
+                for group in pool.map(aggregate, [positions[start::workers] for start in range(workers)]):
+                    for i, computed in group:
+                        table_stats[i] = computed
+                        self.column_stats.persist(tableList[i], computed)
+
+        table_sketches = [self.column_sketches.get(table) if approx else None for table in tableList]
+        return [self.summary_helper(*args) for args in zip(tableList, table_infos, table_stats, table_sketches)]
+
+    def summary_helper(self, table_name, table_info = None, table_stats = None, table_sketches = None):
+        """
+        **Internal use only. Do not call**
+
+        Generates and returns summary metadata for a specific table in the DuckDB backend from its column statistics:
+        min, max, mean and sample standard deviation of all numeric columns.
+
+        `table_info` : CatalogTable, optional, default=None
+            Schema of the table. Looked up in the catalog if None
+
+        `table_stats` : TableStats, optional, default=None
+            Column statistics of the table. Read from `dsi_column_stats` (and rebuilt if stale) if None
+
+        `table_sketches` : OrderedDict, optional, default=None
+            Column sketches of the table. If given, approximate quantiles, distinct counts and samples are added
         """
-        col_info = self.cur.execute(f"PRAGMA table_info({table_name})").fetchall()
+        if table_info is None:
+            table_info = self.catalog.table(table_name)
+        if table_stats is None:
+            table_stats = self.column_stats.get(table_name)
 
         numeric_types = {'INTEGER', 'REAL', 'FLOAT', 'NUMERIC', 'DECIMAL', 'DOUBLE', 'BIGINT'}
         headers = ['column', 'type', 'min', 'max', 'avg', 'std_dev']
-        rows = []
+        if table_sketches is not None:
+            headers += ['p50', 'p95', 'p99', 'approx_distinct', 'sample']
 
-        for col in col_info:
-            col_name = col[1]
-            col_type = col[2].upper()
-            is_primary = col[5] > 0
-            display_name = f"{col_name}*" if is_primary else col_name
-
-            if any(nt in col_type for nt in numeric_types):
-                min_val, max_val, avg_val, std_dev = self.cur.execute(f"""
-                    SELECT
-                        MIN("{col_name}"),
-                        MAX("{col_name}"),
-                        AVG("{col_name}"),
-                        STDDEV_SAMP("{col_name}")
-                    FROM {table_name}
-                    WHERE "{col_name}" IS NOT NULL
-                """).fetchone()
-            else:
-                min_val = max_val = avg_val = std_dev = None
-            
-            if avg_val != None and std_dev == None:
-                std_dev = 0
-            rows.append([display_name, col_type, min_val, max_val, avg_val, std_dev])
+        rows = []
+        for col_name, col_type, pk in zip(table_info.columns, table_info.types, table_info.pk):
+            min_val, max_val, avg_val, std_dev = None, None, None, None
+            if any(nt in col_type.upper() for nt in numeric_types):
+                moments = table_stats.columns[col_name]
+                min_val, max_val, avg_val, std_dev = moments.min, moments.max, moments.mean, moments.std_dev(sample = True)
+            display_name = f"{col_name}*" if pk > 0 else col_name
+            row = [display_name, col_type.upper(), min_val, max_val, avg_val, std_dev]
+            if table_sketches is not None:
+                sketch = table_sketches.get(col_name)
+                if sketch is not None:
+                    row += sketch.summary(self.column_stats.kind(col_type) == "integer")
+                else:
+                    row += [None] * 5
+            rows.append(row)
 
         return headers, rows
 
@@ -871,10 +1312,11 @@ class DuckDB(Filesystem):
         """
         Overwrites specified table(s) in this DuckDB backend using the provided Pandas DataFrame(s).
 
-        If a relational schema has been previously loaded into the backend, it will be reapplied to the table.
-        Cannot accept any schemas with circular dependencies.
-
-        **Note:** This function permanently deletes the existing table and its data, before inserting the new data.
+        A DataFrame with every column of its stored table is diffed against it in one transaction: only changed rows are updated,
+        new rows inserted, rows missing from the DataFrame deleted and new columns added, matching rows by the table's
+        single-column primary key if it has one, otherwise by position. Relations and every other table are left untouched.
+        Otherwise, or if the edits break a constraint when applied row by row, the table is dropped and its new data ingested,
+        reapplying a previously loaded relational schema. That cannot accept any schemas with circular dependencies.
 
         `table_name` : str or list
             - If str, name of the table to overwrite in the backend.
@@ -884,14 +1326,173 @@ class DuckDB(Filesystem):
             - If one item, a DataFrame containing the updated data will be written to the table.
             - If a list, all DataFrames with updated data will be written to their own table
         """
+        if isinstance(table_name, list) and isinstance(collection, list):
+            tables = [(name, data, None) for name, data in zip(table_name, collection)]
+        elif isinstance(table_name, str) and isinstance(collection, pd.DataFrame):
+            tables = [(table_name, collection, None)]
+        else:
+            return (TypeError, "inputs to overwrite_table() need to both be a list or (string, Pandas DataFrame).")
+        error = None if self.update_rows(tables) else self.rewrite_tables(table_name, collection)
+        self.data_changed()
+        return error
+
+    def update_table(self, table_name, collection, row_numbers):
+        """
+        Updates rows of a table in this DuckDB backend in place with the edited rows of a Pandas DataFrame, in one transaction.
+
+        Only the changed columns of changed rows are written, new columns are added and extra rows are appended,
+        so the rest of the table, its relations and every other table are left untouched.
+        If the edits break a constraint when applied row by row, the table is rewritten with them like `overwrite_table()`.
+
+        `table_name` : str
+            Name of the table to update.
+
+        `collection` : pandas.DataFrame
+            Edited rows with every column of the table. Its first len(`row_numbers`) rows replace the stored rows
+            at those positions, and any further rows are appended to the table.
+
+        `row_numbers` : list of int
+            1-indexed positions of the edited rows in the table in rowid order, such as the row numbers returned by `find()`.
+
+        `return`: None on success. If an error occurs, returns a tuple in the format of: (ErrorType, error message).
+        """
+        table_info = self.catalog.table(table_name)
+        if table_info is None:
+            print(f"WARNING: Cannot update the table '{table_name}' as it does not exist in the active backend.\n")
+            return
+        num_rows = self.cur.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        if len(row_numbers) > num_rows or any(num > num_rows for num in row_numbers):
+            return (ValueError, "'dsi_row_index' was modified. When adding new rows, values for 'dsi_row_index' must be empty.")
+        if not set(table_info.columns).issubset(set(collection.columns)):
+            return (ValueError, f"{table_name}'s edited data must contain all columns from the original table")
+        if self.update_rows([(table_name, collection, row_numbers)]):
+            self.data_changed()
+            return
+
+        table_df = self.get_table(table_name)
+        edited_df = collection.copy()
+        for col in edited_df.columns:
+            if col not in table_df.columns:
+                table_df[col] = None
+        table_df = table_df[edited_df.columns]
+        for col in table_df.columns:
+            common_dtype = np.result_type(table_df[col].to_numpy().dtype, edited_df[col].to_numpy().dtype)
+            table_df[col] = table_df[col].astype(common_dtype)
+            edited_df[col] = edited_df[col].astype(common_dtype)
+        table_df.loc[[num - 1 for num in row_numbers]] = edited_df.iloc[:len(row_numbers)].values
+        table_df = pd.concat([table_df, edited_df.iloc[len(row_numbers):]], ignore_index=True)
+        error = self.rewrite_tables(table_name, table_df)
+        self.data_changed()
+        return error
+
+    def update_rows(self, tables):
+        """
+        **Internal use only. Do not call**
+
+        Applies edited DataFrames to their stored tables row by row in one transaction with `RowDelta`.
+        Column statistics and sketches of tables with updated or deleted rows are dropped, to be rebuilt when next read,
+        and their text index is rebuilt after the commit.
+
+        `tables` : list of (table name, pandas.DataFrame, row numbers or None)
+            With row numbers, the first rows of the DataFrame are the stored rows at those 1-indexed positions and the rest
+            are appended. Without, the DataFrame is the whole new table, matched by its single-column primary key or by position.
+
+        `return`: True if the tables were updated. False if they must be rewritten instead, in which case nothing was changed
+        """
+        deltas = []
+        edited_keys = []
+        for table_name, collection, row_numbers in tables:
+            table_info = self.catalog.table(table_name)
+            if table_info is None:
+                return False
+            data = OrderedDict()
+            for col, series in collection.items():
+                data[self.duckdb_compatible_name(str(col).replace(' ', '_').replace('-', '_'))] = column_values(series)
+            stored_cols = [self.duckdb_compatible_name(col) for col in table_info.columns]
+            new_cols = [col for col in data if col not in stored_cols]
+            if not set(stored_cols).issubset(data) or any(col.lower() in [c.lower() for c in stored_cols] for col in new_cols):
+                return False
+            # values that would change a column's type are left to a rewrite, which infers the new type as an ingest does
+            for col, col_type in zip(stored_cols, table_info.types):
+                values = data[col]
+                if any(x is not None for x in values) and \
+                        not kind_fits(self.type_inference.infer(values), self.column_kind(col_type), row_numbers is None):
+                    return False
+            key = None
+            pk_cols = [col for col, pk in zip(stored_cols, table_info.pk) if pk]
+            if row_numbers is None and len(pk_cols) == 1:
+                keys = data[pk_cols[0]]
+                if None in keys or key_error(table_name, pk_cols[0], keys) is not None:
+                    return False
+                key = list(data.keys()).index(pk_cols[0])
+                if keys_changed(self.cur, table_name, pk_cols[0], keys):
+                    edited_keys.append(table_name)
+            deltas.append((self.duckdb_compatible_name(table_name), data, new_cols, row_numbers, key))
+
+        # as in ingest_artifacts(), the text index is updated after the commit and checkpoint, which may renumber rowids
+        text_marks = []
+        self.cur.execute("BEGIN TRANSACTION")
+        try:
+            for table_name, data, new_cols, row_numbers, key in deltas:
+                text_mark = self.text_index.mark(table_name)
+                stats_mark = self.column_stats.mark(table_name)
+                sketch_mark = self.column_sketches.mark(table_name)
+                for col in new_cols:
+                    self.cur.execute(f"ALTER TABLE {table_name} ADD COLUMN {col}{self.sql_type(data[col], table_name, col)};")
+                if new_cols:
+                    self.catalog.reload_table(table_name)
+
+                delta = RowDelta(self.cur, table_name, list(data.keys()))
+                rows = list(zip(*data.values()))
+                if row_numbers is None:
+                    delta.match_all(rows, key)
+                else:
+                    delta.match(self.row_ids(table_name, row_numbers), rows[:len(row_numbers)])
+                    delta.insert(rows[len(row_numbers):])
+                delta.apply()
+
+                if delta.rewrites or new_cols:
+                    self.column_stats.drop(table_name)
+                    self.column_sketches.drop(table_name)
+                    text_marks.append((table_name, None))
+                elif not delta.empty:
+                    self.column_stats.update(table_name, stats_mark)
+                    self.column_sketches.update(table_name, sketch_mark)
+                    text_marks.append((table_name, text_mark))
+            self.cur.execute("COMMIT")
+            self.cur.execute("CHECKPOINT")
+        except duckdb.Error:
+            self.cur.execute("ROLLBACK")
+            self.cur.execute("CHECKPOINT")
+            for table_name, data, new_cols, _, _ in deltas:
+                self.catalog.reload_table(table_name)
+                self.type_inference.forget(table_name)
+            return False
+
+        if self.text_index.enabled and len(text_marks) > 0:
+            self.cur.execute("BEGIN TRANSACTION")
+            for table_name, text_mark in text_marks:
+                self.text_index.update(table_name, text_mark)
+            self.cur.execute("COMMIT")
+            self.cur.execute("CHECKPOINT")
+        for table_name in edited_keys:
+            print(f"WARNING: The data in {table_name}'s primary key column was edited which could reorder rows in the table.")
+        return True
+
+    def rewrite_tables(self, table_name, collection):
+        """
+        **Internal use only. Do not call.**
+
+        Drops the tables of `overwrite_table()` and ingests their new data, reapplying the relational schema
+        of the whole database, which is read back for it
+        """
         not_exists = False
         temp_data = OrderedDict()
         if isinstance(table_name, list) and isinstance(collection, list):
             temp_data = self.process_artifacts()
         elif isinstance(table_name, str) and isinstance(collection, pd.DataFrame):
             # if single table doesn't exist, skip all relations/dependencies checking
-            if self.cur.execute(f"""SELECT COUNT(*) FROM information_schema.tables 
-                                WHERE table_name = '{table_name}'""").fetchone()[0] == 0:
+            if self.catalog.table(table_name) is None:
                 not_exists = True
                 temp_data[table_name] = OrderedDict(collection.to_dict(orient='list'))
                 table_name = []
@@ -913,22 +1514,14 @@ class DuckDB(Filesystem):
             result = next((pk_tuple[1] for pk_tuple in temp_data["dsi_relations"]["primary_key"] if name in pk_tuple[0]), None)
             if result:
                 new_data = temp_data[name][result]
-                if any(isinstance(x, str) for x in new_data) and any(isinstance(x, (int, float)) for x in new_data):
-                    return (TypeError, f"There are mismatched data types in {name}'s primary key column, {result}. Cannot update.")
-                if len(new_data) != len(set(new_data)):
-                    return (ValueError, f"{name}'s primary key column, {result}, must have unique data")
-
-                rows = self.cur.execute(f"SELECT {result} FROM {name}").fetchall()
-                old_data = [row[0] for row in rows]
-                if old_data != new_data:
-                    if any(isinstance(x, float) for x in new_data):
-                        new_data = [round(val, 4) for val in new_data]
+                error = key_error(name, result, new_data)
+                if error is not None:
+                    return error
+
+                if keys_changed(self.cur, name, result, new_data):
                     for pk, fk in zip(temp_data["dsi_relations"]["primary_key"], temp_data["dsi_relations"]["foreign_key"]):
                         if pk == (name, result) and fk != (None, None):
-                            fk_data = temp_data[fk[0]][fk[1]]
-                            if any(isinstance(x, float) for x in fk_data):
-                                fk_data = [round(val, 4) for val in fk_data]
-                            if not all(item in new_data for item in fk_data):
+                            if not keys_contained(temp_data[fk[0]][fk[1]], new_data):
                                 errorMsg = f"Data in '{fk[1]}', the foreign key of '{fk[0]}', must match '{result}', the primary"
                                 return(TypeError, errorMsg + f" key of '{name}'. Please ensure that all rows in '{fk[0]}' are updated")
 
@@ -940,9 +1533,15 @@ class DuckDB(Filesystem):
             if circular:
                 return (ValueError, f"A complex schema with a circular dependency cannot be ingested into a DuckDB backend.")
 
+        # indexes are dropped with their tables, so the ones DSI created are rebuilt on the new tables
+        index_definitions = self.indexes.definitions([name for name in ordered_tables if name != "dsi_relations"])
         for table_name in ordered_tables:
             temp_name = table_name[1:-1] if table_name[0] == '"' and table_name[-1] == '"' else table_name
             self.con.execute(f'DROP TABLE IF EXISTS "{temp_name}" CASCADE')
+            self.column_stats.drop(temp_name)
+            self.column_sketches.drop(temp_name)
+            self.catalog.reload_table(temp_name)
+            self.type_inference.forget(self.duckdb_compatible_name(temp_name))
 
         temp_runTable_bool = self.runTable
         self.runTable = False
@@ -954,7 +1553,86 @@ class DuckDB(Filesystem):
 
         if errorStmt is not None:
             raise errorStmt[0](f"Error updating data in {self.filename} due to {errorStmt[1]}")
-        
+        self.indexes.restore(index_definitions)
+        self.cur.execute("CHECKPOINT")
+
+    def create_index(self, table_name, column_name):
+        """
+        Creates an index on a column so `find_relation()` and queries filtering on it do not scan the whole table.
+        Nothing is done if DSI already created one. The index is kept when the table is overwritten or updated.
+
+        `table_name` : str
+            Name of the table
+
+        `column_name` : str
+            Name of the column to index
+
+        `return`: the index name. If an error occurs, returns a tuple in the format of: (ErrorType, error message).
+        """
+        try:
+            name = self.indexes.create(table_name, column_name)
+            self.cur.execute("CHECKPOINT")
+        except ValueError as e:
+            return (ValueError, str(e))
+        except duckdb.Error as e:
+            return (duckdb.Error, e)
+        return name
+
+    def drop_index(self, table_name, column_name):
+        """
+        Drops the index created on a column by DSI, either at ingest, by `create_index()` or by `auto_index`.
+        Indexes of primary keys and indexes created outside DSI are kept.
+
+        `table_name` : str
+            Name of the table
+
+        `column_name` : str
+            Name of the indexed column
+
+        `return`: None on success. If an error occurs, returns a tuple in the format of: (ErrorType, error message).
+        """
+        try:
+            self.indexes.drop(table_name, column_name)
+            self.cur.execute("CHECKPOINT")
+        except ValueError as e:
+            return (ValueError, str(e))
+        except duckdb.Error as e:
+            return (duckdb.Error, e)
+
+    def time_limit(self, timeout = None):
+        """
+        Returns a context manager within which this backend's statements are cancelled after `timeout` seconds,
+        or by `cancel()`, and raise a QueryCancelled. The backend stays usable afterwards. No timeout applies if None.
+        """
+        return self.cancellation.limit(timeout)
+
+    def cancel(self):
+        """
+        Cancels the statements running inside `time_limit()` or `query_artifacts()`, in every thread reading this backend.
+        Safe to call from another thread or a signal handler, such as the CLI's Ctrl-C handler.
+
+        `return`: True if a statement was cancelled, False if none was running
+        """
+        return self.cancellation.cancel()
+
+    def slow_queries(self, limit = None):
+        """
+        Returns the statements in the `query_log` file that took at least `slow_query_ms` milliseconds, slowest first,
+        as a list of dicts with the `time`, `origin`, `sql`, `latency_ms`, `rows` and query `plan` of each.
+        Statements logged by other backends and earlier sessions sharing the file are included.
+
+        `limit` : int, optional, default=None
+            Maximum number of statements returned. All if None.
+        """
+        return self.query_log.slow(limit)
+
+    def index_advice(self):
+        """
+        Returns the columns that `find_relation()` and `query_artifacts()` filtered on at least 3 times since the backend
+        was opened and that have no index, most filtered first, as a list of (table, column, number of filters)
+        """
+        return self.indexes.advice()
+
     def check_table_relations(self, tables, relation_dict):
         """
         **Internal use only. Do not call.**
@@ -1026,11 +1704,61 @@ class DuckDB(Filesystem):
 
         return False, ordered_tables
 
+    def backup(self, backup_file, generations = BACKUP_GENERATIONS):
+        """
+        Copies the database to `backup_file`. A file database is checkpointed, so the file alone holds all committed data,
+        and then copied. An in-memory database is saved there like with `persist()`.
+
+        The previous backups move to "<name>.1<ext>", "<name>.2<ext>", ... and only the newest `generations` files are kept.
+        Nothing is copied if the database is unchanged since this backend's last backup to `backup_file`.
+
+        `return`: True if a backup was written, False if it was skipped
+        """
+        if self.persistence is None:
+            # a checkpoint with nothing to write leaves the file untouched, so an unchanged database keeps its version
+            self.cur.execute("CHECKPOINT")
+        version = self.cache_version()
+        if backup_current(self.last_backup, backup_file, version):
+            return False
+        temp_file = backup_file + ".tmp"
+        if self.persistence is None:
+            shutil.copyfile(self.filename, temp_file)
+        else:
+            self.persistence.save(temp_file)
+        install_backup(temp_file, backup_file, generations)
+        self.last_backup = (backup_file, version)
+        return True
+
+    def persist(self, filename = None):
+        """
+        Saves an in-memory database to a file with ATTACH and COPY FROM DATABASE. A database already in the file is replaced.
+
+        `filename` : str, optional, default=None
+            File to save to. If None, the database is saved to its `persist_to` file.
+
+        `return`: None on success. If an error occurs, returns a tuple in the format of: (ErrorType, error message).
+        """
+        if self.persistence is None:
+            return (ValueError, f"{self.filename} is not an in-memory database, so its data is already stored in the file")
+        if filename is None and self.persistence.path is None:
+            return (ValueError, "A filename is needed to save an in-memory database that was created without persist_to")
+        self.persistence.save(filename)
+
     # Closes connection to server
     def close(self):
         """
-        Closes the DuckDB database's connection.
+        Closes the DuckDB database's connection. An in-memory database created with `persist_to` is saved first.
 
         `return`: None
         """
+        self.maintenance.wait()
+        if self.persistence is not None and self.persistence.path is not None:
+            self.persistence.save()
+        # Terminal closes loaded backends more than once, and only the first close saves
+        self.persistence = None
+        if self.read_pool is not None:
+            self.cur.cursor.close()
+            release_read_pool(self.read_pool)
+            self.read_pool = None
+            return
         self.con.close()
\ No newline at end of file
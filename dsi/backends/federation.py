@@ -0,0 +1,691 @@
+import math
+import os
+import re
+import sqlite3
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+from dsi.backends.sqlite import ValueObject
+from dsi.backends.catalog import CatalogTable, SqliteCatalog, DuckDBCatalog
+from dsi.backends.cancellation import SqliteCancellation, DuckDBCancellation, QueryCancelled
+from dsi.backends.cell_match import is_number, number_literal, like_pattern
+from dsi.backends.indexes import quote
+from dsi.backends.lazy_rows import LazyRows
+
+# column of every federated view holding the database file each row was read from
+SOURCE_COLUMN = "dsi_source"
+# name of the schema each database file is attached as, followed by the file's position
+SOURCE_PREFIX = "dsi_src"
+# number of databases SQLite can attach to one connection when its build allows raising the default of 10
+SQLITE_MAX_ATTACHED = 125
+
+class Federation(metaclass=ABCMeta):
+    """
+    Read-only federation of many DSI database files of one engine, such as the databases of several campaigns.
+
+    Every file is attached to a single in-memory connection, and each table name found in any file is exposed as a view
+    that is the UNION ALL of that table across the files. Columns missing from a file read as NULL, and the `dsi_source`
+    column of each row holds the file it came from (or the row's own `dsi_source` if the table already has one).
+    Queries, finds and summaries on the views run across all files in one statement per table, so the engine plans,
+    filters and aggregates all files together. Tables are matched by name case-insensitively.
+
+    The views are built once, when the federation is created. `refresh()` rebuilds them after tables or columns were
+    added to the files. Rows added to the files are always visible, unless the engine had to copy the files (see `stage()`).
+    """
+    # tables with these name prefixes are internal to a backend and not federated
+    hidden_prefixes = ()
+
+    def __init__(self, filenames):
+        """
+        `filenames` : str or list of str
+            Database files to federate. Each must have been written by a backend of this federation's engine
+        """
+        if isinstance(filenames, str):
+            filenames = [filenames]
+        if len(filenames) == 0:
+            raise ValueError("Need at least one database file to federate")
+        for filename in filenames:
+            if not os.path.isfile(filename):
+                raise ValueError(f"'{filename}' does not exist")
+        self.filename = ":memory:"
+        self.filenames = list(filenames)
+        self.con = self.connect(len(self.filenames))
+        self.cur = self.con.cursor()
+        self.cancellation = self.make_cancellation()
+        self.sources = OrderedDict()
+        for position, filename in enumerate(self.filenames):
+            alias = f"{SOURCE_PREFIX}_{position}"
+            self.attach(alias, filename)
+            self.sources[alias] = filename
+        self.views = OrderedDict()
+        self.numbered = {}
+        self.refresh()
+
+    def refresh(self):
+        """
+        Rebuilds the federated views from the current schema of every file
+        """
+        self.stage()
+        merged = OrderedDict()
+        for alias in self.sources:
+            source_tables = OrderedDict()
+            for table, column, col_type in self.source_tables(alias):
+                if not table.startswith(self.hidden_prefixes):
+                    source_tables.setdefault(table, []).append((column, col_type))
+            for table, columns in source_tables.items():
+                name, view_columns, parts = merged.setdefault(table.lower(), (table, OrderedDict(), []))
+                for column, col_type in columns:
+                    if column.lower() != SOURCE_COLUMN:
+                        view_columns.setdefault(column.lower(), (column, []))[1].append(col_type)
+                parts.append((alias, table, {column.lower() for column, _ in columns}))
+
+        for name in self.views:
+            self.cur.execute(f"DROP VIEW IF EXISTS {quote(name)}")
+        self.views = OrderedDict()
+        self.numbered = {}
+        for name, view_columns, parts in merged.values():
+            casts = {key: self.common_type(types) for key, (_, types) in view_columns.items()}
+            selects, numbered = [], []
+            for position, (alias, table, present) in enumerate(parts):
+                if SOURCE_COLUMN in present:
+                    select = [f"{quote(SOURCE_COLUMN)} AS {quote(SOURCE_COLUMN)}"]
+                else:
+                    select = ["'" + self.sources[alias].replace("'", "''") + f"' AS {quote(SOURCE_COLUMN)}"]
+                for key, (column, _) in view_columns.items():
+                    value = quote(column) if key in present else "NULL"
+                    if casts[key] is not None:
+                        value = f"CAST({value} AS {casts[key]})"
+                    select.append(f"{value} AS {quote(column)}")
+                selects.append(f"SELECT {', '.join(select)} FROM {self.source_table(alias, table)}")
+                numbered.append(f"SELECT {position} AS dsi_part, rowid AS dsi_rowid, {', '.join(select)} FROM {self.source_table(alias, table)}")
+            self.cur.execute(self.view_statement(quote(name), " UNION ALL ".join(selects)))
+            self.numbered[name] = " UNION ALL ".join(numbered)
+
+            view = CatalogTable(name)
+            view.columns = [SOURCE_COLUMN] + [column for column, _ in view_columns.values()]
+            view.types = ["VARCHAR"] + [casts[key] or types[0] for key, (_, types) in view_columns.items()]
+            view.pk = [0] * len(view.columns)
+            self.views[name] = view
+
+    def numbered_rows(self, name):
+        """
+        **Internal use only. Do not call**
+
+        Returns a SELECT of the rows of the view `name` with their row number first, as `dsi_row_num`. Rows are numbered
+        file by file and by rowid within each file, so a row keeps its number between calls even where the engine
+        reads the files in parallel
+        """
+        columns = ", ".join(quote(col) for col in self.views[name].columns)
+        return f"SELECT ROW_NUMBER() OVER (ORDER BY dsi_part, dsi_rowid) AS dsi_row_num, {columns} FROM ({self.numbered[name]}) AS t0"
+
+    @abstractmethod
+    def connect(self, num_files):
+        """
+        **Internal use only. Do not call**
+
+        Returns an in-memory connection that can attach `num_files` databases
+        """
+        pass
+
+    @abstractmethod
+    def make_cancellation(self):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    @abstractmethod
+    def attach(self, alias, filename):
+        """
+        **Internal use only. Do not call**
+
+        Attaches the database `filename` read-only as the schema `alias`
+        """
+        pass
+
+    @abstractmethod
+    def source_tables(self, alias):
+        """
+        **Internal use only. Do not call**
+
+        Returns (table, column, declared type) of every column of the tables of the attached schema `alias`, in catalog order
+        """
+        pass
+
+    def stage(self):
+        """
+        **Internal use only. Do not call**
+
+        Copies the tables of files that cannot be attached into the federation's own database before the views are built.
+        Nothing is copied by default
+        """
+        pass
+
+    def source_table(self, alias, table):
+        """
+        **Internal use only. Do not call**
+
+        Returns the qualified name the views read `table` of the attached schema `alias` from
+        """
+        return f"{alias}.{self.qualified(table)}"
+
+    def qualified(self, table):
+        """
+        **Internal use only. Do not call**
+
+        Returns the name of `table` within an attached schema, without the schema
+        """
+        return quote(table)
+
+    @abstractmethod
+    def view_statement(self, name, select):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    def common_type(self, types):
+        """
+        **Internal use only. Do not call**
+
+        Returns the type a column declared with `types` in different files is cast to in its view, or None if no cast is needed
+        """
+        return None
+
+    @abstractmethod
+    def is_numeric(self, col_type):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    @abstractmethod
+    def read_frame(self, query):
+        """
+        **Internal use only. Do not call**
+
+        Runs `query` and returns its result as a DataFrame
+        """
+        pass
+
+    def text(self, col_name):
+        """
+        **Internal use only. Do not call**
+
+        Returns the SQL condition under which a cell of `col_name` contains the LIKE pattern that follows it
+        """
+        return f"CAST({col_name} AS TEXT) LIKE"
+
+    def table(self, table_name):
+        """
+        Returns the CatalogTable of the view `table_name`, or None if no file has such a table
+        """
+        if len(table_name) > 1 and table_name[0] == '"' and table_name[-1] == '"':
+            table_name = table_name[1:-1]
+        return self.views.get(table_name) or next((view for name, view in self.views.items() if name.lower() == table_name.lower()), None)
+
+    def tables(self):
+        """
+        Returns the names of all federated views
+        """
+        return list(self.views.keys())
+
+    def query_artifacts(self, query, isVerbose = False, dict_return = False, timeout = None):
+        """
+        Executes a SQL query on the federated views and returns the result in the specified format dependent on `dict_return`
+
+        `query` : str
+            Must be a SELECT or PRAGMA SQL query. Tables are read across all files, with their `dsi_source` column.
+
+        `isVerbose` : bool, optional, default=False
+            If True, prints the result.
+
+        `dict_return` : bool, optional, default=False
+            If True, returns the result as an OrderedDict.
+            If False, returns the result as a pandas DataFrame.
+
+        `timeout` : float, optional, default=None
+            Number of seconds after which the query is cancelled. A cancelled query returns (QueryCancelled, "error message").
+
+        `return` : pandas.DataFrame or OrderedDict or tuple
+            - If query is valid and `dict_return` is False: returns a DataFrame.
+            - If query is valid and `dict_return` is True: returns an OrderedDict.
+            - If query is invalid: returns a tuple (ErrorType, "error message"). Ex: (ValueError, "this is an error")
+        """
+        if query[:6].lower() != "select" and query[:6].lower() != "pragma":
+            return (RuntimeError, "Error in query_artifacts: Can only run SELECT or PRAGMA queries on federated data")
+        try:
+            with self.cancellation.limit(timeout):
+                data = self.read_frame(query)
+        except QueryCancelled as e:
+            return (QueryCancelled, f"Error in query_artifacts: {e}")
+        except Exception as e:
+            return (RuntimeError, f"Error in query_artifacts: {e}")
+        if isVerbose:
+            print(data)
+        if dict_return:
+            return OrderedDict(data.to_dict(orient='list'))
+        return data
+
+    def get_artifacts(self, query, isVerbose = False, dict_return = False, timeout = None):
+        return self.query_artifacts(query, isVerbose, dict_return, timeout)
+
+    def get_table(self, table_name, dict_return = False):
+        """
+        Returns every row of a federated table, across all files
+        """
+        return self.query_artifacts(query = f"SELECT * FROM {table_name}", dict_return = dict_return)
+
+    def find(self, query_object):
+        """
+        Searches for all instances of `query_object` across the federated tables at the table, column, and cell levels.
+        Returns ValueObjects like `Sqlite.find()`
+        """
+        all_return = []
+        for match in [self.find_table(query_object), self.find_column(query_object), self.find_cell(query_object)]:
+            if isinstance(match, list):
+                all_return += match
+        if len(all_return) > 0:
+            return all_return
+        return f"{query_object} was not found in the federated databases"
+
+    def find_table(self, query_object, limit = None):
+        """
+        Finds all federated tables whose names contain `query_object`. Returns ValueObjects like `Sqlite.find_table()`
+        """
+        if not isinstance(query_object, str):
+            return f"{query_object} needs to be a string if finding among table names"
+        table_return_list = []
+        for name, view in self.views.items():
+            if query_object in name:
+                val = ValueObject()
+                val.t_name = name
+                val.c_name = list(view.columns)
+                val.value = LazyRows(self.con.cursor, quote(name), limit = limit, order = None)
+                val.type = "table"
+                table_return_list.append(val)
+        if len(table_return_list) > 0:
+            return table_return_list
+        return f"{query_object} is not a table name in the federated databases"
+
+    def find_column(self, query_object, range = False, limit = None):
+        """
+        Finds all columns of the federated tables whose names contain `query_object`. Returns ValueObjects like
+        `Sqlite.find_column()`. With `range`, the [min, max] of each numeric column across all files is computed
+        in one statement per table, counting missing values as 0
+        """
+        if not isinstance(query_object, str):
+            return f"{query_object} needs to be a string if finding among column names"
+        col_return_list = []
+        for name, view in self.views.items():
+            matches = [(col, col_type) for col, col_type in zip(view.columns, view.types) if query_object in col]
+            if range:
+                matches = [(col, col_type) for col, col_type in matches if self.is_numeric(col_type)]
+            if len(matches) == 0:
+                continue
+            if not range:
+                for col, _ in matches:
+                    val = ValueObject()
+                    val.t_name = name
+                    val.c_name = [col]
+                    val.value = LazyRows(self.con.cursor, quote(name), quote(col), limit, single_column = True, order = None)
+                    val.type = "column"
+                    col_return_list.append(val)
+                continue
+            aggregates = ", ".join(f"MIN({quote(col)}), MAX({quote(col)}), COUNT(*) - COUNT({quote(col)})" for col, _ in matches)
+            with self.cancellation.limit():
+                stats = self.cur.execute(f"SELECT {aggregates} FROM {quote(name)}").fetchone()
+            for i, (col, _) in enumerate(matches):
+                minimum, maximum, null_count = stats[3 * i : 3 * i + 3]
+                if null_count > 0:
+                    minimum, maximum = (0, 0) if minimum is None else (min(minimum, 0), max(maximum, 0))
+                val = ValueObject()
+                val.t_name = name
+                val.c_name = [col]
+                val.value = [minimum, maximum]
+                val.type = "range"
+                col_return_list.append(val)
+        if len(col_return_list) > 0:
+            return col_return_list
+        return f"{query_object} is not a column name in the federated databases"
+
+    def find_cell(self, query_object, row = False):
+        """
+        Finds all cells of the federated tables that match or contain `query_object`, reading each table across all files
+        in one statement. Returns ValueObjects like `Sqlite.find_cell()`, whose `row_num` is the position of the row
+        in its federated table, with the rows of each file in rowid order. The `dsi_source` column is not searched
+        """
+        value_obj_list = []
+        for name, view in self.views.items():
+            predicates = []
+            for col, col_type in zip(view.columns[1:], view.types[1:]):
+                if is_number(query_object) and self.is_numeric(col_type):
+                    predicates.append((col, f"{quote(col)} = {number_literal(query_object)}"))
+                else:
+                    predicates.append((col, f"{self.text(quote(col))} {like_pattern(query_object)}"))
+            where = " OR ".join(f"({predicate})" for _, predicate in predicates)
+            if row:
+                select = ", ".join(quote(col) for col in view.columns)
+            else:
+                select = ", ".join(f"({predicate})" for _, predicate in predicates) + ", " + \
+                         ", ".join(quote(col) for col, _ in predicates)
+            query = f"SELECT dsi_row_num, {select} FROM ({self.numbered_rows(name)}) AS t1 WHERE {where}"
+            with self.cancellation.limit():
+                value_rows = self.cur.execute(query).fetchall()
+            for value_row in value_rows:
+                if row:
+                    val = ValueObject()
+                    val.t_name = name
+                    val.row_num = value_row[0]
+                    val.c_name = list(view.columns)
+                    val.value = list(value_row[1:])
+                    val.type = "row"
+                    value_obj_list.append(val)
+                    continue
+                matched = value_row[1:len(predicates) + 1]
+                cells = value_row[len(predicates) + 1:]
+                for (col, _), is_match, cell in zip(predicates, matched, cells):
+                    if is_match:
+                        val = ValueObject()
+                        val.t_name = name
+                        val.row_num = value_row[0]
+                        val.c_name = [col]
+                        val.value = cell
+                        val.type = "cell"
+                        value_obj_list.append(val)
+        if len(value_obj_list) > 0:
+            return value_obj_list
+        return f"{query_object} is not a cell in the federated databases"
+
+    def find_relation(self, column_name, relation):
+        """
+        Finds all rows of the first federated table with `column_name` that satisfy `relation`, across all files.
+        Returns ValueObjects like `Sqlite.find_relation()`, or the queries to run if several tables have the column
+        """
+        column = column_name[1:-1] if len(column_name) > 1 and column_name[0] in "'\"" and column_name[-1] == column_name[0] else column_name
+        all_tables = [name for name, view in self.views.items() if any(col.lower() == column.lower() for col in view.columns)]
+        if len(all_tables) == 0:
+            return f"'{column}' is not a column in the federated databases. Ensure the column is written first."
+        old_relation = relation
+        col_name = quote(column)
+        if relation[0] == '(' and relation[-1] == ')':
+            values = relation[1:-1].strip()
+            values = re.sub(r"\s*,\s*(?=(?:[^']*'[^']*')*[^']*$)", ",", values)
+            values = re.split(r",(?=(?:[^']*'[^']*')*[^']*$)", values)
+            relation = f"BETWEEN {values[0]} AND {values[1]}"
+        elif relation[0] == "~":
+            col_name = self.text(col_name)
+            relation = relation[3:] if relation[:2] == '~~' else relation[2:]
+            if relation[0] == "'" and relation[-1] == "'":
+                relation = relation[1:-1]
+            relation = f"'%{relation}%'"
+        if len(all_tables) > 1:
+            return [f"SELECT * FROM {quote(table)} WHERE {col_name} {relation}" for table in all_tables]
+
+        view = self.views[all_tables[0]]
+        query = f"SELECT * FROM ({self.numbered_rows(view.name)}) AS t1 WHERE {col_name} {relation}"
+        try:
+            with self.cancellation.limit():
+                output_data = self.cur.execute(query).fetchall()
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            return (RuntimeError, f"Error in find_relation: {e}")
+        if not output_data:
+            return f"Could not find any rows where  {column} {old_relation}  in the federated databases."
+        return_list = []
+        for row in output_data:
+            temp = ValueObject()
+            temp.t_name = view.name
+            temp.c_name = list(view.columns)
+            temp.row_num = int(row[0])
+            temp.type = "relation"
+            temp.value = list(row[1:])
+            return_list.append(temp)
+        return return_list
+
+    def list(self):
+        """
+        Returns (table, number of columns, number of rows across all files) of every federated table,
+        counted in a single statement
+        """
+        if len(self.views) == 0:
+            return []
+        counts = " UNION ALL ".join(f"SELECT {i}, COUNT(*) FROM {quote(name)}" for i, name in enumerate(self.views))
+        num_rows = dict(self.cur.execute(counts).fetchall())
+        return [(name, len(view.columns), num_rows[i]) for i, (name, view) in enumerate(self.views.items())]
+
+    def num_tables(self):
+        """
+        Prints the number of federated tables
+        """
+        table_count = len(self.views)
+        print(f"Federated databases have {table_count} table{'' if table_count == 1 else 's'}")
+
+    def display(self, table_name, num_rows = 25, display_cols = None):
+        """
+        Returns the first `num_rows` rows of a federated table, across all files
+        """
+        view = self.table(table_name)
+        if view is None:
+            return (ValueError, f"'{table_name}' does not exist in the federated databases")
+        select = "*" if display_cols is None else ", ".join(display_cols)
+        try:
+            df = self.read_frame(f"SELECT {select} FROM {quote(view.name)} LIMIT {int(num_rows)}")
+        except Exception:
+            return (ValueError, "'display_cols' was incorrect. It must be a list of column names in the table")
+        df.attrs["max_rows"] = self.cur.execute(f"SELECT COUNT(*) FROM {quote(view.name)}").fetchone()[0]
+        return df
+
+    def summary(self, table_name = None, approx = False):
+        """
+        Returns the min, max, mean and population standard deviation of every numeric column of the federated tables,
+        aggregated across all files in one statement per table. Shaped like `Sqlite.summary()`.
+        Approximate summaries need the sketches of a single database and are not available
+        """
+        if approx:
+            return (NotImplementedError, "Approximate summaries are not available for federated databases")
+        if table_name is None:
+            summary_list = [self.summary_table(view) for view in self.views.values()]
+            return [self.tables()] + summary_list
+        view = self.table(table_name)
+        if view is None:
+            return (ValueError, f"'{table_name}' does not exist in the federated databases")
+        return self.summary_table(view)
+
+    def summary_table(self, view):
+        """
+        **Internal use only. Do not call**
+        """
+        numeric = [col for col, col_type in zip(view.columns, view.types) if self.is_numeric(col_type)]
+        stats = {}
+        if len(numeric) > 0:
+            aggregates = ", ".join(f"MIN({quote(col)}), MAX({quote(col)}), AVG({quote(col)}), COUNT({quote(col)})" for col in numeric)
+            with self.cancellation.limit():
+                row = self.cur.execute(f"SELECT {aggregates} FROM {quote(view.name)}").fetchone()
+            counts = {}
+            for i, col in enumerate(numeric):
+                minimum, maximum, mean, counts[col] = row[4 * i : 4 * i + 4]
+                stats[col] = [minimum, maximum, mean, None if mean is None else 0]
+
+            # second pass for the squared deviations around each mean, as accurate as the two-pass variance of a backend
+            spread = [col for col in numeric if stats[col][2] is not None and counts[col] > 1]
+            if len(spread) > 0:
+                deviations = ", ".join(f"SUM(({quote(col)} - ?) * ({quote(col)} - ?))" for col in spread)
+                means = [float(stats[col][2]) for col in spread for _ in range(2)]
+                with self.cancellation.limit():
+                    row = self.cur.execute(f"SELECT {deviations} FROM {quote(view.name)}", means).fetchone()
+                for col, m2 in zip(spread, row):
+                    stats[col][3] = math.sqrt(max(m2, 0) / counts[col])
+        rows = [[col, col_type.upper()] + stats.get(col, [None] * 4) for col, col_type in zip(view.columns, view.types)]
+        return pd.DataFrame(rows, columns = ['column', 'type', 'min', 'max', 'avg', 'std_dev'], dtype = object)
+
+    def time_limit(self, timeout = None):
+        """
+        Returns a context manager within which the federation's statements are cancelled after `timeout` seconds or by `cancel()`
+        """
+        return self.cancellation.limit(timeout)
+
+    def cancel(self):
+        """
+        Cancels the running statement. Returns True if one was running
+        """
+        return self.cancellation.cancel()
+
+    def close(self):
+        """
+        Detaches every file and closes the federation's connection
+        """
+        self.con.close()
+
+class SqliteFederation(Federation):
+    """
+    Federation of SQLite databases. The views are TEMP views, as SQLite only lets those read other attached databases.
+
+    SQLite attaches at most 10 databases to a connection, or up to 125 where its build allows raising that limit.
+    Beyond that limit, the files are attached in batches and their tables copied into the federation's private temporary
+    database, which SQLite keeps on disk once it outgrows its cache. The views then read the copies, so rows added
+    to the files afterwards are only visible after `refresh()`.
+    """
+    hidden_prefixes = SqliteCatalog.hidden_prefixes
+
+    def connect(self, num_files):
+        con = sqlite3.connect(":memory:", uri = True)
+        if num_files > con.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED):
+            con.setlimit(sqlite3.SQLITE_LIMIT_ATTACHED, SQLITE_MAX_ATTACHED)
+        self.batch_files = con.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        self.staged = OrderedDict() if num_files > self.batch_files else None
+        if self.staged is None:
+            return con
+        con.close()
+        # an empty filename opens a temporary database that spills to disk, rather than holding every copy in memory
+        return sqlite3.connect("")
+
+    def make_cancellation(self):
+        return SqliteCancellation(lambda: self.con)
+
+    def attach(self, alias, filename):
+        # staged files are attached in batches by stage()
+        if self.staged is None:
+            self.cur.execute(f"ATTACH DATABASE ? AS {alias}", (Path(filename).absolute().as_uri() + "?mode=ro",))
+
+    def stage(self):
+        if self.staged is None:
+            return
+        for alias, columns in self.staged.items():
+            for table in OrderedDict.fromkeys(table for table, _, _ in columns):
+                self.cur.execute(f"DROP TABLE IF EXISTS {self.source_table(alias, table)}")
+        self.staged = OrderedDict()
+        aliases = list(self.sources.keys())
+        for start in range(0, len(aliases), self.batch_files):
+            batch = aliases[start:start + self.batch_files]
+            for alias in batch:
+                self.cur.execute(f"ATTACH DATABASE ? AS {alias}", (Path(self.sources[alias]).absolute().as_uri() + "?mode=ro",))
+            try:
+                self.cur.execute("BEGIN")
+                for alias in batch:
+                    columns = [column for column in self.attached_tables(alias) if not column[0].startswith(self.hidden_prefixes)]
+                    self.staged[alias] = columns
+                    tables = OrderedDict()
+                    for table, column, col_type in columns:
+                        tables.setdefault(table, []).append(f"{quote(column)} {col_type}")
+                    for table, definitions in tables.items():
+                        staged_table = self.source_table(alias, table)
+                        self.cur.execute(f"CREATE TABLE {staged_table} ({', '.join(definitions)})")
+                        self.cur.execute(f"INSERT INTO {staged_table} SELECT * FROM {alias}.{quote(table)}")
+                self.con.commit()
+            finally:
+                # a database cannot be detached inside the transaction that read it
+                if self.con.in_transaction:
+                    self.con.rollback()
+                for alias in batch:
+                    self.cur.execute(f"DETACH DATABASE {alias}")
+
+    def source_tables(self, alias):
+        if self.staged is not None:
+            return self.staged[alias]
+        return self.attached_tables(alias)
+
+    def attached_tables(self, alias):
+        """
+        **Internal use only. Do not call**
+
+        Returns (table, column, declared type) of every column of the tables of the attached schema `alias`, in catalog order
+        """
+        return self.cur.execute(f"""SELECT m.name, p.name, p.type FROM {alias}.sqlite_master AS m
+                                    JOIN pragma_table_info(m.name, '{alias}') AS p WHERE m.type = 'table'""").fetchall()
+
+    def source_table(self, alias, table):
+        if self.staged is not None:
+            return f"main.{quote(f'{alias}_{table}')}"
+        return super().source_table(alias, table)
+
+    def view_statement(self, name, select):
+        return f"CREATE TEMP VIEW {name} AS {select}"
+
+    def common_type(self, types):
+        # columns of a compound view have no affinity, so numeric columns are cast for quoted values to compare as numbers
+        if all("INT" in (col_type or "").upper() for col_type in types):
+            return "INTEGER"
+        if all(self.is_numeric(col_type) for col_type in types):
+            return "REAL"
+        return None
+
+    def is_numeric(self, col_type):
+        col_type = (col_type or "").upper()
+        return any(t in col_type for t in ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC"))
+
+    def read_frame(self, query):
+        return pd.read_sql_query(query, self.con)
+
+class DuckDBFederation(Federation):
+    """
+    Federation of DuckDB databases, which can attach any number of files. A column declared with different types
+    in different files is read as DOUBLE if all of them are numeric, and as VARCHAR otherwise.
+    A file that another process has open for writing cannot be attached
+    """
+    hidden_prefixes = DuckDBCatalog.hidden_prefixes
+    numeric_types = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT",
+                     "UHUGEINT", "FLOAT", "DOUBLE", "DECIMAL")
+
+    def connect(self, num_files):
+        import duckdb
+        return duckdb.connect(":memory:")
+
+    def make_cancellation(self):
+        return DuckDBCancellation(self.cur)
+
+    def attach(self, alias, filename):
+        path = str(Path(filename).absolute()).replace("'", "''")
+        self.cur.execute(f"ATTACH '{path}' AS {alias} (READ_ONLY)")
+
+    def source_tables(self, alias):
+        return self.cur.execute("""SELECT c.table_name, c.column_name, c.data_type FROM duckdb_columns() AS c
+                                   JOIN duckdb_tables() AS t ON c.table_oid = t.table_oid
+                                   WHERE c.database_name = ? AND c.schema_name = 'main'
+                                   ORDER BY t.table_oid, c.column_index""", [alias]).fetchall()
+
+    def qualified(self, table):
+        return f"main.{quote(table)}"
+
+    def view_statement(self, name, select):
+        return f"CREATE VIEW {name} AS {select}"
+
+    def common_type(self, types):
+        if len(set(types)) == 1:
+            return None
+        if all(self.is_numeric(col_type) for col_type in types):
+            return "DOUBLE"
+        return "VARCHAR"
+
+    def is_numeric(self, col_type):
+        return (col_type or "").upper().startswith(self.numeric_types)
+
+    def read_frame(self, query):
+        return self.cur.execute(query).fetch_df()
+
+    def text(self, col_name):
+        return f"CAST({col_name} AS VARCHAR) ILIKE"
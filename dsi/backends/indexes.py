@@ -0,0 +1,223 @@
+import re
+from abc import ABCMeta, abstractmethod
+from collections import Counter
+
+# name prefix of every index DSI creates, followed by the table and column names
+INDEX_PREFIX = "dsi_index"
+
+# number of times a column must be filtered on before the advisor proposes, or builds, an index on it
+ADVISOR_THRESHOLD = 3
+
+# characters of table and column names that are replaced in index names
+NAME_UNSAFE = re.compile(r'\W')
+# string literals of a SQL statement, removed before looking for table and column names
+SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+# tables read by a statement
+SQL_SOURCE = re.compile(r'\b(?:FROM|JOIN)\s+("(?:[^"]|"")+"|[A-Za-z_]\w*)', re.IGNORECASE)
+# columns compared in a WHERE or ON clause, optionally qualified by a table name or alias
+SQL_PREDICATE = re.compile(r'(?:[A-Za-z_]\w*\.)?("(?:[^"]|"")+"|\b[A-Za-z_]\w*)\s*(?:==|=|!=|<>|<=|>=|<|>|\bBETWEEN\b|\bIN\b)', re.IGNORECASE)
+# start of the clauses whose comparisons can use an index
+SQL_FILTER = re.compile(r'\b(?:WHERE|ON)\b', re.IGNORECASE)
+
+def quote(name):
+    """
+    Returns `name` as a double-quoted SQL identifier
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+def unquote(name):
+    """
+    Returns a SQL identifier without its double quotes
+    """
+    if len(name) > 1 and name[0] == '"' and name[-1] == '"':
+        return name[1:-1].replace('""', '"')
+    return name
+
+class IndexManager(metaclass=ABCMeta):
+    """
+    Single-column indexes of a backend: the ones DSI builds on foreign key columns at ingest,
+    the ones users create and drop, and an advisor that counts how often each column is filtered on.
+
+    `find_relation()` and `query_artifacts()` report the columns they filter on with `record()` and `record_query()`
+    whenever they scan the database, that is when their result is not cached.
+    Columns filtered on at least `threshold` times without an index are returned by `advice()`, and indexed right away
+    if `auto` is True. The counts are kept in memory for the lifetime of the backend.
+    """
+    def __init__(self, cursor, catalog, auto = False, threshold = ADVISOR_THRESHOLD):
+        """
+        `cursor` : database cursor that sees the backend's open transaction
+
+        `catalog` : the backend's schema Catalog
+
+        `auto` : bool, optional, default=False
+            If True, a column is indexed as soon as it was filtered on `threshold` times
+
+        `threshold` : int, optional, default=3
+            Number of filters on a column after which an index on it is advised
+        """
+        self.cur = cursor
+        self.catalog = catalog
+        self.auto = auto
+        self.threshold = threshold
+        self.filters = Counter()
+
+    def index_name(self, table_name, column_name):
+        """
+        Returns the name of the index DSI creates on a column
+        """
+        return f"{INDEX_PREFIX}_{NAME_UNSAFE.sub('_', table_name)}_{NAME_UNSAFE.sub('_', column_name)}"
+
+    def resolve(self, table_name, column_name):
+        """
+        **Internal use only. Do not call**
+
+        Returns the (table, column) names as stored in the database. Raises a ValueError if either does not exist
+        """
+        table_info = self.catalog.table(table_name)
+        if table_info is None or self.catalog.is_hidden(table_info.name):
+            raise ValueError(f"'{table_name}' does not exist in this database")
+        column = next((col for col in table_info.columns if col.lower() == unquote(column_name).lower()), None)
+        if column is None:
+            raise ValueError(f"'{column_name}' is not a column of '{table_name}'")
+        return table_info.name, column
+
+    def create(self, table_name, column_name):
+        """
+        Creates an index on a column unless one exists, and returns the index name.
+        Raises a ValueError if the table or column does not exist
+        """
+        table, column = self.resolve(table_name, column_name)
+        name = self.index_name(table, column)
+        self.cur.execute(f"CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({quote(column)})")
+        return name
+
+    def drop(self, table_name, column_name):
+        """
+        Drops the indexes created on a column by `create()`, and returns their names.
+        Raises a ValueError if the table or column does not exist, or the column has no such index
+        """
+        table, column = self.resolve(table_name, column_name)
+        names = [name for name, t, c in self.indexes() if (t, c) == (table, column) and name.startswith(INDEX_PREFIX)]
+        if not names:
+            raise ValueError(f"'{column}' of '{table}' has no index created by DSI")
+        for name in names:
+            self.cur.execute(f"DROP INDEX IF EXISTS {quote(name)}")
+        return names
+
+    @abstractmethod
+    def indexes(self):
+        """
+        Returns (index name, table, first column) of every index of user tables, excluding those of primary key
+        and unique constraints
+        """
+        pass
+
+    def indexed(self, table_name, column_name):
+        """
+        Returns True if lookups on a column can already use an index, including that of a constraint
+        """
+        table_info = self.catalog.table(table_name)
+        if table_info is None:
+            return False
+        if any(col == column_name and pk == 1 for col, pk in zip(table_info.columns, table_info.pk)):
+            return True
+        return any((t, c) == (table_info.name, column_name) for _, t, c in self.indexes())
+
+    def definitions(self, table_names):
+        """
+        Returns the (table, column) of each index created by DSI on the tables in `table_names`,
+        so they can be recreated with `restore()` after the tables are rewritten
+        """
+        tables = {self.catalog.unquote(name).lower() for name in table_names}
+        return [(t, c) for name, t, c in self.indexes() if t.lower() in tables and name.startswith(INDEX_PREFIX)]
+
+    def restore(self, definitions):
+        """
+        Recreates indexes returned by `definitions()` whose column still exists
+        """
+        for table, column in definitions:
+            try:
+                self.create(table, column)
+            except ValueError:
+                continue
+
+    def ensure_keys(self, table_names):
+        """
+        Indexes the foreign key columns of the tables in `table_names`, which would otherwise be scanned by joins
+        along `dsi_relations` and by lookups of a run through `run_id`, a foreign key of runTable.
+        Primary keys are already indexed by their constraint. Runs inside the caller's transaction
+        """
+        for table_name in table_names:
+            table_info = self.catalog.table(table_name)
+            if table_info is None:
+                continue
+            for column, _, _ in table_info.foreign_keys:
+                if not self.indexed(table_info.name, column):
+                    self.create(table_info.name, column)
+
+    def record(self, table_name, column_name):
+        """
+        Counts a filter on a column. With `auto`, indexes the column once it reaches the threshold
+        """
+        table_info = self.catalog.table(table_name)
+        if table_info is None or self.catalog.is_hidden(table_info.name):
+            return
+        column = next((col for col in table_info.columns if col.lower() == unquote(column_name).lower()), None)
+        if column is None:
+            return
+        key = (table_info.name, column)
+        self.filters[key] += 1
+        if self.auto and self.filters[key] >= self.threshold and not self.indexed(*key):
+            try:
+                self.create(*key)
+            except Exception:
+                # an index is only an optimization, so a database that cannot be written is left as it is
+                pass
+
+    def record_query(self, query):
+        """
+        Counts the filters of the WHERE and ON clauses of a SQL statement on columns of the tables it reads
+        """
+        query = SQL_STRING.sub("''", query)
+        tables = [self.catalog.table(unquote(name)) for name in SQL_SOURCE.findall(query)]
+        tables = [table_info for table_info in tables if table_info is not None]
+        if not tables:
+            return
+        for clause in SQL_FILTER.split(query)[1:]:
+            for column in SQL_PREDICATE.findall(clause):
+                column = unquote(column)
+                for table_info in tables:
+                    if any(col.lower() == column.lower() for col in table_info.columns):
+                        self.record(table_info.name, column)
+
+    def advice(self):
+        """
+        Returns (table, column, number of filters) of every column filtered on at least `threshold` times
+        that has no index, most filtered first
+        """
+        return [(table, column, count) for (table, column), count in self.filters.most_common()
+                if count >= self.threshold and self.catalog.table(table) is not None and not self.indexed(table, column)]
+
+class SqliteIndexManager(IndexManager):
+    """
+    Index management of a SQLite backend
+    """
+    def indexes(self):
+        rows = self.cur.execute("""SELECT m.name, m.tbl_name, i.name FROM sqlite_master AS m, pragma_index_info(m.name) AS i
+                                   WHERE m.type = 'index' AND m.sql IS NOT NULL AND i.seqno = 0""").fetchall()
+        return [row for row in rows if not self.catalog.is_hidden(row[1])]
+
+class DuckDBIndexManager(IndexManager):
+    """
+    Index management of a DuckDB backend. The index DuckDB keeps to check a foreign key is not used by lookups,
+    so foreign key columns are indexed like in SQLite
+    """
+    def indexes(self):
+        rows = self.cur.execute("""SELECT index_name, table_name, expressions FROM duckdb_indexes()
+                                   WHERE database_name = current_database() AND schema_name = 'main'""").fetchall()
+        indexes = []
+        for name, table, expressions in rows:
+            first = expressions.strip("[]").split(",")[0].strip() if isinstance(expressions, str) else expressions[0]
+            if not self.catalog.is_hidden(table):
+                indexes.append((name, table, unquote(first)))
+        return indexes
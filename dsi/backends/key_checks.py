@@ -0,0 +1,49 @@
+from itertools import repeat
+
+# number of stored key values fetched at a time while comparing them to the new ones
+KEY_FETCH_SIZE = 5000
+
+def key_error(table_name, col_name, values):
+    """
+    Returns (ErrorType, error message) if `values` cannot be the primary key column `col_name` of `table_name`:
+    they mix text with numbers, or are not unique. Returns None for a valid key.
+    Types are classified from the set of value types and uniqueness from a set of the values, so the check is linear
+    """
+    value_types = set(map(type, values))
+    if any(issubclass(t, str) for t in value_types) and any(issubclass(t, (int, float)) for t in value_types):
+        return (TypeError, f"There are mismatched data types in {table_name}'s primary key column, {col_name}. Cannot update.")
+    if len(values) != len(set(values)):
+        return (ValueError, f"{table_name}'s primary key column, {col_name}, must have unique data")
+    return None
+
+def key_set(values):
+    """
+    Returns the set of key `values` used to match foreign keys to primary keys, with floats rounded to 4 decimals
+    if the column holds any float
+    """
+    if any(issubclass(t, float) for t in set(map(type, values))):
+        return set(map(round, values, repeat(4)))
+    return set(values)
+
+def keys_contained(fk_values, pk_values):
+    """
+    Returns True if every foreign key value in `fk_values` is one of the primary key values in `pk_values`
+    """
+    return key_set(fk_values) <= key_set(pk_values)
+
+def keys_changed(cursor, table_name, col_name, values):
+    """
+    Returns True if the stored column `col_name` of `table_name`, in its stored order, differs from the list `values`.
+    The row count is compared first, then the stored values chunk by chunk, stopping at the first difference
+    """
+    if cursor.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0] != len(values):
+        return True
+    cursor.execute(f"SELECT {col_name} FROM {table_name}")
+    start = 0
+    while True:
+        rows = cursor.fetchmany(KEY_FETCH_SIZE)
+        if len(rows) == 0:
+            return False
+        if [row[0] for row in rows] != values[start:start + len(rows)]:
+            return True
+        start += len(rows)
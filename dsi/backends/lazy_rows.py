@@ -0,0 +1,119 @@
+from itertools import islice
+
+# number of rows fetched from the database at a time while iterating
+FETCH_SIZE = 10000
+
+# LIMIT used when only an OFFSET is needed. SQLite cannot have an OFFSET without a LIMIT and DuckDB rejects LIMIT -1
+NO_LIMIT = 9223372036854775807
+
+class LazyRows:
+    """
+    Rows of a table or column returned by find_table() and find_column(), read from the database only when accessed.
+
+    Behaves like a read-only list: len(), iteration, indexing, slicing and comparison with a list all work.
+    Every access queries the table again, so the rows always reflect its current contents.
+    Rows are in insertion order. A handle can only be read while its backend is open.
+    """
+    def __init__(self, cursor_factory, table_name, columns = "*", limit = None, single_column = False, order = "rowid"):
+        """
+        `cursor_factory` : callable
+            Returns a new cursor of the backend's connection. A fresh cursor is used for each access.
+
+        `table_name` : str
+            Name of the table to read, quoted if needed
+
+        `columns` : str, optional, default="*"
+            SELECT list of the columns to read
+
+        `limit` : int, optional, default=None
+            Maximum number of rows the handle exposes. All rows if None
+
+        `single_column` : bool, optional, default=False
+            If True, each row is returned as its only value instead of a tuple
+
+        `order` : str, optional, default="rowid"
+            ORDER BY expression of the rows. None for views, which have no rowid and keep the order the engine reads them in
+        """
+        self.cursor_factory = cursor_factory
+        self.table_name = table_name
+        self.columns = columns
+        self.limit = limit
+        self.single_column = single_column
+        self.order = order
+
+    def query(self, limit = None, offset = 0):
+        """
+        **Internal use only. Do not call**
+        """
+        query = f"SELECT {self.columns} FROM {self.table_name}"
+        if self.order is not None:
+            query += f" ORDER BY {self.order}"
+        if limit is not None or offset > 0:
+            query += f" LIMIT {NO_LIMIT if limit is None else int(limit)}"
+        if offset > 0:
+            query += f" OFFSET {int(offset)}"
+        return query
+
+    def bounds(self, limit, offset):
+        """
+        **Internal use only. Do not call**
+
+        Clips a requested window of rows to the handle's own limit. Returns the window's limit, or 0 if it is empty
+        """
+        if self.limit is None:
+            return limit
+        remaining = max(self.limit - offset, 0)
+        return remaining if limit is None else min(limit, remaining)
+
+    def fetch(self, limit = None, offset = 0):
+        """
+        Returns a list of at most `limit` rows, starting at row `offset` (0-indexed)
+        """
+        limit = self.bounds(limit, offset)
+        if limit == 0:
+            return []
+        rows = self.cursor_factory().execute(self.query(limit, offset)).fetchall()
+        if self.single_column:
+            return [row[0] for row in rows]
+        return rows
+
+    def __iter__(self):
+        limit = self.bounds(None, 0)
+        if limit == 0:
+            return
+        cursor = self.cursor_factory().execute(self.query(limit))
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if len(rows) == 0:
+                return
+            if self.single_column:
+                yield from (row[0] for row in rows)
+            else:
+                yield from rows
+
+    def __len__(self):
+        num_rows = self.cursor_factory().execute(f"SELECT COUNT(*) FROM {self.table_name}").fetchone()[0]
+        return num_rows if self.limit is None else min(num_rows, self.limit)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.start, index.stop, index.step
+            if (start is not None and start < 0) or (stop is not None and stop < 0) or (step is not None and step < 0):
+                return self.fetch()[index]
+            start = start or 0
+            limit = None if stop is None else max(stop - start, 0)
+            return list(islice(self.fetch(limit, start), 0, None, step))
+        if index < 0:
+            index += len(self)
+        rows = self.fetch(1, index) if index >= 0 else []
+        if len(rows) == 0:
+            raise IndexError("row index out of range")
+        return rows[0]
+
+    def __eq__(self, other):
+        if isinstance(other, (LazyRows, list, tuple)):
+            return self.fetch() == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"LazyRows({self.table_name}, columns={self.columns}, limit={self.limit})"
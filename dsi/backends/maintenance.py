@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from datetime import datetime
+
+# rows ingested since the last maintenance after which Terminal runs it again
+MAINTENANCE_ROWS = 100000
+# growth in bytes of the database and write-ahead log files since the last maintenance after which Terminal runs it again
+MAINTENANCE_BYTES = 256 * 1024 * 1024
+# rows of each index SQLite's ANALYZE samples, so statistics of large tables are gathered in milliseconds
+ANALYSIS_LIMIT = 1000
+
+class Maintenance(metaclass=ABCMeta):
+    """
+    Keeps a database file healthy during long runs of ingests: refreshes the statistics the query planner relies on
+    and moves the write-ahead log back into the database file.
+
+    Terminal reports each ingest to `after_ingest()`. Once the rows ingested, or the growth of the database files,
+    since the last maintenance cross a threshold, the maintenance tasks run on a background thread with their own
+    connection or cursor, so the ingest returns right away. Each task's name, start time, duration and error, if any,
+    is appended to `history`. An in-memory database has no file to maintain and is skipped.
+    """
+    def __init__(self, filename):
+        """
+        `filename` : path of the database file
+        """
+        self.filename = filename
+        self.enabled = filename != ":memory:"
+        self.pending_rows = 0
+        self.last_size = self.size()
+        self.thread = None
+        self.history = []
+
+    def size(self):
+        """
+        Returns the total size in bytes of the database file and its write-ahead log
+        """
+        if not self.enabled:
+            return 0
+        return sum(os.path.getsize(path) for path in self.files() if os.path.isfile(path))
+
+    @abstractmethod
+    def files(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns the paths of the database file and its write-ahead log
+        """
+        pass
+
+    def after_ingest(self, rows, max_rows = MAINTENANCE_ROWS, max_bytes = MAINTENANCE_BYTES, logger = None):
+        """
+        Counts `rows` newly ingested rows, and starts the maintenance tasks in the background if at least `max_rows` rows
+        were ingested or the files grew by at least `max_bytes` bytes since the last maintenance. A threshold of None never
+        triggers. Nothing is started while the previous maintenance still runs; its rows count towards the next one.
+
+        `logger` : logging.Logger, optional, default=None
+            Logger to which each task's duration is reported
+
+        `return`: True if the maintenance was started
+        """
+        if not self.enabled:
+            return False
+        self.pending_rows += rows
+        rows_due = max_rows is not None and self.pending_rows >= max_rows
+        bytes_due = max_bytes is not None and self.size() - self.last_size >= max_bytes
+        if not (rows_due or bytes_due) or self.running():
+            return False
+        self.pending_rows = 0
+        self.thread = threading.Thread(target = self.run, args = (logger,), daemon = True)
+        self.thread.start()
+        return True
+
+    def running(self):
+        """
+        Returns True while maintenance tasks run in the background
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def wait(self):
+        """
+        Waits for maintenance tasks running in the background to finish
+        """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self, logger = None):
+        """
+        Runs every maintenance task in order and records it in `history`. A failed task is recorded with its error
+        and does not stop the others, as the next maintenance retries it
+        """
+        try:
+            cur = self.connect()
+        except Exception as e:
+            self.history.append({"task": "connect", "started": datetime.now(), "seconds": 0.0, "error": str(e)})
+            if logger is not None:
+                logger.warning(f"   Maintenance of {self.filename} could not connect due to {e}")
+            return
+        try:
+            for name, statement in self.tasks(cur):
+                started = datetime.now()
+                start = time.perf_counter()
+                error = None
+                try:
+                    statement(cur)
+                except Exception as e:
+                    error = str(e)
+                seconds = time.perf_counter() - start
+                self.history.append({"task": name, "started": started, "seconds": seconds, "error": error})
+                if logger is not None:
+                    if error is None:
+                        logger.info(f"   Maintenance of {self.filename}: {name} took {seconds:.3f} s")
+                    else:
+                        logger.warning(f"   Maintenance of {self.filename}: {name} failed after {seconds:.3f} s due to {error}")
+        finally:
+            cur.close()
+        self.last_size = self.size()
+
+    @abstractmethod
+    def connect(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns the connection or cursor the maintenance tasks run on, closed once they finish
+        """
+        pass
+
+    @abstractmethod
+    def tasks(self, cur):
+        """
+        **Internal use only. Do not call**
+
+        Returns the (name, function of `cur`) of each maintenance task, in the order they run
+        """
+        pass
+
+class SqliteMaintenance(Maintenance):
+    """
+    Maintenance of a SQLite database on its own connection: ANALYZE on the first run, as a bulk-loaded database has
+    no statistics yet, and PRAGMA optimize afterwards. Then an incremental vacuum if the database was created with
+    auto_vacuum=INCREMENTAL, and a checkpoint that truncates the write-ahead log in WAL mode.
+    """
+    def files(self):
+        return [self.filename, f"{self.filename}-wal"]
+
+    def connect(self):
+        # waits for the backend's own transactions rather than failing while an ingest commits
+        con = sqlite3.connect(self.filename, timeout = 30, isolation_level = None)
+        con.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        return con
+
+    def tasks(self, con):
+        return [("analyze", self.analyze), ("incremental_vacuum", self.incremental_vacuum), ("checkpoint", self.checkpoint)]
+
+    def analyze(self, con):
+        """
+        **Internal use only. Do not call**
+        """
+        if con.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None:
+            con.execute("ANALYZE")
+        else:
+            con.execute("PRAGMA optimize")
+
+    def incremental_vacuum(self, con):
+        """
+        **Internal use only. Do not call**
+        """
+        if con.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            con.execute("PRAGMA incremental_vacuum").fetchall()
+
+    def checkpoint(self, con):
+        """
+        **Internal use only. Do not call**
+        """
+        if con.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            con.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+class DuckDBMaintenance(Maintenance):
+    """
+    Maintenance of a DuckDB database on its own cursor of the backend's connection: ANALYZE, which refreshes
+    the distinct-count statistics used to plan joins, then a CHECKPOINT of the write-ahead log
+    """
+    def __init__(self, filename, con):
+        """
+        `con` : the backend's DuckDB connection
+        """
+        self.con = con
+        super().__init__(filename)
+
+    def files(self):
+        return [self.filename, f"{self.filename}.wal"]
+
+    def connect(self):
+        return self.con.cursor()
+
+    def tasks(self, cur):
+        return [("analyze", lambda cur: cur.execute("ANALYZE")), ("checkpoint", lambda cur: cur.execute("CHECKPOINT"))]
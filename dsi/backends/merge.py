@@ -0,0 +1,667 @@
+import os
+import sqlite3
+import threading
+from abc import ABCMeta, abstractmethod
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dsi.backends.indexes import quote
+
+# number of database files attached to the backend and merged in one transaction
+MERGE_BATCH_FILES = 64
+# number of threads reading the schemas of the database files before they are merged
+MERGE_SCAN_WORKERS = 8
+# name of the schema each database file of a batch is attached as, followed by the file's position
+MERGE_PREFIX = "dsi_merge"
+# temporary table mapping the run_id of each file's runs to the run_id of the same run in the backend
+RUN_MAP_TABLE = "dsi_merge_runs"
+# table recording the file and original run_id of every run merged into the backend
+MERGED_RUNS_TABLE = "dsi_merged_runs"
+
+class SourceSchema:
+    """
+    Schema of one database file to merge, read by `Merge.scan()`
+
+        - filename: path of the database file
+        - path: absolute path of the file with symbolic links resolved, which identifies its runs across merges
+        - tables: OrderedDict of lowercase table name -> CatalogTable, without runTable, dsi_units and internal tables
+        - units: list of (table_name, column_name, unit) rows of the file's dsi_units table
+        - runs: list of (run_id, run_timestamp) rows of the file's runTable, or None if the file has no runTable
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = os.path.realpath(filename)
+        self.tables = OrderedDict()
+        self.units = []
+        self.runs = None
+
+class Merge(metaclass=ABCMeta):
+    """
+    Merges many DSI database files of the backend's engine into the backend with set-based SQL.
+
+    The schemas of all files are read first, by several threads, and reconciled with the backend in one transaction:
+    missing tables are created, missing columns are added, and the units of every file are checked against `dsi_units`.
+    The files are then attached to the backend in batches, and each table of a batch is copied with a single
+    `INSERT INTO ... SELECT` over the UNION ALL of the files, so rows never pass through Python.
+    Every run of every file gets its own run_id, numbered after the backend's highest run_id, even if several runs share
+    a `run_timestamp`. The file and original run_id of each merged run are recorded in `dsi_merged_runs`, so the runs
+    of a file merged again keep the run_ids they got the first time. Every `run_id` column is rewritten to the run_ids of the backend.
+    A runTable created by `ingest_artifacts()` allows only one run per `run_timestamp` and is never changed by a merge,
+    so runs sharing a `run_timestamp` can only be merged into a database without a runTable, or with one created by a merge.
+
+    Each batch is its own transaction, as neither engine detaches a database inside the transaction that read it.
+    A failed batch is rolled back, and the batches before it stay merged.
+    """
+    batch_files = MERGE_BATCH_FILES
+
+    def __init__(self, backend):
+        """
+        `backend` : the Sqlite or DuckDB backend the files are merged into
+        """
+        self.backend = backend
+        self.cur = backend.cur
+        self.catalog = backend.catalog
+
+    def merge(self, filenames, batch_size = None, workers = None, isVerbose = False):
+        """
+        Merges the database files `filenames` into the backend. See the backend's `merge_artifacts()` for the inputs
+
+        `return`: an OrderedDict of table name -> number of rows merged into it. If an error occurs, returns a tuple
+        in the format of: (ErrorType, error message)
+        """
+        if isinstance(filenames, str):
+            filenames = [filenames]
+        if len(filenames) == 0:
+            return (ValueError, "Need at least one database file to merge")
+        target = None if self.backend.filename == ":memory:" else os.path.realpath(self.backend.filename)
+        for filename in filenames:
+            if not os.path.isfile(filename):
+                return (ValueError, f"'{filename}' does not exist")
+            if os.path.realpath(filename) == target:
+                return (ValueError, f"Cannot merge '{filename}' into itself")
+
+        try:
+            with ThreadPoolExecutor(max_workers = workers or MERGE_SCAN_WORKERS) as pool:
+                sources = list(pool.map(self.scan, filenames))
+        finally:
+            self.close_scanners()
+        for source in sources:
+            if isinstance(source, tuple):
+                return source
+
+        error = self.check_units(sources)
+        if error is not None:
+            return error
+
+        runs = any(source.runs is not None for source in sources)
+        if runs:
+            error = self.check_runs(sources)
+            if error is not None:
+                return error
+
+        plan = self.plan(sources)
+        table_names = (["runTable"] if runs else []) + [name for name, _, _ in plan.values()] + ["dsi_units"]
+        marks = [(name, self.backend.text_index.mark(name), self.backend.column_stats.mark(name),
+                  self.backend.column_sketches.mark(name)) for name in table_names]
+
+        error = self.reconcile(plan, sources, runs)
+        if error is not None:
+            return error
+
+        batch_size = min(batch_size or self.batch_files, self.attach_limit())
+        counts = OrderedDict((name, 0) for name, _, _ in plan.values())
+        merged = 0
+        try:
+            for start in range(0, len(sources), batch_size):
+                batch = list(enumerate(sources[start:start + batch_size], start))
+                error = self.merge_batch(batch, plan, counts, isVerbose)
+                if error is not None:
+                    files = ", ".join(source.filename for _, source in batch)
+                    return (error[0], f"Error merging {files} after merging {merged} files: {error[1]}")
+                merged += len(batch)
+        finally:
+            finish_error = self.finish(marks, runs)
+        if finish_error is not None:
+            return finish_error
+        return counts
+
+    def scan(self, filename):
+        """
+        **Internal use only. Do not call**
+
+        Reads the schema, units and runs of one database file. Runs in a worker thread.
+        Returns a SourceSchema, or an error tuple if the file cannot be read
+        """
+        try:
+            cur = self.open(filename)
+        except Exception as e:
+            return (ValueError, f"'{filename}' is not a {self.engine()} database: {e}")
+        try:
+            source = SourceSchema(filename)
+            for name, entry in type(self.catalog)(cur).load().items():
+                if name.startswith(self.catalog.hidden_prefixes):
+                    continue
+                if name.lower() == "runtable":
+                    source.runs = cur.execute(f"SELECT run_id, run_timestamp FROM {quote(name)}").fetchall()
+                elif name.lower() == "dsi_units":
+                    # the three columns, whether or not the file still has the old `column` name
+                    source.units = [tuple(row[:3]) for row in cur.execute(f"SELECT * FROM {quote(name)}").fetchall()]
+                else:
+                    source.tables[name.lower()] = entry
+            return source
+        except Exception as e:
+            return (ValueError, f"'{filename}' is not a {self.engine()} database: {e}")
+        finally:
+            self.release(cur)
+
+    def check_units(self, sources):
+        """
+        **Internal use only. Do not call**
+
+        Returns an error tuple if two files, or a file and the backend, store different units for the same column
+        """
+        units = OrderedDict()
+        if self.catalog.table("dsi_units") is not None:
+            for table, column, unit in self.cur.execute("SELECT * FROM dsi_units").fetchall():
+                units.setdefault((table, column), (unit, "the backend"))
+        for source in sources:
+            for table, column, unit in source.units:
+                known_unit, origin = units.setdefault((table, column), (unit, source.filename))
+                if known_unit != unit:
+                    return (TypeError, f"Cannot merge different units for the column {column} in {table}: " + \
+                                       f"'{known_unit}' in {origin} and '{unit}' in {source.filename}")
+
+    def merged_runs(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns the set of (file path, original run_id, run_timestamp) of the runs merged into the backend before
+        """
+        if self.catalog.table(MERGED_RUNS_TABLE) is None:
+            return set()
+        return set(self.cur.execute(f"SELECT source, source_run_id, run_timestamp FROM {MERGED_RUNS_TABLE}").fetchall())
+
+    def check_runs(self, sources):
+        """
+        **Internal use only. Do not call**
+
+        Returns an error tuple if the backend's runTable allows only one run per `run_timestamp`, cannot be changed,
+        and the new runs of the files share a `run_timestamp` with each other or with a run of the backend
+        """
+        if not self.fixed_timestamps():
+            return None
+        merged = self.merged_runs()
+        timestamps = Counter(timestamp for timestamp, in self.cur.execute("SELECT run_timestamp FROM runTable").fetchall())
+        for source in sources:
+            for run_id, timestamp in source.runs or []:
+                if (source.path, run_id, timestamp) not in merged:
+                    timestamps[timestamp] += 1
+        shared = [timestamp for timestamp, runs in timestamps.items() if runs > 1]
+        if len(shared) > 0:
+            return (ValueError, f"The runTable of this {self.engine()} database allows only one run per run_timestamp, " + \
+                                f"but {len(shared)} run_timestamps, such as '{shared[0]}', would be shared by several runs. " + \
+                                "Merge the files into a new database instead")
+
+    def plan(self, sources):
+        """
+        **Internal use only. Do not call**
+
+        Returns an OrderedDict of lowercase table name -> (table name in the backend, OrderedDict of lowercase column name ->
+        (column, declared type) across all files, first file's CatalogTable) in an order that inserts referenced tables first
+        """
+        tables = OrderedDict()
+        for source in sources:
+            for key, entry in source.tables.items():
+                existing = self.catalog.table(entry.name)
+                name, columns, first = tables.setdefault(key, (entry.name if existing is None else existing.name, OrderedDict(), entry))
+                for column, col_type in zip(entry.columns, entry.types):
+                    columns.setdefault(column.lower(), (column, col_type))
+
+        ordered = OrderedDict()
+        while len(ordered) < len(tables):
+            ready = [key for key, (_, _, first) in tables.items() if key not in ordered and
+                     all(ref.lower() in ordered or ref.lower() == key or ref.lower() not in tables for _, ref, _ in first.foreign_keys)]
+            # a circular schema is merged in catalog order
+            for key in ready or [key for key in tables if key not in ordered][:1]:
+                ordered[key] = tables[key]
+        return ordered
+
+    def reconcile(self, plan, sources, runs):
+        """
+        **Internal use only. Do not call**
+
+        Creates the missing tables and columns, runTable and the new units in the backend, in one transaction
+        """
+        try:
+            self.begin()
+            if runs:
+                self.create_runs()
+                self.catalog.reload_table("runTable")
+                self.cur.execute(f"""CREATE TABLE IF NOT EXISTS {MERGED_RUNS_TABLE}
+                                     (source TEXT, source_run_id INTEGER, run_timestamp TEXT, run_id INTEGER)""")
+                self.catalog.reload_table(MERGED_RUNS_TABLE)
+            for name, columns, first in plan.values():
+                existing = self.catalog.table(name)
+                if existing is None:
+                    self.cur.execute(self.create_statement(name, columns, first))
+                else:
+                    present = {column.lower() for column in existing.columns}
+                    for key, (column, col_type) in columns.items():
+                        if key not in present:
+                            self.cur.execute(f"ALTER TABLE {quote(existing.name)} ADD COLUMN {quote(column)} {col_type};")
+                self.catalog.reload_table(name)
+
+            new_units = OrderedDict()
+            stored = set()
+            if self.catalog.table("dsi_units") is not None:
+                stored = {(table, column) for table, column, _ in self.cur.execute("SELECT * FROM dsi_units").fetchall()}
+            for source in sources:
+                for table, column, unit in source.units:
+                    if (table, column) not in stored:
+                        new_units.setdefault((table, column), unit)
+            if len(new_units) > 0:
+                self.cur.execute("CREATE TABLE IF NOT EXISTS dsi_units (table_name TEXT, column_name TEXT, unit TEXT)")
+                self.catalog.reload_table("dsi_units")
+                self.cur.executemany("INSERT INTO dsi_units VALUES (?, ?, ?)",
+                                     [(table, column, unit) for (table, column), unit in new_units.items()])
+            self.commit()
+        except self.engine_errors() as e:
+            self.rollback()
+            self.catalog.invalidate()
+            return (self.engine_errors()[0], f"Error reconciling the schemas of the merged files: {e}")
+
+    def create_statement(self, name, columns, first):
+        """
+        **Internal use only. Do not call**
+
+        Returns the CREATE TABLE statement of a table missing from the backend, with the columns of all files
+        and the primary and foreign keys of the first file that has the table
+        """
+        definitions = [f"{quote(column)} {col_type}" for column, col_type in columns.values()]
+        pk_cols = [column for _, column in sorted((pk, column) for column, pk in zip(first.columns, first.pk) if pk > 0)]
+        if len(pk_cols) > 0:
+            definitions.append(f"PRIMARY KEY ({', '.join(quote(column) for column in pk_cols)})")
+        for column, ref_table, ref_col in first.foreign_keys:
+            definitions.append(f"FOREIGN KEY ({quote(column)}) REFERENCES {quote(ref_table)} ({quote(ref_col)})")
+        return f"CREATE TABLE {quote(name)} ({', '.join(definitions)});"
+
+    def merge_batch(self, batch, plan, counts, isVerbose = False):
+        """
+        **Internal use only. Do not call**
+
+        Attaches the files of `batch`, a list of (position, SourceSchema), and copies their runs and tables into the backend
+        in one transaction. Adds the number of merged rows of each table to `counts`. Returns an error tuple on failure
+        """
+        attached = []
+        try:
+            for position, source in batch:
+                self.attach(f"{MERGE_PREFIX}{position}", source.filename)
+                attached.append(f"{MERGE_PREFIX}{position}")
+            self.begin()
+            run_sources = [(position, source) for position, source in batch if source.runs is not None]
+            if len(run_sources) > 0:
+                self.map_runs(run_sources, isVerbose)
+            for key, (name, columns, _) in plan.items():
+                selects = []
+                for position, source in batch:
+                    if key in source.tables:
+                        selects.append(self.select(position, source, source.tables[key], columns))
+                if len(selects) == 0:
+                    continue
+                col_names = ", ".join(quote(column) for column, _ in columns.values())
+                query = f"INSERT INTO {quote(name)} ({col_names}) {' UNION ALL '.join(selects)}"
+                if isVerbose:
+                    print(query)
+                counts[name] += self.insert(query)
+            self.commit()
+        except self.engine_errors() as e:
+            self.rollback()
+            return (self.engine_errors()[0], e)
+        finally:
+            for alias in attached:
+                self.cur.execute(f"DETACH DATABASE {alias}")
+
+    def map_runs(self, run_sources, isVerbose = False):
+        """
+        **Internal use only. Do not call**
+
+        Adds the runs of the files in `run_sources` to runTable and fills the temporary run map with their new run_ids.
+        A run recorded in `dsi_merged_runs` with the same file, run_id and run_timestamp keeps its run_id.
+        Every other run gets a new run_id, in timestamp order, after the backend's highest run_id
+        """
+        self.cur.execute(f"""CREATE TEMP TABLE IF NOT EXISTS {RUN_MAP_TABLE}
+                             (source INTEGER, path TEXT, run_id INTEGER, run_timestamp TEXT, new_run_id INTEGER)""")
+        self.cur.execute(f"DELETE FROM temp.{RUN_MAP_TABLE}")
+        last_run_id = self.cur.execute("SELECT COALESCE(MAX(run_id), 0) FROM runTable").fetchone()[0]
+        runs = " UNION ALL ".join(f"SELECT {position}, {self.literal(source.path)}, run_id, run_timestamp FROM {MERGE_PREFIX}{position}.runTable"
+                                  for position, source in run_sources)
+        queries = [f"INSERT INTO temp.{RUN_MAP_TABLE} (source, path, run_id, run_timestamp) {runs}",
+                   f"""UPDATE temp.{RUN_MAP_TABLE} SET new_run_id = p.run_id FROM {MERGED_RUNS_TABLE} AS p
+                       WHERE p.source = {RUN_MAP_TABLE}.path AND p.source_run_id = {RUN_MAP_TABLE}.run_id
+                       AND p.run_timestamp = {RUN_MAP_TABLE}.run_timestamp
+                       AND EXISTS (SELECT 1 FROM runTable AS r WHERE r.run_id = p.run_id)""",
+                   f"""UPDATE temp.{RUN_MAP_TABLE} SET new_run_id = {last_run_id} + n.position
+                       FROM (SELECT source, run_id, ROW_NUMBER() OVER (ORDER BY run_timestamp, source, run_id) AS position
+                             FROM temp.{RUN_MAP_TABLE} WHERE new_run_id IS NULL) AS n
+                       WHERE n.source = {RUN_MAP_TABLE}.source AND n.run_id = {RUN_MAP_TABLE}.run_id""",
+                   f"""INSERT INTO runTable (run_id, run_timestamp) SELECT new_run_id, run_timestamp FROM temp.{RUN_MAP_TABLE}
+                       WHERE new_run_id > {last_run_id} ORDER BY new_run_id""",
+                   f"""INSERT INTO {MERGED_RUNS_TABLE} (source, source_run_id, run_timestamp, run_id)
+                       SELECT path, run_id, run_timestamp, new_run_id FROM temp.{RUN_MAP_TABLE} WHERE new_run_id > {last_run_id}"""]
+        for query in queries:
+            if isVerbose:
+                print(query)
+            self.cur.execute(query)
+
+    def literal(self, value):
+        """
+        **Internal use only. Do not call**
+
+        Returns `value` as a quoted SQL string literal
+        """
+        return "'" + str(value).replace("'", "''") + "'"
+
+    def select(self, position, source, entry, columns):
+        """
+        **Internal use only. Do not call**
+
+        Returns the SELECT reading the table `entry` of one attached file in the backend's column order.
+        Columns the file lacks are NULL, and its run_ids are replaced by the backend's
+        """
+        present = {column.lower(): column for column in entry.columns}
+        values = []
+        join = ""
+        for key, (column, _) in columns.items():
+            if key not in present:
+                values.append("NULL")
+            elif key == "run_id" and source.runs is not None:
+                values.append("m.new_run_id")
+                join = f" LEFT JOIN temp.{RUN_MAP_TABLE} AS m ON m.source = {position} AND m.run_id = s.{quote(present[key])}"
+            else:
+                values.append(f"s.{quote(present[key])}")
+        return f"SELECT {', '.join(values)} FROM {MERGE_PREFIX}{position}.{quote(entry.name)} AS s{join}"
+
+    @abstractmethod
+    def finish(self, marks, runs):
+        """
+        **Internal use only. Do not call**
+
+        Updates the text index, column statistics, sketches and foreign key indexes of the merged tables
+        with the rows added since `marks` were taken
+        """
+        pass
+
+    @abstractmethod
+    def engine(self):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    @abstractmethod
+    def engine_errors(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns the exception types of the engine's failed statements
+        """
+        pass
+
+    @abstractmethod
+    def open(self, filename):
+        """
+        **Internal use only. Do not call**
+
+        Opens the database file `filename` read-only in the calling thread. Returns a cursor whose catalog is that file
+        """
+        pass
+
+    @abstractmethod
+    def release(self, cur):
+        """
+        **Internal use only. Do not call**
+
+        Closes a database file opened with `open()`
+        """
+        pass
+
+    def close_scanners(self):
+        """
+        **Internal use only. Do not call**
+
+        Closes the connections the worker threads kept open to read the files
+        """
+        pass
+
+    @abstractmethod
+    def attach(self, alias, filename):
+        """
+        **Internal use only. Do not call**
+
+        Attaches the database `filename` to the backend's connection as the schema `alias`
+        """
+        pass
+
+    @abstractmethod
+    def attach_limit(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns the number of files that can be attached to the backend's connection at once
+        """
+        pass
+
+    @abstractmethod
+    def create_runs(self):
+        """
+        **Internal use only. Do not call**
+
+        Creates the backend's runTable if it does not exist yet. Unlike the runTable of `ingest_artifacts()`, several runs
+        can share a `run_timestamp`, as runs of different files are often written in the same second
+        """
+        pass
+
+    @abstractmethod
+    def fixed_timestamps(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if the backend's runTable allows only one run per `run_timestamp`, as the runTable of `ingest_artifacts()` does
+        """
+        pass
+
+    @abstractmethod
+    def insert(self, query):
+        """
+        **Internal use only. Do not call**
+
+        Runs the INSERT statement `query` and returns the number of inserted rows
+        """
+        pass
+
+    @abstractmethod
+    def begin(self):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    @abstractmethod
+    def commit(self):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    @abstractmethod
+    def rollback(self):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+class SqliteMerge(Merge):
+    """
+    Merge of SQLite databases into a Sqlite backend. SQLite attaches at most 10 databases to a connection,
+    so batches hold at most as many files as the connection can still attach
+    """
+    def engine(self):
+        return "SQLite"
+
+    def engine_errors(self):
+        return (sqlite3.Error,)
+
+    def open(self, filename):
+        return sqlite3.connect(Path(filename).absolute().as_uri() + "?mode=ro", uri = True).cursor()
+
+    def release(self, cur):
+        cur.connection.close()
+
+    def attach(self, alias, filename):
+        self.cur.execute(f"ATTACH DATABASE ? AS {alias}", (str(Path(filename).absolute()),))
+
+    def attach_limit(self):
+        attached = [row for row in self.cur.execute("PRAGMA database_list;").fetchall() if row[1] not in ("main", "temp")]
+        return max(self.backend.con.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - len(attached), 1)
+
+    def create_runs(self):
+        self.cur.execute("CREATE TABLE IF NOT EXISTS runTable (run_id INTEGER PRIMARY KEY AUTOINCREMENT, run_timestamp TEXT);")
+
+    def fixed_timestamps(self):
+        return self.cur.execute("""SELECT COUNT(*) FROM pragma_index_list('runTable') AS i JOIN pragma_index_info(i.name) AS c
+                                   WHERE i."unique" = 1 AND i.origin = 'u' AND c.name = 'run_timestamp';""").fetchone()[0] > 0
+
+    def insert(self, query):
+        self.cur.execute(query)
+        return self.cur.rowcount
+
+    def begin(self):
+        if not self.backend.con.in_transaction:
+            self.cur.execute("BEGIN;")
+
+    def commit(self):
+        self.backend.con.commit()
+
+    def rollback(self):
+        self.backend.con.rollback()
+
+    def finish(self, marks, runs):
+        backend = self.backend
+        try:
+            self.begin()
+            for table_name, text_mark, stats_mark, sketch_mark in marks:
+                if self.catalog.table(table_name) is None:
+                    continue
+                backend.text_index.update(table_name, text_mark)
+                backend.column_stats.update(table_name, stats_mark)
+                backend.column_sketches.update(table_name, sketch_mark)
+            backend.indexes.ensure_keys([table_name for table_name, _, _, _ in marks if table_name not in ("runTable", "dsi_units")])
+            self.cur.execute(f"DROP TABLE IF EXISTS temp.{RUN_MAP_TABLE}")
+            self.commit()
+        except sqlite3.Error as e:
+            self.rollback()
+            return (sqlite3.Error, e)
+
+class DuckDBMerge(Merge):
+    """
+    Merge of DuckDB databases into a DuckDB backend. DuckDB reads the files of a batch with all its threads.
+    The `seq_run_id` sequence of the backend is moved past the merged run_ids
+
+    Each worker thread reads the schemas through one in-memory connection that attaches the files in turn,
+    which is much cheaper than opening every file as its own database
+    """
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.local = threading.local()
+        self.scanners = []
+        self.lock = threading.Lock()
+
+    def engine(self):
+        return "DuckDB"
+
+    def engine_errors(self):
+        import duckdb
+        return (duckdb.Error,)
+
+    def open(self, filename):
+        import duckdb
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = duckdb.connect(":memory:")
+            with self.lock:
+                self.scanners.append(con)
+            self.local.con = con
+        path = str(Path(filename).absolute()).replace("'", "''")
+        con.execute(f"ATTACH '{path}' AS {MERGE_PREFIX} (READ_ONLY)")
+        # the catalog reads the current database
+        con.execute(f"USE {MERGE_PREFIX}")
+        return con
+
+    def release(self, cur):
+        cur.execute("USE memory")
+        cur.execute(f"DETACH DATABASE IF EXISTS {MERGE_PREFIX}")
+
+    def close_scanners(self):
+        with self.lock:
+            for con in self.scanners:
+                con.close()
+            self.scanners = []
+        self.local = threading.local()
+
+    def attach(self, alias, filename):
+        path = str(Path(filename).absolute()).replace("'", "''")
+        self.cur.execute(f"ATTACH '{path}' AS {alias} (READ_ONLY)")
+
+    def attach_limit(self):
+        return self.batch_files
+
+    def create_runs(self):
+        self.cur.execute("CREATE TABLE IF NOT EXISTS runTable (run_id INTEGER PRIMARY KEY, run_timestamp TEXT);")
+
+    def fixed_timestamps(self):
+        return self.cur.execute("""SELECT COUNT(*) FROM duckdb_constraints()
+                                   WHERE database_name = current_database() AND schema_name = 'main' AND table_name = 'runTable'
+                                   AND constraint_type = 'UNIQUE' AND constraint_column_names = ['run_timestamp']""").fetchone()[0] > 0
+
+    def insert(self, query):
+        return self.cur.execute(query).fetchone()[0]
+
+    def begin(self):
+        self.cur.execute("BEGIN TRANSACTION")
+
+    def commit(self):
+        self.cur.execute("COMMIT")
+
+    def rollback(self):
+        self.cur.execute("ROLLBACK")
+
+    def finish(self, marks, runs):
+        import duckdb
+        backend = self.backend
+        try:
+            self.begin()
+            for table_name, _, stats_mark, sketch_mark in marks:
+                if self.catalog.table(table_name) is not None:
+                    backend.column_stats.update(table_name, stats_mark)
+                    backend.column_sketches.update(table_name, sketch_mark)
+            backend.indexes.ensure_keys([table_name for table_name, _, _, _ in marks if table_name not in ("runTable", "dsi_units")])
+            if runs:
+                next_run_id = self.cur.execute("SELECT COALESCE(MAX(run_id), 0) + 1 FROM runTable").fetchone()[0]
+                self.cur.execute("DROP SEQUENCE IF EXISTS seq_run_id")
+                self.cur.execute(f"CREATE SEQUENCE seq_run_id START {next_run_id}")
+            self.cur.execute(f"DROP TABLE IF EXISTS temp.{RUN_MAP_TABLE}")
+            self.commit()
+            self.cur.execute("CHECKPOINT")
+            # indexed after the checkpoint, which may renumber rowids of tables with deleted rows
+            if backend.text_index.enabled:
+                self.begin()
+                for table_name, text_mark, _, _ in marks:
+                    if self.catalog.table(table_name) is not None:
+                        backend.text_index.update(table_name, text_mark)
+                self.commit()
+                self.cur.execute("CHECKPOINT")
+        except duckdb.Error as e:
+            self.rollback()
+            self.cur.execute("CHECKPOINT")
+            return (duckdb.Error, e)
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import time
+from abc import ABCMeta, abstractmethod
+
+# schema name under which DuckDB attaches the file an in-memory database is loaded from or saved to
+PERSIST_SCHEMA = "dsi_persist"
+
+class Persistence(metaclass=ABCMeta):
+    """
+    Keeps a file copy of an in-memory database.
+
+    The database is loaded from the file when the backend opens, and saved to it by `save()`, by `save_if_due()` once
+    `interval` seconds passed since the last save, and when the backend closes. Writes between saves only live in memory.
+    """
+    def __init__(self, path, interval = None):
+        """
+        `path` : str or None
+            File the database is loaded from if it exists, and saved to. If None, it is only saved to paths given to `save()`
+
+        `interval` : float, optional, default=None
+            Minimum number of seconds between saves by `save_if_due()`. Never saves periodically if None
+        """
+        self.path = path
+        self.interval = interval
+        self.last_save = time.monotonic()
+
+    def load(self):
+        """
+        Copies the database stored in `path`, if any, into memory
+        """
+        if self.path is not None and os.path.isfile(self.path):
+            self.copy_from(self.path)
+
+    def save(self, path = None):
+        """
+        Writes the in-memory database to `path`, or to the persistence file if None.
+        A file already at the destination is replaced as a whole
+        """
+        self.copy_to(path or self.path)
+        if path is None or path == self.path:
+            self.last_save = time.monotonic()
+
+    def save_if_due(self):
+        """
+        Saves the database if `interval` seconds passed since the last save. Returns True if it was saved
+        """
+        if self.path is None or self.interval is None or time.monotonic() - self.last_save < self.interval:
+            return False
+        self.save()
+        return True
+
+    @abstractmethod
+    def copy_from(self, path):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    @abstractmethod
+    def copy_to(self, path):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+class SqlitePersistence(Persistence):
+    """
+    Persistence of an in-memory SQLite database through the online backup API
+    """
+    def __init__(self, con, path, interval = None):
+        super().__init__(path, interval)
+        self.con = con
+
+    def copy_from(self, path):
+        source = sqlite3.connect(path)
+        try:
+            source.backup(self.con)
+        finally:
+            source.close()
+
+    def copy_to(self, path):
+        # the backup replaces every page of the destination in one transaction, so readers of the file never see a partial copy
+        target = sqlite3.connect(path)
+        try:
+            self.con.backup(target)
+        finally:
+            target.close()
+
+class DuckDBPersistence(Persistence):
+    """
+    Persistence of an in-memory DuckDB database by attaching the file and running COPY FROM DATABASE
+    """
+    def __init__(self, cur, path, interval = None):
+        super().__init__(path, interval)
+        self.cur = cur
+        self.database = cur.execute("SELECT current_database()").fetchone()[0]
+
+    def copy_from(self, path):
+        self.cur.execute(f"ATTACH '{escape(path)}' AS {PERSIST_SCHEMA} (READ_ONLY)")
+        try:
+            self.cur.execute(f"COPY FROM DATABASE {PERSIST_SCHEMA} TO {self.database}")
+        finally:
+            self.cur.execute(f"DETACH {PERSIST_SCHEMA}")
+
+    def copy_to(self, path):
+        # COPY FROM DATABASE needs an empty target, so a new file is written and moved over the old one
+        temp_path = f"{path}.tmp"
+        for stale in (temp_path, f"{temp_path}.wal"):
+            if os.path.exists(stale):
+                os.remove(stale)
+        self.cur.execute(f"ATTACH '{escape(temp_path)}' AS {PERSIST_SCHEMA}")
+        try:
+            self.cur.execute(f"COPY FROM DATABASE {self.database} TO {PERSIST_SCHEMA}")
+            self.cur.execute(f"CHECKPOINT {PERSIST_SCHEMA}")
+        finally:
+            self.cur.execute(f"DETACH {PERSIST_SCHEMA}")
+        os.replace(temp_path, path)
+
+def escape(path):
+    """
+    Returns `path` with single quotes doubled for use in a SQL string literal
+    """
+    return path.replace("'", "''")
@@ -0,0 +1,149 @@
+import copy
+import re
+import sys
+from collections import OrderedDict
+
+import pandas as pd
+
+# default memory budget of a backend's query result cache, in bytes
+QUERY_CACHE_BYTES = 64 * 1024 * 1024
+
+# quoted literals and identifiers of a SQL statement, whose whitespace is significant
+SQL_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+# SQL functions whose result differs between calls, so statements using them are never cached
+SQL_VOLATILE = re.compile(r"\b(random|randomblob|uuid|gen_random_uuid|setseed|nextval|currval|now|current_date|current_time|"
+                          r"current_timestamp|get_current_time|get_current_timestamp|changes|total_changes|last_insert_rowid)\b", re.IGNORECASE)
+
+def normalize_sql(query):
+    """
+    Returns `query` with runs of whitespace outside quotes collapsed to one space and trailing semicolons removed,
+    so statements that only differ in layout share a cache entry
+    """
+    parts = SQL_QUOTED.split(query)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i])
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+def query_key(query, dict_return = False):
+    """
+    Returns the cache key of the SQL statement `query`, or None if it calls a function whose result differs between calls
+    """
+    query = normalize_sql(query)
+    if SQL_VOLATILE.search(SQL_QUOTED.sub("''", query)):
+        return None
+    return ("query", query, dict_return)
+
+def result_size(value):
+    """
+    Returns the approximate number of bytes held by a cached result: a DataFrame, or lists, dicts and
+    result objects such as ValueObjects, with the sizes of their values included
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index = True, deep = True).sum())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(map(result_size, value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_size(k) + result_size(v) for k, v in value.items())
+    if hasattr(value, "__dict__") and not callable(value):
+        return sys.getsizeof(value) + result_size(vars(value))
+    return sys.getsizeof(value)
+
+def result_copy(value):
+    """
+    Returns a copy of a cached result that the caller can modify without changing the cached one.
+    DataFrames and dicts of column lists are copied, and each object in a list is copied along with its list attributes
+    """
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, dict):
+        return value.__class__((k, list(v) if isinstance(v, list) else v) for k, v in value.items())
+    if isinstance(value, list):
+        items = []
+        for item in value:
+            if hasattr(item, "__dict__"):
+                item = copy.copy(item)
+                for attr, attr_value in vars(item).items():
+                    if isinstance(attr_value, list):
+                        setattr(item, attr, list(attr_value))
+            items.append(item)
+        return items
+    return value
+
+class QueryCache:
+    """
+    Least recently used cache of query and find results of one backend, bounded by an approximate memory budget.
+
+    Each entry is stored with the database version it was computed at, and a lookup with any other version is a miss
+    that drops the entry, so results are never served after the data changed. Results are copied in and out of the cache.
+    """
+    def __init__(self, max_bytes = QUERY_CACHE_BYTES):
+        """
+        `max_bytes` : int, optional, default=64 MiB
+            Memory budget of all cached results. Least recently used results are evicted to stay within it,
+            and a single result larger than the budget is not cached. 0 disables the cache
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> (version, result, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key, version):
+        """
+        Returns a copy of the result cached for `key` at database `version`, or None if there is none.
+        A None `key` is never cached
+        """
+        if not self.enabled or key is None:
+            return None
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result_copy(entry[1])
+        if entry is not None:
+            self.remove(key)
+        self.misses += 1
+        return None
+
+    def put(self, key, version, result):
+        """
+        Caches a copy of `result` for `key`, computed at database `version`, evicting least recently used results as needed
+        """
+        if not self.enabled or key is None:
+            return
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = (version, result_copy(result), size)
+        self.size += size
+        while self.size > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key):
+        """
+        **Internal use only. Do not call**
+        """
+        self.size -= self.entries.pop(key)[2]
+
+    def clear(self):
+        """
+        Drops every cached result. Called when the backend's data changes
+        """
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        """
+        Returns a dict of the number of cache `hits`, `misses` and `evictions`, and the number of cached `entries`,
+        their approximate `bytes` and the `max_bytes` budget
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes}
@@ -0,0 +1,121 @@
+import json
+import os
+import time
+from abc import ABCMeta, abstractmethod
+from datetime import datetime
+from threading import Lock
+
+# latency in milliseconds from which a statement is slow, and its query plan is captured in the log
+SLOW_QUERY_MS = 100
+
+class QueryLog(metaclass=ABCMeta):
+    """
+    Opt-in log of the statements a backend runs for queries and finds, kept as a JSON-lines file.
+
+    Each line is one statement with its `time`, `origin` (the backend method that ran it, such as "query_artifacts"
+    or "find_cell"), `sql` text, `latency_ms`, number of `rows` returned, and the engine's query `plan` if the statement
+    took at least `slow_ms` milliseconds, None otherwise. Several backends and processes can append to the same file.
+    """
+    def __init__(self, cursor, path = None, slow_ms = SLOW_QUERY_MS):
+        """
+        `cursor` : database cursor used to explain slow statements
+
+        `path` : str, optional, default=None
+            JSON-lines file the statements are appended to. Nothing is logged if None
+
+        `slow_ms` : float, optional, default=100
+            Latency in milliseconds from which a statement's query plan is captured
+        """
+        self.cur = cursor
+        self.path = path
+        self.slow_ms = slow_ms
+        self.lock = Lock()
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def start(self):
+        """
+        Returns the start time to pass to `record()` once the statement returned its rows
+        """
+        return time.perf_counter()
+
+    def record(self, origin, sql, start, rows, params = None):
+        """
+        Appends a statement that started at `start` and returned `rows` rows to the log.
+        `params` are the values bound to the statement's placeholders, needed to explain it
+        """
+        if self.path is None:
+            return
+        latency_ms = (time.perf_counter() - start) * 1000
+        entry = {"time": datetime.now().isoformat(timespec = "milliseconds"), "origin": origin, "sql": sql,
+                 "latency_ms": round(latency_ms, 3), "rows": rows, "plan": None}
+        if latency_ms >= self.slow_ms:
+            try:
+                entry["plan"] = self.explain(sql, params)
+            except Exception as e:
+                # statements such as PRAGMA cannot be explained by every engine
+                entry["plan"] = f"Could not explain the statement: {e}"
+        line = json.dumps(entry, default = str) + "\n"
+        with self.lock:
+            with open(self.path, "a") as log_file:
+                log_file.write(line)
+
+    def entries(self):
+        """
+        Returns every statement in the log file as a list of dicts, oldest first
+        """
+        if self.path is None or not os.path.isfile(self.path):
+            return []
+        with self.lock:
+            with open(self.path) as log_file:
+                lines = log_file.readlines()
+        # a line still being written by another process is skipped
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def slow(self, limit = None):
+        """
+        Returns the statements in the log that took at least `slow_ms` milliseconds, slowest first.
+        Only the first `limit` are returned if it is not None
+        """
+        slow_entries = sorted((entry for entry in self.entries() if entry["latency_ms"] >= self.slow_ms),
+                              key = lambda entry: entry["latency_ms"], reverse = True)
+        return slow_entries if limit is None else slow_entries[:limit]
+
+    @abstractmethod
+    def explain(self, sql, params = None):
+        """
+        **Internal use only. Do not call**
+
+        Returns the engine's query plan of `sql` as text
+        """
+        pass
+
+class SqliteQueryLog(QueryLog):
+    """
+    Query log of a SQLite backend, with plans from EXPLAIN QUERY PLAN
+    """
+    def explain(self, sql, params = None):
+        rows = self.cur.execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+        # each row is (id, parent id, unused, detail). Steps are indented under their parent
+        depth = {0: 0}
+        lines = []
+        for step_id, parent_id, _, detail in rows:
+            depth[step_id] = depth.get(parent_id, 0) + 1
+            lines.append("  " * (depth[step_id] - 1) + detail)
+        return "\n".join(lines)
+
+class DuckDBQueryLog(QueryLog):
+    """
+    Query log of a DuckDB backend, with plans from EXPLAIN
+    """
+    def explain(self, sql, params = None):
+        rows = self.cur.execute(f"EXPLAIN {sql}", params).fetchall()
+        return "\n".join(plan for _, plan in rows)
@@ -0,0 +1,149 @@
+import math
+from collections import OrderedDict
+
+import pandas as pd
+
+from dsi.backends.type_inference import INT32, INT64, FLOAT, STRING
+
+# rowids bound per IN list when the stored rows being edited are read back
+ROWID_CHUNK_SIZE = 500
+
+def is_null(value):
+    """
+    Returns True for the values pandas and the databases use for a missing cell: None, NaN, NaT and pd.NA
+    """
+    return value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and math.isnan(value))
+
+def column_values(series):
+    """
+    Returns a pandas Series as a list of Python values, with missing values as None
+    """
+    values = series.tolist()
+    if series.hasnans:
+        values = [None if is_null(value) else value for value in values]
+    return values
+
+def same_value(old, new):
+    """
+    Returns True if a stored cell `old` already holds the edited value `new`. Missing values are all equal
+    and numbers compare by value, so an integer cell read back as 2 matches an edited 2.0
+    """
+    if is_null(old) or is_null(new):
+        return is_null(old) and is_null(new)
+    return old == new
+
+def kind_fits(edited, stored, whole_column = False):
+    """
+    Returns True if values inferred as kind `edited` can be written to a column of kind `stored` in place, i.e. rewriting
+    the table would infer the same column type. `whole_column` is True if the values are the column's entire new content,
+    otherwise they are merged with its other stored values. A column of unknown kind (None) takes any values
+    """
+    if stored is None or edited == stored or (edited == INT32 and stored == INT64):
+        return True
+    if whole_column:
+        return False
+    return stored == STRING or (stored == FLOAT and edited in (INT32, INT64))
+
+class RowDelta:
+    """
+    Row-level changes that turn the stored rows of one table into its edited rows.
+
+    Edited rows are matched to stored rows by rowid, and only the columns whose values differ are written back:
+    one UPDATE per set of changed columns, plus the INSERTs of new rows and the DELETEs of rows a full overwrite dropped.
+    Nothing is written for edited rows that equal the stored ones.
+    """
+    def __init__(self, cursor, table_name, columns):
+        """
+        `cursor` : database cursor inside the caller's transaction
+
+        `table_name` : str
+            Name of the table, quoted for SQL
+
+        `columns` : list of str
+            Column names quoted for SQL, in the order of the values of each edited row
+        """
+        self.cur = cursor
+        self.table_name = table_name
+        self.columns = columns
+        self.updates = OrderedDict() # positions of the changed columns -> parameter rows of one UPDATE
+        self.inserts = []
+        self.deletes = []
+
+    @property
+    def rewrites(self):
+        """
+        True if stored rows are updated or deleted, i.e. the table changes beyond appended rows
+        """
+        return len(self.updates) > 0 or len(self.deletes) > 0
+
+    @property
+    def empty(self):
+        return not self.rewrites and len(self.inserts) == 0
+
+    def compare(self, rowid, stored, edited):
+        """
+        **Internal use only. Do not call**
+
+        Queues an update of the columns of row `rowid` whose `edited` values differ from the `stored` ones
+        """
+        if stored == edited:
+            return
+        changed = tuple(i for i, (old, new) in enumerate(zip(stored, edited)) if not same_value(old, new))
+        if changed:
+            self.updates.setdefault(changed, []).append([edited[i] for i in changed] + [rowid])
+
+    def match(self, rowids, rows):
+        """
+        Compares each edited row in `rows` with the stored row of the same position in `rowids`.
+        Only those stored rows are read back, `ROWID_CHUNK_SIZE` at a time
+        """
+        col_list = ', '.join(self.columns)
+        for start in range(0, len(rowids), ROWID_CHUNK_SIZE):
+            chunk = rowids[start:start + ROWID_CHUNK_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            stored = {row[0]: row[1:] for row in self.cur.execute(f"""SELECT rowid, {col_list} FROM {self.table_name}
+                                                                      WHERE rowid IN ({placeholders})""", chunk).fetchall()}
+            for rowid, edited in zip(chunk, rows[start:start + ROWID_CHUNK_SIZE]):
+                self.compare(rowid, stored[rowid], edited)
+
+    def match_all(self, rows, key = None):
+        """
+        Compares `rows`, the new content of the whole table, with every stored row. Rows are matched by the value of column
+        position `key` if given (a primary key), otherwise by their position in rowid order.
+        Edited rows without a stored match are inserted and stored rows without an edited match are deleted.
+        """
+        col_list = ', '.join(self.columns)
+        stored = self.cur.execute(f"SELECT rowid, {col_list} FROM {self.table_name} ORDER BY rowid").fetchall()
+        if key is None:
+            for row, edited in zip(stored, rows):
+                self.compare(row[0], row[1:], edited)
+            self.deletes.extend(row[0] for row in stored[len(rows):])
+            self.inserts.extend(rows[len(stored):])
+            return
+        stored_keys = {row[key + 1]: row for row in stored}
+        for edited in rows:
+            match = stored_keys.pop(edited[key], None)
+            if match is None:
+                self.inserts.append(edited)
+            else:
+                self.compare(match[0], match[1:], edited)
+        self.deletes.extend(row[0] for row in stored_keys.values())
+
+    def insert(self, rows):
+        """
+        Queues `rows` to be appended to the table
+        """
+        self.inserts.extend(rows)
+
+    def apply(self):
+        """
+        Runs the queued DELETEs, UPDATEs and INSERTs, in that order so primary key values of deleted rows can be reused
+        """
+        if self.deletes:
+            self.cur.executemany(f"DELETE FROM {self.table_name} WHERE rowid = ?", [(rowid,) for rowid in self.deletes])
+        for changed, params in self.updates.items():
+            assignments = ', '.join(f"{self.columns[i]} = ?" for i in changed)
+            self.cur.executemany(f"UPDATE {self.table_name} SET {assignments} WHERE rowid = ?", params)
+        if self.inserts:
+            placeholders = ', '.join('?' * len(self.columns))
+            self.cur.executemany(f"INSERT INTO {self.table_name} ({', '.join(self.columns)}) VALUES ({placeholders})", self.inserts)
@@ -0,0 +1,560 @@
+import math
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+
+import numpy as np
+
+from dsi.backends.column_stats import NEW_TABLE, TableStats
+
+# Name of the table holding the sketches. Catalogs hide it from users
+SKETCHES_TABLE = "dsi_column_sketches"
+
+# number of rows read from the database at a time while sketching existing rows
+SKETCH_FETCH_SIZE = 10000
+
+# quantiles reported by summary(approx=True)
+SUMMARY_QUANTILES = (0.5, 0.95, 0.99)
+
+# number of sampled values shown per column by summary(approx=True)
+SUMMARY_SAMPLE_SIZE = 5
+
+class KLLSketch:
+    """
+    KLL quantile sketch of a stream of numbers (Karnin, Lang and Liberty, 2016).
+
+    Values are kept in a stack of levels. A level that outgrows its capacity is sorted and every other value,
+    starting at a random offset, moves up one level with twice the weight. Capacities shrink by 2/3 per level below the top,
+    so about 3k values are kept whatever the stream length. Two sketches merge by concatenating their levels.
+
+    Error bound: a quantile q is answered with a value whose rank is within ±εn of qn, where for the default
+    k = 200 the normalized rank error ε is about 1.65% with 99% confidence. p95 therefore returns a value between the
+    true p93.35 and p96.65. Error shrinks in proportion to 1/k. Streams shorter than the capacity of the first level are exact.
+    """
+    def __init__(self, k = 200):
+        """
+        `k` : int, optional, default=200
+            Capacity of the top level, which sets the accuracy/size trade-off
+        """
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng()
+
+    def capacity(self, level):
+        """
+        **Internal use only. Do not call**
+        """
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, values):
+        """
+        Adds an array of numbers to the sketch
+        """
+        values = np.asarray(values, dtype = np.float64)
+        self.n += len(values)
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self.compress()
+
+    def merge(self, other):
+        """
+        Adds every value summarised by `other` to this sketch
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], values))
+        self.n += other.n
+        self.compress()
+
+    def compress(self):
+        """
+        **Internal use only. Do not call**
+
+        Compacts the lowest level over capacity until every level fits
+        """
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) <= self.capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            values = np.sort(self.levels[level])
+            odd = len(values) % 2
+            promoted = values[odd + int(self.rng.integers(2))::2]
+            self.levels[level] = values[:odd]
+            self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+            # a new top level shrinks the capacity of every level below it
+            level = 0
+
+    def quantiles(self, qs):
+        """
+        Returns the approximate value at each quantile in `qs` (0 <= q <= 1), or None for each if the sketch is empty
+        """
+        if self.n == 0:
+            return [None for _ in qs]
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(v), 2.0 ** level) for level, v in enumerate(self.levels)])
+        order = np.argsort(values, kind = "stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, [q * cumulative[-1] for q in qs], side = "left")
+        return [float(values[min(p, len(values) - 1)]) for p in positions]
+
+    def to_bytes(self):
+        """
+        Serializes the sketch
+        """
+        header = [self.k, self.n, len(self.levels)] + [len(v) for v in self.levels]
+        return np.concatenate([np.array(header, dtype = np.float64)] + self.levels).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Restores a sketch serialized with `to_bytes()`
+        """
+        array = np.frombuffer(data, dtype = np.float64)
+        sketch = cls(int(array[0]))
+        sketch.n = int(array[1])
+        num_levels = int(array[2])
+        sizes = array[3:3 + num_levels].astype(np.int64)
+        offsets = np.concatenate(([3 + num_levels], 3 + num_levels + np.cumsum(sizes)))
+        sketch.levels = [array[offsets[i]:offsets[i + 1]].copy() for i in range(num_levels)]
+        return sketch
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch (Flajolet et al., 2007) with 2^p one-byte registers.
+
+    Each value is hashed with SplitMix64. The first p bits of the hash pick a register, which keeps the longest run of
+    leading zeros seen in the remaining bits. Two sketches merge by taking the maximum of each register.
+
+    Error bound: the relative standard error is 1.04 / sqrt(2^p), 1.6% for the default p = 12 (4 KB per column),
+    so about 95% of estimates are within 3.3% of the true count. Counts below 2.5 * 2^p use linear counting, which is
+    close to exact for small counts. Values are hashed as 64-bit floats, so 1 and 1.0 are one value and integers
+    that differ only beyond 2^53 are counted once.
+    """
+    def __init__(self, p = 12):
+        """
+        `p` : int, optional, default=12
+            Number of hash bits used to pick a register, at least 12
+        """
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype = np.uint8)
+
+    def hash(self, values):
+        """
+        **Internal use only. Do not call**
+
+        SplitMix64 finalizer over the bits of each value as a 64-bit float
+        """
+        values = np.asarray(values, dtype = np.float64) + 0.0 # -0.0 and 0.0 hash alike
+        z = values.view(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+    def update(self, values):
+        """
+        Adds an array of numbers to the sketch
+        """
+        if len(values) == 0:
+            return
+        hashes = self.hash(values)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # the remaining bits fit a float64 exactly, whose binary exponent is their bit length (0 for 0)
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        """
+        Adds every value summarised by `other` to this sketch
+        """
+        np.maximum(self.registers, other.registers, out = self.registers)
+
+    def count(self):
+        """
+        Returns the estimated number of distinct values
+        """
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        """
+        Serializes the sketch
+        """
+        return bytes([self.p]) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Restores a sketch serialized with `to_bytes()`
+        """
+        sketch = cls(data[0])
+        sketch.registers = np.frombuffer(data[1:], dtype = np.uint8).copy()
+        return sketch
+
+class ReservoirSample:
+    """
+    Uniform random sample without replacement of up to `size` values of a stream (bottom-k sampling).
+
+    Every value gets a uniform random key and the sample keeps the values with the smallest keys, which is a uniform
+    sample of everything seen. Two samples merge by keeping the smallest keys of both, a uniform sample of the union.
+    The sample is exact (every value) while fewer than `size` values were seen.
+    """
+    def __init__(self, size = 256):
+        """
+        `size` : int, optional, default=256
+            Maximum number of values kept
+        """
+        self.size = size
+        self.keys = np.empty(0)
+        self.values = np.empty(0)
+        self.rng = np.random.default_rng()
+
+    def update(self, values):
+        """
+        Adds an array of numbers to the sample
+        """
+        values = np.asarray(values, dtype = np.float64)
+        self.keep(np.concatenate((self.keys, self.rng.random(len(values)))), np.concatenate((self.values, values)))
+
+    def merge(self, other):
+        """
+        Adds every value sampled by `other` to this sample
+        """
+        self.keep(np.concatenate((self.keys, other.keys)), np.concatenate((self.values, other.values)))
+
+    def keep(self, keys, values):
+        """
+        **Internal use only. Do not call**
+        """
+        if len(keys) > self.size:
+            smallest = np.argpartition(keys, self.size)[:self.size]
+            keys, values = keys[smallest], values[smallest]
+        order = np.argsort(keys)
+        self.keys, self.values = keys[order], values[order]
+
+    def sample(self, size = None):
+        """
+        Returns up to `size` sampled values (all of them if None) as a list, in random order
+        """
+        return self.values[:size].tolist()
+
+    def to_bytes(self):
+        """
+        Serializes the sample
+        """
+        return np.concatenate(([self.size], self.keys, self.values)).astype(np.float64).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Restores a sample serialized with `to_bytes()`
+        """
+        array = np.frombuffer(data, dtype = np.float64)
+        sample = cls(int(array[0]))
+        half = (len(array) - 1) // 2
+        sample.keys, sample.values = array[1:1 + half].copy(), array[1 + half:].copy()
+        return sample
+
+class ColumnSketch:
+    """
+    Quantile sketch, distinct-count sketch and sample of one numeric column
+    """
+    def __init__(self, quantiles = None, distinct = None, sample = None):
+        self.quantiles = KLLSketch() if quantiles is None else quantiles
+        self.distinct = HyperLogLog() if distinct is None else distinct
+        self.sample = ReservoirSample() if sample is None else sample
+
+    def update(self, values):
+        """
+        Adds an array of numbers
+        """
+        if len(values) > 0:
+            self.quantiles.update(values)
+            self.distinct.update(values)
+            self.sample.update(values)
+
+    def merge(self, other):
+        """
+        Adds every value summarised by `other`
+        """
+        self.quantiles.merge(other.quantiles)
+        self.distinct.merge(other.distinct)
+        self.sample.merge(other.sample)
+
+    def summary(self, integer = False):
+        """
+        Returns [p50, p95, p99, approximate distinct count, sample of SUMMARY_SAMPLE_SIZE values].
+        Whole quantiles and sampled values are returned as ints if the column is an integer column
+        """
+        values = self.quantiles.quantiles(SUMMARY_QUANTILES)
+        sample = self.sample.sample(SUMMARY_SAMPLE_SIZE)
+        if integer:
+            values = [int(v) if v is not None and v.is_integer() else v for v in values]
+            sample = [int(v) if v.is_integer() else v for v in sample]
+        return values + [self.distinct.count(), sample]
+
+class ColumnSketches(metaclass=ABCMeta):
+    """
+    Optional sketches of every numeric column of every table, stored in the `dsi_column_sketches` table and maintained
+    incrementally next to the column statistics during each ingest, so `summary(approx=True)` reports quantiles,
+    distinct counts and samples without scanning tables. See KLLSketch, HyperLogLog and ReservoirSample for error bounds.
+
+    Each table has one row with a NULL column_name holding the row count and highest rowid its sketches describe,
+    which must match the table like the column statistics do (see `ColumnStats.is_fresh()`). Stale sketches are
+    rebuilt from the table on first use.
+    """
+    def __init__(self, cursor, catalog, column_stats, enabled = False):
+        """
+        `cursor` : database cursor that sees the backend's open transaction
+
+        `catalog` : the backend's schema Catalog
+
+        `column_stats` : the backend's ColumnStats
+
+        `enabled` : bool, optional, default=False
+            If True, sketches are built and maintained. Sketches already stored in the database are always maintained
+        """
+        self.cur = cursor
+        self.catalog = catalog
+        self.column_stats = column_stats
+        self.requested = enabled
+        self.found = None
+
+    @property
+    def enabled(self):
+        """
+        True if sketches were requested or are already stored in the database. The database is only checked on first use
+        """
+        if self.requested:
+            return True
+        if self.found is None:
+            self.found = self.exists()
+        return self.found
+
+    def exists(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if the database already stores sketches
+        """
+        return self.catalog.table(SKETCHES_TABLE) is not None
+
+    @abstractmethod
+    def create(self):
+        """
+        **Internal use only. Do not call**
+        """
+        pass
+
+    def numeric_columns(self, table_info):
+        """
+        **Internal use only. Do not call**
+
+        Returns the columns of a table that are sketched
+        """
+        return [col for col, col_type in zip(table_info.columns, table_info.types) if self.column_stats.is_numeric(col_type)]
+
+    @abstractmethod
+    def number_expression(self, col):
+        """
+        **Internal use only. Do not call**
+
+        Returns SQL selecting the value of `col` as a 64-bit float, or NULL if it is not a number
+        """
+        pass
+
+    def mark(self, table_name):
+        """
+        Returns the mark to pass to `update()` after an ingest into `table_name`, like `ColumnStats.mark()`
+        """
+        if not self.enabled:
+            return None
+        return self.column_stats.mark_state(table_name, self.load_state(table_name))
+
+    def update(self, table_name, mark, values = None):
+        """
+        Merges sketches of the rows of `table_name` added since `mark` was taken into the stored sketches.
+        Rebuilds them when `mark` is None. Runs inside the caller's transaction, after the column statistics were updated
+
+        `values` : dict, optional, default=None
+            The ingested data as column name -> list of values, sketched without reading the rows back when possible
+        """
+        if not self.enabled:
+            return
+        stored = None
+        if mark is NEW_TABLE:
+            stored, mark = OrderedDict(), None
+        elif mark is not None:
+            stored = self.load(table_name)
+            state = self.load_state(table_name)
+            if state is None or not self.column_stats.in_order(table_name, mark, state.num_rows, values):
+                stored = None
+        if stored is None:
+            stored, mark, values = OrderedDict(), None, None
+        sketches = self.compute(table_name, mark, values)
+        for col, sketch in sketches.items():
+            if col in stored:
+                stored[col].merge(sketch)
+                sketches[col] = stored[col]
+        self.store(table_name, self.column_stats.load(table_name), sketches)
+
+    def get(self, table_name):
+        """
+        Returns an OrderedDict of column name -> ColumnSketch for the numeric columns of `table_name`.
+        Stale sketches are rebuilt and stored again (or only rebuilt if the database cannot be written)
+        """
+        table_stats = self.column_stats.get(table_name)
+        state = self.load_state(table_name)
+        if state is not None and (state.num_rows, state.max_rowid) == (table_stats.num_rows, table_stats.max_rowid):
+            sketches = self.load(table_name)
+            if sketches is not None:
+                return sketches
+        sketches = self.compute(table_name)
+        self.column_stats.write(lambda: self.store(table_name, table_stats, sketches))
+        self.found = True
+        return sketches
+
+    def compute(self, table_name, mark = None, values = None):
+        """
+        **Internal use only. Do not call**
+
+        Sketches the numeric columns of the rows of `table_name` whose rowid is greater than `mark` (all rows if None).
+        Columns whose ingested `values` are all numbers are sketched from memory
+        """
+        table_info = self.catalog.table(table_name)
+        sketches = OrderedDict((col, ColumnSketch()) for col in self.numeric_columns(table_info))
+        remaining = list(sketches.keys())
+        if values is not None:
+            by_name = {self.catalog.unquote(col).lower(): v for col, v in values.items()}
+            for col in list(remaining):
+                numbers = self.numbers(by_name.get(col.lower()))
+                if numbers is not None:
+                    sketches[col].update(numbers)
+                    remaining.remove(col)
+        if len(remaining) == 0:
+            return sketches
+
+        where = "" if mark is None else f" WHERE rowid > {int(mark)}"
+        select = ", ".join(self.number_expression(self.quote(col)) for col in remaining)
+        cursor = self.cur.execute(f"SELECT {select} FROM {self.quote(table_info.name)}{where}")
+        while True:
+            rows = cursor.fetchmany(SKETCH_FETCH_SIZE)
+            if len(rows) == 0:
+                break
+            chunk = np.array(rows, dtype = np.float64).reshape(len(rows), len(remaining))
+            for i, col in enumerate(remaining):
+                numbers = chunk[:, i]
+                sketches[col].update(numbers[~np.isnan(numbers)])
+        return sketches
+
+    def numbers(self, values):
+        """
+        **Internal use only. Do not call**
+
+        Returns the non-null values of an ingested list as a float array, or None if it holds anything but numbers
+        """
+        if not isinstance(values, list):
+            return None
+        array = np.array(values)
+        if array.dtype == object:
+            array = np.array([v for v in values if v is not None])
+        if array.dtype.kind not in "bif":
+            return None
+        array = array.astype(np.float64)
+        return array[~np.isnan(array)] # stored as NULL
+
+    def load_state(self, table_name):
+        """
+        **Internal use only. Do not call**
+
+        Returns a TableStats holding only the row count and highest rowid the stored sketches of `table_name` describe
+        """
+        if not self.exists():
+            return None
+        table_info = self.catalog.table(table_name)
+        if table_info is None:
+            return None
+        row = self.cur.execute(f"SELECT num_rows, max_rowid FROM {SKETCHES_TABLE} WHERE table_name = ? AND column_name IS NULL",
+                               [table_info.name]).fetchone()
+        return None if row is None else TableStats(row[0], row[1])
+
+    def load(self, table_name):
+        """
+        **Internal use only. Do not call**
+
+        Returns the stored sketches of `table_name`, or None if they do not cover its current numeric columns
+        """
+        if not self.exists():
+            return None
+        table_info = self.catalog.table(table_name)
+        rows = self.cur.execute(f"""SELECT column_name, quantiles, distinct_values, sample FROM {SKETCHES_TABLE}
+                                    WHERE table_name = ? AND column_name IS NOT NULL""", [table_info.name]).fetchall()
+        stored = {col: ColumnSketch(KLLSketch.from_bytes(q), HyperLogLog.from_bytes(d), ReservoirSample.from_bytes(s))
+                  for col, q, d, s in rows}
+        numeric = self.numeric_columns(table_info)
+        if sorted(stored.keys()) != sorted(numeric):
+            return None
+        return OrderedDict((col, stored[col]) for col in numeric)
+
+    def store(self, table_name, table_stats, sketches):
+        """
+        **Internal use only. Do not call**
+
+        Replaces the stored sketches of `table_name`, recorded as describing the table as of `table_stats`
+        """
+        self.create()
+        name = self.catalog.table(table_name).name
+        self.cur.execute(f"DELETE FROM {SKETCHES_TABLE} WHERE table_name = ?", [name])
+        rows = [(name, None, table_stats.num_rows, table_stats.max_rowid, None, None, None)]
+        for col, sketch in sketches.items():
+            rows.append((name, col, None, None, sketch.quantiles.to_bytes(), sketch.distinct.to_bytes(), sketch.sample.to_bytes()))
+        self.cur.executemany(f"INSERT INTO {SKETCHES_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.column_stats.guard(name, SKETCHES_TABLE)
+
+    def drop(self, table_name):
+        """
+        Deletes the sketches of a table. Runs inside the caller's transaction
+        """
+        if self.exists():
+            self.cur.execute(f"DELETE FROM {SKETCHES_TABLE} WHERE lower(table_name) = lower(?)", [self.catalog.unquote(table_name)])
+
+    def quote(self, name):
+        """
+        **Internal use only. Do not call**
+        """
+        return '"' + name.replace('"', '""') + '"'
+
+class SqliteColumnSketches(ColumnSketches):
+    """
+    Column sketches of a SQLite backend. Only integer and real values are sketched, so text stored in a numeric column is skipped
+    """
+    def create(self):
+        if not self.exists():
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS {SKETCHES_TABLE} (table_name TEXT, column_name TEXT,
+                                 num_rows INTEGER, max_rowid INTEGER, quantiles BLOB, distinct_values BLOB, sample BLOB)""")
+            self.catalog.reload_table(SKETCHES_TABLE)
+
+    def number_expression(self, col):
+        return f"CASE WHEN typeof({col}) IN ('integer', 'real') THEN {col} END"
+
+class DuckDBColumnSketches(ColumnSketches):
+    """
+    Column sketches of a DuckDB backend
+    """
+    def create(self):
+        if not self.exists():
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS {SKETCHES_TABLE} (table_name VARCHAR, column_name VARCHAR,
+                                 num_rows BIGINT, max_rowid BIGINT, quantiles BLOB, distinct_values BLOB, sample BLOB)""")
+            self.catalog.reload_table(SKETCHES_TABLE)
+
+    def number_expression(self, col):
+        return f"CAST({col} AS DOUBLE)"
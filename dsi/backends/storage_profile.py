@@ -0,0 +1,117 @@
+import os
+
+# settings a storage profile can hold. Sizes are in bytes and converted to each engine's own unit
+STORAGE_SETTINGS = {
+    "journal_mode": "SQLite journal mode: DELETE, TRUNCATE, PERSIST, MEMORY, WAL or OFF",
+    "synchronous": "SQLite fsync level: OFF, NORMAL, FULL or EXTRA",
+    "page_size": "SQLite page size in bytes, only applied to a database without tables",
+    "cache_size": "SQLite page cache size in bytes",
+    "mmap_size": "SQLite memory-mapped I/O size in bytes, 0 turns it off",
+    "temp_store": "SQLite storage of temporary tables and indices: DEFAULT, FILE or MEMORY",
+    "wal_autocheckpoint": "Write-ahead log size in bytes after which committed changes are checkpointed into the database file",
+    "threads": "Number of threads a query may use. SQLite only uses them to sort",
+    "memory_limit": "DuckDB memory limit in bytes, beyond which it spills to the temporary directory",
+    "temp_directory": "DuckDB directory for data spilled from memory",
+}
+
+# named sets of storage settings. Settings left out keep the engine's default
+STORAGE_PROFILES = {
+    "default": {},
+    # fewer fsyncs and checkpoints while many large ingests are committed
+    "ingest-heavy": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": 256 * 1024 * 1024,
+        "wal_autocheckpoint": 64 * 1024 * 1024,
+    },
+    # readers that are not blocked by a writer, and large caches and memory maps for repeated scans
+    "read-heavy": {
+        "journal_mode": "WAL",
+        "cache_size": 256 * 1024 * 1024,
+        "mmap_size": 1024 * 1024 * 1024,
+        "threads": os.cpu_count() or 1,
+    },
+    # small caches, temporary data on disk and one thread, for login nodes and small allocations
+    "low-memory": {
+        "cache_size": 2 * 1024 * 1024,
+        "mmap_size": 0,
+        "temp_store": "FILE",
+        "threads": 1,
+        "memory_limit": 256 * 1024 * 1024,
+    },
+}
+
+# SQLite settings stored in the database file rather than the connection, which a read-only connection cannot change
+SQLITE_FILE_SETTINGS = ["journal_mode", "page_size"]
+
+def storage_settings(profile = "default", overrides = None):
+    """
+    Returns the settings of the storage profile named `profile`, updated with the `overrides` dict of setting names and values.
+    Raises a ValueError for an unknown profile or setting
+    """
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"'{profile}' is not a storage profile. Valid profiles are: {', '.join(STORAGE_PROFILES)}")
+    settings = dict(STORAGE_PROFILES[profile])
+    for name, value in (overrides or {}).items():
+        if name not in STORAGE_SETTINGS:
+            raise ValueError(f"'{name}' is not a storage setting. Valid settings are: {', '.join(STORAGE_SETTINGS)}")
+        settings[name] = value
+    return settings
+
+def sqlite_pragmas(settings, read_only = False):
+    """
+    Returns the PRAGMA statements applying `settings` to a SQLite connection, in the order they must run.
+    Settings SQLite does not have are left out, as are settings of the database file if `read_only`
+    """
+    pragmas = []
+    if "page_size" in settings and not read_only:
+        # the page size must be set before WAL mode, which fixes it
+        pragmas.append(f"PRAGMA page_size = {int(settings['page_size'])}")
+    if "journal_mode" in settings and not read_only:
+        pragmas.append(f"PRAGMA journal_mode = {keyword(settings['journal_mode'])}")
+    if "synchronous" in settings:
+        pragmas.append(f"PRAGMA synchronous = {keyword(settings['synchronous'])}")
+    if "cache_size" in settings:
+        # a negative cache size is a number of KiB rather than pages
+        pragmas.append(f"PRAGMA cache_size = -{max(int(settings['cache_size']) // 1024, 1)}")
+    if "mmap_size" in settings:
+        pragmas.append(f"PRAGMA mmap_size = {int(settings['mmap_size'])}")
+    if "temp_store" in settings:
+        pragmas.append(f"PRAGMA temp_store = {keyword(settings['temp_store'])}")
+    if "threads" in settings:
+        pragmas.append(f"PRAGMA threads = {int(settings['threads'])}")
+    return pragmas
+
+def apply_sqlite_settings(con, settings, read_only = False):
+    """
+    Applies `settings` to the SQLite connection `con`
+    """
+    for pragma in sqlite_pragmas(settings, read_only):
+        con.execute(pragma)
+    if "wal_autocheckpoint" in settings:
+        page_size = con.execute("PRAGMA page_size").fetchone()[0]
+        con.execute(f"PRAGMA wal_autocheckpoint = {max(int(settings['wal_autocheckpoint']) // page_size, 1)}")
+
+def duckdb_statements(settings):
+    """
+    Returns the SET statements applying `settings` to a DuckDB database. Settings DuckDB does not have are left out
+    """
+    statements = []
+    if "threads" in settings:
+        statements.append(f"SET threads = {int(settings['threads'])}")
+    if "memory_limit" in settings:
+        statements.append(f"SET memory_limit = '{int(settings['memory_limit'])}B'")
+    if "temp_directory" in settings:
+        statements.append(f"SET temp_directory = '{str(settings['temp_directory']).replace(chr(39), chr(39) * 2)}'")
+    if "wal_autocheckpoint" in settings:
+        statements.append(f"SET checkpoint_threshold = '{int(settings['wal_autocheckpoint'])}B'")
+    return statements
+
+def keyword(value):
+    """
+    Returns a PRAGMA keyword value, rejecting anything that is not a plain word
+    """
+    value = str(value).upper()
+    if not value.isalpha():
+        raise ValueError(f"'{value}' is not a valid storage setting value")
+    return value
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from itertools import chain
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# number of rows fetched from the database at a time while reading a table into columns
+READ_FETCH_SIZE = 5000
+# number of rows in each batch yielded by a streamed query, unless the caller asks for another size
+QUERY_BATCH_ROWS = 10000
+
+def read_columns(cursor, query, columns, arrow = False, fetch_size = READ_FETCH_SIZE):
+    """
+    Runs `query` and returns its rows as an OrderedDict of column name -> list of values, in `columns` order.
+    The string 'NULL' is read as None, as `process_artifacts()` always has.
+
+    Rows are fetched `fetch_size` at a time and moved into the columns chunk by chunk, so apart from the columns
+    only one chunk of row tuples is held in memory.
+
+    `arrow` : bool, optional, default=False
+        If True, each column is returned as a pyarrow.ChunkedArray with one chunk per fetch, so no Python list of the
+        whole column is built. Integer chunks are widened to float where a column mixes both, and a column mixing
+        text with other values, which Arrow cannot hold, is returned as a list instead
+    """
+    data = OrderedDict((col, []) for col in columns)
+    cursor.execute(query)
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if len(rows) == 0:
+            break
+        # each column is kept as tuples of plain values, which the garbage collector stops tracking,
+        # so its collections do not walk every value read so far as they would through one growing list
+        for values, chunks in zip(zip(*rows), data.values()):
+            if "NULL" in values:
+                values = tuple(None if v == "NULL" else v for v in values)
+            chunks.append(values)
+    for col, chunks in data.items():
+        data[col] = arrow_column(chunks) if arrow else list(chain.from_iterable(chunks))
+    return data
+
+def arrow_column(chunks):
+    """
+    **Internal use only. Do not call**
+
+    Converts chunks of Python values of one column into a pyarrow.ChunkedArray, or one list if Arrow cannot hold them
+    """
+    try:
+        arrays = [pa.array(values) for values in chunks]
+        types = {array.type for array in arrays if array.type != pa.null()}
+        if len(types) > 1 and all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+            types = {pa.float64()}
+        if len(types) > 1:
+            raise pa.ArrowInvalid("mixed types")
+        target = types.pop() if len(types) > 0 else pa.null()
+        return pa.chunked_array([array.cast(target) for array in arrays], type = target)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return [v for values in chunks for v in values]
+
+def arrow_columns(table, columns):
+    """
+    Returns an OrderedDict of column name -> pyarrow.ChunkedArray from a pyarrow.Table, named by `columns` in order,
+    with the string 'NULL' read as None like `read_columns()`
+    """
+    data = OrderedDict()
+    for col, array in zip(columns, table.columns):
+        if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+            array = pc.if_else(pc.equal(array, "NULL"), pa.scalar(None, array.type), array)
+        data[col] = array
+    return data
+
+def record_batch(rows, columns):
+    """
+    Returns a list of row tuples as a pyarrow.RecordBatch with fields named by `columns`. Arrow types are inferred
+    from the values of these rows only, and a column mixing text with other values, which Arrow cannot hold, is stored as text
+    """
+    arrays = []
+    for values in zip(*rows) if len(rows) > 0 else ([] for _ in columns):
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if v is None else str(v) for v in values], type = pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, names = list(columns))
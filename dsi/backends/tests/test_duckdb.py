@@ -1,7 +1,13 @@
 from collections import OrderedDict
 
 from dsi.backends.duckdb import DuckDB
+from dsi.backends.cancellation import QueryCancelled
+from dsi.backends.federation import DuckDBFederation
 import os
+import threading
+import time
+import pandas as pd
+from datetime import datetime
 
 def test_duckdb_artifact():
     dbpath = "wildfire.db"
@@ -21,6 +27,19 @@ def test_artifact_ingest():
     # No error implies success
     assert True
 
+def test_artifact_ingest_rollback():
+    dbpath = 'test_artifact.duckdb'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3]})}))
+    # the failing table comes after one that was already created and filled in the same transaction
+    error = store.ingest_artifacts(OrderedDict({"fire": OrderedDict({'bar':[1]}), "wildfire": OrderedDict({'FOO':[4]})}))
+    assert error == (ValueError, "Cannot have duplicate column names")
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4]})}))
+    assert store.catalog.tables() == ["wildfire"]
+    store.close()
+
 def test_artifact_query():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})})
     dbpath = 'test_artifact.db'
@@ -33,6 +52,47 @@ def test_artifact_query():
     correct_output = [[1, 3], [2, 2], [3, 1]]
     assert query_data.values.tolist() == correct_output
 
+def test_artifact_query_iter():
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3,4,5],'bar':[5,4,3,2,1]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+    frames = list(store.query_iter("SELECT * FROM wildfire WHERE foo > 1 ORDER BY foo;", batch_rows = 3))
+    batches = list(store.query_iter("SELECT foo FROM wildfire ORDER BY foo;", batch_rows = 2, arrow = True))
+    empty = list(store.query_iter("SELECT * FROM wildfire WHERE foo > 5;"))
+    error = store.query_iter("DELETE FROM wildfire;")
+    store.close()
+    assert [len(frame) for frame in frames] == [3, 1]
+    assert pd.concat(frames).values.tolist() == [[2, 4], [3, 3], [4, 2], [5, 1]]
+    assert [batch.num_rows for batch in batches] == [2, 2, 1]
+    assert [v for batch in batches for v in batch.column(0).to_pylist()] == [1, 2, 3, 4, 5]
+    assert empty == []
+    assert error[0] == RuntimeError
+
+def test_query_cache():
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+    first = store.query_artifacts("SELECT * FROM wildfire")
+    first["bar"] = 0
+    assert store.query_artifacts("SELECT *  FROM wildfire;").values.tolist() == [[1, 3], [2, 2], [3, 1]]
+    assert [r.row_num for r in store.find_relation("foo", "> 1")] == [2, 3]
+    assert [r.row_num for r in store.find_relation("foo", "> 1")] == [2, 3]
+    assert (store.cache_stats()["hits"], store.cache_stats()["misses"]) == (2, 2)
+
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4],'bar':[0]})}))
+    assert store.get_table("wildfire").values.tolist() == [[1, 3], [2, 2], [3, 1], [4, 0]]
+    assert [r.row_num for r in store.find_relation("foo", "> 1")] == [2, 3, 4]
+    store.con.cursor().execute("UPDATE wildfire SET bar = 0 WHERE foo = 1")
+    assert store.get_table("wildfire").values.tolist() == [[1, 0], [2, 2], [3, 1], [4, 0]]
+    assert store.cache_stats()["hits"] == 2
+    store.close()
+
 def test_artifact_get_table():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})})
     dbpath = 'test_artifact.db'
@@ -57,6 +117,68 @@ def test_artifact_process():
     store.close()
     assert artifact == valid_middleware_datastructure
 
+def test_artifact_process_tables():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["a","NULL",None]}),
+                                        "fire": OrderedDict({'baz':[1.5]})}))
+    artifact = store.process_artifacts(table_names=["Wildfire", "missing"])
+    assert artifact == OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["a",None,None]})})
+
+    arrow_artifact = store.process_artifacts(table_names="fire", arrow=True)
+    assert list(arrow_artifact.keys()) == ["fire"]
+    assert arrow_artifact["fire"]["baz"].to_pylist() == [1.5]
+    assert store.process_artifacts(arrow=True)["wildfire"]["bar"].to_pylist() == ["a", None, None]
+    store.close()
+
+def test_update_table():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3,4],'bar':["a","b","c","d"]}),
+                                        "fire": OrderedDict({'id':[1,2,3],'baz':[1.5,2.5,3.5]}),
+                                        "dsi_relations": OrderedDict({"primary_key": [("fire", "id")], "foreign_key": [(None, None)]})}))
+    store.cur.execute("DELETE FROM wildfire WHERE foo = 1")
+    # rows at positions 2 and 3 are edited, the third row is appended and the new column added
+    edited = pd.DataFrame({'foo': [30, 4, 5], 'bar': ["c", "d", "e"], 'qux': [1.5, None, 2.5]})
+    assert store.update_table("wildfire", edited, [2, 3]) is None
+    assert store.cur.execute("SELECT * FROM wildfire ORDER BY rowid").fetchall() == \
+        [(2, "b", None), (30, "c", 1.5), (4, "d", None), (5, "e", 2.5)]
+    assert store.update_table("wildfire", pd.DataFrame({'foo': [1]}), [5]) == \
+        (ValueError, "'dsi_row_index' was modified. When adding new rows, values for 'dsi_row_index' must be empty.")
+
+    # matched by position: the first two rows are kept and the rest deleted
+    store.overwrite_table("wildfire", pd.DataFrame({'foo': [2, 30], 'bar': ["b", "z"], 'qux': [None, 1.5]}))
+    assert store.cur.execute("SELECT * FROM wildfire ORDER BY rowid").fetchall() == [(2, "b", None), (30, "z", 1.5)]
+
+    # matched by primary key, so stored rows keep their order
+    store.overwrite_table("fire", pd.DataFrame({'id': [3, 1, 4], 'baz': [3.5, 9.5, 4.5]}))
+    assert store.cur.execute("SELECT * FROM fire ORDER BY rowid").fetchall() == [(1, 9.5), (3, 3.5), (4, 4.5)]
+    assert store.catalog.table("fire").pk == [1, 0]
+    store.close()
+
+def test_overwrite_table_keys():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({"parent": OrderedDict({'id':[1.5,2.5,3.5],'v':[1,2,3]}),
+                                        "child": OrderedDict({'pid':[1.5,3.5],'w':[10,30]}),
+                                        "dsi_relations": OrderedDict({"primary_key": [("parent", "id"), ("parent", "id")],
+                                                                      "foreign_key": [(None, None), ("child", "pid")]})}))
+    assert store.overwrite_table("parent", pd.DataFrame({'id': [1.5, 1.5, 3.5], 'v': [1, 2, 3]})) == \
+        (ValueError, "parent's primary key column, id, must have unique data")
+    assert store.overwrite_table("parent", pd.DataFrame({'id': [1.5, "b", 3.5], 'v': [1, 2, 3]})) == \
+        (TypeError, "There are mismatched data types in parent's primary key column, id. Cannot update.")
+    assert store.overwrite_table("parent", pd.DataFrame({'id': [1.5, 2.5, 4.5], 'v': [1, 2, 3]})) == \
+        (TypeError, "Data in 'pid', the foreign key of 'child', must match 'id', the primary key of 'parent'. " +
+                    "Please ensure that all rows in 'child' are updated")
+    assert store.cur.execute("SELECT * FROM parent ORDER BY rowid").fetchall() == [(1.5, 1), (2.5, 2), (3.5, 3)]
+    store.close()
+
 def test_find():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f",2,1]})})
     dbpath = 'test_artifact.db'
@@ -127,6 +249,30 @@ def test_find_range():
     assert range_data[0].type == 'range'
     store.close()
 
+def test_find_lazy():
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[5,None,-1],'baz':["a","b","c"]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+
+    table_data = store.find_table("fire", limit = 2)[0].value
+    assert len(table_data) == 2
+    assert table_data == [(1, 5, "a"), (2, None, "b")]
+    assert table_data[-1] == (2, None, "b")
+    assert list(store.find_table("fire")[0].value)[2] == (3, -1, "c")
+
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4],'bar':[7],'baz':["d"]})}))
+    col_data = store.find_column("ba")
+    assert col_data[0].value[1:] == [None, -1, 7]
+    assert len(col_data[1].value) == 4
+
+    # missing values count as 0 and text columns have no range
+    range_data = store.find_column("ba", range = True)
+    assert [(r.c_name, r.value) for r in range_data] == [(['bar'], [-1, 7])]
+    store.close()
+
 def test_find_cell():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f",2,1]})})
     dbpath = 'test_artifact.db'
@@ -159,6 +305,25 @@ def test_find_row():
     assert row_data[0].type == 'row'
     store.close()
 
+def test_find_cell_typed():
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,12,2],'bar':[2.0,0.5,2.5],'baz':["home 2","it's",None]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+
+    # numbers are compared numerically in numeric columns and matched as text elsewhere
+    cell_data = store.find_cell(2)
+    assert [(c.row_num, c.c_name[0], c.value) for c in cell_data] == [(1, 'bar', 2.0), (1, 'baz', "home 2"), (3, 'foo', 2)]
+    assert store.find_cell(2.5)[0].row_num == 3
+    assert store.find_cell(0.25) == "0.25 is not a cell in this database"
+
+    # one row per match, even if several cells of the row match
+    assert [r.row_num for r in store.find_cell("2", row = True)] == [1, 2, 3]
+    assert store.find_cell("it's")[0].c_name == ['baz']
+    store.close()
+
 def test_find_relation():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f",2,1]})})
     dbpath = 'test_artifact.db'
@@ -251,4 +416,488 @@ def test_find_relation():
     assert row_data[0].row_num == 1
     assert row_data[0].type == 'relation'
 
-    store.close()
\ No newline at end of file
+    store.close()
+def test_text_index():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath, text_index=True)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["fire_a","Fire_b","xyz"]})}))
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4],'bar':["wildfire"]})}))
+    assert store.list() == [('wildfire', 2, 4)]
+
+    cell_data = store.find_cell("fire", row = True)
+    assert [c.row_num for c in cell_data] == [1, 2, 4]
+    assert store.find_cell("zzz") == "zzz is not a cell in this database"
+    assert [r.row_num for r in store.find_relation("bar", "~ 'ire_'")] == [1, 2]
+    assert store.text_index.stats()["tables"] == 1
+
+    # rows deleted outside of DSI leave the index stale, so the table is scanned until its next ingest
+    store.cur.execute("DELETE FROM wildfire WHERE foo = 1")
+    assert [c.row_num for c in store.find_cell("fire", row = True)] == [1, 3]
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[5],'bar':["fire_c"]})}))
+    assert [c.row_num for c in store.find_cell("fire", row = True)] == [1, 3, 4]
+    store.close()
+
+def test_summary(monkeypatch):
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,None],'bar':["f","g","h"],'baz':[0.5,0.5,0.5]}),
+                                                  "fire": OrderedDict({'a':[3]}), "smoke": OrderedDict({'b':[None]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+
+    summary = store.summary()
+    assert summary[0] == ["fire", "smoke", "wildfire"]
+    assert summary[3].values.tolist() == [['foo', 'INTEGER', 1, 2, 1.5, 0.7071067811865476], ['bar', 'VARCHAR', None, None, None, None],
+                                          ['baz', 'DOUBLE', 0.5, 0.5, 0.5, 0.0]]
+    assert summary[1].values.tolist() == [['a', 'INTEGER', 3, 3, 3.0, 0]]
+    assert summary[2].values.tolist() == [['b', 'INTEGER', None, None, None, None]]
+
+    # tables summarised concurrently come back in the same order with the same values
+    monkeypatch.setattr("dsi.backends.duckdb.os.cpu_count", lambda: 2)
+    assert all(a.equals(b) for a, b in zip(store.summary()[1:], summary[1:]))
+    store.close()
+
+def test_column_stats(monkeypatch):
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,None],'bar':["f","g","h"]}), "fire": OrderedDict({'a':[3]})}))
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[6],'bar':["i"],'baz':[0.5]})}))
+
+    # the second ingest was merged into the stored statistics, and the column it added counts earlier rows as nulls
+    assert "dsi_column_stats" not in store.catalog.tables()
+    assert store.list() == [("fire", 1, 1), ("wildfire", 3, 4)]
+    moments = store.column_stats.load("wildfire").columns
+    assert (moments["foo"].count, moments["foo"].nulls, moments["foo"].mean, moments["foo"].m2) == (3, 1, 3.0, 14.0)
+    assert (moments["bar"].min, moments["bar"].max) == ("f", "i")
+    assert (moments["baz"].count, moments["baz"].nulls) == (1, 3)
+    assert store.summary("wildfire").values.tolist() == [['foo', 'INTEGER', 1, 6, 3.0, 2.6457513110645907], ['bar', 'VARCHAR', None, None, None, None],
+                                                         ['baz', 'DOUBLE', 0.5, 0.5, 0.5, 0]]
+
+    # rows written outside DSI make the statistics stale, so they are rebuilt on use
+    store.cur.execute("INSERT INTO wildfire (foo) VALUES (11)")
+    assert store.display("wildfire").attrs["max_rows"] == 5
+    assert store.summary("wildfire").values.tolist()[0] == ['foo', 'INTEGER', 1, 11, 5.0, 4.546060565661952]
+
+    # missing statistics are rebuilt by concurrent workers with the same values
+    summary = store.summary()
+    store.cur.execute("DELETE FROM dsi_column_stats")
+    monkeypatch.setattr("dsi.backends.duckdb.os.cpu_count", lambda: 2)
+    assert all(a.equals(b) for a, b in zip(store.summary()[1:], summary[1:]))
+
+    store.overwrite_table("wildfire", pd.DataFrame({'foo':[7, 9]}))
+    assert store.list() == [("fire", 1, 1), ("wildfire", 1, 2)]
+    assert store.summary("wildfire").values.tolist() == [['foo', 'INTEGER', 7, 9, 8.0, 1.4142135623730951]]
+    store.close()
+
+def test_summary_approx():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath, sketches=True)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':list(range(1, 501)),'bar':["f"] * 500})}))
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':list(range(501, 1001)),'bar':["g"] * 500})}))
+
+    # sketches of the second ingest were merged into the stored ones
+    assert "dsi_column_sketches" not in store.catalog.tables()
+    assert store.cur.execute("SELECT num_rows FROM dsi_column_sketches WHERE column_name IS NULL").fetchall() == [(1000,)]
+    summary = store.summary("wildfire", approx=True)
+    assert summary.columns.tolist() == ['column', 'type', 'min', 'max', 'avg', 'std_dev', 'p50', 'p95', 'p99', 'approx_distinct', 'sample']
+    column, _, _, _, _, _, p50, p95, p99, distinct, sample = summary.values.tolist()[0]
+    assert column == "foo" and abs(p50 - 500) <= 17 and abs(p95 - 950) <= 17 and abs(p99 - 990) <= 17
+    assert abs(distinct - 1000) <= 33
+    assert len(sample) == 5 and all(isinstance(v, int) and 1 <= v <= 1000 for v in sample)
+    assert summary.values.tolist()[1][6:] == [None] * 5
+
+    # rows written outside DSI make the sketches stale, so they are rebuilt on use
+    store.cur.execute("INSERT INTO wildfire (foo) VALUES (5000)")
+    assert store.summary(approx=True)[1].values.tolist()[0][3] == 5000
+    assert store.cur.execute("SELECT num_rows FROM dsi_column_sketches WHERE column_name IS NULL").fetchall() == [(1001,)]
+    store.close()
+
+def test_read_pool():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    writer = DuckDB(dbpath, read_pool=True)
+    writer.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f","g","h"]})}))
+    reader = DuckDB(dbpath, read_pool=True)
+    assert reader.con is writer.con
+
+    # other threads read committed rows on their own cursors while the writer ingests
+    counts, errors = [], []
+    def read():
+        try:
+            for _ in range(10):
+                counts.append(len(reader.query_artifacts("SELECT * FROM wildfire")))
+                assert [r.row_num for r in reader.find_cell("g")] == [2]
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(5):
+        writer.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[i],'bar':["i"]})}))
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(counts) == 40 and all(3 <= c <= 8 for c in counts)
+    reader.close()
+    assert len(writer.query_artifacts("SELECT * FROM wildfire")) == 8
+    writer.close()
+
+def test_in_memory():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(":memory:", persist_to=dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f","g","h"]})}))
+    assert not os.path.exists(dbpath)
+    store.close()
+
+    # the saved file is loaded into memory, and later writes are saved once the interval passed
+    store = DuckDB(":memory:", persist_to=dbpath, persist_interval=0)
+    assert store.get_table("wildfire").values.tolist() == [[1, "f"], [2, "g"], [3, "h"]]
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4],'bar':["i"]})}))
+    saved = DuckDB(dbpath)
+    assert len(saved.get_table("wildfire")) == 4
+    saved.close()
+    store.close()
+
+    store = DuckDB(":memory:")
+    store.ingest_artifacts(OrderedDict({"fire": OrderedDict({'a':[5]})}))
+    assert store.persist()[0] == ValueError
+    store.persist(dbpath)
+    store.close()
+    saved = DuckDB(dbpath)
+    assert saved.get_table("fire").values.tolist() == [[5]]
+    assert saved.persist()[0] == ValueError
+    saved.close()
+
+def test_backup():
+    dbpath = 'test_artifact.db'
+    backups = ['test_artifact.backup.db', 'test_artifact.backup.1.db']
+    for path in [dbpath] + backups:
+        if os.path.exists(path):
+            os.remove(path)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3]})}))
+    assert store.backup(backups[0], 2) == True
+    # an unchanged database is not copied again
+    assert store.backup(backups[0], 2) == False
+    assert not os.path.exists(backups[1])
+
+    # older backups rotate and only the newest two are kept
+    for value in [4, 5]:
+        store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[value]})}))
+        assert store.backup(backups[0], 2) == True
+    store.close()
+    assert not os.path.exists('test_artifact.backup.2.db')
+    for path, num_rows in zip(backups, [5, 4]):
+        backup = DuckDB(path)
+        assert len(backup.get_table("wildfire")) == num_rows
+        backup.close()
+        os.remove(path)
+
+def test_storage_profile():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath, profile="low-memory", storage_options={"wal_autocheckpoint": 32 * 1024 * 1024})
+    settings = store.cur.execute("SELECT current_setting('threads'), current_setting('memory_limit'), current_setting('checkpoint_threshold')").fetchone()
+    assert settings == (1, "256.0 MiB", "32.0 MiB")
+    store.close()
+
+    try:
+        DuckDB(dbpath, profile="fast")
+        assert False
+    except ValueError:
+        pass
+
+def test_indexes():
+    dbpath = 'test_artifact.duckdb'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.runTable = True
+    store.ingest_artifacts(OrderedDict({"parent": OrderedDict({'id':[1,2,3],'v':[1,2,3]}),
+                                        "child": OrderedDict({'pid':[1,3],'w':[10,30]}),
+                                        "dsi_relations": OrderedDict({"primary_key": [("parent", "id"), ("parent", "id")],
+                                                                      "foreign_key": [(None, None), ("child", "pid")]})}))
+    indexed = {(table, column) for _, table, column in store.indexes.indexes()}
+    assert indexed == {("child", "pid"), ("child", "run_id"), ("parent", "run_id")}
+
+    for value in [15, 16, 17]:
+        store.find_relation("w", f">{value}")
+    store.query_artifacts("SELECT * FROM parent WHERE v = 2 AND id > 0")
+    assert store.index_advice() == [("child", "w", 3)]
+    assert store.create_index("child", "w") == "dsi_index_child_w"
+    assert store.index_advice() == []
+
+    assert store.drop_index("child", "w") is None
+    assert store.drop_index("child", "w")[0] == ValueError
+    assert store.create_index("child", "missing")[0] == ValueError
+    store.close()
+
+    store = DuckDB(dbpath, auto_index=True)
+    for value in [1, 2, 3]:
+        store.find_relation("v", f"={value}")
+    assert store.indexes.indexed("parent", "v")
+    store.close()
+
+def test_query_log():
+    dbpath = 'test_artifact.duckdb'
+    logpath = 'test_query_log.jsonl'
+    for path in [dbpath, logpath]:
+        if os.path.exists(path):
+            os.remove(path)
+    store = DuckDB(dbpath, query_log=logpath, slow_query_ms=0)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["a","b","c"]})}))
+    store.query_artifacts("SELECT * FROM wildfire WHERE foo > 1")
+    store.find_cell("b")
+    store.find_relation("foo", "=3")
+    entries = store.query_log.entries()
+    assert [(entry["origin"], entry["rows"]) for entry in entries] == [("query_artifacts", 2), ("find_cell", 1), ("find_relation", 1)]
+    assert "SCAN" in entries[0]["plan"]
+    assert len(store.slow_queries(limit=2)) == 2
+    store.close()
+
+    store = DuckDB(dbpath, query_log=logpath, slow_query_ms=60000)
+    store.query_artifacts("SELECT * FROM wildfire")
+    assert store.query_log.entries()[-1]["plan"] is None
+    assert store.slow_queries() == []
+    store.close()
+    os.remove(logpath)
+
+def test_maintenance():
+    dbpath = 'test_artifact.duckdb'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})}))
+    assert not store.maintenance.after_ingest(3, max_rows=5, max_bytes=None)
+    assert store.maintenance.after_ingest(3, max_rows=5, max_bytes=None)
+    store.maintenance.wait()
+    assert [(entry["task"], entry["error"]) for entry in store.maintenance.history] == [("analyze", None), ("checkpoint", None)]
+    assert store.query_artifacts("SELECT * FROM wildfire")["foo"].tolist() == [1, 2, 3]
+    store.close()
+
+    store = DuckDB(":memory:")
+    assert not store.maintenance.after_ingest(10, max_rows=1)
+    store.close()
+
+def test_ingest_after_external_drop():
+    dbpath = 'test_artifact.duckdb'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2]})}))
+    # the cached type of foo no longer applies once the table is gone
+    store.cur.execute("DROP TABLE wildfire")
+    assert store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':["a","b"]})})) is None
+    assert store.catalog.table("wildfire").types == ["VARCHAR"]
+    assert store.query_artifacts("SELECT * FROM wildfire")["foo"].tolist() == ["a", "b"]
+    store.close()
+
+def test_timeout():
+    dbpath = 'test_artifact.duckdb'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})}))
+    endless = "SELECT count(*) FROM range(1000000000000) AS a(x) WHERE x % 7 = 3"
+    error = store.query_artifacts(endless, timeout=0.2)
+    assert error[0] == QueryCancelled
+    assert "timeout of 0.2 seconds" in error[1]
+    assert store.query_artifacts("SELECT * FROM wildfire")["foo"].tolist() == [1, 2, 3]
+
+    timer = threading.Timer(0.2, store.cancel)
+    timer.start()
+    error = store.query_artifacts(endless)
+    timer.join()
+    assert error == (QueryCancelled, "Error in query_artifacts: The statement was cancelled")
+    assert not store.cancel()
+
+    # cancel() stops the query right away even while a longer timeout is waiting
+    timer = threading.Timer(0.2, store.cancel)
+    timer.start()
+    start = time.monotonic()
+    error = store.query_artifacts(endless, timeout=30)
+    timer.join()
+    assert error == (QueryCancelled, "Error in query_artifacts: The statement was cancelled")
+    assert time.monotonic() - start < 5
+
+    try:
+        with store.time_limit(0.2):
+            store.cur.execute(endless).fetchall()
+        assert False
+    except QueryCancelled:
+        pass
+    assert store.find_relation("foo", "=2")[0].value == [2, 2]
+    store.close()
+
+def test_timeout_between_statements():
+    dbpath = 'test_artifact.duckdb'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = DuckDB(dbpath)
+    store.ingest_artifacts(OrderedDict({f"wildfire{i}": OrderedDict({'foo':[1,2,3],'bar':['a','b','c']}) for i in range(3)}))
+    for i in range(3):
+        store.cur.execute(f"INSERT INTO wildfire{i} SELECT range, CAST(range AS VARCHAR) FROM range(2000000)")
+
+    # the deadline passes before find() runs any statement, so each of its statements must be interrupted
+    for timeout in (1e-5, 0.01):
+        try:
+            with store.time_limit(timeout):
+                time.sleep(0.05)
+                store.find("1234")
+            assert False
+        except QueryCancelled:
+            pass
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM wildfire0")["n"].tolist() == [2000003]
+    store.close()
+
+def test_federation():
+    dbpaths = [f"test_federation_{i}.duckdb" for i in range(3)]
+    for i, dbpath in enumerate(dbpaths):
+        if os.path.exists(dbpath):
+            os.remove(dbpath)
+        store = DuckDB(dbpath)
+        data = OrderedDict({'foo':[i, i + 1],'bar':['a', 'b']})
+        if i == 2:
+            data['baz'] = [1.5, 2.5]
+        store.ingest_artifacts(OrderedDict({"wildfire": data, f"only{i}": OrderedDict({'x':[i]})}))
+        store.close()
+
+    fed = DuckDBFederation(dbpaths)
+    assert len(fed.tables()) == 4
+    assert fed.table("wildfire").columns == ["dsi_source", "foo", "bar", "baz"]
+    totals = fed.query_artifacts("SELECT dsi_source, SUM(foo) AS s FROM wildfire GROUP BY dsi_source ORDER BY dsi_source")
+    assert totals["dsi_source"].tolist() == dbpaths
+    assert totals["s"].tolist() == [1, 3, 5]
+    assert dict((t, rows) for t, _, rows in fed.list())["wildfire"] == 6
+
+    rows = fed.find_relation("baz", "> '2'")
+    assert [row.value for row in rows] == [[dbpaths[2], 3, 'b', 2.5]]
+    assert [row.row_num for row in fed.find_relation("foo", "BETWEEN '1' AND '2'")] == [2, 3, 4, 5]
+    assert [match.row_num for match in fed.find_cell("b")] == [2, 4, 6]
+    assert isinstance(fed.find_cell("test_federation"), str)
+
+    summary = fed.summary("wildfire")
+    assert summary["column"].tolist() == ["dsi_source", "foo", "bar", "baz"]
+    assert summary["min"].tolist()[1] == 0 and summary["max"].tolist()[1] == 3
+    fed.close()
+    for dbpath in dbpaths:
+        os.remove(dbpath)
+
+def test_federation_row_numbers():
+    dbpaths = [f"test_federation_{i}.duckdb" for i in range(3)]
+    for i, dbpath in enumerate(dbpaths):
+        if os.path.exists(dbpath):
+            os.remove(dbpath)
+        store = DuckDB(dbpath)
+        store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[i * 300000]})}))
+        store.cur.execute(f"INSERT INTO wildfire SELECT range FROM range({i * 300000 + 1}, {(i + 1) * 300000})")
+        store.close()
+
+    # rows are numbered file by file in rowid order, even when DuckDB is free to return them out of order
+    fed = DuckDBFederation(dbpaths)
+    fed.cur.execute("SET preserve_insertion_order = false")
+    fed.cur.execute("SET threads = 4")
+    for _ in range(3):
+        assert [row.row_num for row in fed.find_relation("foo", "IN (5, 300005, 899999)")] == [6, 300006, 900000]
+        assert [match.row_num for match in fed.find_cell(600007)] == [600008]
+    fed.close()
+    for dbpath in dbpaths:
+        os.remove(dbpath)
+
+def test_merge(monkeypatch):
+    dbpaths = [f"test_merge_{i}.duckdb" for i in range(3)] + ["test_merge_units.duckdb", "test_merge_target.duckdb"]
+    for dbpath in dbpaths:
+        if os.path.exists(dbpath):
+            os.remove(dbpath)
+    units = OrderedDict({"table_name": ["wildfire"], "column_name": ["foo"], "unit": ["m"]})
+    DuckDB.runTable = True
+    for i, dbpath in enumerate(dbpaths[:3]):
+        run_start = datetime(2026, 1, i + 1)
+        monkeypatch.setattr("dsi.backends.duckdb.datetime", type("RunClock", (), {"now": staticmethod(lambda: run_start)}))
+        store = DuckDB(dbpath)
+        data = OrderedDict({'foo':[i, i + 1],'bar':['a', 'b']})
+        if i == 2:
+            data['baz'] = [1.5, 2.5]
+        store.ingest_artifacts(OrderedDict({"wildfire": data, "dsi_units": units}))
+        store.close()
+    DuckDB.runTable = False
+    store = DuckDB(dbpaths[3])
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[9]}),
+                                        "dsi_units": OrderedDict({"table_name": ["wildfire"], "column_name": ["foo"], "unit": ["s"]})}))
+    store.close()
+
+    store = DuckDB(dbpaths[4])
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[100],'bar':['z']})}))
+    assert store.merge_artifacts(dbpaths[:3], batch_size = 2) == OrderedDict({"wildfire": 6})
+    assert store.catalog.table("wildfire").columns == ["foo", "bar", "run_id", "baz"]
+    runs = store.query_artifacts("SELECT run_id, run_timestamp FROM runTable ORDER BY run_id")
+    assert runs["run_id"].tolist() == [1, 2, 3]
+    merged = store.query_artifacts("SELECT foo, run_id, baz FROM wildfire ORDER BY foo, run_id")
+    assert merged["run_id"].tolist()[:6] == [1, 1, 2, 2, 3, 3]
+    assert merged["baz"].tolist()[4:6] == [1.5, 2.5]
+    assert store.query_artifacts("SELECT unit FROM dsi_units")["unit"].tolist() == ["m"]
+
+    # merging the same runs again maps them to the stored run_ids
+    store.merge_artifacts(dbpaths[:1])
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM runTable")["n"].tolist() == [3]
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM wildfire WHERE run_id = 1")["n"].tolist() == [4]
+
+    error = store.merge_artifacts([dbpaths[3]])
+    assert error[0] == TypeError
+    assert "different units for the column foo in wildfire" in error[1]
+    assert store.merge_artifacts([dbpaths[4]])[0] == ValueError
+    assert store.find_relation("foo", "=100")[0].value[:2] == [100, 'z']
+    store.close()
+    for dbpath in dbpaths:
+        os.remove(dbpath)
+
+def test_merge_same_second(monkeypatch):
+    dbpaths = [f"test_merge_{i}.duckdb" for i in range(3)] + ["test_merge_target.duckdb", "test_merge_runs.duckdb"]
+    for dbpath in dbpaths:
+        if os.path.exists(dbpath):
+            os.remove(dbpath)
+    # every shard, and the run of the last database, is written in the same second
+    monkeypatch.setattr("dsi.backends.duckdb.datetime", type("RunClock", (), {"now": staticmethod(lambda: datetime(2026, 1, 1))}))
+    DuckDB.runTable = True
+    for i, dbpath in enumerate(dbpaths[:3]):
+        store = DuckDB(dbpath)
+        store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[i, i]})}))
+        store.close()
+    store = DuckDB(dbpaths[4])
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[9]})}))
+    DuckDB.runTable = False
+
+    # the runTable of an ingest allows only one run per run_timestamp, and DuckDB cannot drop that constraint
+    error = store.merge_artifacts(dbpaths[:3])
+    assert error[0] == ValueError
+    assert "only one run per run_timestamp" in error[1]
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM wildfire")["n"].tolist() == [1]
+    store.close()
+
+    store = DuckDB(dbpaths[3])
+    assert store.merge_artifacts(dbpaths[:3]) == OrderedDict({"wildfire": 6})
+    runs = store.query_artifacts("SELECT run_id, run_timestamp FROM runTable ORDER BY run_id")
+    assert runs["run_id"].tolist() == [1, 2, 3]
+    assert set(runs["run_timestamp"].tolist()) == {"2026-01-01 00:00:00"}
+    merged = store.query_artifacts("SELECT foo, run_id FROM wildfire ORDER BY foo, run_id")
+    assert merged["foo"].tolist() == [0, 0, 1, 1, 2, 2]
+    assert merged["run_id"].tolist() == [1, 1, 2, 2, 3, 3]
+    assert sorted(store.list()) == [("runTable", 2, 3), ("wildfire", 2, 6)]
+
+    # a file merged again keeps the run_id of its run
+    store.merge_artifacts(dbpaths[1:2])
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM runTable")["n"].tolist() == [3]
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM wildfire WHERE run_id = 2")["n"].tolist() == [4]
+    store.close()
+    for dbpath in dbpaths:
+        os.remove(dbpath)
@@ -0,0 +1,27 @@
+import pandas as pd
+
+from dsi.backends.query_cache import QueryCache, query_key, result_size
+
+def test_query_cache_lru():
+    frame = pd.DataFrame({"a": range(100)})
+    cache = QueryCache(max_bytes = 3 * result_size(frame))
+    for i in range(4):
+        cache.put(("query", i), 1, frame)
+    assert cache.get(("query", 0), 1) is None
+    assert cache.get(("query", 1), 1).equals(frame)
+    cache.put(("query", 4), 1, frame)
+    assert cache.get(("query", 2), 1) is None
+    assert cache.get(("query", 1), 2) is None
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 2
+
+    cached = cache.get(("query", 3), 1)
+    cached["a"] = 0
+    assert cache.get(("query", 3), 1).equals(frame)
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (3, 3)
+
+def test_query_key():
+    assert query_key("SELECT *\n  FROM t  WHERE b = 'x  y';") == query_key("SELECT * FROM t WHERE b = 'x  y'")
+    assert query_key("SELECT * FROM t WHERE b = 'x y'") != query_key("SELECT * FROM t WHERE b = 'x  y'")
+    assert query_key("SELECT random() FROM t") is None
+    assert query_key("SELECT * FROM t WHERE b = 'random()'") is not None
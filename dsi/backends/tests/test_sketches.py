@@ -0,0 +1,48 @@
+import numpy as np
+
+from dsi.backends.sketches import KLLSketch, HyperLogLog, ReservoirSample
+
+def test_kll_quantiles():
+    values = np.random.default_rng(0).lognormal(size=100000)
+    whole, merged = KLLSketch(), KLLSketch()
+    for chunk in np.array_split(values, 10):
+        whole.update(chunk)
+        part = KLLSketch()
+        part.update(chunk)
+        merged.merge(part)
+    ordered = np.sort(values)
+    for sketch in (whole, KLLSketch.from_bytes(merged.to_bytes())):
+        assert sketch.n == len(values)
+        for q, value in zip((0.01, 0.5, 0.95, 0.99), sketch.quantiles((0.01, 0.5, 0.95, 0.99))):
+            assert abs(np.searchsorted(ordered, value, side="right") / len(values) - q) < 0.0165
+
+    small = KLLSketch()
+    small.update([3, 1, 2])
+    assert small.quantiles((0, 0.5, 1)) == [1.0, 2.0, 3.0]
+    assert KLLSketch().quantiles((0.5,)) == [None]
+
+def test_hyperloglog_count():
+    values = np.random.default_rng(0).permutation(100000)
+    sketch, other = HyperLogLog(), HyperLogLog()
+    sketch.update(values[:60000])
+    other.update(values[40000:])
+    sketch.merge(other)
+    assert abs(HyperLogLog.from_bytes(sketch.to_bytes()).count() / 100000 - 1) < 0.033
+
+    small = HyperLogLog()
+    small.update([1, 1.0, 2, 3, 0.0, -0.0])
+    assert small.count() == 4
+
+def test_reservoir_sample():
+    sample, other = ReservoirSample(100), ReservoirSample(100)
+    sample.update(np.arange(1000))
+    other.update(np.arange(1000, 2000))
+    sample.merge(other)
+    values = ReservoirSample.from_bytes(sample.to_bytes()).sample()
+    assert len(values) == len(set(values)) == 100
+    assert all(0 <= v < 2000 for v in values)
+    assert 0 < sum(v >= 1000 for v in values) < 100
+
+    small = ReservoirSample(100)
+    small.update([5, 6])
+    assert sorted(small.sample()) == [5.0, 6.0]
@@ -1,7 +1,15 @@
 from collections import OrderedDict
 
 from dsi.backends.sqlite import Sqlite
+from dsi.backends.cancellation import QueryCancelled
+from dsi.backends.federation import SqliteFederation
 import os
+import math
+import sqlite3
+import threading
+import time
+import pandas as pd
+from datetime import datetime
 
 def test_sql_artifact():
     dbpath = "wildfire.db"
@@ -21,6 +29,38 @@ def test_artifact_ingest():
     # No error implies success
     assert True
 
+def test_artifact_ingest_units():
+    units = OrderedDict({'table_name': ['wildfire', 'wildfire', 'wildfire'], 'column_name': ['foo', 'bar', 'foo'], 'unit': ['m', 's', 'm']})
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]}), "dsi_units": units})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    assert store.ingest_artifacts(valid_middleware_datastructure) is None
+    assert store.ingest_artifacts(valid_middleware_datastructure) is None
+
+    bad_units = OrderedDict({'table_name': ['wildfire'], 'column_name': ['bar'], 'unit': ['kg']})
+    error = store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4],'bar':[0]}), "dsi_units": bad_units}))
+    units_data = store.query_artifacts("SELECT * FROM dsi_units;")
+    wildfire_data = store.query_artifacts("SELECT * FROM wildfire;")
+    store.close()
+    assert error == (TypeError, "Cannot ingest different units for the column bar in wildfire")
+    assert units_data.values.tolist() == [['wildfire', 'foo', 'm'], ['wildfire', 'bar', 's']]
+    assert wildfire_data.values.tolist() == [[1, 3], [2, 2], [3, 1]] * 2
+
+def test_artifact_ingest_rollback():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3]})}))
+    # the failing table comes after one that was already created and filled in the same transaction
+    error = store.ingest_artifacts(OrderedDict({"fire": OrderedDict({'bar':[1]}), "wildfire": OrderedDict({'FOO':[4]})}))
+    assert error == (ValueError, "Cannot have duplicate column names")
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4]})}))
+    assert store.catalog.tables() == ["wildfire"]
+    store.close()
+
 def test_artifact_query():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})})
     dbpath = 'test_artifact.db'
@@ -46,6 +86,50 @@ def test_artifact_query():
     correct_output = [[1, 3], [2, 2], [3, 1]]
     assert get_data.values.tolist() == correct_output == query_data.values.tolist()
 
+def test_artifact_query_iter():
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3,4,5],'bar':[5,4,3,2,1]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+    frames = list(store.query_iter("SELECT * FROM wildfire WHERE foo > 1 ORDER BY foo;", batch_rows = 3))
+    batches = list(store.query_iter("SELECT foo FROM wildfire ORDER BY foo;", batch_rows = 2, arrow = True))
+    empty = list(store.query_iter("SELECT * FROM wildfire WHERE foo > 5;"))
+    error = store.query_iter("DELETE FROM wildfire;")
+    store.close()
+    assert [len(frame) for frame in frames] == [3, 1]
+    assert pd.concat(frames).values.tolist() == [[2, 4], [3, 3], [4, 2], [5, 1]]
+    assert [batch.num_rows for batch in batches] == [2, 2, 1]
+    assert [v for batch in batches for v in batch.column(0).to_pylist()] == [1, 2, 3, 4, 5]
+    assert empty == []
+    assert error[0] == RuntimeError
+
+def test_query_cache():
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+    first = store.query_artifacts("SELECT * FROM wildfire")
+    first["bar"] = 0
+    assert store.query_artifacts("SELECT *  FROM wildfire;").values.tolist() == [[1, 3], [2, 2], [3, 1]]
+    assert [r.row_num for r in store.find_relation("foo", "> 1")] == [2, 3]
+    assert [r.row_num for r in store.find_relation("foo", "> 1")] == [2, 3]
+    assert (store.cache_stats()["hits"], store.cache_stats()["misses"]) == (2, 2)
+
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4],'bar':[0]})}))
+    assert store.get_table("wildfire").values.tolist() == [[1, 3], [2, 2], [3, 1], [4, 0]]
+    assert [r.row_num for r in store.find_relation("foo", "> 1")] == [2, 3, 4]
+    other = sqlite3.connect(dbpath)
+    other.execute("UPDATE wildfire SET bar = 0 WHERE foo = 1")
+    other.commit()
+    other.close()
+    assert store.get_table("wildfire").values.tolist() == [[1, 0], [2, 2], [3, 1], [4, 0]]
+    assert store.cache_stats()["hits"] == 2
+    store.close()
+
 def test_artifact_notebook():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})})
     dbpath = 'test_artifact.db'
@@ -68,6 +152,66 @@ def test_artifact_process():
     store.close()
     assert artifact == valid_middleware_datastructure
 
+def test_artifact_process_tables():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["a","NULL",None]}),
+                                        "fire": OrderedDict({'baz':[1.5]})}))
+    artifact = store.process_artifacts(table_names=["Wildfire", "missing"])
+    assert artifact == OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["a",None,None]})})
+
+    arrow_artifact = store.process_artifacts(table_names="fire", arrow=True)
+    assert list(arrow_artifact.keys()) == ["fire"]
+    assert arrow_artifact["fire"]["baz"].to_pylist() == [1.5]
+    assert store.process_artifacts(arrow=True)["wildfire"]["bar"].to_pylist() == ["a", None, None]
+    store.close()
+
+def test_update_table():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3,4],'bar':["a","b","c","d"]}),
+                                        "fire": OrderedDict({'id':[1,2,3],'baz':[1.5,2.5,3.5]}),
+                                        "dsi_relations": OrderedDict({"primary_key": [("fire", "id")], "foreign_key": [(None, None)]})}))
+    store.cur.execute("DELETE FROM wildfire WHERE foo = 1")
+    store.con.commit()
+    # rows at positions 2 and 3 are edited, the third row is appended and the new column added
+    edited = pd.DataFrame({'foo': [30, 4, 5], 'bar': ["c", "d", "e"], 'qux': [1.5, None, 2.5]})
+    assert store.update_table("wildfire", edited, [2, 3]) is None
+    assert store.cur.execute("SELECT * FROM wildfire ORDER BY rowid").fetchall() == \
+        [(2, "b", None), (30, "c", 1.5), (4, "d", None), (5, "e", 2.5)]
+    assert store.update_table("wildfire", pd.DataFrame({'foo': [1]}), [5]) == \
+        (ValueError, "'dsi_row_index' was modified. When adding new rows, values for 'dsi_row_index' must be empty.")
+
+    # matched by position: the first two rows are kept and the rest deleted
+    store.overwrite_table("wildfire", pd.DataFrame({'foo': [2, 30], 'bar': ["b", "z"], 'qux': [None, 1.5]}))
+    assert store.cur.execute("SELECT * FROM wildfire ORDER BY rowid").fetchall() == [(2, "b", None), (30, "z", 1.5)]
+
+    # matched by primary key, so stored rows keep their order
+    store.overwrite_table("fire", pd.DataFrame({'id': [3, 1, 4], 'baz': [3.5, 9.5, 4.5]}))
+    assert store.cur.execute("SELECT * FROM fire ORDER BY rowid").fetchall() == [(1, 9.5), (3, 3.5), (4, 4.5)]
+    assert store.catalog.table("fire").pk == [1, 0]
+    store.close()
+
+def test_overwrite_table_keys():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(OrderedDict({"parent": OrderedDict({'id':[1.5,2.5,3.5],'v':[1,2,3]}),
+                                        "child": OrderedDict({'pid':[1.5,3.5],'w':[10,30]}),
+                                        "dsi_relations": OrderedDict({"primary_key": [("parent", "id"), ("parent", "id")],
+                                                                      "foreign_key": [(None, None), ("child", "pid")]})}))
+    assert store.overwrite_table("parent", pd.DataFrame({'id': [1.5, 1.5, 3.5], 'v': [1, 2, 3]})) == \
+        (ValueError, "parent's primary key column, id, must have unique data")
+    assert store.overwrite_table("parent", pd.DataFrame({'id': [1.5, "b", 3.5], 'v': [1, 2, 3]})) == \
+        (TypeError, "There are mismatched data types in parent's primary key column, id. Cannot update.")
+    assert store.cur.execute("SELECT * FROM parent ORDER BY rowid").fetchall() == [(1.5, 1), (2.5, 2), (3.5, 3)]
+    store.close()
+
 def test_find():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f",2,1]})})
     dbpath = 'test_artifact.db'
@@ -138,6 +282,30 @@ def test_find_range():
     assert range_data[0].type == 'range'
     store.close()
 
+def test_find_lazy():
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[5,None,-1],'baz':["a","b","c"]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+
+    table_data = store.find_table("fire", limit = 2)[0].value
+    assert len(table_data) == 2
+    assert table_data == [(1, 5, "a"), (2, None, "b")]
+    assert table_data[-1] == (2, None, "b")
+    assert list(store.find_table("fire")[0].value)[2] == (3, -1, "c")
+
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4],'bar':[7],'baz':["d"]})}))
+    col_data = store.find_column("ba")
+    assert col_data[0].value[1:] == [None, -1, 7]
+    assert len(col_data[1].value) == 4
+
+    # missing values count as 0 and text columns have no range
+    range_data = store.find_column("ba", range = True)
+    assert [(r.c_name, r.value) for r in range_data] == [(['bar'], [-1, 7])]
+    store.close()
+
 def test_find_cell():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f",2,1]})})
     dbpath = 'test_artifact.db'
@@ -170,6 +338,25 @@ def test_find_row():
     assert row_data[0].type == 'row'
     store.close()
 
+def test_find_cell_typed():
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,12,2],'bar':[2.0,0.5,2.5],'baz':["home 2","it's",None]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+
+    # numbers are compared numerically in numeric columns and matched as text elsewhere
+    cell_data = store.find_cell(2)
+    assert [(c.row_num, c.c_name[0], c.value) for c in cell_data] == [(1, 'bar', 2.0), (1, 'baz', "home 2"), (3, 'foo', 2)]
+    assert store.find_cell(2.5)[0].row_num == 3
+    assert store.find_cell(0.25) == "0.25 is not a cell in this database"
+
+    # one row per match, even if several cells of the row match
+    assert [r.row_num for r in store.find_cell("2", row = True)] == [1, 2, 3]
+    assert store.find_cell("it's")[0].c_name == ['baz']
+    store.close()
+
 def test_find_relation():
     valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f",2,1]})})
     dbpath = 'test_artifact.db'
@@ -262,4 +449,615 @@ def test_find_relation():
     assert row_data[0].row_num == 1
     assert row_data[0].type == 'relation'
 
-    store.close()
\ No newline at end of file
+    store.close()
+def test_catalog_refresh():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})}))
+    assert store.list() == [('wildfire', 2, 3)]
+
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'baz':[4]}), "fire": OrderedDict({'id':[1]})}))
+    table_info = store.catalog.table("wildfire")
+    assert store.list() == [('wildfire', 3, 4), ('fire', 1, 1)]
+    assert table_info.columns == ['foo', 'bar', 'baz']
+    assert table_info.types == ['INTEGER', 'INTEGER', 'INTEGER']
+    store.close()
+
+def test_find_row_num_after_delete():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3,4],'bar':["a","b","c","d"]})}))
+    store.cur.execute("DELETE FROM wildfire WHERE foo = 2")
+    store.con.commit()
+
+    row_data = store.find_relation("foo", ">2")
+    assert [r.row_num for r in row_data] == [2, 3]
+    cell_data = store.find_cell("d")
+    assert cell_data[0].row_num == 3
+    row_data = store.find_cell("c", row = True)
+    assert row_data[0].row_num == 2
+    assert row_data[0].value == [3, "c"]
+    store.close()
+
+def test_text_index():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath, text_index=True)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["fire_a","Fire_b","xyz"]})}))
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4],'bar':["wildfire"],'baz':[1234]})}))
+    assert store.list() == [('wildfire', 3, 4)]
+
+    cell_data = store.find_cell("fire", row = True)
+    assert [c.row_num for c in cell_data] == [1, 2, 4]
+    assert cell_data[2].value == [4, "wildfire", 1234]
+    assert store.find_cell("123")[0].row_num == 4
+    assert store.find_cell("zzz") == "zzz is not a cell in this database"
+    assert [r.row_num for r in store.find_relation("bar", "~ 'ire_'")] == [1, 2]
+    assert store.text_index.stats()["entries"] == 4
+    store.close()
+
+    store = Sqlite(dbpath)
+    assert store.text_index.enabled
+    assert store.find_cell("FIRE_B")[0].row_num == 2
+    store.close()
+
+def test_text_index_integer_key():
+    relations = OrderedDict({'primary_key': [('wildfire', 'id')], 'foreign_key': [(None, None)]})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath, text_index = True)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'id':[5,6],'bar':["fire_a","fire_b"]}), "dsi_relations": relations}))
+
+    # the INTEGER PRIMARY KEY is the rowid, so these rows land below the rows already indexed
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'id':[1,2],'bar':["fire_c","fire_d"]})}))
+    assert [c.value for c in store.find_cell("fire_")] == ["fire_c", "fire_d", "fire_a", "fire_b"]
+    store.close()
+
+def test_summary(monkeypatch):
+    valid_middleware_datastructure = OrderedDict({"wildfire": OrderedDict({'foo':[1,2,None],'bar':["f","g","h"],'baz':[0.5,0.5,0.5]}),
+                                                  "fire": OrderedDict({'a':[3]}), "smoke": OrderedDict({'b':[None]})})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(valid_middleware_datastructure)
+
+    summary = store.summary()
+    assert summary[0] == ["wildfire", "fire", "smoke"]
+    assert summary[1].values.tolist() == [['foo', 'INTEGER', 1, 2, 1.5, 0.5], ['bar', 'VARCHAR', None, None, None, None],
+                                          ['baz', 'FLOAT', 0.5, 0.5, 0.5, 0.0]]
+    assert summary[2].values.tolist() == [['a', 'INTEGER', 3, 3, 3.0, 0]]
+    assert summary[3].values.tolist() == [['b', 'INTEGER', None, None, None, None]]
+
+    # tables summarised concurrently come back in the same order with the same values
+    monkeypatch.setattr("dsi.backends.sqlite.os.cpu_count", lambda: 2)
+    assert all(a.equals(b) for a, b in zip(store.summary()[1:], summary[1:]))
+    store.close()
+
+def test_column_stats(monkeypatch):
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,None],'bar':["f","g","h"]}), "fire": OrderedDict({'a':[3]})}))
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[6],'bar':["i"],'baz':[0.5]})}))
+
+    # the second ingest was merged into the stored statistics, and the column it added counts earlier rows as nulls
+    assert "dsi_column_stats" not in store.catalog.tables()
+    assert sorted(store.list()) == [("fire", 1, 1), ("wildfire", 3, 4)]
+    moments = store.column_stats.load("wildfire").columns
+    assert (moments["foo"].count, moments["foo"].nulls, moments["foo"].mean, moments["foo"].m2) == (3, 1, 3.0, 14.0)
+    assert (moments["baz"].count, moments["baz"].nulls) == (1, 3)
+    assert store.summary("wildfire").values.tolist() == [['foo', 'INTEGER', 1, 6, 3.0, 2.160246899469287], ['bar', 'VARCHAR', None, None, None, None],
+                                                         ['baz', 'FLOAT', 0.5, 0.5, 0.5, 0]]
+
+    # rows written outside DSI make the statistics stale, so they are rebuilt on use
+    store.cur.execute("INSERT INTO wildfire (foo) VALUES (11)")
+    store.con.commit()
+    assert store.display("wildfire").attrs["max_rows"] == 5
+    assert store.summary("wildfire").values.tolist()[0] == ['foo', 'INTEGER', 1, 11, 5.0, 3.9370039370059056]
+
+    # missing statistics are rebuilt by concurrent workers with the same values
+    summary = store.summary()
+    store.cur.execute("DELETE FROM dsi_column_stats")
+    store.con.commit()
+    monkeypatch.setattr("dsi.backends.sqlite.os.cpu_count", lambda: 2)
+    assert all(a.equals(b) for a, b in zip(store.summary()[1:], summary[1:]))
+
+    store.overwrite_table("wildfire", pd.DataFrame({'foo':[7, 9]}))
+    assert sorted(store.list()) == [("fire", 1, 1), ("wildfire", 1, 2)]
+    assert store.summary("wildfire").values.tolist() == [['foo', 'INTEGER', 7, 9, 8.0, 1.0]]
+    store.close()
+
+def test_column_stats_integer_key(monkeypatch):
+    relations = OrderedDict({'primary_key': [('wildfire', 'id')], 'foreign_key': [(None, None)]})
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath, sketches=True)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'id':[5,6],'foo':[1.0,2.0]}), "dsi_relations": relations}))
+    marks = []
+    compute = store.column_stats.compute
+    monkeypatch.setattr(store.column_stats, "compute", lambda *args, **kwargs: marks.append(kwargs.get("mark")) or compute(*args, **kwargs))
+
+    # keys above the highest one only need the new rows aggregated
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'id':[7,8],'foo':[3.0,4.0]})}))
+    assert marks == [6]
+    assert store.summary("wildfire").values.tolist()[1] == ['foo', 'FLOAT', 1.0, 4.0, 2.5, 1.118033988749895]
+
+    # the INTEGER PRIMARY KEY is the rowid, so these rows land below the existing ones and the whole table is aggregated
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'id':[1,2],'foo':[5.0,6.0]})}))
+    assert marks == [6, None]
+    assert sorted(store.list()) == [("wildfire", 2, 6)]
+    assert store.summary("wildfire").values.tolist()[1] == ['foo', 'FLOAT', 1.0, 6.0, 3.5, 1.707825127659933]
+    assert store.summary("wildfire", approx=True).values.tolist()[1][3] == 6.0
+    store.close()
+
+def test_column_stats_external_writes():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath, sketches=True)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3]})}))
+    assert store.summary("wildfire", approx=True).values.tolist()[0][3] == 3
+    store.close()
+
+    # rows updated or deleted by another program leave the highest rowid unchanged
+    other = sqlite3.connect(dbpath)
+    other.execute("UPDATE wildfire SET foo = 1000 WHERE foo = 1")
+    other.execute("DELETE FROM wildfire WHERE foo = 2")
+    other.commit()
+    other.close()
+    store = Sqlite(dbpath, sketches=True)
+    assert store.list() == [("wildfire", 1, 2)]
+    assert store.summary("wildfire").values.tolist()[0][2:4] == [3, 1000]
+    assert store.summary("wildfire", approx=True).values.tolist()[0][3] == 1000
+    assert "TRIGGER" not in store.get_schema()
+
+    # statistics stored without the triggers are not trusted
+    store.cur.execute("DROP TRIGGER dsi_column_stats_wildfire_update")
+    store.con.commit()
+    store.cur.execute("UPDATE wildfire SET foo = 5 WHERE foo = 1000")
+    store.con.commit()
+    assert store.summary("wildfire").values.tolist()[0][2:4] == [3, 5]
+    store.close()
+
+def test_summary_approx():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath, sketches=True)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':list(range(1, 501)),'bar':["f"] * 500})}))
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':list(range(501, 1001)),'bar':["g"] * 500})}))
+
+    # sketches of the second ingest were merged into the stored ones
+    assert "dsi_column_sketches" not in store.catalog.tables()
+    assert store.cur.execute("SELECT num_rows, max_rowid FROM dsi_column_sketches WHERE column_name IS NULL").fetchall() == [(1000, 1000)]
+    summary = store.summary("wildfire", approx=True)
+    assert summary.columns.tolist() == ['column', 'type', 'min', 'max', 'avg', 'std_dev', 'p50', 'p95', 'p99', 'approx_distinct', 'sample']
+    column, _, _, _, _, _, p50, p95, p99, distinct, sample = summary.values.tolist()[0]
+    assert column == "foo" and abs(p50 - 500) <= 17 and abs(p95 - 950) <= 17 and abs(p99 - 990) <= 17
+    assert abs(distinct - 1000) <= 33
+    assert len(sample) == 5 and all(isinstance(v, int) and 1 <= v <= 1000 for v in sample)
+    assert summary.values.tolist()[1][6:] == [None] * 5
+
+    # rows written outside DSI make the sketches stale, so they are rebuilt on use
+    store.cur.execute("INSERT INTO wildfire (foo) VALUES (5000)")
+    store.con.commit()
+    assert store.summary(approx=True)[1].values.tolist()[0][3] == 5000
+    assert store.cur.execute("SELECT max_rowid FROM dsi_column_sketches WHERE column_name IS NULL").fetchall() == [(1001,)]
+    store.close()
+
+def test_read_pool():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    writer = Sqlite(dbpath, read_pool=True)
+    writer.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f","g","h"]})}))
+    reader = Sqlite(dbpath, read_pool=True)
+    assert reader.read_pool is writer.read_pool
+    assert writer.cur.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    # other threads read committed rows on their own connections while the writer ingests
+    counts, errors = [], []
+    def read():
+        try:
+            for _ in range(10):
+                counts.append(len(reader.query_artifacts("SELECT * FROM wildfire")))
+                assert [r.row_num for r in reader.find_cell("g")] == [2]
+                assert list(reader.find_table("wildfire")[0].value)[:3] == [(1, "f"), (2, "g"), (3, "h")]
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(5):
+        writer.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[i],'bar':["i"]})}))
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(counts) == 40 and all(3 <= c <= 8 for c in counts)
+    reader.close()
+    writer.close()
+
+    store = Sqlite(dbpath, read_only=True)
+    assert len(store.query_artifacts("SELECT * FROM wildfire")) == 8
+    try:
+        store.cur.execute("DELETE FROM wildfire")
+        assert False
+    except sqlite3.OperationalError:
+        pass
+    store.close()
+
+def test_in_memory():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(":memory:", persist_to=dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["f","g","h"]})}))
+    assert not os.path.exists(dbpath)
+    store.close()
+
+    # the saved file is loaded into memory, and later writes are saved once the interval passed
+    store = Sqlite(":memory:", persist_to=dbpath, persist_interval=0)
+    assert store.get_table("wildfire").values.tolist() == [[1, "f"], [2, "g"], [3, "h"]]
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[4],'bar':["i"]})}))
+    saved = Sqlite(dbpath)
+    assert len(saved.get_table("wildfire")) == 4
+    saved.close()
+    store.close()
+
+    store = Sqlite(":memory:")
+    store.ingest_artifacts(OrderedDict({"fire": OrderedDict({'a':[5]})}))
+    assert store.persist()[0] == ValueError
+    store.persist(dbpath)
+    store.close()
+    saved = Sqlite(dbpath)
+    assert saved.get_table("fire").values.tolist() == [[5]]
+    assert saved.persist()[0] == ValueError
+    saved.close()
+
+def test_backup():
+    dbpath = 'test_artifact.db'
+    backups = ['test_artifact.backup.db', 'test_artifact.backup.1.db']
+    for path in [dbpath] + backups:
+        if os.path.exists(path):
+            os.remove(path)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3]})}))
+    assert store.backup(backups[0], 2) == True
+    # an unchanged database is not copied again
+    assert store.backup(backups[0], 2) == False
+    assert not os.path.exists(backups[1])
+
+    # older backups rotate and only the newest two are kept
+    for value in [4, 5]:
+        store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[value]})}))
+        assert store.backup(backups[0], 2) == True
+    store.close()
+    assert not os.path.exists('test_artifact.backup.2.db')
+    for path, num_rows in zip(backups, [5, 4]):
+        backup = Sqlite(path)
+        assert len(backup.get_table("wildfire")) == num_rows
+        backup.close()
+        os.remove(path)
+
+def test_storage_profile():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath, profile="ingest-heavy", storage_options={"synchronous": "OFF", "mmap_size": 1048576})
+    assert store.cur.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert store.cur.execute("PRAGMA synchronous").fetchone()[0] == 0
+    assert store.cur.execute("PRAGMA cache_size").fetchone()[0] == -262144
+    assert store.cur.execute("PRAGMA mmap_size").fetchone()[0] == 1048576
+    assert store.cur.execute("PRAGMA wal_autocheckpoint").fetchone()[0] == 64 * 1024 * 1024 // store.cur.execute("PRAGMA page_size").fetchone()[0]
+    store.close()
+
+    for profile, options in [("fast", None), ("default", {"compression": "zstd"})]:
+        try:
+            Sqlite(dbpath, profile=profile, storage_options=options)
+            assert False
+        except ValueError:
+            pass
+
+def test_indexes():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.runTable = True
+    store.ingest_artifacts(OrderedDict({"parent": OrderedDict({'id':[1,2,3],'v':[1,2,3]}),
+                                        "child": OrderedDict({'pid':[1,3],'w':[10,30]}),
+                                        "dsi_relations": OrderedDict({"primary_key": [("parent", "id"), ("parent", "id")],
+                                                                      "foreign_key": [(None, None), ("child", "pid")]})}))
+    indexed = {(table, column) for _, table, column in store.indexes.indexes()}
+    assert indexed == {("child", "pid"), ("child", "run_id"), ("parent", "run_id")}
+
+    for value in [15, 16, 17]:
+        store.find_relation("w", f">{value}")
+    store.query_artifacts("SELECT * FROM parent WHERE v = 2 AND id > 'v = 1'")
+    assert store.index_advice() == [("child", "w", 3)]
+    assert store.create_index("child", "w") == "dsi_index_child_w"
+    assert store.index_advice() == []
+    plan = store.cur.execute("EXPLAIN QUERY PLAN SELECT * FROM child WHERE w > 15").fetchall()
+    assert "dsi_index_child_w" in plan[0][3]
+
+    store.overwrite_table("child", pd.DataFrame({'run_id': [1, 1], 'pid': [1, 2], 'w': [5, 50]}))
+    assert ("child", "w") in {(table, column) for _, table, column in store.indexes.indexes()}
+    assert store.drop_index("child", "w") is None
+    assert store.drop_index("child", "w")[0] == ValueError
+    assert store.create_index("child", "missing")[0] == ValueError
+    store.close()
+
+    store = Sqlite(dbpath, auto_index=True)
+    for value in [1, 2, 3]:
+        store.find_relation("v", f"={value}")
+    assert store.indexes.indexed("parent", "v")
+    store.close()
+
+def test_query_log():
+    dbpath = 'test_artifact.db'
+    logpath = 'test_query_log.jsonl'
+    for path in [dbpath, logpath]:
+        if os.path.exists(path):
+            os.remove(path)
+    store = Sqlite(dbpath, query_log=logpath, slow_query_ms=0)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':["a","b","c"]})}))
+    store.query_artifacts("SELECT * FROM wildfire WHERE foo > 1")
+    store.find_cell("b")
+    store.find_relation("foo", "=3")
+    entries = store.query_log.entries()
+    assert [(entry["origin"], entry["rows"]) for entry in entries] == [("query_artifacts", 2), ("find_cell", 1), ("find_relation", 1)]
+    assert "SCAN" in entries[0]["plan"]
+    assert len(store.slow_queries(limit=2)) == 2
+    store.close()
+
+    store = Sqlite(dbpath, query_log=logpath, slow_query_ms=60000)
+    store.query_artifacts("SELECT * FROM wildfire")
+    assert store.query_log.entries()[-1]["plan"] is None
+    assert store.slow_queries() == []
+    store.close()
+    os.remove(logpath)
+
+def test_maintenance():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath, profile="ingest-heavy")
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})}))
+    store.create_index("wildfire", "foo")
+    assert not store.maintenance.after_ingest(3, max_rows=5, max_bytes=None)
+    assert store.maintenance.after_ingest(3, max_rows=5, max_bytes=None)
+    store.maintenance.wait()
+    assert [(entry["task"], entry["error"]) for entry in store.maintenance.history] == \
+        [("analyze", None), ("incremental_vacuum", None), ("checkpoint", None)]
+    assert ("wildfire",) in store.cur.execute("SELECT tbl FROM sqlite_stat1").fetchall()
+    assert not os.path.exists(dbpath + "-wal") or os.path.getsize(dbpath + "-wal") == 0
+    store.close()
+
+    store = Sqlite(":memory:")
+    assert not store.maintenance.after_ingest(10, max_rows=1)
+    store.close()
+
+def test_timeout():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})}))
+    endless = "SELECT count(*) FROM (WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT x FROM c)"
+    error = store.query_artifacts(endless, timeout=0.2)
+    assert error[0] == QueryCancelled
+    assert "timeout of 0.2 seconds" in error[1]
+    assert store.query_artifacts("SELECT * FROM wildfire")["foo"].tolist() == [1, 2, 3]
+
+    timer = threading.Timer(0.2, store.cancel)
+    timer.start()
+    error = store.query_artifacts(endless)
+    timer.join()
+    assert error == (QueryCancelled, "Error in query_artifacts/get_artifacts: The statement was cancelled")
+    assert not store.cancel()
+
+    # cancel() stops the query right away even while a longer timeout is waiting
+    timer = threading.Timer(0.2, store.cancel)
+    timer.start()
+    start = time.monotonic()
+    error = store.query_artifacts(endless, timeout=30)
+    timer.join()
+    assert error == (QueryCancelled, "Error in query_artifacts/get_artifacts: The statement was cancelled")
+    assert time.monotonic() - start < 5
+
+    try:
+        with store.time_limit(0.2):
+            store.cur.execute(endless).fetchall()
+        assert False
+    except QueryCancelled:
+        pass
+    assert store.find_relation("foo", "=2")[0].value == [2, 2]
+    store.close()
+
+def test_timeout_read_pool():
+    dbpath = 'test_artifact.db'
+    if os.path.exists(dbpath):
+        os.remove(dbpath)
+    store = Sqlite(dbpath, read_pool=True)
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1,2,3],'bar':[3,2,1]})}))
+    endless = "SELECT count(*) FROM (WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT x FROM c)"
+
+    # each reader thread times out on its own read connection, while the owner thread runs under a longer limit
+    errors = []
+    def read(timeout):
+        errors.append(store.query_artifacts(endless, timeout=timeout))
+    with store.time_limit(30):
+        threads = [threading.Thread(target=read, args=(timeout,)) for timeout in (0.2, 0.4)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.monotonic() - start < 5
+        assert store.query_artifacts("SELECT * FROM wildfire")["foo"].tolist() == [1, 2, 3]
+    assert sorted(error[1] for error in errors) == [f"Error in query_artifacts/get_artifacts: The statement was cancelled after exceeding its timeout of {t} seconds" for t in (0.2, 0.4)]
+
+    thread = threading.Thread(target=read, args=(None,))
+    thread.start()
+    time.sleep(0.2)
+    assert store.cancel()
+    thread.join()
+    assert errors[-1] == (QueryCancelled, "Error in query_artifacts/get_artifacts: The statement was cancelled")
+    store.close()
+
+def test_federation():
+    dbpaths = [f"test_federation_{i}.db" for i in range(3)]
+    for i, dbpath in enumerate(dbpaths):
+        if os.path.exists(dbpath):
+            os.remove(dbpath)
+        store = Sqlite(dbpath)
+        data = OrderedDict({'foo':[i, i + 1],'bar':['a', 'b']})
+        if i == 2:
+            data['baz'] = [1.5, 2.5]
+        store.ingest_artifacts(OrderedDict({"wildfire": data, f"only{i}": OrderedDict({'x':[i]})}))
+        store.close()
+
+    fed = SqliteFederation(dbpaths)
+    assert len(fed.tables()) == 4
+    assert fed.table("wildfire").columns == ["dsi_source", "foo", "bar", "baz"]
+    totals = fed.query_artifacts("SELECT dsi_source, SUM(foo) AS s FROM wildfire GROUP BY dsi_source ORDER BY dsi_source")
+    assert totals["dsi_source"].tolist() == dbpaths
+    assert totals["s"].tolist() == [1, 3, 5]
+    assert dict((t, rows) for t, _, rows in fed.list())["wildfire"] == 6
+
+    rows = fed.find_relation("baz", "> '2'")
+    assert [row.value for row in rows] == [[dbpaths[2], 3, 'b', 2.5]]
+    assert [row.row_num for row in fed.find_relation("foo", "BETWEEN '1' AND '2'")] == [2, 3, 4, 5]
+    assert [match.row_num for match in fed.find_cell("b")] == [2, 4, 6]
+    assert isinstance(fed.find_cell("test_federation"), str)
+
+    summary = fed.summary("wildfire")
+    assert summary["column"].tolist() == ["dsi_source", "foo", "bar", "baz"]
+    assert summary["min"].tolist()[1] == 0 and summary["max"].tolist()[1] == 3
+    fed.close()
+    for dbpath in dbpaths:
+        os.remove(dbpath)
+
+def test_federation_many_files():
+    dbpaths = [f"test_federation_many_{i}.db" for i in range(12)]
+    for i, dbpath in enumerate(dbpaths):
+        if os.path.exists(dbpath):
+            os.remove(dbpath)
+        store = Sqlite(dbpath)
+        store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1e9 + i % 3]})}))
+        store.close()
+
+    fed = SqliteFederation(dbpaths)
+    assert fed.list() == [("wildfire", 2, 12)]
+    totals = fed.query_artifacts("SELECT COUNT(DISTINCT dsi_source) AS n FROM wildfire")
+    assert totals["n"].tolist() == [12]
+    summary = fed.summary("wildfire")
+    assert abs(summary["std_dev"].tolist()[1] - math.sqrt(2 / 3)) < 1e-6
+
+    store = Sqlite(dbpaths[-1])
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[1e9]})}))
+    store.close()
+    fed.refresh()
+    assert fed.list() == [("wildfire", 2, 13)]
+    assert [row.row_num for row in fed.find_relation("foo", "= 1000000000")] == [1, 4, 7, 10, 13]
+    fed.close()
+    for dbpath in dbpaths:
+        os.remove(dbpath)
+
+def test_merge(monkeypatch):
+    dbpaths = [f"test_merge_{i}.db" for i in range(3)] + ["test_merge_units.db", "test_merge_target.db"]
+    for dbpath in dbpaths:
+        if os.path.exists(dbpath):
+            os.remove(dbpath)
+    units = OrderedDict({"table_name": ["wildfire"], "column_name": ["foo"], "unit": ["m"]})
+    Sqlite.runTable = True
+    for i, dbpath in enumerate(dbpaths[:3]):
+        run_start = datetime(2026, 1, i + 1)
+        monkeypatch.setattr("dsi.backends.sqlite.datetime", type("RunClock", (), {"now": staticmethod(lambda: run_start)}))
+        store = Sqlite(dbpath)
+        data = OrderedDict({'foo':[i, i + 1],'bar':['a', 'b']})
+        if i == 2:
+            data['baz'] = [1.5, 2.5]
+        store.ingest_artifacts(OrderedDict({"wildfire": data, "dsi_units": units}))
+        store.close()
+    Sqlite.runTable = False
+    store = Sqlite(dbpaths[3])
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[9]}),
+                                        "dsi_units": OrderedDict({"table_name": ["wildfire"], "column_name": ["foo"], "unit": ["s"]})}))
+    store.close()
+
+    store = Sqlite(dbpaths[4])
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[100],'bar':['z']})}))
+    assert store.merge_artifacts(dbpaths[:3], batch_size = 2) == OrderedDict({"wildfire": 6})
+    assert store.catalog.table("wildfire").columns == ["foo", "bar", "run_id", "baz"]
+    runs = store.query_artifacts("SELECT run_id, run_timestamp FROM runTable ORDER BY run_id")
+    assert runs["run_id"].tolist() == [1, 2, 3]
+    merged = store.query_artifacts("SELECT foo, run_id, baz FROM wildfire ORDER BY foo, run_id")
+    assert merged["run_id"].tolist()[:6] == [1, 1, 2, 2, 3, 3]
+    assert merged["baz"].tolist()[4:6] == [1.5, 2.5]
+    assert store.query_artifacts("SELECT unit FROM dsi_units")["unit"].tolist() == ["m"]
+
+    # merging the same runs again maps them to the stored run_ids
+    store.merge_artifacts(dbpaths[:1])
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM runTable")["n"].tolist() == [3]
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM wildfire WHERE run_id = 1")["n"].tolist() == [4]
+
+    error = store.merge_artifacts([dbpaths[3]])
+    assert error[0] == TypeError
+    assert "different units for the column foo in wildfire" in error[1]
+    assert store.merge_artifacts([dbpaths[4]])[0] == ValueError
+    assert store.find_relation("foo", "=100")[0].value[:2] == [100, 'z']
+    store.close()
+    for dbpath in dbpaths:
+        os.remove(dbpath)
+
+def test_merge_same_second(monkeypatch):
+    dbpaths = [f"test_merge_{i}.db" for i in range(3)] + ["test_merge_target.db", "test_merge_runs.db"]
+    for dbpath in dbpaths:
+        if os.path.exists(dbpath):
+            os.remove(dbpath)
+    # every shard, and the run of the last database, is written in the same second
+    monkeypatch.setattr("dsi.backends.sqlite.datetime", type("RunClock", (), {"now": staticmethod(lambda: datetime(2026, 1, 1))}))
+    Sqlite.runTable = True
+    for i, dbpath in enumerate(dbpaths[:3]):
+        store = Sqlite(dbpath)
+        store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[i, i]})}))
+        store.close()
+    store = Sqlite(dbpaths[4])
+    store.ingest_artifacts(OrderedDict({"wildfire": OrderedDict({'foo':[9]})}))
+    Sqlite.runTable = False
+
+    # the runTable of an ingest allows only one run per run_timestamp, and a merge leaves its schema as it is
+    schema = store.get_schema()
+    error = store.merge_artifacts(dbpaths[:3])
+    assert error[0] == ValueError
+    assert "only one run per run_timestamp" in error[1]
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM wildfire")["n"].tolist() == [1]
+    assert store.get_schema() == schema
+    store.close()
+
+    store = Sqlite(dbpaths[3])
+    assert store.merge_artifacts(dbpaths[:3]) == OrderedDict({"wildfire": 6})
+    runs = store.query_artifacts("SELECT run_id, run_timestamp FROM runTable ORDER BY run_id")
+    assert runs["run_id"].tolist() == [1, 2, 3]
+    assert set(runs["run_timestamp"].tolist()) == {"2026-01-01 00:00:00"}
+    merged = store.query_artifacts("SELECT foo, run_id FROM wildfire ORDER BY foo, run_id")
+    assert merged["foo"].tolist() == [0, 0, 1, 1, 2, 2]
+    assert merged["run_id"].tolist() == [1, 1, 2, 2, 3, 3]
+    assert sorted(store.list()) == [("runTable", 2, 3), ("wildfire", 2, 6)]
+
+    # a file merged again keeps the run_id of its run
+    store.merge_artifacts(dbpaths[1:2])
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM runTable")["n"].tolist() == [3]
+    assert store.query_artifacts("SELECT COUNT(*) AS n FROM wildfire WHERE run_id = 2")["n"].tolist() == [4]
+    store.close()
+    for dbpath in dbpaths:
+        os.remove(dbpath)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from dsi.backends.type_inference import TypeInference
+
+def test_infer_list():
+    engine = TypeInference(sample_size=10)
+    assert engine.infer([1, 2, None, True]) == "int32"
+    assert engine.infer([1, 2**40]) == "int64"
+    assert engine.infer([1, 2**70]) == "float"
+    assert engine.infer([1.5, None, np.float64(2)]) == "float"
+    assert engine.infer([1, 2.5]) == "string"
+    assert engine.infer([None, None]) == "int32"
+    assert engine.infer([]) == "int32"
+    assert engine.infer(list(range(1000)) + ["a"]) == "string"
+
+def test_infer_typed_arrays():
+    engine = TypeInference()
+    assert engine.infer(np.arange(5)) == "int32"
+    assert engine.infer(np.array([0, 2**40])) == "int64"
+    assert engine.infer(pd.Series([0.5, 1.5])) == "float"
+    assert engine.infer(pd.Series(["a", "b"])) == "string"
+    assert engine.infer(np.array([True, False])) == "int32"
+
+def test_infer_cache():
+    engine = TypeInference()
+    assert engine.infer([1, 2], "wildfire", "foo") == "int32"
+    assert engine.infer(["a"], "wildfire", "foo") == "int32"
+    engine.forget("wildfire")
+    assert engine.infer(["a"], "wildfire", "foo") == "string"
+
+class Catalog:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def table(self, table_name):
+        columns = self.tables.get(table_name)
+        return None if columns is None else type("CatalogTable", (), {"columns": columns})
+
+    def unquote(self, name):
+        return name.strip('"')
+
+def test_infer_cache_catalog():
+    catalog = Catalog({})
+    engine = TypeInference(catalog)
+    assert engine.infer([1, 2], "wildfire", '"foo"') == "int32"
+    catalog.tables["wildfire"] = ["foo"]
+    assert engine.infer(["a"], "wildfire", '"foo"') == "int32"
+    # the table was dropped outside the backend
+    del catalog.tables["wildfire"]
+    assert engine.infer(["a"], "wildfire", '"foo"') == "string"
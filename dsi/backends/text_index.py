@@ -0,0 +1,354 @@
+import re
+from abc import ABCMeta, abstractmethod
+from time import perf_counter
+
+# Reserved name prefix of every table the text indexes create. Catalogs hide tables with this prefix from users
+TEXT_INDEX_PREFIX = "dsi_text_index"
+
+# trigram indexes can only narrow down searches for literal runs of at least this many characters
+MIN_TRIGRAM_LENGTH = 3
+
+# above this many candidate rows a DuckDB table is cheaper to scan than to probe by rowid
+MAX_CANDIDATES = 50000
+
+class TextIndex(metaclass=ABCMeta):
+    """
+    Optional substring index over every cell of every user table, maintained incrementally during ingest.
+
+    The index only narrows a search down to candidate rows. Backends still apply their own LIKE/ILIKE predicate to the
+    candidates, so results are identical to a full scan. A pattern whose literal runs between LIKE wildcards
+    (% and _) are all shorter than three characters cannot use a trigram index and falls back to the full scan.
+
+    Counters for reporting:
+        - build_seconds: total time spent creating and updating the index
+        - lookups: number of searches answered through the index
+        - lookup_seconds: total time spent in those index lookups
+    """
+    def __init__(self, cursor, catalog, enabled = False):
+        """
+        `cursor` : database cursor that sees the backend's open transaction
+
+        `catalog` : the backend's schema Catalog
+
+        `enabled` : bool, optional, default=False
+            If True, the index is built and maintained. An index already stored in the database is always maintained
+        """
+        self.cur = cursor
+        self.catalog = catalog
+        self.requested = enabled
+        self.found = None
+        self.build_seconds = 0.0
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+
+    @property
+    def enabled(self):
+        """
+        True if the index was requested or is already stored in the database. The database is only checked on first use
+        """
+        if self.requested:
+            return True
+        if self.found is None:
+            self.found = self.exists()
+        return self.found
+
+    @abstractmethod
+    def exists(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if the database already stores a text index
+        """
+        pass
+
+    def mark(self, table_name):
+        """
+        Returns the highest rowid of `table_name`, or None if the table does not exist yet.
+        Called before rows are inserted so `update()` only indexes the rows added after it
+        """
+        if not self.enabled or self.catalog.table(table_name) is None:
+            return None
+        max_rowid = self.cur.execute(f"SELECT MAX(rowid) FROM {table_name}").fetchone()[0]
+        return -1 if max_rowid is None else max_rowid
+
+    @abstractmethod
+    def is_indexed(self, table_name):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if `table_name` has an index that is current with its schema
+        """
+        pass
+
+    def build_missing(self, table_names):
+        """
+        Builds the index of every table in `table_names` that is not indexed yet
+        """
+        for table_name in table_names:
+            if not self.is_indexed(table_name):
+                self.rebuild(table_name)
+
+    @abstractmethod
+    def update(self, table_name, mark):
+        """
+        Indexes the rows of `table_name` added since `mark` was taken. Rebuilds the table's index when `mark` is None,
+        i.e. the table was created or recreated since then
+        """
+        pass
+
+    @abstractmethod
+    def rebuild(self, table_name):
+        """
+        Drops and rebuilds the index of one table from its current contents
+        """
+        pass
+
+    @abstractmethod
+    def candidates(self, table_name, pattern):
+        """
+        Returns SQL for an IN (...) list of the rowids of `table_name` that may match the LIKE `pattern` in any column
+        (a subquery or literal rowids), None if the index cannot answer this pattern, or an empty string if no row can match
+        """
+        pass
+
+    @abstractmethod
+    def stats(self):
+        """
+        Returns a dict with the number of indexed tables, the number of index entries (indexed rows in SQLite,
+        trigram postings in DuckDB), the size of the index in bytes (None if the engine cannot report it) and the timing counters
+        """
+        pass
+
+    def literal_runs(self, pattern):
+        """
+        **Internal use only. Do not call**
+
+        Splits a LIKE pattern at its wildcards and returns the literal runs long enough to be looked up as trigrams
+        """
+        return [run for run in re.split(r"[%_]", pattern) if len(run) >= MIN_TRIGRAM_LENGTH]
+
+    def quote(self, name):
+        """
+        **Internal use only. Do not call**
+        """
+        return '"' + name.replace('"', '""') + '"'
+
+    def timed_lookup(self, start):
+        """
+        **Internal use only. Do not call**
+        """
+        self.lookups += 1
+        self.lookup_seconds += perf_counter() - start
+
+class SqliteTextIndex(TextIndex):
+    """
+    Text index of a SQLite backend: one external-content FTS5 table with the trigram tokenizer per user table.
+    The FTS5 table stores only rowids per trigram (detail=none) and reads cell values from the user table itself.
+    FTS5 columns are fixed at creation, so adding a column to a table rebuilds that table's index.
+    """
+    def exists(self):
+        return any(name.startswith(TEXT_INDEX_PREFIX) for name in self.catalog.all_tables())
+
+    def index_name(self, table_name):
+        """
+        **Internal use only. Do not call**
+        """
+        return f"{TEXT_INDEX_PREFIX}_{self.catalog.table(table_name).name}"
+
+    def is_indexed(self, table_name):
+        index_info = self.catalog.table(self.index_name(table_name))
+        return index_info is not None and index_info.columns == self.catalog.table(table_name).columns
+
+    def mark(self, table_name):
+        # new rows of a table keyed by its rowid are not all above the current highest rowid, so its index is rebuilt
+        if self.catalog.has_rowid_alias(table_name):
+            return None
+        return super().mark(table_name)
+
+    def update(self, table_name, mark):
+        if not self.enabled:
+            return
+        if mark is None or not self.is_indexed(table_name):
+            self.rebuild(table_name)
+            return
+        start = perf_counter()
+        col_list = ', '.join(self.quote(col) for col in self.catalog.table(table_name).columns)
+        self.cur.execute(f"""INSERT INTO {self.quote(self.index_name(table_name))} (rowid, {col_list})
+                             SELECT rowid, {col_list} FROM {table_name} WHERE rowid > ?""", (mark,))
+        self.build_seconds += perf_counter() - start
+
+    def rebuild(self, table_name):
+        start = perf_counter()
+        table_info = self.catalog.table(table_name)
+        index_name = self.index_name(table_name)
+        col_list = ', '.join(self.quote(col) for col in table_info.columns)
+        content = table_info.name.replace("'", "''")
+        self.cur.execute(f"DROP TABLE IF EXISTS {self.quote(index_name)}")
+        self.cur.execute(f"""CREATE VIRTUAL TABLE {self.quote(index_name)} USING fts5({col_list},
+                             content='{content}', content_rowid='rowid', tokenize='trigram', detail='none')""")
+        self.cur.execute(f"INSERT INTO {self.quote(index_name)} ({self.quote(index_name)}) VALUES ('rebuild')")
+        self.catalog.reload_table(index_name)
+        self.build_seconds += perf_counter() - start
+
+    def candidates(self, table_name, pattern):
+        if not self.enabled:
+            return None
+        runs = self.literal_runs(pattern)
+        if len(runs) == 0 or not self.is_indexed(table_name):
+            return None
+        start = perf_counter()
+        # every trigram of the pattern's literal runs must appear in the row. The index keeps no positions (detail=none),
+        # so candidates are a superset of the matches, which the caller's LIKE narrows down
+        trigrams = sorted({run[i:i+3] for run in runs for i in range(len(run) - 2)})
+        match = " AND ".join('"' + trigram.replace('"', '""') + '"' for trigram in trigrams)
+        match = match.replace("'", "''")
+        index_name = self.quote(self.index_name(table_name))
+        subquery = f"SELECT rowid FROM {index_name} WHERE {index_name} MATCH '{match}'"
+        found = self.cur.execute(subquery + " LIMIT 1").fetchone()
+        self.timed_lookup(start)
+        return "" if found is None else subquery
+
+    def stats(self):
+        index_tables = [row[0] for row in self.cur.execute(f"""SELECT name FROM sqlite_master WHERE type = 'table'
+                                                             AND sql LIKE 'CREATE VIRTUAL TABLE%' AND name LIKE '{TEXT_INDEX_PREFIX}%'""")]
+        entries = 0
+        for name in index_tables:
+            # one docsize row per indexed row
+            entries += self.cur.execute(f"SELECT COUNT(*) FROM {self.quote(name + '_docsize')}").fetchone()[0]
+        try:
+            size = self.cur.execute(f"SELECT SUM(pgsize) FROM dbstat WHERE name LIKE '{TEXT_INDEX_PREFIX}%'").fetchone()[0]
+        except Exception:
+            size = None # dbstat is not compiled into every SQLite build
+        return {"tables": len(index_tables), "entries": entries, "size_bytes": size, "build_seconds": self.build_seconds,
+                "lookups": self.lookups, "lookup_seconds": self.lookup_seconds}
+
+class DuckDBTextIndex(TextIndex):
+    """
+    Text index of a DuckDB backend: a DSI-maintained inverted index `dsi_text_index` mapping lowercased trigrams
+    of each column to posting lists of rowids, one posting list per (table, column, trigram) and ingest.
+    A lookup reads only the rarest trigram of the pattern for each column, and its posting lists are the candidates.
+    Indexed tables are registered in `dsi_text_index_tables` with their row count and highest rowid when last indexed.
+    DuckDB may renumber rowids when a checkpoint compacts deleted rows, so a table whose count or highest rowid no longer
+    matches its registry entry is treated as not indexed: searches scan it and its next ingest rebuilds its index.
+    """
+    registry = TEXT_INDEX_PREFIX + "_tables"
+
+    def exists(self):
+        return self.catalog.table(self.registry) is not None
+
+    def create(self):
+        """
+        **Internal use only. Do not call**
+        """
+        if not self.exists():
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS {TEXT_INDEX_PREFIX}
+                                 (table_name VARCHAR, column_name VARCHAR, trigram VARCHAR, row_ids BIGINT[])""")
+            self.cur.execute(f"CREATE TABLE IF NOT EXISTS {self.registry} (table_name VARCHAR, num_rows BIGINT, max_rowid BIGINT)")
+            self.catalog.reload_table(TEXT_INDEX_PREFIX)
+            self.catalog.reload_table(self.registry)
+
+    def is_indexed(self, table_name):
+        if not self.exists():
+            return False
+        name = self.catalog.table(table_name).name
+        registered = self.cur.execute(f"SELECT num_rows, max_rowid FROM {self.registry} WHERE table_name = ?", [name]).fetchone()
+        return registered is not None and registered == self.table_state(table_name)
+
+    def table_state(self, table_name):
+        """
+        **Internal use only. Do not call**
+
+        Returns (row count, highest rowid) of `table_name`
+        """
+        return self.cur.execute(f"SELECT COUNT(*), COALESCE(MAX(rowid), -1) FROM {table_name}").fetchone()
+
+    def mark(self, table_name):
+        if not self.enabled or self.catalog.table(table_name) is None or not self.is_indexed(table_name):
+            return None
+        return self.table_state(table_name)[1]
+
+    def update(self, table_name, mark):
+        if not self.enabled:
+            return
+        if mark is None:
+            self.rebuild(table_name)
+            return
+        start = perf_counter()
+        self.index_rows(table_name, mark)
+        self.register(table_name)
+        self.build_seconds += perf_counter() - start
+
+    def rebuild(self, table_name):
+        start = perf_counter()
+        self.create()
+        name = self.catalog.table(table_name).name
+        self.cur.execute(f"DELETE FROM {TEXT_INDEX_PREFIX} WHERE table_name = ?", [name])
+        self.index_rows(table_name, -1)
+        self.register(table_name)
+        self.build_seconds += perf_counter() - start
+
+    def register(self, table_name):
+        """
+        **Internal use only. Do not call**
+
+        Records the current row count and highest rowid of `table_name` as indexed
+        """
+        name = self.catalog.table(table_name).name
+        self.cur.execute(f"DELETE FROM {self.registry} WHERE table_name = ?", [name])
+        self.cur.execute(f"INSERT INTO {self.registry} VALUES (?, ?, ?)", [name] + list(self.table_state(table_name)))
+
+    def index_rows(self, table_name, mark):
+        """
+        **Internal use only. Do not call**
+
+        Adds posting lists for every column of the rows of `table_name` whose rowid is greater than `mark`
+        """
+        table_info = self.catalog.table(table_name)
+        for col in table_info.columns:
+            self.cur.execute(f"""
+                INSERT INTO {TEXT_INDEX_PREFIX}
+                SELECT ?, ?, trigram, list(DISTINCT row_id ORDER BY row_id) FROM (
+                    SELECT row_id, unnest(list_transform(range(1, length(v) - 1), i -> substring(v, i, 3))) AS trigram
+                    FROM (SELECT rowid AS row_id, lower(CAST({self.quote(col)} AS VARCHAR)) AS v FROM {table_name} WHERE rowid > ?)
+                    WHERE v IS NOT NULL)
+                GROUP BY trigram""", [table_info.name, col, mark])
+
+    def candidates(self, table_name, pattern):
+        if not self.enabled:
+            return None
+        runs = self.literal_runs(pattern.lower())
+        if len(runs) == 0 or not self.is_indexed(table_name):
+            return None
+        start = perf_counter()
+        trigrams = sorted({run[i:i+3] for run in runs for i in range(len(run) - 2)})
+        name = self.catalog.table(table_name).name
+        placeholders = ', '.join('?' * len(trigrams))
+        # for each column holding every trigram of the pattern, the posting lists of its rarest trigram are the candidates
+        row_ids = self.cur.execute(f"""
+            WITH postings AS (SELECT column_name, trigram, SUM(len(row_ids)) AS n FROM {TEXT_INDEX_PREFIX}
+                              WHERE table_name = ? AND trigram IN ({placeholders}) GROUP BY column_name, trigram),
+                 rarest AS (SELECT column_name, arg_min(trigram, n) AS trigram FROM postings
+                            GROUP BY column_name HAVING COUNT(*) = {len(trigrams)})
+            SELECT DISTINCT unnest(d.row_ids) FROM {TEXT_INDEX_PREFIX} AS d JOIN rarest USING (column_name, trigram)
+            WHERE d.table_name = ?""", [name] + trigrams + [name]).fetchall()
+        self.timed_lookup(start)
+        if len(row_ids) == 0:
+            return ""
+        if len(row_ids) > MAX_CANDIDATES:
+            return None
+        # a literal list is pushed down into the table scan, unlike a subquery
+        return ", ".join(str(row[0]) for row in row_ids)
+
+    def stats(self):
+        if not self.exists():
+            tables, entries = 0, 0
+        else:
+            tables = self.cur.execute(f"SELECT COUNT(*) FROM {self.registry}").fetchone()[0]
+            entries = self.cur.execute(f"SELECT COALESCE(SUM(len(row_ids)), 0) FROM {TEXT_INDEX_PREFIX}").fetchone()[0]
+        size = None
+        if tables > 0:
+            # bytes of the storage blocks holding the index table
+            size = self.cur.execute(f"""SELECT COUNT(DISTINCT block_id) * (SELECT block_size FROM pragma_database_size())
+                                         FROM pragma_storage_info('{TEXT_INDEX_PREFIX}') WHERE persistent""").fetchone()[0]
+        return {"tables": tables, "entries": entries, "size_bytes": size, "build_seconds": self.build_seconds,
+                "lookups": self.lookups, "lookup_seconds": self.lookup_seconds}
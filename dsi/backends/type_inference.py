@@ -0,0 +1,158 @@
+from functools import partial
+from operator import is_not
+
+import numpy as np
+import pandas as pd
+
+# Kinds of column types inferred from ingested data. Each backend maps these to its own SQL types
+INT32 = "int32"
+INT64 = "int64"
+FLOAT = "float"
+STRING = "string"
+
+INT32_MIN = -2147483648
+INT32_MAX =  2147483647
+INT64_MIN = -9223372036854775808
+INT64_MAX =  9223372036854775807
+
+class TypeInference:
+    """
+    Column type inference engine shared by the SQLite and DuckDB backends.
+
+    Infers the kind of a column {int32, int64, float, string} with the same rules the backends have always used:
+    all non-null values are ints (bools included) -> an integer kind sized by the range of the values,
+    all non-null values are floats -> float, anything else (including a mix of ints and floats) -> string.
+    An empty or all-null column is treated as int32.
+
+        - Typed NumPy arrays and pandas Series are decided from their dtype and a vectorized min/max.
+        - Python lists are first checked on a bounded, strided sample so string columns are decided
+          without touching every value. Numeric columns are then confirmed with a C-level pass over
+          the element types and a min/max range check.
+        - Decisions are cached per (table, column) so repeated ingests into the same table skip inference.
+          A cached decision is only reused while the catalog still has that column, so a table dropped and
+          recreated outside the backend is inferred again.
+    """
+    def __init__(self, catalog = None, sample_size = 1000):
+        """
+        `catalog` : Catalog, optional, default=None
+            Schema catalog of the backend. If None, cached decisions are reused until `forget()` is called
+
+        `sample_size` : int, optional, default=1000
+            Maximum number of values from a Python list inspected before a full pass is needed
+        """
+        self.catalog = catalog
+        self.sample_size = sample_size
+        self.cache = {}
+
+    def infer(self, values, table_name = None, column_name = None):
+        """
+        Returns the kind of a column of values: "int32", "int64", "float" or "string".
+
+        `values` : list, numpy.ndarray or pandas.Series
+            Data of one column
+
+        `table_name` : str, optional, default=None
+            Table the column belongs to. If both `table_name` and `column_name` are given, the decision is cached
+
+        `column_name` : str, optional, default=None
+            Name of the column
+        """
+        key = None
+        if table_name is not None and column_name is not None:
+            key = (table_name, column_name)
+            if key in self.cache and self.exists(table_name, column_name):
+                return self.cache[key]
+
+        if isinstance(values, pd.Series) and values.dtype != object:
+            kind = self.infer_dtype(values.to_numpy())
+        elif isinstance(values, np.ndarray) and values.dtype != object:
+            kind = self.infer_dtype(values)
+        else:
+            kind = self.infer_list(values)
+
+        if key is not None:
+            self.cache[key] = kind
+        return kind
+
+    def forget(self, table_name):
+        """
+        Drops every cached decision for `table_name`. Called when a table is dropped or rewritten
+        """
+        for key in [k for k in self.cache if k[0] == table_name]:
+            del self.cache[key]
+
+    def exists(self, table_name, column_name):
+        """
+        **Internal use only. Do not call**
+
+        Returns True if the catalog still has the column, or if there is no catalog
+        """
+        if self.catalog is None:
+            return True
+        table_info = self.catalog.table(table_name)
+        if table_info is None:
+            return False
+        column_name = self.catalog.unquote(column_name).lower()
+        return any(col.lower() == column_name for col in table_info.columns)
+
+    def infer_dtype(self, array):
+        """
+        **Internal use only. Do not call**
+
+        Infers the kind of a typed NumPy array from its dtype
+        """
+        if array.dtype == bool:
+            return INT32
+        if np.issubdtype(array.dtype, np.integer):
+            if array.size == 0:
+                return INT32
+            if int(array.min()) < INT32_MIN or int(array.max()) > INT32_MAX:
+                return INT64
+            return INT32
+        if np.issubdtype(array.dtype, np.floating):
+            return FLOAT
+        return STRING
+
+    def infer_list(self, values):
+        """
+        **Internal use only. Do not call**
+
+        Infers the kind of a list of Python values
+        """
+        if not isinstance(values, list):
+            values = list(values)
+
+        if len(values) > self.sample_size:
+            step = len(values) // self.sample_size
+            if self.kind_of_types(set(map(type, values[::step]))) == STRING:
+                return STRING
+
+        value_types = set(map(type, values))
+        kind = self.kind_of_types(value_types)
+        if kind != INT64:
+            return kind
+
+        non_null = values
+        if type(None) in value_types:
+            non_null = list(filter(partial(is_not, None), values))
+        if len(non_null) == 0:
+            return INT32
+        low, high = min(non_null), max(non_null)
+        if low < INT64_MIN or high > INT64_MAX:
+            return FLOAT
+        if low < INT32_MIN or high > INT32_MAX:
+            return INT64
+        return INT32
+
+    def kind_of_types(self, value_types):
+        """
+        **Internal use only. Do not call**
+
+        Classifies a set of Python types. Integer columns are returned as int64 before their range is checked
+        """
+        value_types = value_types - {type(None)}
+        if all(issubclass(t, int) for t in value_types):
+            return INT64
+        if all(issubclass(t, float) for t in value_types):
+            return FLOAT
+        return STRING
@@ -10,8 +10,10 @@ import textwrap
 from contextlib import redirect_stdout
 import sys
 import io
+import signal
 
 from dsi.core import Terminal
+from dsi.backends.storage_profile import STORAGE_PROFILES, STORAGE_SETTINGS
 from ._version import __version__
 
 def autofill_path(text, state):
@@ -51,7 +53,7 @@ class DSI_cli:
         self.start_dir = os.getcwd() + "/"
         return
     
-    def startup(self, backend="sqlite"):
+    def startup(self, backend="sqlite", profile="default", storage_options=None):
         self.t = Terminal(debug = 0, runTable=False)
         self.t.user_wrapper = True
 
@@ -64,11 +66,11 @@ class DSI_cli:
         try:
             with redirect_stdout(fnull):
                 if backend=="duckdb":
-                    self.t.load_module('backend','DuckDB','back-write', filename = db_path)
+                    self.t.load_module('backend','DuckDB','back-write', filename = db_path, profile = profile, storage_options = storage_options)
                     self.name = "duckdb"
                 else:
                     backend = "sqlite"
-                    self.t.load_module('backend','Sqlite','back-write', filename = db_path)
+                    self.t.load_module('backend','Sqlite','back-write', filename = db_path, profile = profile, storage_options = storage_options)
                     self.name = "sqlite"
         except Exception as e:
             print(f"backend ERROR: {e}")
@@ -86,12 +88,14 @@ class DSI_cli:
             ("find <condition>", "Finds all rows of a table that match a column-level condition."),
             ("help", "Shows this help message."),
             ("list", "Lists all tables in the current DSI database"),
+            ("merge <filenames> [-b batch_size] [-w workers]",
+            "Merges many DSI databases of the CLI's backend type, or glob patterns of them, into the DSI database"),
             ("plot_table <table_name> [-f filename]", "Plots numerical data from a table to an optional file name argument"),
-            ("query <SQL_query> [-n num_rows] [-e filename]",
-            "Executes a SQL query (in quotes). Optionally limit printed rows or export to CSV/Parquet"),
+            ("query <SQL_query> [-n num_rows] [-e filename] [-t seconds]",
+            "Executes a SQL query (in quotes). Optionally limit printed rows, export to CSV/Parquet or set a timeout"),
             ("read <filename> [-t table_name]", "Reads a file or URL into the DSI database. Optionally set table name."),
             ("search <value>", "Searches for a string or number across DSI."),
-            ("summary [-t table_name]", "Summary of the database or a specific table."),
+            ("summary [-t table_name] [-a]", "Summary of the database or a specific table. Optionally add approximate quantiles."),
             ("write <filename>", "Writes data in DSI database to a permanent location."),
             ("ls", "Lists all files in the current or specified directory."),
             ("cd <path>", "Changes the working directory within the CLI environment.")
@@ -101,9 +105,20 @@ class DSI_cli:
         terminal_width = shutil.get_terminal_size().columns
         for cmd, desc in commands:
             print(textwrap.fill(f"{cmd:48} {desc}", width=terminal_width, subsequent_indent=' ' * 50))
+        print("Pressing Ctrl-C while a query, find or search runs cancels it and keeps the loaded data.")
         print()
 
 
+    def interrupt(self, signum, frame):
+        '''
+        Handles Ctrl-C while a command runs: cancels the running statement and keeps the CLI session and its data.
+        Without a running statement, Ctrl-C exits the CLI as before
+        '''
+        if not self.t.cancel():
+            raise KeyboardInterrupt
+        print("\nCancelling the running statement...")
+
+
     def cd(self, args):
         '''
         Changes the current working directory only within the CLI environment
@@ -196,8 +211,12 @@ class DSI_cli:
         Exports to a csv/parquet file
         '''
         if table_name != "temp_query":
+            # only the exported table is read, except for ER diagrams which show every table
+            process_args = {}
+            if table_name != "dsi_erd_gen":
+                process_args["table_names"] = [table_name[7:] if "dsi_tb_" in table_name else table_name, "runTable", "dsi_units"]
             try:        
-                self.t.artifact_handler(interaction_type='process')
+                self.t.artifact_handler(interaction_type='process', **process_args)
             except Exception as e:
                 self.t.active_metadata = OrderedDict()
                 print(f"export ERROR: {e}")
@@ -346,6 +365,40 @@ class DSI_cli:
             return
 
 
+    def get_merge_parser(self):
+        parser = argparse.ArgumentParser(prog='merge')
+        parser.add_argument('filenames', nargs='+', help='Database files or glob patterns (in quotes) to merge into DSI')
+        parser.add_argument('-b', '--batch_size', type=int, required=False, help='Number of files merged in one transaction')
+        parser.add_argument('-w', '--workers', type=int, required=False, help='Number of threads reading the schemas of the files')
+        return parser
+
+    def merge(self, args):
+        '''
+        Merges many DSI database files of the CLI's backend type into the DSI database, inside the database engine
+
+        Args:
+            filenames (list): database files or glob patterns matching them
+            batch_size (int): number of files merged in one transaction
+            workers (int): number of threads reading the schemas of the files
+        '''
+        filenames = []
+        for pattern in args.filenames:
+            matches = sorted(glob.glob(os.path.expanduser(pattern)))
+            if len(matches) == 0:
+                print(f"merge ERROR: No database files match {pattern}\n")
+                return
+            filenames.extend(matches)
+
+        try:
+            merged = self.t.merge(filenames, batch_size = args.batch_size, workers = args.workers)
+        except Exception as e:
+            print(f"merge ERROR: {e}\n")
+            return
+        print(f"Merged {len(filenames)} databases into the tables: {', '.join(merged.keys())}")
+        self.t.num_tables()
+        print()
+
+
     def get_plot_table_parser(self):
         parser = argparse.ArgumentParser(prog='plot_table')
         parser.add_argument('table_name', help='Table to plot')
@@ -372,6 +425,7 @@ class DSI_cli:
         parser.add_argument('sql_query', help='SQL query (in quotes) to execute')
         parser.add_argument('-n', '--num_rows', type=int, required=False, help='Show first n rows of the table')
         parser.add_argument('-e', '--export', type=str, required=False, help='Export to csv or parquet file')
+        parser.add_argument('-t', '--timeout', type=float, required=False, help='Cancel the query after this many seconds')
         return parser
 
     def query(self, args):
@@ -386,7 +440,7 @@ class DSI_cli:
         print(f"Printing the result from input SQL query: {sql_query}")
 
         try:
-            data = self.t.artifact_handler(interaction_type='query', query = sql_query)
+            data = self.t.artifact_handler(interaction_type='query', query = sql_query, timeout = args.timeout)
         except Exception as e:
             print(f"query ERROR: {e}")
             return
@@ -555,6 +609,7 @@ class DSI_cli:
     def get_summary_parser(self):
         parser = argparse.ArgumentParser(prog='summary')
         parser.add_argument('-t', '--table', type=str, required=False, help='Show only this table')
+        parser.add_argument('-a', '--approx', action='store_true', help='Add approximate quantiles, distinct counts and samples')
         return parser
     
     def summary(self, args):
@@ -566,7 +621,7 @@ class DSI_cli:
             table_name = args.table
         
         try:
-            self.t.summary(table_name)
+            self.t.summary(table_name, approx = args.approx)
         except Exception as e:
             print(f"summary ERROR: {e}")
         print()
@@ -655,6 +710,7 @@ COMMANDS = {
     'find' : (None, cli.find),
     'help': (None, cli.help_fn),
     'list' : (None, cli.list_tables),
+    'merge' : (cli.get_merge_parser, cli.merge),
     'read' : (cli.get_read_parser, cli.read),
     'plot_table' : (cli.get_plot_table_parser, cli.plot_table),
     'query' : (cli.get_query_parser, cli.query),
@@ -672,11 +728,24 @@ def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument("-b", "--backend", type=str, default="sqlite", help="Supported backends are sqlite and duckdb")
+    parser.add_argument("-p", "--profile", type=str, default="default", help=f"Storage profile of the backend: {', '.join(STORAGE_PROFILES)}")
+    parser.add_argument("-s", "--storage", type=str, action="append", default=[], metavar="SETTING=VALUE",
+                        help="Storage setting overriding the profile, such as synchronous=OFF. Can be repeated")
 
     args = parser.parse_args()
     if args.backend.lower() not in ["sqlite", "duckdb"]:
         print("ERROR: Invalid backend input. Valid backends are: sqlite, duckdb")
         exit(1)
+    if args.profile not in STORAGE_PROFILES:
+        print(f"ERROR: Invalid profile input. Valid profiles are: {', '.join(STORAGE_PROFILES)}")
+        exit(1)
+    storage_options = {}
+    for option in args.storage:
+        name, _, value = option.partition("=")
+        if name not in STORAGE_SETTINGS or value == "":
+            print(f"ERROR: Invalid storage setting '{option}'. Valid settings are: {', '.join(STORAGE_SETTINGS)}")
+            exit(1)
+        storage_options[name] = int(value) if value.isdigit() else value
     print("   ", textwrap.dedent(fr"""
          _____           ___                          
         /  /  \         /  /\         ___     
@@ -691,7 +760,7 @@ def main():
                         \__\/                   v{cli.version()}
     """).strip())
     print()
-    cli.startup(args.backend)
+    cli.startup(args.backend, args.profile, storage_options)
     print("\nEnter \"help\" for usage hints.")
 
     while True:
@@ -709,15 +778,20 @@ def main():
                 
             parser_factory, handler = COMMANDS[command]
 
-            if parser_factory:
-                parser = parser_factory()
-                try:
-                    parsed_args = parser.parse_args(args)
-                    handler(parsed_args)
-                except SystemExit:
-                    pass # argparse tries to exit on error — suppress that in shell
-            else:
-                handler(args)
+            # Ctrl-C cancels the statement a command runs, rather than the whole session
+            previous_handler = signal.signal(signal.SIGINT, cli.interrupt)
+            try:
+                if parser_factory:
+                    parser = parser_factory()
+                    try:
+                        parsed_args = parser.parse_args(args)
+                        handler(parsed_args)
+                    except SystemExit:
+                        pass # argparse tries to exit on error — suppress that in shell
+                else:
+                    handler(args)
+            finally:
+                signal.signal(signal.SIGINT, previous_handler)
             
         except KeyboardInterrupt:
             cli.exit_cli([])
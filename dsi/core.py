@@ -13,7 +13,10 @@ import csv
 import re
 import tarfile
 import subprocess
-from contextlib import redirect_stdout
+from contextlib import redirect_stdout, nullcontext
+
+from dsi.backends.backup import BACKUP_GENERATIONS
+from dsi.backends.maintenance import MAINTENANCE_ROWS, MAINTENANCE_BYTES
 
 class Terminal():
     """
@@ -38,7 +41,8 @@ class Terminal():
                               'backend': ['back-read', 'back-write']}
     VALID_ARTIFACT_INTERACTION_TYPES = ['put', 'get', 'inspect', 'read', 'ingest', 'query', 'notebook', 'process']
 
-    def __init__(self, debug = 0, backup_db = False, runTable = False):
+    def __init__(self, debug = 0, backup_db = False, runTable = False, backup_generations = BACKUP_GENERATIONS,
+                 maintenance_rows = MAINTENANCE_ROWS, maintenance_bytes = MAINTENANCE_BYTES):
         """
         Initialization function to configure optional DSI core parameters.
 
@@ -52,9 +56,20 @@ class Terminal():
         `backup_db` : bool, default=False
             - If True, creates a backup of the current backend database before committing any new changes.
 
+        `backup_generations` : int, default=1
+            - Number of backup files kept per backend database. Each new backup moves the older ones
+              to "<name>.backup.1<ext>", "<name>.backup.2<ext>", ... and deletes the oldest beyond this count.
+
         `runTable` : bool, default=False
             - If True, a 'runTable' is created, and timestamped each time new data/metadata is ingested.
               Recommended for in-situ use-cases.
+
+        `maintenance_rows` : int, default=100000
+            - Number of rows ingested into a SQLite or DuckDB backend after which its planner statistics are refreshed
+              and its write-ahead log checkpointed on a background thread. None never triggers on rows.
+
+        `maintenance_bytes` : int, default=256 MiB
+            - Growth in bytes of a backend's database files after which the same maintenance runs. None never triggers on size.
         """
         def static_munge(prefix, implementations):
             return (['.'.join(i) for i in product(prefix, implementations)])
@@ -81,9 +96,13 @@ class Terminal():
         
         self.active_metadata = OrderedDict()
         self.loaded_backends = []
+        self.federation = None
 
         self.runTable = runTable
         self.backup_db = backup_db
+        self.backup_generations = backup_generations
+        self.maintenance_rows = maintenance_rows
+        self.maintenance_bytes = maintenance_bytes
 
         self.user_wrapper = False
         self.new_tables = None
@@ -252,6 +271,8 @@ class Terminal():
                             parent_classes = class_.__bases__
                             if parent_classes and parent_classes[0].__name__ == "Filesystem" and 'filename' in kwargs:
                                 backend_filename = kwargs['filename']
+                                if backend_filename == ":memory:" and kwargs.get('persist_to') is not None:
+                                    backend_filename = kwargs['persist_to']
                                 has_data = False
                                 has_runTable = False
                                 # if to-be-loaded backend has data and runTable in its tables, turn global runTable off
@@ -271,6 +292,9 @@ class Terminal():
                                     raise ValueError("runTable flag is only valid for in-situ workflows, not for populated backends wihout a runTable.")
                                 
                             class_.runTable = self.runTable
+                        if mod_function == "back-read" and class_.__name__ == "Sqlite" and os.path.isfile(kwargs.get('filename', '')):
+                            # back-read backends are never written to, so an existing SQLite file is opened read-only
+                            kwargs.setdefault('read_only', True)
                         class_object = class_(**kwargs)
                         self.active_modules[mod_function].append(class_object)
                         if mod_type == "backend":
@@ -429,9 +453,13 @@ class Terminal():
 
                     - if backup_db flag = True in Core instance, a backup is created prior to ingesting data
                 - 'query' or 'get': retrieves data from first loaded backend based on a specified 'query'
+
+                    - after `federate()`, the query runs across all federated databases instead
                 - 'notebook' or 'inspect': generates an interactive Python notebook with all data from first loaded backend
                 - 'process' or 'read': overwrites current DSI abstraction with all data from first loaded BACK-READ backend
 
+                    - pass `table_names` to read only those tables from a SQLite or DuckDB backend
+
         `query` : str, optional
             Required only when `interaction_type` is 'query' or 'get', and it is an input to a backend's `query_artifact()` method.
 
@@ -440,7 +468,11 @@ class Terminal():
             View relevant functions in the DSI backend file to understand other arguments to pass in.
         
         `return`: only when `interaction_type` = 'query'
-            By default stores query result as a Pandas.DataFrame. If specified, returns it as an OrderedDict
+            By default stores query result as a Pandas.DataFrame. If specified, returns it as an OrderedDict.
+            If `batch_rows` is passed, returns an iterator over the result in batches of at most `batch_rows` rows instead,
+            as DataFrames or, with `arrow` = True, as pyarrow.RecordBatches. Only SQLite and DuckDB backends support this
+            If `timeout` is passed to a SQLite or DuckDB backend, the query is cancelled after that many seconds
+            and a QueryCancelled error is raised
 
         A DSI Core Terminal may load zero or more Backends with storage functionality.
         """
@@ -460,17 +492,14 @@ class Terminal():
                 if self.debug_level != 0:
                     self.logger.info("-------------------------------------")
                     self.logger.info(f"{obj.__class__.__name__} backend - {interaction_type.upper()} the data")
-                start = datetime.now()
                 parent_class = obj.__class__.__bases__[0].__name__
-                if self.backup_db == True and parent_class == "Filesystem" and os.path.getsize(obj.filename) > 100:
+                if self.backup_db == True and parent_class == "Filesystem" and self.backup_path(obj) is not None and \
+                    (obj.filename == ":memory:" or os.path.getsize(obj.filename) > 100):
                     if self.debug_level != 0:
                         self.logger.info(f"   Creating backup file before ingesting data into the {obj.__class__.__name__} backend")
-                    backup_start = datetime.now()
-                    backup_file = obj.filename[:obj.filename.rfind('.')] + ".backup" + obj.filename[obj.filename.rfind('.'):]
-                    shutil.copyfile(obj.filename, backup_file)
-                    backup_end = datetime.now()
-                    if self.debug_level != 0:
-                        self.logger.info(f"   Backup file runtime: {backup_end-backup_start}")
+                    self.backup_backend(obj)
+                # the backup runtime is logged on its own, so this runtime only covers the ingest
+                start = datetime.now()
                 
                 tester = 0
                 if sys.gettrace() is None:
@@ -491,6 +520,12 @@ class Terminal():
                     sys.settrace(None) # ends trace to prevent large overhead
                 operation_success = True
                 end = datetime.now()
+                if hasattr(obj, "maintenance") and obj.maintenance.after_ingest(self.ingested_rows(), self.maintenance_rows,
+                                                                                self.maintenance_bytes, self.logger):
+                    if self.debug_level != 0:
+                        self.logger.info(f"   Started the maintenance of the {obj.__class__.__name__} backend in the background")
+                if self.debug_level != 0 and hasattr(obj, "text_index") and obj.text_index.enabled:
+                    self.logger.info(f"   Text index: {obj.text_index.stats()}")
                 self.logger.info(f"Runtime: {end-start}")
         if interaction_type in ['ingest', 'put'] and len(self.active_modules['back-read']) > 0:
             backread_active = True
@@ -503,7 +538,9 @@ class Terminal():
             self.logger.info(f"{first_backend.__class__.__name__} backend - {interaction_type.upper()} the data")
         start = datetime.now()
         if interaction_type in ['query', 'get']:
-            # TODO query all backends together
+            # queries run across all federated databases when federate() was called
+            first_backend = self.read_backend()
+            parent_backend = first_backend.__class__.__bases__[0].__name__
             if self.valid_backend(first_backend, parent_backend):
                 if "query" in first_backend.query_artifacts.__code__.co_varnames:
                     self.logger.info(f"Query to get data: {query}")
@@ -512,7 +549,13 @@ class Terminal():
                 if sys.gettrace() is None:
                     tester = 1
                     sys.settrace(self.trace_function) # starts a short trace to get line number where query_artifacts() returned
-                if interaction_type == "get":
+                if "batch_rows" in kwargs:
+                    if not hasattr(first_backend, "query_iter"):
+                        if tester == 1:
+                            sys.settrace(None)
+                        raise NotImplementedError(f"{first_backend.__class__.__name__} backend cannot return a query result in batches")
+                    query_data = first_backend.query_iter(**kwargs)
+                elif interaction_type == "get":
                     query_data = first_backend.get_artifacts(**kwargs)
                 elif interaction_type == "query":
                     query_data = first_backend.query_artifacts(**kwargs)
@@ -557,9 +600,9 @@ class Terminal():
                 if self.debug_level != 0:
                     self.logger.info(f"{first_backend.__class__.__name__} backend - {interaction_type.upper()} the data")
                 if interaction_type == "process":
-                    self.active_metadata = first_backend.process_artifacts()
+                    self.active_metadata = first_backend.process_artifacts(**kwargs)
                 elif interaction_type == "read":
-                    self.active_metadata = first_backend.read_to_artifact()
+                    self.active_metadata = first_backend.read_to_artifact(**kwargs)
                 operation_success = True
             else: #backend is empty - cannot process data
                 if self.debug_level != 0:
@@ -596,11 +639,11 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Getting data from the table: {table_name} in the first loaded backend')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend to be able to get data from a specified table')
             raise NotImplementedError('Need to load a valid backend to be able to get data from a specified table')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
@@ -651,13 +694,16 @@ class Terminal():
         
         return output
 
-    def find(self, query_object):
+    def find(self, query_object, timeout = None):
         """
         Find all instances of `query_object` across all tables, columns, and cells in the first loaded backend.
        
         `query_object` : any
             The object to search for in the backend. Can be of any type, including str, float, or int.
 
+        `timeout` : float, optional, default=None
+            Number of seconds after which the find is cancelled with a QueryCancelled error. No timeout if None
+
         `return` : list
             A list of backend-specific result objects, each representing a match for `query_object`.
             The structure of each object depends on the backend implementation.
@@ -667,18 +713,19 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Finding `{query_object}` across all tables, columns, and cells in the first loaded backend')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend before performing a find on it')
             raise NotImplementedError('Need to load a valid backend before performing a find on it')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
                 self.logger.error("Error in find all function: First loaded backend needs to have data to be able to find data from it")
             raise RuntimeError("Error in find all function: First loaded backend needs to have data to be able to find data from it")
         start = datetime.now()
-        return_object = backend.find(query_object)
+        with self.time_limit(backend, timeout):
+            return_object = backend.find(query_object)
         return self.find_helper(query_object, return_object, start, "")
     
     def find_table(self, query_object):
@@ -697,11 +744,11 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Finding all tables whose name matches `{query_object}` in the first loaded backend')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend before performing a find on it')
             raise NotImplementedError('Need to load a valid backend before performing a find on it')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
@@ -711,7 +758,7 @@ class Terminal():
         return_object = backend.find_table(query_object)
         return self.find_helper(query_object, return_object, start, "table ")
     
-    def find_column(self, query_object, range = False):
+    def find_column(self, query_object, range = False, timeout = None):
         """
         Find all columns whose name matches `query_object` in the first loaded backend.
        
@@ -723,6 +770,9 @@ class Terminal():
 
             If False, then data for each column that matches `query_object` is included in return
 
+        `timeout` : float, optional, default=None
+            Number of seconds after which the find is cancelled with a QueryCancelled error. No timeout if None
+
         `return` : list
             A list of backend-specific result objects, each representing a match for `query_object`.
             The structure of each object depends on the backend implementation.
@@ -732,21 +782,22 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Finding all columns whose name matches `{query_object}` in the first loaded backend')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend before performing a find on it')
             raise NotImplementedError('Need to load a valid backend before performing a find on it')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
                 self.logger.error("Error in find column function: First loaded backend needs to have data to be able to find data from it")
             raise RuntimeError("Error in find column function: First loaded backend needs to have data to be able to find data from it")
         start = datetime.now()
-        return_object = backend.find_column(query_object, range)
+        with self.time_limit(backend, timeout):
+            return_object = backend.find_column(query_object, range)
         return self.find_helper(query_object, return_object, start, "column ")
 
-    def find_cell(self, query_object, row = False):
+    def find_cell(self, query_object, row = False, timeout = None):
         """
         Find all cells that match the `query_object` in the first loaded backend.
        
@@ -758,6 +809,9 @@ class Terminal():
 
             If False, includes only the value of the matching cell
 
+        `timeout` : float, optional, default=None
+            Number of seconds after which the find is cancelled with a QueryCancelled error. No timeout if None
+
         `return` : list
             A list of backend-specific result objects, each representing a match for `query_object`.
             The structure of each object depends on the backend implementation.
@@ -767,18 +821,19 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Finding all cells which match `{query_object}` in the first loaded backend')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend before performing a find on it')
             raise NotImplementedError('Need to load a valid backend before performing a find on it')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
                 self.logger.error("First loaded backend needs to have data to be able to find data from it")
             raise RuntimeError("First loaded backend needs to have data to be able to find data from it")
         start = datetime.now()
-        return_object = backend.find_cell(query_object, row)
+        with self.time_limit(backend, timeout):
+            return_object = backend.find_cell(query_object, row)
         return self.find_helper(query_object, return_object, start, "cell ")
 
     # Internal function to return found objects or print errors.
@@ -804,7 +859,7 @@ class Terminal():
             self.logger.info(f"Runtime: {end-start}")
         return return_object
     
-    def find_relation(self, query_object):
+    def find_relation(self, query_object, timeout = None):
         """   
         Finds all rows in the first table of the first loaded backend that satisfy a column-level condition.
         `query_object` must include a column, operator, and value to define a valid relational condition.
@@ -813,6 +868,9 @@ class Terminal():
             A relational expression combining column, operator, and value.
             Ex: "age > 4", "age < 4", "age >= 4", "age <= 4", "age = 4", "age == 4", "age != 4", "age (4, 8)", "age ~ 4", "age ~~ 4".
 
+        `timeout` : float, optional, default=None
+            Number of seconds after which the find is cancelled with a QueryCancelled error. No timeout if None
+
         `return` : list
             A list of backend-specific result objects, each representing a row that satisfies the relation.
             The structure of each object depends on the backend implementation.
@@ -822,11 +880,11 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Finding all rows in the first table of the first loaded backend where {query_object}')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend before performing a find on it')
             raise NotImplementedError('Need to load a valid backend before performing a find on it')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
@@ -891,7 +949,8 @@ class Terminal():
         else:
             relation = f"{result[1]} {wrap_in_quotes(result[2])}"
 
-        return_object = backend.find_relation(column_name, relation)
+        with self.time_limit(backend, timeout):
+            return_object = backend.find_relation(column_name, relation)
         if isinstance(return_object, str):
             if self.debug_level != 0:
                 self.logger.warning(return_object)
@@ -920,8 +979,8 @@ class Terminal():
         """
         Overwrites specified table(s) in the first loaded backend with the provided Pandas DataFrame(s).
 
-        If a relational schema has been previously loaded into the backend, it will be reapplied to the table.
-        **Note:** This function permanently deletes the existing table and its data, before inserting the new data.
+        Rows are diffed against the stored table so only changed rows are written, and rows missing from the DataFrame are deleted.
+        If the table cannot be updated row by row, it is dropped and its new data ingested, reapplying a previously loaded relational schema.
 
         `table_name` : str or list
             - If str, name of the table to overwrite in the backend.
@@ -948,7 +1007,6 @@ class Terminal():
             if self.debug_level != 0:
                 self.logger.error("First loaded backend needs to have data to be able to overwrite its data")
             raise RuntimeError("First loaded backend needs to have data to be able to overwrite its data")
-        start = datetime.now()
 
         list_names = isinstance(table_name, list) and all(isinstance(name, str) for name in table_name)
         if not isinstance(table_name, str) and list_names == False:
@@ -973,13 +1031,8 @@ class Terminal():
         if backup == True:
             if self.debug_level != 0:
                 self.logger.info(f"   Creating backup file before overwriting data in the {backend.__class__.__name__} backend")
-            backup_start = datetime.now()
-            extension = backend.filename.rfind('.')
-            backup_file = backend.filename[:extension] + ".backup" + backend.filename[extension:]
-            shutil.copyfile(backend.filename, backup_file)
-            backup_end = datetime.now()
-            if self.debug_level != 0:
-                self.logger.info(f"   Backup file creation runtime: {backup_end-backup_start}")
+            self.backup_backend(backend)
+        start = datetime.now()
 
         errorStmt = backend.overwrite_table(table_name, collection)
         if errorStmt is not None and isinstance(errorStmt, tuple):
@@ -990,6 +1043,63 @@ class Terminal():
         end = datetime.now()
         if self.debug_level != 0:
             self.logger.info(f"Runtime: {end-start}")
+
+    def update_table(self, table_name, collection, row_numbers, backup = False):
+        """
+        Updates rows of a table in the first loaded backend in place with the edited rows of a Pandas DataFrame.
+        Only changed values and new rows and columns are written, so the rest of the table and every other table are left untouched.
+
+        `table_name` : str
+            Name of the table to update in the backend.
+
+        `collection` : pandas.DataFrame
+            Edited rows with every column of the table. Its first len(`row_numbers`) rows replace the stored rows
+            at those positions, and any further rows are appended to the table.
+
+        `row_numbers` : list of int
+            1-indexed positions of the edited rows in the table, such as the row numbers returned by `find()`.
+
+        `backup` : bool, optional, default False.
+            - If True, creates a backup file for the DSI backend before updating its data.
+            - If False, (default), only updates the data.
+        """
+        if self.debug_level != 0:
+            self.logger.info("-------------------------------------")
+            self.logger.info(f'Updating rows of the table: {table_name} in the first loaded backend')
+        if len(self.loaded_backends) == 0:
+            if self.debug_level != 0:
+                self.logger.error('Need to load a valid backend to be able to update a table')
+            raise NotImplementedError('Need to load a valid backend to be able to update a table')
+        backend = self.loaded_backends[0]
+        parent_backend = backend.__class__.__bases__[0].__name__
+        if not self.valid_backend(backend, parent_backend):
+            if self.debug_level != 0:
+                self.logger.error("First loaded backend needs to have data to be able to update its data")
+            raise RuntimeError("First loaded backend needs to have data to be able to update its data")
+        if not isinstance(table_name, str) or table_name.lower() in self.dsi_tables:
+            if self.debug_level != 0:
+                self.logger.error("Input 'table_name' must be a single table name that is not DSI-reserved. Try again.")
+            raise RuntimeError("Input 'table_name' must be a single table name that is not DSI-reserved. Try again.")
+        if not isinstance(collection, pd.DataFrame):
+            if self.debug_level != 0:
+                self.logger.error("Input 'collection' must be a single DataFrame")
+            raise RuntimeError("Input 'collection' must be a single DataFrame")
+
+        if backup == True:
+            if self.debug_level != 0:
+                self.logger.info(f"   Creating backup file before updating data in the {backend.__class__.__name__} backend")
+            self.backup_backend(backend)
+        start = datetime.now()
+
+        errorStmt = backend.update_table(table_name, collection, row_numbers)
+        if errorStmt is not None and isinstance(errorStmt, tuple):
+            if self.debug_level != 0:
+                self.logger.error(f"Update_table() error: {errorStmt[1]}")
+            raise errorStmt[0](errorStmt[1])
+
+        end = datetime.now()
+        if self.debug_level != 0:
+            self.logger.info(f"Runtime: {end-start}")
     
     def list(self):
         """
@@ -998,11 +1108,11 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Listing data of all tables and their dimensions in the first loaded backend')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend before listing all tables in it')
             raise NotImplementedError('Need to load a valid backend before listing all tables in it')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
@@ -1021,7 +1131,7 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info(f"Runtime: {end-start}")
 
-    def summary(self, table_name = None, collection = False):
+    def summary(self, table_name = None, collection = False, approx = False):
         """
         Returns/Prints numerical metadata from tables in the first loaded backend.
 
@@ -1033,6 +1143,11 @@ class Terminal():
         `collection` : bool, optional, default False.
             - If True, returns either a list of DataFrames (table_name = None), or a single DataFrame of metadata
             - If False (default), prints metadata from all tables (table_name = None), or just a single table
+
+        `approx` : bool, optional, default False.
+            If True, also returns/prints approximate p50, p95 and p99 quantiles, distinct counts and a random sample of each
+            numeric column from sketches stored in the backend. Quantiles are within 1.65% of the requested rank
+            and distinct counts within 3.3%, both with high probability.
         """
         if self.debug_level != 0 and table_name == None:
             self.logger.info("-------------------------------------")
@@ -1040,11 +1155,11 @@ class Terminal():
         elif self.debug_level != 0 and table_name != None:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Summarizing numerical data of the table: {table_name} in the first loaded backend')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend before printing table info from it')
             raise NotImplementedError('Need to load a valid backend before printing table info from it')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
@@ -1052,7 +1167,7 @@ class Terminal():
             raise RuntimeError("First loaded backend needs to have data to be able to summarize its data")
         start = datetime.now()
 
-        output = backend.summary(table_name)
+        output = backend.summary(table_name, approx = True) if approx else backend.summary(table_name)
         if output is not None and isinstance(output, tuple):
             if self.debug_level != 0:
                 self.logger.error(f"Summary error: {output[1]}")
@@ -1087,11 +1202,11 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Printing number of tables in the first loaded backend')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend before listing all tables in it')
             raise NotImplementedError('Need to load a valid backend before listing all tables in it')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
@@ -1123,11 +1238,11 @@ class Terminal():
         if self.debug_level != 0:
             self.logger.info("-------------------------------------")
             self.logger.error(f'Displaying data from the table {table_name} in the first loaded backend')
-        if len(self.loaded_backends) == 0:
+        if self.read_backend() is None:
             if self.debug_level != 0:
                 self.logger.error('Need to load a valid backend before printing table info from it')
             raise NotImplementedError('Need to load a valid backend before printing table info from it')
-        backend = self.loaded_backends[0]
+        backend = self.read_backend()
         parent_backend = backend.__class__.__bases__[0].__name__
         if not self.valid_backend(backend, parent_backend):
             if self.debug_level != 0:
@@ -1279,6 +1394,7 @@ class Terminal():
             backend.close()
         for loaded in self.loaded_backends:
             loaded.close()
+        self.unfederate()
 
         if self.debug_level != 0:
             self.logger.info("Cleared all loaded plugins and backends")
@@ -1378,10 +1494,192 @@ class Terminal():
             original_file = frame.f_code.co_filename # Get file name
         return self.trace_function
 
+    def merge(self, filenames, batch_size = None, workers = None):
+        """
+        Merges DSI database files into all loaded BACK-WRITE SQLite or DuckDB backends with their `merge_artifacts()`.
+        Rows are copied inside the engine with `INSERT INTO ... SELECT`, schemas are reconciled, units are checked
+        and run_ids are renumbered consistently with the backend's runTable.
+
+        If backup_db flag = True in Core instance, a backup is created prior to merging the files
+
+        `filenames` : str or list of str
+            Database files of the same engine as the backends to merge into them.
+
+        `batch_size` : int, optional, default=None
+            Number of files attached and merged in one transaction. If None, the default of each backend.
+
+        `workers` : int, optional, default=None
+            Number of threads reading the schemas of the files. If None, 8.
+
+        `return`: an OrderedDict of table name -> number of rows merged into it, for the first BACK-WRITE backend
+        """
+        backends = [obj for obj in self.active_modules['back-write'] if hasattr(obj, "merge_artifacts")]
+        if len(backends) == 0:
+            if self.debug_level != 0:
+                self.logger.error('Need to load a SQLite or DuckDB BACK-WRITE backend to merge databases into')
+            raise NotImplementedError('Need to load a SQLite or DuckDB BACK-WRITE backend to merge databases into')
+
+        merged = None
+        for obj in backends:
+            if self.debug_level != 0:
+                self.logger.info("-------------------------------------")
+                self.logger.info(f"{obj.__class__.__name__} backend - MERGE {len(filenames)} databases")
+            if self.backup_db == True and self.backup_path(obj) is not None and \
+                (obj.filename == ":memory:" or os.path.getsize(obj.filename) > 100):
+                if self.debug_level != 0:
+                    self.logger.info(f"   Creating backup file before merging data into the {obj.__class__.__name__} backend")
+                self.backup_backend(obj)
+            start = datetime.now()
+            result = obj.merge_artifacts(filenames, batch_size = batch_size, workers = workers)
+            if isinstance(result, tuple):
+                if self.debug_level != 0:
+                    self.logger.error(f"Error merging databases due to {result[1]}")
+                raise result[0](f"Error merging databases due to {result[1]}")
+            end = datetime.now()
+            if obj.maintenance.after_ingest(sum(result.values()), self.maintenance_rows, self.maintenance_bytes, self.logger):
+                if self.debug_level != 0:
+                    self.logger.info(f"   Started the maintenance of the {obj.__class__.__name__} backend in the background")
+            if self.debug_level != 0:
+                self.logger.info(f"   Merged rows: {dict(result)}")
+                self.logger.info(f"Runtime: {end-start}")
+            if merged is None:
+                merged = result
+        return merged
+
+    def federate(self, filenames = None, backend_name = None):
+        """
+        Federates several DSI database files of one engine so that queries, finds and summaries run across all of them
+        together, until `unfederate()` is called. Each table is read as the UNION ALL of the same-named tables of all files,
+        with a `dsi_source` column holding the file of each row. Ingesting, updating and writing still use the loaded backends.
+
+        `filenames` : list of str, optional, default=None
+            SQLite or DuckDB database files to federate. If None, the files of all loaded SQLite or DuckDB backends are federated
+
+        `backend_name` : str, optional, default=None
+            Engine of the files: "Sqlite" or "DuckDB". If None, the engine of the first loaded backend, or "Sqlite"
+        """
+        from dsi.backends.federation import SqliteFederation, DuckDBFederation
+        if backend_name is None:
+            engines = [backend.__class__.__name__ for backend in self.loaded_backends if backend.__class__.__name__ in ["Sqlite", "DuckDB"]]
+            backend_name = engines[0] if len(engines) > 0 else "Sqlite"
+        if backend_name.lower() not in ["sqlite", "duckdb"]:
+            raise ValueError("Only SQLite and DuckDB databases can be federated")
+        if filenames is None:
+            filenames = [backend.filename for backend in self.loaded_backends
+                         if backend.__class__.__name__.lower() == backend_name.lower() and os.path.isfile(backend.filename)]
+        if self.debug_level != 0:
+            self.logger.info("-------------------------------------")
+            self.logger.info(f"Federating {len(filenames)} {backend_name} databases")
+        start = datetime.now()
+        federation = SqliteFederation(filenames) if backend_name.lower() == "sqlite" else DuckDBFederation(filenames)
+        self.unfederate()
+        self.federation = federation
+        end = datetime.now()
+        if self.debug_level != 0:
+            self.logger.info(f"Federated tables: {', '.join(federation.tables())}")
+            self.logger.info(f"Runtime: {end-start}")
+
+    def unfederate(self):
+        """
+        Closes the federation created by `federate()`. Queries, finds and summaries run on the first loaded backend again
+        """
+        if self.federation is not None:
+            self.federation.close()
+            self.federation = None
+
+    def read_backend(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns the backend that queries, finds and summaries run on: the federation if `federate()` was called,
+        otherwise the first loaded backend, or None if there is neither
+        """
+        if self.federation is not None:
+            return self.federation
+        return self.loaded_backends[0] if len(self.loaded_backends) > 0 else None
+
+    def time_limit(self, backend, timeout = None):
+        """
+        **Internal use only. Do not call**
+
+        Returns a context manager within which the statements of `backend` can be cancelled, by `timeout` or by its `cancel()`.
+        Backends without cancellation run without a limit
+        """
+        if hasattr(backend, "time_limit"):
+            return backend.time_limit(timeout)
+        return nullcontext()
+
+    def cancel(self):
+        """
+        Cancels the statement running on the first loaded backend or the federation, if it supports cancellation.
+        Safe to call from another thread or a signal handler.
+
+        `return`: True if a statement was cancelled, False if none was running
+        """
+        backend = self.read_backend()
+        if backend is None or not hasattr(backend, "cancel"):
+            return False
+        return backend.cancel()
+
+    def ingested_rows(self):
+        """
+        **Internal use only. Do not call**
+
+        Returns the number of rows of data in the current DSI abstraction, excluding DSI's relations and units
+        """
+        return sum(len(next(iter(table.values()), [])) for name, table in self.active_metadata.items()
+                   if name not in ("dsi_relations", "dsi_units"))
+
+    def backup_path(self, backend):
+        """
+        **Internal use only. Do not call**
+
+        Returns the path of the backup file of a Filesystem backend, next to its database file or the `persist_to` file
+        of an in-memory database. Returns None for an in-memory database without a `persist_to` file
+        """
+        path = backend.filename
+        if path == ":memory:":
+            path = backend.persistence.path
+            if path is None:
+                return None
+        extension = path.rfind('.')
+        return path[:extension] + ".backup" + path[extension:]
+
+    def backup_backend(self, backend):
+        """
+        **Internal use only. Do not call**
+
+        Backs up the database of a Filesystem backend to its `backup_path()` with the backend's `backup()`, keeping
+        `backup_generations` backups, and logs the backup runtime. An in-memory database without a `persist_to` file
+        is not backed up, and an unchanged database is not copied again
+        """
+        backup_file = self.backup_path(backend)
+        if backup_file is None:
+            if self.debug_level != 0:
+                self.logger.info("   Skipped the backup of an in-memory backend without a persist_to file")
+            return
+        backup_start = datetime.now()
+        if hasattr(backend, "backup"):
+            written = backend.backup(backup_file, self.backup_generations)
+        else:
+            shutil.copyfile(backend.filename, backup_file)
+            written = True
+        backup_end = datetime.now()
+        if self.debug_level != 0:
+            if written:
+                self.logger.info(f"   Backup file runtime: {backup_end-backup_start}")
+            else:
+                self.logger.info(f"   Skipped the backup as the data is unchanged since the last one in {backup_file}")
+
     # Internal function used to check if a backend has data
     def valid_backend(self, backend, parent_name):
         valid = False
-        if parent_name == "Filesystem":
+        if parent_name == "Federation":
+            valid = len(backend.tables()) > 0
+        elif parent_name == "Filesystem" and backend.filename == ":memory:":
+            # an in-memory database has no file to measure, so it is valid once it has a table
+            valid = len(backend.catalog.tables()) > 0
+        elif parent_name == "Filesystem":
             if backend.__class__.__name__ == "Sqlite" and os.path.getsize(backend.filename) > 100:
                 valid = True
             if backend.__class__.__name__ == "DuckDB" and os.path.getsize(backend.filename) > 13000:
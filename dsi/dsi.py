@@ -1,11 +1,13 @@
 from dsi.core import Terminal, Sync
+from dsi.backends.query_cache import QUERY_CACHE_BYTES
+from dsi.backends.query_log import SLOW_QUERY_MS
 from collections import OrderedDict
-import numpy as np
 import pandas as pd
 import os
 import sys
 from contextlib import redirect_stdout
 import io
+import glob
 
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -17,7 +19,9 @@ class DSI():
     The DSI Class abstracts Core.Terminal for managing metadata and Core.Sync for data management and movement.
     '''
 
-    def __init__(self, filename = ".temp.db", backend_name = "Sqlite", **kwargs):
+    def __init__(self, filename = ".temp.db", backend_name = "Sqlite", text_index = False, sketches = False, cache_bytes = QUERY_CACHE_BYTES,
+                 persist_to = None, persist_interval = None, profile = "default", storage_options = None, auto_index = False,
+                 query_log = None, slow_query_ms = SLOW_QUERY_MS, **kwargs):
         """
         Initializes DSI by activating a backend for data operations; default is a Sqlite backend for temporary data analysis.
         If users specify `filename`, data is saved to a permanent backend file.
@@ -27,6 +31,7 @@ class DSI():
             If not specified, a temporary, hidden backend file is created for users to analyze their data.
             If specified and backend file already exists, it is activated for a user to explore its data.
             If specified and backend file does not exist, a file with this name is created.
+            If ":memory:", all data is kept in RAM and discarded by `close()` unless saved with `persist()`.
             
             Accepted file extensions:
                 - If backend_name = "Sqlite" → .db, .sqlite, .sqlite3
@@ -35,6 +40,47 @@ class DSI():
         `backend_name` : str, optional
             Name of the backend to activate. Must be either "Sqlite" or "DuckDB".
             Default is "Sqlite".
+
+        `text_index` : bool, optional
+            If True, maintains a substring index of all data on every ingest so `search()` and `find()`
+            with `~` or `~~` do not scan every table. Default is False.
+
+        `sketches` : bool, optional
+            If True, maintains quantile, distinct-count and sample sketches of every numeric column on every ingest
+            so `summary(approx=True)` answers without scanning tables. Default is False.
+
+        `cache_bytes` : int, optional
+            Memory budget in bytes of the cache of `query()`, `get_table()` and `find()` results, which are reused until the data changes.
+            Default is 64 MiB. 0 disables the cache.
+
+        `persist_to` : str, optional
+            If specified, all data is kept in RAM like with `filename` ":memory:", and saved to this file by `persist()`,
+            by `close()` and every `persist_interval` seconds. Data already in this file is loaded first. Default is None.
+
+        `persist_interval` : float, optional
+            Minimum number of seconds between saves to `persist_to`, checked after each `read()` and `update()`.
+            If None (default), data is only saved by `persist()` and `close()`.
+
+        `profile` : str, optional
+            Storage profile of the backend: "default", "ingest-heavy", "read-heavy" or "low-memory".
+            Sets journaling, fsync, cache, memory-map, thread and memory-limit settings suited to the workload. Default is "default".
+
+        `storage_options` : dict, optional
+            Storage settings that override those of `profile`, such as {"synchronous": "OFF", "threads": 4}.
+            Valid names are listed in `dsi.backends.storage_profile.STORAGE_SETTINGS`. Default is None.
+
+        `auto_index` : bool, optional
+            If True, a column is indexed once `find()` or `query()` filtered on it 3 times.
+            If False (default), such columns are only suggested by `index_advice()`.
+            Foreign key columns are always indexed when data is loaded.
+
+        `query_log` : str, optional
+            JSON-lines file logging each statement run by `query()`, `get_table()`, `find()` and `search()`
+            with its latency and number of rows. If None (default), nothing is logged.
+
+        `slow_query_ms` : float, optional
+            Latency in milliseconds from which a logged statement is slow: its query plan is logged too,
+            and it is returned by `slow_queries()`. Default is 100.
         """
         self.t = Terminal(debug = 0, runTable=False)
         self.s = Sync()
@@ -44,14 +90,16 @@ class DSI():
         self.schema_tables = set()
         self.loaded_tables = set()
 
+        if persist_to is not None:
+            filename = ":memory:"
         if filename == ".temp.db" and os.path.exists(filename):
             os.remove(filename)
 
-        if filename != ".temp.db" and backend_name.lower() == "sqlite":
+        if filename not in [".temp.db", ":memory:"] and backend_name.lower() == "sqlite":
             file_extension = filename.rsplit(".", 1)[-1] if '.' in filename else ''
             if file_extension.lower() not in ["db", "sqlite", "sqlite3"]:
                 filename += ".db"
-        elif filename != ".temp.db" and backend_name.lower() == "duckdb":
+        elif filename not in [".temp.db", ":memory:"] and backend_name.lower() == "duckdb":
             file_extension = filename.rsplit(".", 1)[-1] if '.' in filename else ''
             if file_extension.lower() not in ["db", "duckdb"]:
                 filename += ".db"
@@ -61,11 +109,17 @@ class DSI():
         try:
             if backend_name.lower() == 'sqlite':
                 with redirect_stdout(fnull):
-                    self.t.load_module('backend','Sqlite','back-write', filename=filename, kwargs = kwargs)
+                    self.t.load_module('backend','Sqlite','back-write', filename=filename, text_index=text_index, sketches=sketches, cache_bytes=cache_bytes,
+                                      persist_to=persist_to, persist_interval=persist_interval, profile=profile,
+                                      storage_options=storage_options, auto_index=auto_index,
+                                      query_log=query_log, slow_query_ms=slow_query_ms, kwargs = kwargs)
                     self.backend_name = "sqlite"
             elif backend_name.lower() == 'duckdb':
                 with redirect_stdout(fnull):
-                    self.t.load_module('backend','DuckDB','back-write', filename=filename)
+                    self.t.load_module('backend','DuckDB','back-write', filename=filename, text_index=text_index, sketches=sketches, cache_bytes=cache_bytes,
+                                      persist_to=persist_to, persist_interval=persist_interval, profile=profile,
+                                      storage_options=storage_options, auto_index=auto_index,
+                                      query_log=query_log, slow_query_ms=slow_query_ms)
                     self.backend_name = "duckdb"
             else:
                 print("Please check the 'backend_name' argument as that one is not supported by DSI")
@@ -74,7 +128,9 @@ class DSI():
             sys.exit(f"backend ERROR: {e}")
 
         self.main_backend_obj = self.t.loaded_backends[0]
-        if filename != ".temp.db":
+        if persist_to is not None:
+            print(f"Created an in-memory instance of DSI with the {backend_name} backend, saved to {persist_to}")
+        elif filename != ".temp.db":
             print(f"Created an instance of DSI with the {backend_name} backend: {filename}")
         else:
             print("Created an instance of DSI")
@@ -308,7 +364,7 @@ class DSI():
         else:
             print(f"Loaded {filenames} into the table {table_keys[0]}")
 
-    def query(self, statement, collection = False, update = False):
+    def query(self, statement, collection = False, update = False, timeout = None):
         """
         Executes a SQL query on the active backend.
 
@@ -325,9 +381,14 @@ class DSI():
 
             If False (default), return object does not include this column.
 
+        `timeout` : float, optional, default None.
+            Number of seconds after which the query is cancelled. The backend and its data are left intact.
+
+            If None (default), the query runs until it completes.
+
         `return`: If the `statement` is incorrectly formatted, then nothing is returned or printed
         """
-        if not self.t.valid_backend(self.main_backend_obj, self.main_backend_obj.__class__.__bases__[0].__name__):
+        if not self.t.valid_backend(self.t.read_backend(), self.t.read_backend().__class__.__bases__[0].__name__):
             sys.exit("ERROR: Cannot query() on an empty backend. Please ensure there is data in it.")
         if self.schema_read == True:
             sys.exit("ERROR: Cannot query() until all associated data is loaded after a complex schema")
@@ -336,7 +397,7 @@ class DSI():
         try:
             f = io.StringIO()
             with redirect_stdout(f):
-                df = self.t.artifact_handler(interaction_type='query', query=statement)
+                df = self.t.artifact_handler(interaction_type='query', query=statement, timeout=timeout)
             output = f.getvalue()
         except Exception as e:
             sys.exit(f"query() ERROR: {e}")
@@ -358,7 +419,35 @@ class DSI():
                 df.insert(0, "dsi_table_name", self.t.get_table_names(statement)[0])
                 print("Note: Includes 'dsi_table_name' column for dsi.update(); DO NOT modify. Drop if not updating data.")
             return df
-    
+
+    def query_iter(self, statement, batch_rows = 10000, arrow = False):
+        """
+        Executes a SQL query on the active backend and returns its result in batches of rows,
+        so results larger than memory can be processed one batch at a time. Only SQLite and DuckDB backends support this.
+
+        `statement` : str
+            A SQL query to execute. Only `SELECT` and `PRAGMA` statements are allowed.
+
+        `batch_rows` : int, optional, default 10000.
+            Maximum number of rows in each batch.
+
+        `arrow` : bool, optional, default False.
+            If True, yields each batch as a pyarrow.RecordBatch.
+
+            If False (default), yields each batch as a pandas DataFrame.
+
+        `return`: an iterator over the batches of the result. It is empty if the query returns no data
+        """
+        if not self.t.valid_backend(self.t.read_backend(), self.t.read_backend().__class__.__bases__[0].__name__):
+            sys.exit("ERROR: Cannot query_iter() on an empty backend. Please ensure there is data in it.")
+        if self.schema_read == True:
+            sys.exit("ERROR: Cannot query_iter() until all associated data is loaded after a complex schema")
+
+        try:
+            return self.t.artifact_handler(interaction_type='query', query=statement, batch_rows=batch_rows, arrow=arrow)
+        except Exception as e:
+            sys.exit(f"query_iter() ERROR: {e}")
+
     def get_table(self, table_name, collection = False, update = False):
         """
         Retrieves all data from a specified table without requiring knowledge of the active backend's query language.
@@ -380,7 +469,7 @@ class DSI():
         
         `return`: If `table_name` does not exist in the backend, then nothing is returned or printed
         """
-        if not self.t.valid_backend(self.main_backend_obj, self.main_backend_obj.__class__.__bases__[0].__name__):
+        if not self.t.valid_backend(self.t.read_backend(), self.t.read_backend().__class__.__bases__[0].__name__):
             sys.exit("ERROR: Cannot get a table of data from an empty backend. Please ensure there is data in it.")
         if self.schema_read == True:
             sys.exit("ERROR: Cannot get a table of data until all associated data is loaded after a complex schema")
@@ -404,7 +493,7 @@ class DSI():
                 print("Note: Includes 'dsi_table_name' column for dsi.update(); DO NOT modify. Drop if not updating data.")
             return df
         
-    def find(self, query, collection = False, update = False):
+    def find(self, query, collection = False, update = False, timeout = None):
         """
         Finds all rows in the table where a column-level condition (e.g., "age > 4") is satisfied.
 
@@ -433,9 +522,14 @@ class DSI():
 
             If False (default), return object does not include these columns.
 
+        `timeout` : float, optional, default None.
+            Number of seconds after which the find is cancelled. The backend and its data are left intact.
+
+            If None (default), the find runs until it completes.
+
         `return` : If there are no matches found, then nothing is returned or printed
         """
-        if not self.t.valid_backend(self.main_backend_obj, self.main_backend_obj.__class__.__bases__[0].__name__):
+        if not self.t.valid_backend(self.t.read_backend(), self.t.read_backend().__class__.__bases__[0].__name__):
             sys.exit("ERROR: Cannot find() on an empty backend. Please ensure there is data in it.")
         if self.schema_read == True:
             sys.exit("ERROR: Cannot find() until all associated data is loaded after a complex schema")
@@ -453,7 +547,7 @@ class DSI():
         try:
             f = io.StringIO()
             with redirect_stdout(f):
-                find_data = self.t.find_relation(query)
+                find_data = self.t.find_relation(query, timeout=timeout)
             output = f.getvalue()
         except Exception as e:
             e = str(e).replace("query_object", "query")
@@ -496,7 +590,7 @@ class DSI():
                 print(first_msg, "keep any extra rows blank. Drop if not updating.\n")
             return output_df
     
-    def search(self, query, collection = False):
+    def search(self, query, collection = False, timeout = None):
         """
         Finds all rows across all tables in the active backend where `query` can be found.
 
@@ -507,8 +601,13 @@ class DSI():
             If True, returns a list of pandas DataFrames representing a subset of tables where `query` is found.
 
             If False (default), prints the matches to the console.
+
+        `timeout` : float, optional, default None.
+            Number of seconds after which the search, across all tables, is cancelled. The backend and its data are left intact.
+
+            If None (default), the search runs until it completes.
         """
-        if not self.t.valid_backend(self.main_backend_obj, self.main_backend_obj.__class__.__bases__[0].__name__):
+        if not self.t.valid_backend(self.t.read_backend(), self.t.read_backend().__class__.__bases__[0].__name__):
             sys.exit("ERROR: Cannot search() on an empty backend. Please ensure there is data in it.")
         if self.schema_read == True:
             sys.exit("ERROR: Cannot search() until all associated data is loaded after a complex schema")
@@ -520,7 +619,7 @@ class DSI():
 
         fnull = open(os.devnull, 'w')
         try:
-            with redirect_stdout(fnull):
+            with redirect_stdout(fnull), self.t.time_limit(self.t.read_backend(), timeout):
                 find_cell = self.t.find_cell(query, row=True)
                 find_table = self.t.find_table(query)
                 find_col = self.t.find_column(query)
@@ -570,6 +669,7 @@ class DSI():
             DataFrame must include unchanged **`dsi_`** columns from `find()`, `search()`, `query()` or `get_table()` to successfully update.
 
             - If a `query()` DataFrame is the input, the corresponding table in the backend will be completely overwritten.
+            - Otherwise only the edited rows, new rows and new columns are written to the table.
 
         `backup` : bool, optional, default False. 
             If True, creates a backup file for the DSI backend before updating its data.
@@ -579,6 +679,8 @@ class DSI():
         - NOTE: Columns from the original table cannot be deleted during update. Only row edits or column additions are allowed.
         - NOTE: If update() affects a user-defined primary key column, row order may change upon reinsertion.
         """
+        if self.t.federation is not None:
+            sys.exit("ERROR: Cannot update() federated databases. Call unfederate() first")
         if not self.t.valid_backend(self.main_backend_obj, self.main_backend_obj.__class__.__bases__[0].__name__):
             sys.exit("ERROR: Cannot update() an empty backend. Please ensure there is data in it.")
         if self.schema_read == True:
@@ -615,50 +717,24 @@ class DSI():
             if numeric_rows != sorted(numeric_rows) or len(numeric_rows) != len(set(numeric_rows)):
                 sys.exit("update() ERROR: 'dsi_row_index' must be unchanged and in increasing order.")
 
-            row_num_list = numeric_rows
             table_df = table_df.drop(columns='dsi_table_name')
             table_df = table_df.drop(columns='dsi_row_index')
-
-            fnull = open(os.devnull, 'w')
-            with redirect_stdout(fnull):
-                actual_df = self.t.get_table(table_name)
-            if actual_df.empty: # dont update if this table doesn't exist
-                print(f"WARNING: Cannot update the table '{table_name}' as it does not exist in the active backend.\n")
-                return
-            
-            if len(row_num_list) > len(actual_df) or any(ind > len(actual_df) for ind in row_num_list):
-                sys.exit("update() ERROR: 'dsi_row_index' was modified. When adding new rows, values for 'dsi_row_index' must be empty.")
-            
-            # currently prevents users from dropping columns from the original table
-            if not set(actual_df.columns).issubset(set(table_df.columns)):
-                sys.exit(f"update() ERROR: {table_name}'s edited data must contain all columns from the original table")
-            new_cols = list(set(table_df.columns) - set(actual_df.columns))
-            if new_cols:
-                for col in new_cols:
-                    actual_df[col] = None
-                actual_df = actual_df[table_df.columns]
-            
-            for col in actual_df.columns:
-                common_dtype = np.result_type(actual_df[col].to_numpy().dtype, table_df[col].to_numpy().dtype)
-                actual_df[col] = actual_df[col].astype(common_dtype)
-                table_df[col] = table_df[col].astype(common_dtype)
-            
-            id_list = [x - 1 for x in row_num_list] # IF ROW NUMBERS ARE 1-INDEXED NOT 0-INDEXED
-            table_df_max_len = table_df.iloc[:len(id_list)]
-            actual_df.loc[id_list] = table_df_max_len.values
-            if len(table_df) > len(id_list):
-                extra_rows = table_df.iloc[len(id_list):]
-                actual_df = pd.concat([actual_df, extra_rows], ignore_index=True)
         else:
             collection = collection.drop(columns='dsi_table_name')
             actual_df = collection.copy()
         
         try:
             if backup == True:
-                extension = self.database_name.rfind('.')
-                backup_file = self.database_name[:extension] + ".backup" + self.database_name[extension:]
-                print(f"Created backup '{backup_file}' before updating the data.")
-            self.t.overwrite_table(table_name, actual_df, backup)
+                backup_file = self.t.backup_path(self.main_backend_obj)
+                if backup_file is None:
+                    print("Skipped the backup of in-memory data that has no persist_to file.")
+                else:
+                    print(f"Created backup '{backup_file}' before updating the data.")
+            if actual_df is None:
+                # only the edited and new rows are written, the rest of the table is not read or rewritten
+                self.t.update_table(table_name, table_df, numeric_rows, backup)
+            else:
+                self.t.overwrite_table(table_name, actual_df, backup)
         except Exception as e:
             sys.exit(f"update() ERROR: {e}")
     
@@ -712,8 +788,13 @@ class DSI():
         if self.schema_read == True:
             sys.exit("ERROR: Cannot write() until all associated data is loaded after a complex schema")
 
+        # writers of a single table only need that table (plus the run and unit tables a plot reads)
+        process_args = {}
+        if table_name is not None and not writer_name.endswith(".py") and writer_name.lower() not in ["er_diagram", "er diagram"]:
+            process_args["table_names"] = [table_name, "runTable", "dsi_units"]
+
         try:        
-            self.t.artifact_handler(interaction_type='process')
+            self.t.artifact_handler(interaction_type='process', **process_args)
         except Exception as e:
             sys.exit(f"write() ERROR: {e}")
 
@@ -800,7 +881,7 @@ class DSI():
             
             If False (default), prints each table's name and dimensions to the console.
         """
-        if not self.t.valid_backend(self.main_backend_obj, self.main_backend_obj.__class__.__bases__[0].__name__):
+        if not self.t.valid_backend(self.t.read_backend(), self.t.read_backend().__class__.__bases__[0].__name__):
             sys.exit("ERROR: Cannot list() tables of an empty backend. Please ensure there is data in it.")
         if self.schema_read == True:
             sys.exit("ERROR: Cannot call list() until all associated data is loaded after a complex schema")
@@ -821,7 +902,7 @@ class DSI():
         else:
             print(output)
 
-    def summary(self, table_name = None, collection = False):
+    def summary(self, table_name = None, collection = False, approx = False):
         """
         Prints numerical metadata and (optionally) sample data from tables in the active backend.
 
@@ -836,8 +917,12 @@ class DSI():
             If True, and table_name not specified, returns a list of Pandas DataFrames of the summary of all tables.
             
             If False (default), prints each table's name and dimensions to the console.
+
+        `approx` : bool, optional, default False.
+            If True, also reports approximate p50, p95 and p99 quantiles, distinct counts and a random sample of each numeric
+            column. Quantiles are within 1.65% of the requested rank and distinct counts within 3.3%, with high probability.
         """
-        if not self.t.valid_backend(self.main_backend_obj, self.main_backend_obj.__class__.__bases__[0].__name__):
+        if not self.t.valid_backend(self.t.read_backend(), self.t.read_backend().__class__.__bases__[0].__name__):
             sys.exit("ERROR: Cannot call summary() on an empty backend. Please ensure there is data in it.")
         if self.schema_read == True:
             sys.exit("ERROR: Cannot call summary() until all associated data is loaded after a complex schema")
@@ -846,7 +931,7 @@ class DSI():
         try:
             f = io.StringIO()
             with redirect_stdout(f):
-                summary_df = self.t.summary(table_name, collection)
+                summary_df = self.t.summary(table_name, collection, approx)
             output = f.getvalue()
         except Exception as e:
             sys.exit(f"summary() ERROR: {e}")
@@ -860,7 +945,7 @@ class DSI():
         """
         Prints the number of tables in the active backend.
         """
-        if not self.t.valid_backend(self.main_backend_obj, self.main_backend_obj.__class__.__bases__[0].__name__):
+        if not self.t.valid_backend(self.t.read_backend(), self.t.read_backend().__class__.__bases__[0].__name__):
             sys.exit("ERROR: Cannot call num_tables() on an empty backend. Please ensure there is data in it.")
         if self.schema_read == True:
             sys.exit("ERROR: Cannot call num_tables() until all associated data is loaded after a complex schema")
@@ -884,7 +969,7 @@ class DSI():
 
             If None (default), all columns are displayed.
         """
-        if not self.t.valid_backend(self.main_backend_obj, self.main_backend_obj.__class__.__bases__[0].__name__):
+        if not self.t.valid_backend(self.t.read_backend(), self.t.read_backend().__class__.__bases__[0].__name__):
             sys.exit("ERROR: Cannot call display() data from an empty backend. Please ensure there is data in it.")
         if self.schema_read == True:
             sys.exit("ERROR: Cannot display() until all associated data is loaded after a complex schema")
@@ -896,6 +981,145 @@ class DSI():
         except Exception as e:
             sys.exit(f"display() ERROR: {e}")
 
+    def cache_stats(self):
+        """
+        Returns statistics of the active backend's cache of `query()`, `get_table()` and `find()` results as a dict:
+        the number of cache `hits`, `misses` and `evictions`, and the number of cached `entries`, their approximate `bytes`
+        and the `max_bytes` budget.
+        """
+        return self.main_backend_obj.cache_stats()
+
+    def create_index(self, table_name, column_name):
+        """
+        Creates an index on a column of the active backend so `find()` and `query()` filtering on it do not scan the whole table.
+        The index is kept when the table is updated or overwritten.
+
+        `table_name` : str
+            Name of the table.
+
+        `column_name` : str
+            Name of the column to index.
+        """
+        if self.schema_read == True:
+            sys.exit("ERROR: Cannot create_index() until all associated data is loaded after a complex schema")
+        result = self.main_backend_obj.create_index(table_name, column_name)
+        if isinstance(result, tuple):
+            sys.exit(f"create_index() ERROR: {result[1]}")
+        print(f"Created index {result} on '{column_name}' of '{table_name}'")
+
+    def drop_index(self, table_name, column_name):
+        """
+        Drops the index DSI created on a column of the active backend, either when data was loaded, by `create_index()`
+        or with `auto_index`.
+
+        `table_name` : str
+            Name of the table.
+
+        `column_name` : str
+            Name of the indexed column.
+        """
+        errorStmt = self.main_backend_obj.drop_index(table_name, column_name)
+        if errorStmt is not None:
+            sys.exit(f"drop_index() ERROR: {errorStmt[1]}")
+        print(f"Dropped the index on '{column_name}' of '{table_name}'")
+
+    def index_advice(self):
+        """
+        Returns the columns of the active backend that `find()` and `query()` filtered on at least 3 times
+        and that have no index, most filtered first, as a list of (table, column, number of filters).
+        Each can be indexed with `create_index()`.
+        """
+        return self.main_backend_obj.index_advice()
+
+    def slow_queries(self, limit = None):
+        """
+        Returns the statements in the `query_log` file that took at least `slow_query_ms` milliseconds, slowest first,
+        as a pandas DataFrame with the `time`, `origin`, `sql`, `latency_ms`, `rows` and query `plan` of each statement.
+        `origin` is the backend function that ran it, such as query_artifacts for `query()` or find_cell for `search()`.
+
+        `limit` : int, optional
+            Maximum number of statements returned. If None (default), all slow statements are returned.
+        """
+        if self.main_backend_obj.query_log.path is None:
+            sys.exit("slow_queries() ERROR: Create DSI with a query_log file to record slow queries")
+        return pd.DataFrame(self.main_backend_obj.slow_queries(limit), columns=["time", "origin", "sql", "latency_ms", "rows", "plan"])
+
+    def merge(self, filenames, batch_size = None, workers = None):
+        """
+        Merges many DSI database files, such as the files written by each rank or run of a job, into the active backend.
+        The files must be of this instance's backend type.
+
+        Rows are copied by the database engine rather than read into Python. Tables and columns missing from the active backend
+        are added, units of the same column must match across all files, and runs are renumbered so that every `run_id`
+        refers to the same run in the active backend. Each run of each file stays a separate run, even if several share a
+        `run_timestamp`, while the runs of a file merged again keep their run_ids. Runs sharing a `run_timestamp` can only be merged
+        into a backend whose runTable was created by a merge, or that has none, as a runTable written by `read()` allows one run per timestamp.
+
+        `filenames` : str or list of str
+            DSI database files to merge, or a glob pattern matching them. Ex: "shards/*.db"
+
+        `batch_size` : int, optional, default=None
+            Number of files merged together in one transaction. If None, 10 for SQLite (the most it can attach) and 64 for DuckDB.
+
+        `workers` : int, optional, default=None
+            Number of threads reading the schemas of the files before they are merged. If None, 8.
+        """
+        if self.schema_read == True:
+            sys.exit("ERROR: Cannot merge() until all associated data is loaded after a complex schema")
+        if isinstance(filenames, str):
+            filenames = sorted(glob.glob(filenames)) if glob.has_magic(filenames) else [filenames]
+        if len(filenames) == 0:
+            sys.exit("merge() ERROR: No database files to merge")
+        try:
+            merged = self.t.merge(filenames, batch_size, workers)
+        except Exception as e:
+            sys.exit(f"merge() ERROR: {e}")
+        print(f"Merged {len(filenames)} databases into the active backend")
+        for table_name, num_rows in merged.items():
+            print(f"  - {table_name}: {num_rows} rows")
+
+    def federate(self, filenames):
+        """
+        Queries several DSI database files together, such as the databases of several campaigns or projects,
+        until `unfederate()` is called. The files must be of this instance's backend type.
+
+        Afterwards `query()`, `find()`, `search()`, `summary()`, `list()` and `display()` run across all the files in one pass
+        of the database engine per table. Each table is read as all same-named tables of the files stacked together,
+        with a `dsi_source` column holding the file each row came from. Columns missing from a file are empty.
+        Data is still loaded into, and written from, this instance's own backend.
+
+        `filenames` : list of str
+            DSI database files to query together. A SQLite backend attaches up to 10 files directly. Beyond that it copies
+            the files into a temporary database, so rows written to them afterwards only show after calling `federate()` again.
+        """
+        if isinstance(filenames, str):
+            filenames = [filenames]
+        try:
+            self.t.federate(filenames, self.backend_name)
+        except Exception as e:
+            sys.exit(f"federate() ERROR: {e}")
+        print(f"Federated {len(filenames)} databases with the tables: {', '.join(self.t.federation.tables())}")
+
+    def unfederate(self):
+        """
+        Stops querying the files passed to `federate()`. Queries run on this instance's own backend again
+        """
+        self.t.unfederate()
+        print("Queries run on the active backend again")
+
+    def persist(self, filename = None):
+        """
+        Saves the data of an in-memory DSI instance, created with `filename` ":memory:" or `persist_to`, to a database file.
+        Data already in that file is replaced.
+
+        `filename` : str, optional
+            File to save the data to. If None (default), the data is saved to the `persist_to` file.
+        """
+        errorStmt = self.main_backend_obj.persist(filename)
+        if errorStmt is not None:
+            sys.exit(f"persist() ERROR: {errorStmt[1]}")
+        print(f"Saved the in-memory data to {filename or self.main_backend_obj.persistence.path}")
+
     def close(self):
         """
         Closes the connection to the active backend and clears all loaded DSI modules.